@@ -0,0 +1,2 @@
+# -*- coding: utf-8 -*-
+"""Local mock server and throughput benchmarks (python -m bench.run_bench)."""
@@ -0,0 +1,324 @@
+# -*- coding: utf-8 -*-
+"""
+Local stand-in for the Labs video API and Gemini generateContent.
+
+Emulates the endpoints of services/endpoints.py (uploadUserImage, I2V/T2V
+batchAsyncGenerate*, batchCheckAsyncVideoGenerationStatus) plus Gemini
+generateContent / streamGenerateContent, with configurable latency, injected
+400/429/503 errors and fake MP4 payloads, so pipeline throughput can be
+measured without spending quota.
+
+Point the app at it through the environment (read when services.endpoints /
+services.core.api_config are first imported):
+    VEO_LABS_BASE=http://127.0.0.1:8799
+    VEO_GEMINI_BASE=http://127.0.0.1:8799/v1beta
+
+Standalone:
+    python -m bench.mock_server --port 8799 --gen-seconds 20 --err-429 0.05
+"""
+import argparse
+import json
+import random
+import re
+import struct
+import threading
+import time
+import uuid
+import zlib
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, Optional
+from urllib.parse import urlparse
+
+_ERRORS = {
+    400: ("INVALID_ARGUMENT", "Request contains an invalid argument."),
+    429: ("RESOURCE_EXHAUSTED", "Quota exceeded (mock)."),
+    503: ("UNAVAILABLE", "The service is currently unavailable (mock)."),
+}
+_MP4_HEAD = b"\x00\x00\x00\x18ftypmp42\x00\x00\x00\x00mp42isom"
+
+
+def tiny_png(seed: int = 0, size: int = 64) -> bytes:
+    """A valid solid-colour PNG; different seeds give different bytes (defeats the upload cache)."""
+    rnd = random.Random(seed)
+    px = bytes((rnd.randrange(256), rnd.randrange(256), rnd.randrange(256)))
+    raw = b"".join(b"\x00" + px * size for _ in range(size))
+
+    def chunk(kind, data):
+        return struct.pack(">I", len(data)) + kind + data + struct.pack(">I", zlib.crc32(kind + data) & 0xffffffff)
+    return (b"\x89PNG\r\n\x1a\n" + chunk(b"IHDR", struct.pack(">IIBBBBB", size, size, 8, 2, 0, 0, 0))
+            + chunk(b"IDAT", zlib.compress(raw)) + chunk(b"IEND", b""))
+
+
+class MockLabsServer:
+    """
+    Args:
+        host, port: Bind address (port 0 = pick a free port)
+        latency: Mean seconds added to every API call (±jitter fraction)
+        jitter: Relative latency spread, 0..1
+        gen_seconds: Mean time until an operation completes (±jitter fraction)
+        fail_rate: Fraction of operations that finish as FAILED
+        error_rates: {400|429|503: probability} injected on API calls (not media GETs)
+        video_bytes: Size of each fake MP4
+        gemini_latency: Seconds before a Gemini reply starts
+        gemini_scenes: Scenes in each fake script
+        stream_chunk_delay: Seconds between streamed Gemini chunks
+        seed: Random seed (None = nondeterministic)
+    """
+
+    def __init__(self, host: str = "127.0.0.1", port: int = 0, latency: float = 0.05, jitter: float = 0.3,
+                 gen_seconds: float = 8.0, fail_rate: float = 0.0, error_rates: Optional[Dict[int, float]] = None,
+                 video_bytes: int = 512 * 1024, gemini_latency: float = 0.5, gemini_scenes: int = 8,
+                 stream_chunk_delay: float = 0.05, seed: Optional[int] = None):
+        self.latency = float(latency)
+        self.jitter = max(0.0, min(1.0, float(jitter)))
+        self.gen_seconds = float(gen_seconds)
+        self.fail_rate = float(fail_rate)
+        self.error_rates = {int(k): float(v) for k, v in (error_rates or {}).items() if v}
+        self.video_bytes = max(len(_MP4_HEAD), int(video_bytes))
+        self.gemini_latency = float(gemini_latency)
+        self.gemini_scenes = int(gemini_scenes)
+        self.stream_chunk_delay = float(stream_chunk_delay)
+        self._rnd = random.Random(seed)
+        self._lock = threading.Lock()
+        self._ops: Dict[str, Dict[str, Any]] = {}
+        self._payload = _MP4_HEAD + b"\x00" * (self.video_bytes - len(_MP4_HEAD))
+        self.reset_stats()
+        self._httpd = ThreadingHTTPServer((host, port), self._handler_class())
+        self._httpd.daemon_threads = True
+        self._thread: Optional[threading.Thread] = None
+
+    # ---- lifecycle --------------------------------------------------
+    @property
+    def base_url(self) -> str:
+        host, port = self._httpd.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self) -> "MockLabsServer":
+        self._thread = threading.Thread(target=self._httpd.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._httpd.shutdown()
+        self._httpd.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    def environ(self) -> Dict[str, str]:
+        """Environment overrides that send the app's Labs/Gemini calls here."""
+        return {"VEO_LABS_BASE": self.base_url, "VEO_GEMINI_BASE": self.base_url + "/v1beta"}
+
+    # ---- stats ------------------------------------------------------
+    def reset_stats(self):
+        with self._lock:
+            self._stats = {"calls": {}, "errors": {}, "bytes_sent": 0, "ops_started": 0}
+
+    def _count(self, kind: str, route: str, n: int = 1):
+        with self._lock:
+            self._stats[kind][route] = self._stats[kind].get(route, 0) + n
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return json.loads(json.dumps(self._stats))
+
+    def op_times(self) -> Dict[str, Dict[str, float]]:
+        """{op_name: {"created": t, "ready": t}} in time.time() seconds."""
+        with self._lock:
+            return {k: {"created": v["created"], "ready": v["ready"], "scene": v["scene"]} for k, v in self._ops.items()}
+
+    # ---- behaviour --------------------------------------------------
+    def _spread(self, mean: float) -> float:
+        if mean <= 0:
+            return 0.0
+        with self._lock:
+            return max(0.0, mean * (1 + self._rnd.uniform(-self.jitter, self.jitter)))
+
+    def _roll_error(self) -> Optional[int]:
+        with self._lock:
+            r = self._rnd.random()
+        acc = 0.0
+        for code, p in sorted(self.error_rates.items()):
+            acc += p
+            if r < acc:
+                return code
+        return None
+
+    def _start_ops(self, body: Dict[str, Any]) -> Dict[str, Any]:
+        now = time.time()
+        scene = uuid.uuid4().hex[:8]
+        ops = []
+        for _ in body.get("requests") or [{}]:
+            name = uuid.uuid4().hex
+            with self._lock:
+                failed = self._rnd.random() < self.fail_rate
+            ready = now + self._spread(self.gen_seconds)
+            with self._lock:
+                self._ops[name] = {"created": now, "ready": ready, "failed": failed, "scene": scene}
+                self._stats["ops_started"] += 1
+            ops.append({"operation": {"name": name}, "sceneId": scene, "status": "MEDIA_GENERATION_STATUS_PENDING"})
+        return {"operations": ops, "remainingCredits": 1000}
+
+    def _check_ops(self, body: Dict[str, Any], base: str) -> Dict[str, Any]:
+        now = time.time()
+        out = []
+        for item in body.get("operations") or []:
+            name = (item.get("operation") or {}).get("name") or item.get("name") or ""
+            with self._lock:
+                op = self._ops.get(name)
+            if op is None:
+                out.append({"operation": {"name": name}, "status": "MEDIA_GENERATION_STATUS_FAILED",
+                            "error": {"message": "unknown operation"}})
+            elif now < op["ready"]:
+                out.append({"operation": {"name": name}, "sceneId": op["scene"], "status": "MEDIA_GENERATION_STATUS_ACTIVE"})
+            elif op["failed"]:
+                out.append({"operation": {"name": name}, "sceneId": op["scene"], "status": "MEDIA_GENERATION_STATUS_FAILED"})
+            else:
+                out.append({"operation": {"name": name, "metadata": {"video": {
+                                "fifeUrl": f"{base}/media/video/{name}.mp4",
+                                "servingBaseUri": f"{base}/media/image/{name}.jpg"}}},
+                            "thumbnail": {"url": f"{base}/media/image/{name}.jpg"},
+                            "sceneId": op["scene"], "status": "MEDIA_GENERATION_STATUS_SUCCESSFUL"})
+        return {"operations": out}
+
+    def _script_text(self) -> str:
+        scenes = [{"scene": i + 1, "prompt": f"Mock scene {i + 1}: a calm establishing shot, soft light.",
+                   "duration": 8} for i in range(self.gemini_scenes)]
+        return json.dumps({"title": "Mock script", "scenes": scenes}, ensure_ascii=False)
+
+    def _handler_class(self):
+        srv = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, *args):
+                pass
+
+            def _send(self, code: int, data: bytes, ctype: str = "application/json", headers=None):
+                self.send_response(code)
+                self.send_header("Content-Type", ctype)
+                self.send_header("Content-Length", str(len(data)))
+                for k, v in (headers or {}).items():
+                    self.send_header(k, v)
+                self.end_headers()
+                if self.command != "HEAD":
+                    self.wfile.write(data)
+                with srv._lock:
+                    srv._stats["bytes_sent"] += len(data)
+
+            def _json(self, code: int, obj):
+                self._send(code, json.dumps(obj).encode("utf-8"))
+
+            def _body(self) -> Dict[str, Any]:
+                n = int(self.headers.get("Content-Length") or 0)
+                try:
+                    return json.loads(self.rfile.read(n) or b"{}")
+                except ValueError:
+                    return {}
+
+            def do_POST(self):
+                path = urlparse(self.path).path
+                body = self._body()
+                route = {"/v1:uploadUserImage": "upload",
+                         "/v1/video:batchAsyncGenerateVideoStartImage": "i2v",
+                         "/v1/video:batchAsyncGenerateVideoText": "t2v",
+                         "/v1/video:batchCheckAsyncVideoGenerationStatus": "check"}.get(path)
+                if route is None and re.match(r"^/v1beta/models/[^/:]+:(stream)?[gG]enerateContent$", path):
+                    route = "gemini_stream" if ":stream" in path else "gemini"
+                if route is None:
+                    self._json(404, {"error": {"code": 404, "message": f"no mock for {path}"}})
+                    return
+                srv._count("calls", route)
+                time.sleep(srv._spread(srv.gemini_latency if route.startswith("gemini") else srv.latency))
+                code = srv._roll_error()
+                if code:
+                    srv._count("errors", str(code))
+                    status, msg = _ERRORS[code]
+                    self._json(code, {"error": {"code": code, "message": msg, "status": status}})
+                    return
+                if route == "upload":
+                    self._json(200, {"mediaGenerationId": {"mediaGenerationId": "mock-" + uuid.uuid4().hex}})
+                elif route in ("i2v", "t2v"):
+                    self._json(200, srv._start_ops(body))
+                elif route == "check":
+                    self._json(200, srv._check_ops(body, srv.base_url))
+                elif route == "gemini":
+                    self._json(200, {"candidates": [{"content": {"role": "model", "parts": [{"text": srv._script_text()}]}}]})
+                else:
+                    self._stream(srv._script_text())
+
+            def _stream(self, text: str):
+                self.send_response(200)
+                self.send_header("Content-Type", "text/event-stream")
+                self.send_header("Connection", "close")
+                self.end_headers()
+                self.close_connection = True
+                step = max(1, len(text) // 20)
+                for i in range(0, len(text), step):
+                    ev = {"candidates": [{"content": {"role": "model", "parts": [{"text": text[i:i + step]}]}}]}
+                    data = f"data: {json.dumps(ev)}\r\n\r\n".encode("utf-8")
+                    self.wfile.write(data)
+                    self.wfile.flush()
+                    with srv._lock:
+                        srv._stats["bytes_sent"] += len(data)
+                    time.sleep(srv.stream_chunk_delay)
+
+            def do_GET(self):
+                path = urlparse(self.path).path
+                if path.startswith("/media/video/"):
+                    srv._count("calls", "video")
+                    payload = srv._payload
+                    rng = re.match(r"bytes=(\d+)-", self.headers.get("Range") or "")
+                    if rng and int(rng.group(1)) < len(payload):
+                        start = int(rng.group(1))
+                        self._send(206, payload[start:], "video/mp4",
+                                   {"Content-Range": f"bytes {start}-{len(payload) - 1}/{len(payload)}"})
+                    elif rng:
+                        self._send(416, b"", "video/mp4", {"Content-Range": f"bytes */{len(payload)}"})
+                    else:
+                        self._send(200, payload, "video/mp4")
+                elif path.startswith("/media/image/"):
+                    srv._count("calls", "image")
+                    self._send(200, tiny_png(hash(path) & 0xffff, 32), "image/png")
+                elif path == "/stats":
+                    self._json(200, srv.stats())
+                else:
+                    self._json(404, {"error": {"code": 404, "message": "not found"}})
+
+            do_HEAD = do_GET
+
+        return Handler
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="Mock Labs/Gemini server for local benchmarks.")
+    ap.add_argument("--host", default="127.0.0.1")
+    ap.add_argument("--port", type=int, default=8799)
+    ap.add_argument("--latency", type=float, default=0.05, help="Mean API latency (s)")
+    ap.add_argument("--gen-seconds", type=float, default=8.0, help="Mean video generation time (s)")
+    ap.add_argument("--fail-rate", type=float, default=0.0)
+    ap.add_argument("--err-400", type=float, default=0.0)
+    ap.add_argument("--err-429", type=float, default=0.0)
+    ap.add_argument("--err-503", type=float, default=0.0)
+    ap.add_argument("--video-kb", type=int, default=512)
+    args = ap.parse_args(argv)
+    srv = MockLabsServer(args.host, args.port, latency=args.latency, gen_seconds=args.gen_seconds,
+                         fail_rate=args.fail_rate, video_bytes=args.video_kb * 1024,
+                         error_rates={400: args.err_400, 429: args.err_429, 503: args.err_503})
+    print(f"Mock server on {srv.base_url}")
+    for k, v in srv.environ().items():
+        print(f"  export {k}={v}")
+    srv.start()
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        srv.stop()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,243 @@
+# -*- coding: utf-8 -*-
+"""
+End-to-end throughput benchmarks against the local mock server.
+
+    python -m bench.run_bench                                  # all scenarios, defaults
+    python -m bench.run_bench --scenes 40 --projects 4 --tokens 3 --err-429 0.05
+    python -m bench.run_bench --json after.json --baseline before.json
+
+Scenarios:
+  pipeline  BatchRunner: upload -> start -> poll -> download for every scene
+  poller    shared OperationPoller on already started operations
+  download  DownloadManager on N fake videos
+  gemini    script generation request, plain vs streamed
+
+Reported: scenes/minute, p50/p95 time-to-first-video, HTTP calls per scene
+(per endpoint), poll detection lag, download MB/s and Gemini time-to-first-scene.
+Run once before and once after a performance change and compare with --baseline.
+"""
+import argparse
+import json
+import math
+import os
+import shutil
+import sys
+import tempfile
+import time
+from concurrent.futures import as_completed
+from typing import Any, Dict, List
+
+from bench.mock_server import MockLabsServer, tiny_png
+
+SCENARIOS = ("pipeline", "poller", "download", "gemini")
+
+
+def pct(values: List[float], p: float) -> float:
+    """Nearest-rank percentile (0 for an empty list)."""
+    if not values:
+        return 0.0
+    xs = sorted(values)
+    return round(xs[min(len(xs) - 1, max(0, math.ceil(p / 100.0 * len(xs)) - 1))], 3)
+
+
+def _per_scene(calls: Dict[str, int], scenes: int) -> Dict[str, float]:
+    out = {k: round(v / max(1, scenes), 2) for k, v in sorted(calls.items())}
+    out["total"] = round(sum(calls.values()) / max(1, scenes), 2)
+    return out
+
+
+def _client(kind: str, tokens: int):
+    if kind == "service":
+        from services.labs_flow_service import LabsClient
+    else:
+        from services.google.labs_flow_client import LabsFlowClient as LabsClient
+    return LabsClient([f"bench-token-{i}-{os.getpid()}" for i in range(max(1, tokens))])
+
+
+# ---- scenarios -------------------------------------------------------
+def bench_pipeline(srv: MockLabsServer, args, work: str) -> Dict[str, Any]:
+    from services.batch_runner import BatchRunner
+
+    in_dir = os.path.join(work, "in")
+    per = max(1, args.scenes // args.projects)
+    seed = int(time.time())
+    for p in range(args.projects):
+        d = os.path.join(in_dir, f"bench_{p + 1}")
+        os.makedirs(d)
+        with open(os.path.join(d, "prompts.json"), "w", encoding="utf-8") as f:
+            json.dump({"scenes": [{"prompt": f"Bench scene {p + 1}.{i + 1}"} for i in range(per)]}, f)
+        for i in range(per):
+            with open(os.path.join(d, f"{i + 1:03d}.png"), "wb") as f:
+                f.write(tiny_png(seed + p * 1000 + i))
+    srv.reset_stats()
+    runner = BatchRunner(_client(args.client, args.tokens), os.path.join(work, "out"), args.model,
+                         "VIDEO_ASPECT_RATIO_LANDSCAPE", copies=args.copies, projects=args.projects,
+                         upload_workers=args.upload_workers, start_interval=args.start_interval,
+                         timeout=args.timeout, async_submit=args.async_submit, on_log=(lambda lv, m: print(f"  [{lv}] {m}")) if args.verbose else None)
+    t0 = time.time()
+    results = runner.run(in_dir)
+    wall = time.time() - t0
+    # time-to-first-video: first finished .mp4 of each scene, from the start of the run
+    ttfv = []
+    for res in results:
+        firsts: Dict[str, float] = {}
+        for name in os.listdir(res.get("videos_dir") or work):
+            if name.endswith(".mp4"):
+                scene = name.rsplit("_video_", 1)[0]
+                mt = os.path.getmtime(os.path.join(res["videos_dir"], name))
+                firsts[scene] = min(firsts.get(scene, mt), mt)
+        ttfv += [mt - t0 for mt in firsts.values()]
+    scenes = sum(r.get("scenes", 0) for r in results)
+    st = srv.stats()
+    return {"scenes": scenes, "videos": sum(r.get("downloaded", 0) for r in results), "seconds": round(wall, 2),
+            "scenes_per_min": round(scenes * 60.0 / max(wall, 1e-6), 2),
+            "ttfv_p50": pct(ttfv, 50), "ttfv_p95": pct(ttfv, 95),
+            "http_per_scene": _per_scene(st["calls"], scenes), "errors": st["errors"]}
+
+
+def bench_poller(srv: MockLabsServer, args, work: str) -> Dict[str, Any]:
+    from services.operation_poller import get_poller, is_terminal
+
+    client = _client(args.client, args.tokens)
+    names = []
+    for i in range(args.scenes):
+        job = {"scene_id": str(i + 1)}
+        client.start_one(job, "veo_3_1_t2v_fast_ultra", "VIDEO_ASPECT_RATIO_LANDSCAPE", f"poll {i}",
+                         copies=args.copies, settle_delay=0)
+        names += job.get("operation_names") or []
+    srv.reset_stats()
+    ready = srv.op_times()
+    seen: Dict[str, float] = {}
+    t0 = time.time()
+    for name, info in get_poller().iter_updates(names, client=client, timeout=args.timeout):
+        if is_terminal(info):
+            seen.setdefault(name, time.time())
+    wall = time.time() - t0
+    lag = [seen[n] - ready[n]["ready"] for n in seen if n in ready]
+    checks = srv.stats()["calls"].get("check", 0)
+    return {"operations": len(names), "finished": len(seen), "seconds": round(wall, 2),
+            "detect_lag_p50": pct(lag, 50), "detect_lag_p95": pct(lag, 95), "check_calls": checks,
+            "checks_per_op": round(checks / max(1, len(names)), 2), "errors": srv.stats()["errors"]}
+
+
+def bench_download(srv: MockLabsServer, args, work: str) -> Dict[str, Any]:
+    from services.utils.download_manager import get_download_manager
+
+    dm = get_download_manager()
+    out = os.path.join(work, "dl")
+    srv.reset_stats()
+    t0 = time.time()
+    futs = [dm.submit(f"{srv.base_url}/media/video/bench{i}.mp4", os.path.join(out, f"v{i}.mp4"))
+            for i in range(args.scenes * args.copies)]
+    res = [f.result() for f in as_completed(futs)]
+    wall = time.time() - t0
+    total = sum(r["bytes"] for r in res)
+    return {"files": len(res), "ok": sum(1 for r in res if r["ok"]), "workers": dm.workers,
+            "seconds": round(wall, 2), "mbps": round(total / max(wall, 1e-6) / 1048576, 2),
+            "file_p50": pct([r["seconds"] for r in res], 50), "file_p95": pct([r["seconds"] for r in res], 95)}
+
+
+def bench_gemini(srv: MockLabsServer, args, work: str) -> Dict[str, Any]:
+    import requests
+    from services.core.api_config import gemini_text_endpoint
+    from services.llm_stream import collect, gemini_stream
+
+    url = gemini_text_endpoint("bench-key")
+    body = {"contents": [{"role": "user", "parts": [{"text": "bench"}]}]}
+    plain, first, full = [], [], []
+    for _ in range(args.gemini_runs):
+        t0 = time.time()
+        requests.post(url, json=body, timeout=60).raise_for_status()
+        plain.append(time.time() - t0)
+        t0 = time.time()
+        marks = []
+        collect(gemini_stream(url, body, 60), lambda i, sc: marks.append(time.time() - t0))
+        full.append(time.time() - t0)
+        if marks:
+            first.append(marks[0])
+    return {"runs": args.gemini_runs, "plain_p50": pct(plain, 50), "stream_first_scene_p50": pct(first, 50),
+            "stream_full_p50": pct(full, 50)}
+
+
+# ---- reporting -------------------------------------------------------
+def _flat(d: Dict[str, Any], prefix: str = "") -> Dict[str, float]:
+    out = {}
+    for k, v in d.items():
+        if isinstance(v, dict):
+            out.update(_flat(v, f"{prefix}{k}."))
+        elif isinstance(v, (int, float)):
+            out[prefix + k] = v
+    return out
+
+
+def report(results: Dict[str, Dict[str, Any]], baseline: Dict[str, Dict[str, Any]] = None):
+    for name, res in results.items():
+        print(f"\n== {name} ==")
+        base = _flat((baseline or {}).get(name) or {})
+        for k, v in _flat(res).items():
+            line = f"  {k:<28} {v:>10}"
+            if k in base and base[k]:
+                line += f"   (trước: {base[k]}, {(v - base[k]) * 100.0 / base[k]:+.1f}%)"
+            print(line)
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="Đo hiệu năng pipeline video trên mock server.")
+    ap.add_argument("--scenarios", default=",".join(SCENARIOS), help="Danh sách, cách nhau bởi dấu phẩy")
+    ap.add_argument("--scenes", type=int, default=12)
+    ap.add_argument("--projects", type=int, default=2)
+    ap.add_argument("--copies", type=int, default=2)
+    ap.add_argument("--tokens", type=int, default=2)
+    ap.add_argument("--client", choices=("flow", "service"), default="flow",
+                    help="flow = services.google.labs_flow_client, service = services.labs_flow_service")
+    ap.add_argument("--model", default="veo_3_1_i2v_s_fast_ultra")
+    ap.add_argument("--upload-workers", type=int, default=4)
+    ap.add_argument("--async-submit", action="store_true", help="Gửi cảnh qua AsyncLabsFlowClient (aiohttp)")
+    ap.add_argument("--start-interval", type=float, default=1.2)
+    ap.add_argument("--timeout", type=float, default=600)
+    ap.add_argument("--latency", type=float, default=0.05)
+    ap.add_argument("--gen-seconds", type=float, default=8.0)
+    ap.add_argument("--fail-rate", type=float, default=0.0)
+    ap.add_argument("--err-400", type=float, default=0.0)
+    ap.add_argument("--err-429", type=float, default=0.0)
+    ap.add_argument("--err-503", type=float, default=0.0)
+    ap.add_argument("--video-kb", type=int, default=512)
+    ap.add_argument("--gemini-runs", type=int, default=3)
+    ap.add_argument("--seed", type=int, default=None)
+    ap.add_argument("--json", help="Ghi kết quả ra file JSON")
+    ap.add_argument("--baseline", help="File JSON của lần đo trước để so sánh")
+    ap.add_argument("-v", "--verbose", action="store_true")
+    args = ap.parse_args(argv)
+    args.projects = max(1, min(args.projects, args.scenes))
+
+    srv = MockLabsServer(latency=args.latency, gen_seconds=args.gen_seconds, fail_rate=args.fail_rate,
+                         video_bytes=args.video_kb * 1024, seed=args.seed,
+                         error_rates={400: args.err_400, 429: args.err_429, 503: args.err_503}).start()
+    if any(m.startswith("services") for m in sys.modules):
+        print("Cảnh báo: services đã được import trước khi đặt VEO_LABS_BASE; kết quả có thể gọi API thật.")
+    os.environ.update(srv.environ())
+    work = tempfile.mkdtemp(prefix="veo_bench_")
+    results = {}
+    try:
+        for name in [s.strip() for s in args.scenarios.split(",") if s.strip()]:
+            if name not in SCENARIOS:
+                print(f"Bỏ qua kịch bản không rõ: {name}")
+                continue
+            print(f"Đang chạy {name}…", flush=True)
+            results[name] = globals()[f"bench_{name}"](srv, args, os.path.join(work, name))
+    finally:
+        srv.stop()
+        shutil.rmtree(work, ignore_errors=True)
+    baseline = None
+    if args.baseline:
+        with open(args.baseline, "r", encoding="utf-8") as f:
+            baseline = json.load(f).get("results")
+    report(results, baseline)
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump({"ts": time.time(), "args": vars(args), "results": results}, f, ensure_ascii=False, indent=2)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
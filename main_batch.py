@@ -0,0 +1,89 @@
+# -*- coding: utf-8 -*-
+"""
+Headless batch runner for the Labs video pipeline (no display / PyQt needed).
+
+    python main_batch.py INPUT_DIR [--out DIR] [--model M] [--aspect A] [--copies N]
+                         [--projects N] [--upload-workers N] [--async-submit] [--watch [SECONDS]]
+
+INPUT_DIR holds one project per entry: <project>/ (prompt .json + images) or
+<project>.json (+ optional <project>/ image folder). Tokens, download_root and
+the 'labs' tuning section come from the same config file as the GUI.
+"""
+import argparse
+import datetime
+import json
+import os
+import signal
+import sys
+
+try:
+    from utils.config import load as load_cfg
+except Exception:  # pragma: no cover
+    from config import load as load_cfg
+
+from services.batch_runner import BatchRunner
+from services.google.labs_flow_client import DEFAULT_PROJECT_ID, LabsFlowClient
+
+ASPECTS = {"16:9": "VIDEO_ASPECT_RATIO_LANDSCAPE", "9:16": "VIDEO_ASPECT_RATIO_PORTRAIT", "1:1": "VIDEO_ASPECT_RATIO_SQUARE"}
+
+
+def _log(level, msg):
+    print(f"{datetime.datetime.now().strftime('%H:%M:%S')} [{level}] {msg}", flush=True)
+
+
+def _tokens(cfg, path):
+    if path:
+        with open(path, "r", encoding="utf-8") as f:
+            return [ln.strip() for ln in f if ln.strip() and not ln.startswith("#")]
+    return [t.strip() for t in cfg.get("tokens", []) if isinstance(t, str) and t.strip()]
+
+
+def main(argv=None):
+    cfg = load_cfg() or {}
+    labs_cfg = cfg.get("labs") or {}
+    ap = argparse.ArgumentParser(description="Tạo video hàng loạt không cần giao diện.")
+    ap.add_argument("input_dir", help="Thư mục chứa các dự án (prompt .json + ảnh)")
+    ap.add_argument("--out", default=cfg.get("download_root") or os.path.join(os.path.expanduser("~"), "Downloads", "VeoProjects"),
+                    help="Thư mục gốc lưu dự án (mặc định: download_root)")
+    ap.add_argument("--model", default="veo_3_1_i2v_s_fast_ultra")
+    ap.add_argument("--aspect", default="16:9", help="16:9, 9:16, 1:1 hoặc VIDEO_ASPECT_RATIO_*")
+    ap.add_argument("--copies", type=int, default=1, help="Số video mỗi cảnh")
+    ap.add_argument("--projects", type=int, default=int(labs_cfg.get("batch_projects", 4)), help="Số dự án chạy song song")
+    ap.add_argument("--upload-workers", type=int, default=int(labs_cfg.get("upload_workers", 4)))
+    ap.add_argument("--start-interval", type=float, default=float(labs_cfg.get("start_interval_sec", 1.2)))
+    ap.add_argument("--timeout", type=float, default=3600, help="Thời gian chờ tối đa mỗi dự án (giây)")
+    ap.add_argument("--tokens-file", help="File token Labs (mỗi dòng một token); mặc định lấy từ cấu hình")
+    ap.add_argument("--no-thumbs", action="store_true", help="Không tải ảnh thumbnail")
+    ap.add_argument("--async-submit", action="store_true", default=bool(labs_cfg.get("async_submit", False)),
+                    help="Gửi cảnh qua một event loop asyncio (cần aiohttp) thay cho các luồng gửi")
+    ap.add_argument("--watch", type=float, nargs="?", const=60.0, metavar="SECONDS",
+                    help="Chạy liên tục, quét lại thư mục mỗi SECONDS giây")
+    args = ap.parse_args(argv)
+
+    toks = _tokens(cfg, args.tokens_file)
+    if not toks:
+        _log("ERR", "Chưa có token Labs (cấu hình 'tokens' hoặc --tokens-file).")
+        return 2
+    client = LabsFlowClient(toks, on_event=lambda ev: _log("WARN", f"Token {ev.get('token')} lỗi {ev.get('code')}")
+                            if ev.get("code") else None)
+    runner = BatchRunner(client, args.out, args.model, ASPECTS.get(args.aspect, args.aspect), copies=args.copies,
+                         projects=args.projects, project_id=cfg.get("default_project_id") or DEFAULT_PROJECT_ID,
+                         upload_workers=args.upload_workers, start_interval=args.start_interval,
+                         timeout=args.timeout, thumbnails=not args.no_thumbs, async_submit=args.async_submit,
+                         on_log=_log)
+    signal.signal(signal.SIGINT, lambda *_: (_log("WARN", "Đang dừng…"), runner.stop()))
+    signal.signal(signal.SIGTERM, lambda *_: runner.stop())
+
+    if args.watch:
+        runner.serve(args.input_dir, args.watch)
+        return 0
+    results = runner.run(args.input_dir)
+    if not results:
+        _log("WARN", f"Không tìm thấy dự án nào trong {args.input_dir}.")
+        return 1
+    print(json.dumps(results, ensure_ascii=False, indent=2))
+    return 0 if all(r.get("done") for r in results) else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
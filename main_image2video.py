@@ -1,5 +1,5 @@
 import sys, os
-from PyQt5.QtWidgets import QApplication, QWidget, QHBoxLayout, QVBoxLayout, QPushButton, QLineEdit, QListWidget, QSplitter, QLabel, QTabWidget
+from PyQt5.QtWidgets import QApplication, QWidget, QHBoxLayout, QVBoxLayout, QPushButton, QLineEdit, QListWidget, QSplitter, QLabel, QTabWidget, QComboBox
 from PyQt5.QtCore import Qt
 from PyQt5.QtGui import QFont
 try:
@@ -12,10 +12,16 @@ try:
     from utils.config import load as load_cfg
 except Exception:
     from config import load as load_cfg
+try:
+    from services.project_scheduler import PRIORITY_HIGH, PRIORITY_LOW, PRIORITY_NORMAL, ProjectQueue, scheduler_config
+except Exception:
+    from project_scheduler import PRIORITY_HIGH, PRIORITY_LOW, PRIORITY_NORMAL, ProjectQueue, scheduler_config
 
 class ProjectsPane(QWidget):
     def __init__(self):
         super().__init__()
+        # up to K projects run at once; their start calls share tokens fairly through the start gate
+        self._queue = ProjectQueue(int(scheduler_config().get("max_projects", 2)))
         self._build_ui()
         self._projects = {}
         self._queue_running = False
@@ -51,9 +57,17 @@ class ProjectsPane(QWidget):
         self.list=QListWidget()
         self.list.currentTextChanged.connect(self._switch_project)
         lv.addWidget(self.list)
+
+        # Priority of the selected project (run queue order + share of token start slots)
+        self.cb_priority=QComboBox()
+        for text, val in (("Ưu tiên cao", PRIORITY_HIGH), ("Ưu tiên thường", PRIORITY_NORMAL), ("Ưu tiên thấp", PRIORITY_LOW)):
+            self.cb_priority.addItem(text, val)
+        self.cb_priority.setCurrentIndex(1)
+        self.cb_priority.currentIndexChanged.connect(self._on_priority_changed)
+        lv.addWidget(self.cb_priority)
         
         # Run all button at bottom
-        self.btn_run_all=QPushButton("CHẠY TẤT CẢ\n(THEO THỨ TỰ)")
+        self.btn_run_all=QPushButton(f"CHẠY TẤT CẢ\n(TỐI ĐA {self._queue.max_projects} DỰ ÁN CÙNG LÚC)")
         self.btn_run_all.setMinimumHeight(50)
         self.btn_run_all.setStyleSheet("QPushButton{background:#43a047;color:white;font-weight:700;font-size:13px;border-radius:8px;padding:10px;} QPushButton:hover{background:#2e7d32;}")
         self.btn_run_all.clicked.connect(self._run_all_queue)
@@ -68,6 +82,7 @@ class ProjectsPane(QWidget):
         name=f"Project_{len(self._projects)+1}"
         panel=ProjectPanel(name, self._default_root(), settings_provider=load_cfg, parent=self)
         panel.project_completed.connect(self._on_project_completed)
+        panel.run_stopped.connect(self._on_project_stopped)
         panel.run_all_requested.connect(self._run_all_queue)
         self._projects[name]=panel; self.list.addItem(name); self.list.setCurrentRow(self.list.count()-1)
 
@@ -78,6 +93,7 @@ class ProjectsPane(QWidget):
         panel=self._projects.pop(name, None)
         if panel: panel.setParent(None); panel.deleteLater()
         self.list.takeItem(self.list.currentRow())
+        self._queue.remove(name); self._pump_queue()
         self._maybe_auto_add_after_delete()
 
     def _switch_project(self, name:str):
@@ -85,7 +101,18 @@ class ProjectsPane(QWidget):
             item=self.right_layout.takeAt(0); w=item.widget()
             if w: w.setParent(None)
         panel=self._projects.get(name)
-        if panel: self.right_layout.addWidget(panel)
+        if panel:
+            self.right_layout.addWidget(panel)
+            self.cb_priority.blockSignals(True)
+            self.cb_priority.setCurrentIndex(max(0, self.cb_priority.findData(panel.priority)))
+            self.cb_priority.blockSignals(False)
+
+    def _on_priority_changed(self, _idx):
+        it=self.list.currentItem()
+        panel=self._projects.get(it.text()) if it else None
+        if not panel: return
+        panel.priority=int(self.cb_priority.currentData())
+        self._queue.set_priority(it.text(), panel.priority)
 
     def _default_root(self):
         cfg = load_cfg()
@@ -105,34 +132,45 @@ class ProjectsPane(QWidget):
             self._ensure_default_project()
 
     def _run_all_queue(self):
-        # Start from the first project in list
         if not self._projects or self._queue_running:
             return
         self._queue_running = True
         self.btn_run_all.setEnabled(False)
-        first = self.list.item(0).text() if self.list.count() else None
-        if first:
-            self.list.setCurrentRow(0)
-            panel = self._projects.get(first)
-            if panel: panel._run_seq()
+        for i in range(self.list.count()):
+            name = self.list.item(i).text()
+            if name in self._projects:
+                self._queue.add(name, self._projects[name].priority)
+        self._pump_queue()
+
+    def _pump_queue(self):
+        """Start queued projects while fewer than max_projects are running."""
+        while True:
+            idle = []
+            for name in self._queue.start():
+                panel = self._projects.get(name)
+                if panel:
+                    panel._run_seq()
+                if not panel or not panel._seq_running:
+                    idle.append(name)  # nothing to submit (or could not start) -> free the slot right away
+            if not idle:
+                break
+            for name in idle:
+                self._queue.done(name)
+        if self._queue.idle():
+            self._queue_running = False
+            self.btn_run_all.setEnabled(True)
 
     def _on_project_completed(self, project_name: str):
-        if not self._queue_running:
-            # even nếu user chạy thủ công, vẫn tiếp tục dự án kế tiếp theo yêu cầu
-            self._queue_running = True
-        # find next
-        names = [self.list.item(i).text() for i in range(self.list.count())]
-        if project_name in names:
-            idx = names.index(project_name) + 1
-            if idx < len(names):
-                nxt = self._projects.get(names[idx])
-                if nxt:
-                    self.list.setCurrentRow(idx)
-                    nxt._run_seq()
-                    return
-        # no more
-        self._queue_running = False
-        self.btn_run_all.setEnabled(True)
+        # a project run by hand was not started by the queue and holds no slot
+        if project_name not in self._queue.running:
+            return
+        self._queue.done(project_name)
+        self._pump_queue()
+
+    def _on_project_stopped(self, project_name: str):
+        # frees the slot for the next queued project; a stop never starts a new queue run
+        self._queue.done(project_name)
+        self._pump_queue()
 
 class MainWindow(QTabWidget):
     def __init__(self):
@@ -2,60 +2,50 @@
 from typing import Dict, Any, Tuple
 from services.http_retry import request_json
 from services.core.key_manager import get_all_keys
+from services.core.rate_limiter import get_rate_limiter
 from services.resilience import acquire
 
-def labs_call(method:str, url:str, *, json_body=None, params=None, headers=None):
-    tokens = get_all_keys('labs')
+def _key_failed(code:int) -> bool:
+    # 401/403/429/5xx/network say something about the key; other 4xx are request errors
+    return code in (0, 401, 403, 429) or code >= 500
+
+def _rotate_call(provider:str, with_key, method:str, url:str, json_body=None, params=None, headers=None):
+    limiter = get_rate_limiter()
+    keys = get_all_keys(provider)
     last_err = ""; last_code = 0; last_headers = {}
-    for t in tokens or [""]:
-        h = dict(headers or {})
-        if t: h['authorization'] = f'Bearer {t}'
-        with acquire('labs'):
-            ok, data, err, code, resp_headers = request_json(method, url, headers=h, params=params, json_body=json_body)
+    for k in limiter.order(provider, keys) or [""]:
+        res = limiter.reserve(provider, [k]) if k else None
+        if res: res.wait()
+        h, p = with_key(k, dict(headers or {}), dict(params or {}))
+        with acquire(provider):
+            ok, data, err, code, resp_headers = request_json(method, url, headers=h, params=p, json_body=json_body)
+        if res: res.report(ok=ok or not _key_failed(code), error=f"HTTP {code} {err}")
         if ok: return ok, data, code, resp_headers
         last_err, last_code, last_headers = err, code, resp_headers
-        if code in (401, 403): continue
+        if code in (401, 403, 429): continue
         break
     return False, {"error": last_err, "trace": last_headers.get("x-request-id","")}, last_code, last_headers
 
+def _bearer(k, h, p):
+    if k: h['authorization'] = f'Bearer {k}'
+    return h, p
+
+def _query_key(k, h, p):
+    if k: p['key'] = k
+    return h, p
+
+def _xi_key(k, h, p):
+    if k: h['xi-api-key'] = k
+    return h, p
+
+def labs_call(method:str, url:str, *, json_body=None, params=None, headers=None):
+    return _rotate_call('labs', _bearer, method, url, json_body=json_body, params=params, headers=headers)
+
 def google_call(method:str, url:str, *, json_body=None, params=None, headers=None):
-    keys = get_all_keys('google')
-    last_err = ""; last_code = 0; last_headers = {}
-    for k in keys or [""]:
-        p = dict(params or {})
-        if k: p['key'] = k
-        with acquire('google'):
-            ok, data, err, code, resp_headers = request_json(method, url, headers=headers, params=p, json_body=json_body)
-        if ok: return ok, data, code, resp_headers
-        last_err, last_code, last_headers = err, code, resp_headers
-        if code in (401, 403): continue
-        break
-    return False, {"error": last_err, "trace": last_headers.get("x-request-id","")}, last_code, last_headers
+    return _rotate_call('google', _query_key, method, url, json_body=json_body, params=params, headers=headers)
 
 def openai_call(method:str, url:str, *, json_body=None, params=None, headers=None):
-    keys = get_all_keys('openai')
-    last_err = ""; last_code = 0; last_headers = {}
-    for k in keys or [""]:
-        h = dict(headers or {})
-        if k: h['authorization'] = f'Bearer {k}'
-        with acquire('openai'):
-            ok, data, err, code, resp_headers = request_json(method, url, headers=h, params=params, json_body=json_body)
-        if ok: return ok, data, code, resp_headers
-        last_err, last_code, last_headers = err, code, resp_headers
-        if code in (401, 403): continue
-        break
-    return False, {"error": last_err, "trace": last_headers.get("x-request-id","")}, last_code, last_headers
+    return _rotate_call('openai', _bearer, method, url, json_body=json_body, params=params, headers=headers)
 
 def eleven_call(method:str, url:str, *, json_body=None, params=None, headers=None):
-    keys = get_all_keys('elevenlabs')
-    last_err = ""; last_code = 0; last_headers = {}
-    for k in keys or [""]:
-        h = dict(headers or {})
-        if k: h['xi-api-key'] = k
-        with acquire('elevenlabs'):
-            ok, data, err, code, resp_headers = request_json(method, url, headers=h, params=params, json_body=json_body)
-        if ok: return ok, data, code, resp_headers
-        last_err, last_code, last_headers = err, code, resp_headers
-        if code in (401, 403): continue
-        break
-    return False, {"error": last_err, "trace": last_headers.get("x-request-id","")}, last_code, last_headers
+    return _rotate_call('elevenlabs', _xi_key, method, url, json_body=json_body, params=params, headers=headers)
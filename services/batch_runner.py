@@ -0,0 +1,477 @@
+# -*- coding: utf-8 -*-
+"""
+Headless video pipeline: submit -> poll -> download -> thumbnail, no PyQt.
+
+Runs the same building blocks as the project panel (SceneSubmitPipeline,
+the shared OperationPoller, the shared DownloadManager and the per-project
+JobJournal) from plain threads, so overnight batches can run on a server
+without a display and with many projects in flight at once.
+
+Input layout (one project per entry of input_dir):
+    input_dir/<project>/*.json + images      prompt file and reference images together
+    input_dir/<project>.json [+ <project>/]  prompt file, images in the sibling folder
+
+Output goes to <out_root>/<project>/{Prompt video, Ảnh tham chiếu, Video} —
+the folders the GUI uses — so a project started headless can be resumed from
+the panel (and vice versa) through the shared journal. Every run also writes
+a per-scene timeline (services.scene_timeline) to <project>/timeline.trace.json.
+
+Usage:
+    runner = BatchRunner(client, out_root, model, aspect, copies=2, projects=4)
+    results = runner.run(input_dir)
+"""
+import asyncio
+import datetime
+import glob
+import json
+import os
+import shutil
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from services.google.labs_flow_async import AsyncLabsFlowClient
+from services.google.labs_flow_client import DEFAULT_PROJECT_ID
+from services.job_journal import JobJournal, apply_record, prompt_hash
+from services.operation_poller import get_poller
+from services.prompt_files import list_images, parse_prompt_file, safe_name
+from services.scene_submit_pipeline import SceneSubmitPipeline
+from services.scene_timeline import SceneTimeline
+from services.utils.download_manager import get_download_manager
+
+Log = Callable[[str, str], None]
+
+
+def project_paths(out_root: str, name: str, create: bool = True) -> Dict[str, str]:
+    """Same folder layout as ProjectPanel._project_paths."""
+    proj_dir = os.path.join(out_root, name)
+    dirs = {
+        "root": out_root,
+        "project": proj_dir,
+        "prompts": os.path.join(proj_dir, "Prompt video"),
+        "images": os.path.join(proj_dir, "Ảnh tham chiếu"),
+        "videos": os.path.join(proj_dir, "Video"),
+    }
+    if create:
+        for d in dirs.values():
+            os.makedirs(d, exist_ok=True)
+    return dirs
+
+
+def discover_projects(input_dir: str) -> List[Tuple[str, str, str]]:
+    """(name, prompt_json, image_dir) for every project found in input_dir, sorted by name."""
+    found = {}
+    try:
+        entries = sorted(os.listdir(input_dir))
+    except OSError:
+        return []
+    for entry in entries:
+        path = os.path.join(input_dir, entry)
+        if os.path.isdir(path):
+            prompts = sorted(glob.glob(os.path.join(path, "*.json")))
+            if prompts:
+                found[entry] = (entry, prompts[0], path)
+        elif entry.lower().endswith(".json"):
+            name = os.path.splitext(entry)[0]
+            found.setdefault(name, (name, path, os.path.join(input_dir, name)))
+    return [found[k] for k in sorted(found)]
+
+
+class ProjectRun:
+    """
+    One project from prompt file to downloaded videos.
+
+    Args:
+        name: Project name (output folder and file prefix)
+        prompt_path: JSON file in any format parse_prompt_file reads
+        image_dir: Folder of reference images, matched to scenes by sorted file name
+        out_root: Root of the project folders
+        client: LabsFlowClient
+        model: Video model key ("_t2v" models need no images)
+        aspect: VIDEO_ASPECT_RATIO_* value
+        copies: Videos per scene
+        project_id: Labs project id
+        upload_workers: Parallel uploads of this project
+        start_interval: Minimum seconds between two start calls on the same token
+        timeout: Seconds to wait for the operations of this project
+        thumbnails: Also download the preview image of each video
+        async_submit: Upload and start every scene from one event loop (AsyncLabsFlowClient,
+                      one pooled aiohttp session) instead of the threaded SceneSubmitPipeline
+        on_log: callback(level, message)
+        stop_event: Set to abort submitting / polling
+    """
+
+    def __init__(self, name: str, prompt_path: str, image_dir: str, out_root: str, client, model: str, aspect: str,
+                 copies: int = 1, project_id: Optional[str] = None, upload_workers: int = 4,
+                 start_interval: float = 1.2, timeout: float = 3600, thumbnails: bool = True,
+                 async_submit: bool = False, on_log: Optional[Log] = None,
+                 stop_event: Optional[threading.Event] = None):
+        self.name = name
+        self.prompt_path = prompt_path
+        self.image_dir = image_dir
+        self.client = client
+        self.model = model
+        self.aspect = aspect
+        self.copies = max(1, int(copies))
+        self.project_id = project_id or DEFAULT_PROJECT_ID
+        self.upload_workers = upload_workers
+        self.start_interval = start_interval
+        self.timeout = timeout
+        self.thumbnails = thumbnails
+        self.async_submit = async_submit
+        self.on_log = on_log
+        self.stop_event = stop_event or threading.Event()
+        self.paths = project_paths(out_root, name, create=False)
+        self.journal = JobJournal(self.paths["prompts"])
+        self.timeline = SceneTimeline(self.paths["project"], title=name)
+        self.jobs: List[Dict[str, Any]] = []
+        self._lock = threading.Lock()
+        self._futures = []
+        self._resumed = set()
+        self._pipeline = None
+
+    def _log(self, level: str, msg: str):
+        if self.on_log:
+            try:
+                self.on_log(level, f"[{self.name}] {msg}")
+            except Exception:
+                pass
+
+    # ---- prepare ----------------------------------------------------
+    def prepare(self) -> List[Dict[str, Any]]:
+        """Copy prompts/images into the project folders and build the job dicts (resuming journaled scenes)."""
+        scenes = parse_prompt_file(self.prompt_path)
+        is_t2v = "_t2v" in (self.model or "")
+        imgs = [] if is_t2v else list_images(self.image_dir)
+        if not scenes:
+            self._log("WARN", "Chưa có kịch bản (JSON).")
+            return []
+        if not is_t2v and not imgs:
+            self._log("WARN", "Chưa có ảnh tham chiếu.")
+            return []
+        n = len(scenes) if is_t2v else min(len(scenes), len(imgs))
+        if not is_t2v and len(imgs) < len(scenes):
+            self._log("WARN", f"Số ảnh ({len(imgs)}) ít hơn số cảnh ({len(scenes)}); chỉ tạo {n} cảnh đầu.")
+
+        paths = project_paths(self.paths["root"], self.name)
+        prior = self.journal.state()["scenes"]
+        self.journal.begin(model=self.model, aspect=self.aspect, copies=self.copies, source="batch")
+        prefix = safe_name(self.name)
+        self.jobs = []
+        for i in range(n):
+            sid = f"{i + 1}"
+            prompt_text = scenes[i]
+            prompt_filename = f"{prefix}_canh_{sid}_prompt.json"
+            try:
+                obj = json.loads(prompt_text)
+                with open(os.path.join(paths["prompts"], prompt_filename), "w", encoding="utf-8") as f:
+                    f.write(json.dumps(obj, ensure_ascii=False, indent=2))
+            except Exception:
+                with open(os.path.join(paths["prompts"], prompt_filename.replace(".json", ".txt")), "w", encoding="utf-8") as f:
+                    f.write(prompt_text)
+            dst = None
+            if not is_t2v:
+                src = imgs[i]
+                ext = os.path.splitext(src)[1].lower() or ".jpg"
+                dst = os.path.join(paths["images"], f"{prefix}_canh_{sid}_anh{ext}")
+                try:
+                    if os.path.abspath(src) != os.path.abspath(dst):
+                        shutil.copy2(src, dst)
+                except Exception as e:
+                    self._log("ERR", f"Không thể copy ảnh: {e}")
+                    dst = src
+            job = {"scene_id": sid, "prompt": prompt_text, "image_path": dst,
+                   "image_name": os.path.basename(dst) if dst else "", "media_id": None, "operation_names": [],
+                   "status": "NEW", "video_by_idx": [None] * self.copies, "thumb_by_idx": [None] * self.copies,
+                   "op_index_map": {}, "downloaded_idx": set(), "completed_at": ""}
+            ph = prompt_hash(prompt_text)
+            rec = prior.get(sid)
+            self.journal.scene(sid, prompt_hash=ph, prompt=prompt_text, image_path=dst, image_name=job["image_name"])
+            if rec and rec.get("prompt_hash") == ph and rec.get("image_name", "") == job["image_name"] and rec.get("ops"):
+                if JobJournal.unfinished_ops(rec):
+                    # cảnh đã gửi nhưng chưa xong -> theo dõi tiếp, không gửi lại
+                    apply_record(job, rec, self.copies)
+                    self._log("INFO", f"Cảnh {sid}: tiếp tục từ nhật ký, không gửi lại.")
+                else:
+                    done = apply_record(dict(job), rec, self.copies)
+                    if len(done["downloaded_idx"]) >= self.copies:
+                        job = done  # đã tải đủ -> bỏ qua; cảnh lỗi thì gửi lại
+                        job["status"] = "DOWNLOADED"
+            self.jobs.append(job)
+        return self.jobs
+
+    # ---- submit -----------------------------------------------------
+    def _on_row(self, idx: int, job: Dict[str, Any]):
+        if job.get("operation_names") and job["scene_id"] not in self._resumed:
+            job["op_index_map"] = {nm: ci for ci, nm in enumerate(job["operation_names"])}
+            try:
+                self.journal.submitted(job["scene_id"], job["operation_names"], media_id=job.get("media_id"))
+            except Exception as e:
+                self._log("WARN", f"Không ghi được nhật ký: {e}")
+
+    def submit(self) -> int:
+        self._resumed = {j["scene_id"] for j in self.jobs if j.get("operation_names")}
+        todo = len(self.jobs) - len(self._resumed)
+        if todo:
+            self._log("INFO", f"Gửi {todo} cảnh, {self.copies} video/cảnh…")
+        if self.async_submit:
+            return asyncio.run(self._submit_async())
+        self._pipeline = SceneSubmitPipeline(self.client, self.model, self.aspect, copies=self.copies,
+                                             project_id=self.project_id, upload_workers=self.upload_workers,
+                                             start_interval=self.start_interval, on_log=self._log, on_row=self._on_row,
+                                             timeline=self.timeline, project=self.name)
+        if self.stop_event.is_set():
+            self._pipeline.stop()
+        return self._pipeline.run(self.jobs)
+
+    async def _submit_async(self) -> int:
+        todo = [(i, j) for i, j in enumerate(self.jobs) if j["scene_id"] not in self._resumed]
+        if not todo or self.stop_event.is_set():
+            return len(self._resumed)
+        async with AsyncLabsFlowClient(self.client.tokens, timeout=self.client.timeout,
+                                       on_event=self.client.on_event) as aclient:
+            results = await aclient.start_many([j for _, j in todo], self.model, self.aspect, copies=self.copies,
+                                               project_id=self.project_id)
+        started = len(self._resumed)
+        for (i, job), rc in zip(todo, results):
+            if isinstance(rc, Exception):
+                self._log("ERR", f"Cảnh {job['scene_id']}: gửi thất bại: {rc}")
+                if job.get("image_path") and not job.get("media_id"):
+                    job["status"] = "UPLOAD_FAILED"
+                continue
+            if rc > 0:
+                started += 1
+                self.timeline.submitted(job["scene_id"], job.get("operation_names") or [])
+            self._on_row(i, job)
+        self._log("HTTP", f"START OK {started}/{len(self.jobs)} cảnh (async).")
+        return started
+
+    def stop(self):
+        self.stop_event.set()
+        if self._pipeline:
+            self._pipeline.stop()
+
+    # ---- poll + download --------------------------------------------
+    def _file_base(self, job: Dict[str, Any], i: int) -> str:
+        return f"{safe_name(self.name)}_canh_{job.get('scene_id', '')}_video_{i}"
+
+    def _download(self, job: Dict[str, Any], ci: int, op: str):
+        url = job["video_by_idx"][ci]
+        i = ci + 1
+        if not url or i in job["downloaded_idx"]:
+            return
+        base = os.path.join(self.paths["videos"], self._file_base(job, i))
+
+        t_sub = time.monotonic()
+
+        def on_done(res):
+            # time in the shared pool before the transfer started is queueing, not download
+            t_end = time.monotonic()
+            t_dl = max(t_sub, t_end - float(res.get("seconds") or 0))
+            self.timeline.complete(job["scene_id"], f"queue_download v{i}", t_sub, t_dl)
+            self.timeline.complete(job["scene_id"], f"download v{i}", t_dl, t_end, ok=res["ok"], mbps=res.get("mbps"))
+            if res["ok"]:
+                with self._lock:
+                    job["downloaded_idx"].add(i)
+                    job.setdefault("local_paths", []).append(res["path"])
+                    if len(job["downloaded_idx"]) >= min(self.copies, len(job["operation_names"]) or self.copies):
+                        job["status"] = "DOWNLOADED"
+                        job["completed_at"] = datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+                self.journal.downloaded(op, res["path"])
+                self._log("HTTP", f"Tải OK -> {res['path']} ({res['mbps']} MB/s)")
+            else:
+                self._log("ERR", f"Tải thất bại: {url} ({res['error']})")
+
+        dm = get_download_manager()
+        with self._lock:
+            self._futures.append(dm.submit(url, base + ".mp4", on_done))
+            thumb = job["thumb_by_idx"][ci] if ci < len(job["thumb_by_idx"]) else None
+            if self.thumbnails and thumb and not os.path.isfile(base + ".jpg"):
+                self._futures.append(dm.submit(thumb, base + ".jpg", lambda res, t0=time.monotonic(): self.timeline.complete(
+                    job["scene_id"], f"thumbnail v{i}", t0, ok=res["ok"])))
+
+    def _on_update(self, name: str, info: Dict[str, Any], job: Dict[str, Any]):
+        self.timeline.op_status(name, info)
+        ci = job["op_index_map"].get(name, 0)
+        with self._lock:
+            while len(job["video_by_idx"]) <= ci:
+                job["video_by_idx"].append(None)
+                job["thumb_by_idx"].append(None)
+            if info.get("video_urls") and not job["video_by_idx"][ci]:
+                job["video_by_idx"][ci] = info["video_urls"][0]
+            if info.get("image_urls"):
+                job["thumb_by_idx"][ci] = info["image_urls"][0]
+            job["status"] = info.get("status", "PROCESSING")
+        try:
+            self.journal.status(name, job["status"], (info.get("video_urls") or [""])[0],
+                                (info.get("image_urls") or [""])[0])
+        except Exception:
+            pass
+        if job["video_by_idx"][ci]:
+            self._download(job, ci, name)
+
+    def watch(self):
+        """Poll every unfinished operation and download each video as soon as its URL is known."""
+        op_jobs = {}
+        for job in self.jobs:
+            job["op_index_map"] = {nm: ci for ci, nm in enumerate(job.get("operation_names") or [])}
+            for ci, nm in enumerate(job.get("operation_names") or []):
+                if ci + 1 in job["downloaded_idx"]:
+                    continue
+                if ci < len(job["video_by_idx"]) and job["video_by_idx"][ci]:
+                    self._download(job, ci, nm)  # URL already journaled, only the file is missing
+                else:
+                    op_jobs[nm] = job
+                    # resumed operations start their 'generate' span now
+                    self.timeline.submitted(job["scene_id"], [nm], first_copy=ci + 1)
+        if op_jobs:
+            self._log("INFO", f"Theo dõi {len(op_jobs)} operation…")
+        self.timeline.attach_poller(get_poller())
+        try:
+            for name, info in get_poller().iter_updates(list(op_jobs), client=self.client, timeout=self.timeout,
+                                                         should_stop=self.stop_event.is_set):
+                if name in op_jobs:
+                    self._on_update(name, info, op_jobs[name])
+        finally:
+            self.timeline.detach_poller()
+        while True:
+            with self._lock:
+                pending = [f for f in self._futures if not f.done()]
+            if not pending:
+                break
+            for f in pending:
+                f.result()
+
+    # ---- whole run --------------------------------------------------
+    def summary(self, seconds: float = 0.0) -> Dict[str, Any]:
+        videos = sum(len([u for u in j.get("video_by_idx") or [] if u]) for j in self.jobs)
+        downloaded = sum(len(j.get("downloaded_idx") or ()) for j in self.jobs)
+        failed = sum(1 for j in self.jobs if j.get("status") in ("FAILED", "DONE_NO_URL", "UPLOAD_FAILED") or
+                     (j.get("status") == "NEW" and not j.get("operation_names")))
+        done = bool(self.jobs) and all(len(j.get("downloaded_idx") or ()) >= self.copies for j in self.jobs)
+        return {"project": self.name, "scenes": len(self.jobs), "videos": videos, "downloaded": downloaded,
+                "failed": failed, "done": done, "seconds": round(seconds, 1),
+                "videos_dir": self.paths["videos"]}
+
+    def run(self) -> Dict[str, Any]:
+        t0 = time.monotonic()
+        if self.prepare():
+            self.submit()
+            if not self.stop_event.is_set():
+                self.watch()
+        res = self.summary(time.monotonic() - t0)
+        self._log("INFO", f"Xong: {res['downloaded']}/{res['scenes'] * self.copies} video trong {res['seconds']}s"
+                          + (f", {res['failed']} cảnh lỗi" if res["failed"] else ""))
+        if self.jobs:
+            try:
+                res["timeline"] = self.timeline.export()
+                self._log("INFO", f"Timeline: {self.timeline.summary_text()}")
+            except OSError as e:
+                self._log("WARN", f"Không ghi được timeline: {e}")
+        return res
+
+
+class BatchRunner:
+    """
+    Run every project of an input folder, several at a time.
+
+    Args:
+        client: LabsFlowClient shared by all projects (its tokens are the submit lanes)
+        out_root: Root of the project folders
+        model, aspect, copies: Video settings for every project
+        projects: Projects processed concurrently
+        project_id: Labs project id
+        upload_workers, start_interval, timeout, thumbnails, async_submit: See ProjectRun
+        on_log: callback(level, message)
+    """
+
+    def __init__(self, client, out_root: str, model: str, aspect: str, copies: int = 1, projects: int = 2,
+                 project_id: Optional[str] = None, upload_workers: int = 4, start_interval: float = 1.2,
+                 timeout: float = 3600, thumbnails: bool = True, async_submit: bool = False,
+                 on_log: Optional[Log] = None):
+        self.client = client
+        self.out_root = out_root
+        self.model = model
+        self.aspect = aspect
+        self.copies = copies
+        self.projects = max(1, int(projects))
+        self.project_id = project_id
+        self.upload_workers = upload_workers
+        self.start_interval = start_interval
+        self.timeout = timeout
+        self.thumbnails = thumbnails
+        self.async_submit = async_submit
+        self.on_log = on_log
+        self.stop_event = threading.Event()
+        self._done: Dict[str, float] = {}
+        self._active: List[ProjectRun] = []
+        self._lock = threading.Lock()
+
+    def stop(self):
+        self.stop_event.set()
+        with self._lock:
+            for run in list(self._active):
+                run.stop()
+
+    def _log(self, level: str, msg: str):
+        if self.on_log:
+            self.on_log(level, msg)
+
+    def _project(self, name: str, prompt_path: str, image_dir: str) -> ProjectRun:
+        return ProjectRun(name, prompt_path, image_dir, self.out_root, self.client, self.model, self.aspect,
+                          copies=self.copies, project_id=self.project_id, upload_workers=self.upload_workers,
+                          start_interval=self.start_interval, timeout=self.timeout, thumbnails=self.thumbnails,
+                          async_submit=self.async_submit, on_log=self.on_log, stop_event=self.stop_event)
+
+    def _todo(self, input_dir: str) -> List[Tuple[str, str, str]]:
+        # watch mode: skip projects finished in this process unless their prompt file changed since
+        out = []
+        for name, prompt_path, image_dir in discover_projects(input_dir):
+            try:
+                mtime = os.path.getmtime(prompt_path)
+            except OSError:
+                continue
+            if self._done.get(name) != mtime:
+                out.append((name, prompt_path, image_dir))
+        return out
+
+    def _run_one(self, run: ProjectRun) -> Dict[str, Any]:
+        with self._lock:
+            self._active.append(run)
+        try:
+            return run.run()
+        finally:
+            with self._lock:
+                self._active.remove(run)
+
+    def run(self, input_dir: str) -> List[Dict[str, Any]]:
+        """Process every project found in input_dir once; returns one summary per project."""
+        todo = self._todo(input_dir)
+        if not todo:
+            return []
+        self._log("INFO", f"{len(todo)} dự án, chạy song song {min(self.projects, len(todo))}.")
+        results = []
+        with ThreadPoolExecutor(max_workers=self.projects) as pool:
+            futs = {pool.submit(self._run_one, self._project(*p)): p for p in todo}
+            for fut in as_completed(futs):
+                name, prompt_path, _ = futs[fut]
+                try:
+                    res = fut.result()
+                except Exception as e:
+                    self._log("ERR", f"[{name}] Lỗi: {e}")
+                    res = {"project": name, "done": False, "error": str(e)}
+                if res.get("done"):
+                    try:
+                        self._done[name] = os.path.getmtime(prompt_path)
+                    except OSError:
+                        pass
+                results.append(res)
+        return sorted(results, key=lambda r: r["project"])
+
+    def serve(self, input_dir: str, interval: float = 60.0):
+        """Daemon mode: rescan input_dir every interval seconds until stop()."""
+        self._log("INFO", f"Theo dõi thư mục {input_dir} (quét mỗi {interval:g}s).")
+        while not self.stop_event.is_set():
+            self.run(input_dir)
+            self.stop_event.wait(interval)
@@ -1,16 +1,20 @@
 # -*- coding: utf-8 -*-
 """
 API Configuration - Single Source of Truth for all API models and endpoints
+
+VEO_GEMINI_BASE / VEO_LABS_BASE environment variables override the base URLs
+(used to point the app at the local mock server in bench/).
 """
+import os
 
 # Models
 GEMINI_TEXT_MODEL = "gemini-2.5-flash"
 GEMINI_IMAGE_MODEL = "gemini-2.5-flash-image"  # FIXED: was "imagen-3.0-generate-001"
 
 # Base URLs
-GEMINI_BASE = "https://generativelanguage.googleapis.com/v1beta"
+GEMINI_BASE = os.environ.get("VEO_GEMINI_BASE", "https://generativelanguage.googleapis.com/v1beta").rstrip("/")
 WHISK_BASE = "https://labs.google/fx/api/trpc"
-LABS_BASE = "https://aisandbox-pa.googleapis.com"
+LABS_BASE = os.environ.get("VEO_LABS_BASE", "https://aisandbox-pa.googleapis.com").rstrip("/")
 
 # Timeouts (in seconds)
 DEFAULT_TIMEOUT = 120
@@ -2,6 +2,15 @@
 import threading
 from typing import List, Optional
 
+from services.core.rate_limiter import get_rate_limiter
+
+# key_type -> rate limiter provider
+_PROVIDERS = {
+    'google_labs_tokens': 'labs',
+    'google_gemini_keys': 'google',
+    'elevenlabs_keys': 'elevenlabs',
+}
+
 class APIKeyManager:
     _instance = None
     _lock = threading.Lock()
@@ -30,20 +39,23 @@ class APIKeyManager:
         self._initialized = True
     
     def set_keys(self, key_type: str, keys: List[str]):
-        self._keys[key_type] = [k for k in keys if k and k.strip()]
-        self._current_indices[key_type] = 0
+        with self._lock:
+            self._keys[key_type] = [k for k in keys if k and k.strip()]
+            self._current_indices[key_type] = 0
     
     def get_all_keys(self, key_type: str) -> List[str]:
         return self._keys.get(key_type, [])
     
     def get_next_key(self, key_type: str) -> Optional[str]:
-        keys = self.get_all_keys(key_type)
-        if not keys:
-            return None
-        idx = self._current_indices[key_type]
-        key = keys[idx % len(keys)]
-        self._current_indices[key_type] = (idx + 1) % len(keys)
-        return key
+        """Next key round-robin, skipping keys the shared rate limiter has in cooldown."""
+        with self._lock:
+            keys = list(self._keys.get(key_type, []))
+            if not keys:
+                return None
+            idx = self._current_indices.get(key_type, 0) % len(keys)
+            self._current_indices[key_type] = (idx + 1) % len(keys)
+        keys = keys[idx:] + keys[:idx]
+        return get_rate_limiter().order(_PROVIDERS.get(key_type, key_type), keys)[0]
 
 _manager = APIKeyManager()
 
@@ -2,36 +2,38 @@
 """
 API Key Rotator - Smart rotation with exponential backoff
 Based on geminiService.ts logic with enhanced error handling
+
+Backed by the process-wide rate limiter (services.core.rate_limiter): keys are
+picked by per-key token-bucket availability and cooldowns shared with every
+other caller, and no thread sleeps while holding a lock.
 """
-import time
 from typing import List, Callable, Any, Optional
 
-
-class APIKeyRotationError(Exception):
-    """Error raised when all API keys fail"""
-    pass
+from services.core.rate_limiter import APIKeyRotationError, get_rate_limiter
 
 
 class APIKeyRotator:
     """
-    Smart API key rotation with exponential backoff and intelligent retry logic
+    Smart API key rotation on top of the shared per-key rate limiter
     
     Features:
-    - Exponential backoff: 2s, 4s, 8s, 16s...
-    - Smart error handling: retry 429, fail fast on 401
+    - Per-key token buckets shared across image, script and TTS jobs
+    - 429 -> exponential per-key cooldown, 401/403 -> long cooldown
     - Transparent logging
     """
     
-    def __init__(self, keys: List[str], log_callback: Optional[Callable[[str], None]] = None):
+    def __init__(self, keys: List[str], log_callback: Optional[Callable[[str], None]] = None, provider: str = 'google'):
         """
         Initialize rotator with keys and optional logging
         
         Args:
             keys: List of API keys to rotate through
             log_callback: Optional callback function for logging (receives string messages)
+            provider: Quota bucket the keys belong to ('google', 'openai', 'elevenlabs', ...)
         """
         self.keys = keys if keys else []
         self.log_callback = log_callback
+        self.provider = provider
         
         if not self.keys:
             raise APIKeyRotationError("No API keys provided")
@@ -41,16 +43,14 @@ class APIKeyRotator:
         if self.log_callback:
             self.log_callback(msg)
     
-    # Maximum backoff delay in seconds
-    MAX_BACKOFF_SECONDS = 32
-    
-    def execute(self, api_call: Callable[[str], Any]) -> Any:
+    def execute(self, api_call: Callable[[str], Any], stop_event=None) -> Any:
         """
         Execute an API call with smart key rotation and error handling
         
         Args:
             api_call: Function that takes an API key and returns result
                      Should raise exceptions on failure
+            stop_event: Optional threading.Event that aborts waiting for a key
         
         Returns:
             Result from successful API call
@@ -58,58 +58,7 @@ class APIKeyRotator:
         Raises:
             APIKeyRotationError: If all keys fail
         """
-        last_error = None
-        
-        for idx, key in enumerate(self.keys):
-            # Exponential backoff: 4s, 8s, 16s, 32s (increased from 2s, 4s, 8s, 16s)
-            if idx > 0:
-                delay = 4 * (2 ** (idx - 1))  # 4s, 8s, 16s, 32s...
-                # Cap at MAX_BACKOFF_SECONDS to avoid excessive waits
-                delay = min(delay, self.MAX_BACKOFF_SECONDS)
-                self._log(f"[BACKOFF] Waiting {delay}s before trying next key...")
-                time.sleep(delay)
-            
-            key_preview = f"...{key[-6:]}" if len(key) > 6 else "***"
-            self._log(f"[KEY {idx + 1}/{len(self.keys)}] Trying key {key_preview}")
-            
-            try:
-                result = api_call(key)
-                self._log(f"[SUCCESS] Key {key_preview} succeeded")
-                return result
-                
-            except Exception as e:
-                error_msg = str(e).lower()
-                last_error = e
-                
-                # Check HTTP status codes in error message
-                # 401: Unauthorized - key is invalid, skip to next immediately
-                if '401' in error_msg or 'unauthorized' in error_msg or 'invalid api key' in error_msg:
-                    self._log(f"[FAIL] Key {key_preview} is invalid (401/unauthorized)")
-                    continue
-                
-                # 429: Rate limit - continue with backoff
-                if '429' in error_msg or 'rate limit' in error_msg or 'quota' in error_msg:
-                    self._log(f"[RATE LIMIT] Key {key_preview} hit rate limit (429)")
-                    continue
-                
-                # 403: Forbidden - permission issue, skip
-                if '403' in error_msg or 'forbidden' in error_msg:
-                    self._log(f"[FORBIDDEN] Key {key_preview} has permission issues (403)")
-                    continue
-                
-                # 5xx: Server errors - might be transient, continue
-                if any(code in error_msg for code in ['500', '502', '503', '504']):
-                    self._log(f"[SERVER ERROR] Key {key_preview} encountered server error (5xx)")
-                    continue
-                
-                # Other errors - log and continue
-                self._log(f"[ERROR] Key {key_preview} failed: {str(e)[:100]}")
-                continue
-        
-        # All keys exhausted
-        error_summary = f"All {len(self.keys)} API keys failed"
-        if last_error:
-            error_summary += f". Last error: {str(last_error)[:200]}"
-        
-        self._log(f"[EXHAUSTED] {error_summary}")
-        raise APIKeyRotationError(error_summary)
+        return get_rate_limiter().call(self.provider, self.keys, api_call, stop_event=stop_event, log=self._log)
+
+
+__all__ = ['APIKeyRotator', 'APIKeyRotationError']
@@ -2,10 +2,14 @@
 """
 Unified API Key Management - Single source for all key rotation and management
 Replaces all duplicate key management implementations across services
+
+Round-robin order is refined by the shared rate limiter: keys that are in
+cooldown or out of budget (services.core.rate_limiter) are moved to the back.
 """
 from typing import List
 import threading
 from services.core.config import load as load_config
+from services.core.rate_limiter import get_rate_limiter
 
 
 class KeyPool:
@@ -99,7 +103,11 @@ def get_key(provider: str) -> str:
         API key or empty string if none available
     """
     refresh()  # Always refresh to get latest config
-    return _POOLS.get(provider, KeyPool()).get_next()
+    pool = _POOLS.get(provider, KeyPool())
+    key = pool.get_next()
+    if not key:
+        return key
+    return _limiter_order(provider, _rotate(pool.get_all(), key))[0]
 
 
 def get_all_keys(provider: str) -> List[str]:
@@ -116,9 +124,22 @@ def get_all_keys(provider: str) -> List[str]:
     return _POOLS.get(provider, KeyPool()).get_all()
 
 
+def _rotate(keys: List[str], first: str) -> List[str]:
+    if first not in keys:
+        return keys
+    i = keys.index(first)
+    return keys[i:] + keys[:i]
+
+
+def _limiter_order(provider: str, keys: List[str]) -> List[str]:
+    # stable sort: keys the limiter considers equally ready keep round-robin order
+    return get_rate_limiter().order(provider, keys) or keys
+
+
 def rotated_list(provider: str, base_list: List[str]) -> List[str]:
     """
-    Rotate list to prioritize next key in pool
+    Rotate list to prioritize next key in pool, then push keys the rate
+    limiter has in cooldown to the back
     
     Args:
         provider: Provider name
@@ -131,9 +152,9 @@ def rotated_list(provider: str, base_list: List[str]) -> List[str]:
     if not base_list:
         return base_list
     
-    key = get_key(provider)
-    if not key or key not in base_list:
-        return base_list
-    
-    # Move key to front
-    return [key] + [x for x in base_list if x != key]
+    refresh()
+    key = _POOLS.get(provider, KeyPool()).get_next()
+    if key and key in base_list:
+        # Move key to front
+        base_list = [key] + [x for x in base_list if x != key]
+    return _limiter_order(provider, base_list)
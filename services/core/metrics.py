@@ -0,0 +1,276 @@
+# -*- coding: utf-8 -*-
+"""
+Metrics for every outbound API call.
+
+Each HTTP attempt is recorded once through observe(): provider, endpoint,
+key/token fingerprint (sha256 prefix, never the key), status, latency, retry
+number and request/response bytes. Calls are aggregated per
+(provider, endpoint) into latency histograms with status counts, and can be
+exported as Prometheus text (prometheus()) or appended to a JSON-lines file
+(optional 'metrics' config section {"jsonl_path": "...", "enabled": true}).
+The settings panel shows snapshot() live.
+
+Usage:
+    t0 = time.monotonic()
+    r = session.post(url, ...)
+    observe("labs", url, t0, response=r, key=token, retries=attempt)
+"""
+import hashlib
+import json
+import math
+import threading
+import time
+from collections import deque
+from typing import Any, Deque, Dict, List, Optional
+from urllib.parse import parse_qs, urlparse
+
+# latency histogram upper bounds (seconds); +Inf is implicit
+BUCKETS = (0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0, 300.0)
+
+_HOST_PROVIDERS = {
+    "aisandbox-pa.googleapis.com": "labs",
+    "generativelanguage.googleapis.com": "gemini",
+    "api.openai.com": "openai",
+    "api.elevenlabs.io": "elevenlabs",
+    "labs.google": "whisk",
+    "texttospeech.googleapis.com": "google_tts",
+}
+
+
+def fingerprint(key: str) -> str:
+    return hashlib.sha256(key.encode("utf-8")).hexdigest()[:8] if key else ""
+
+
+def provider_of(url: str) -> str:
+    host = (urlparse(url or "").hostname or "").lower()
+    if "/v1beta/models/" in (url or ""):
+        return "gemini"
+    return _HOST_PROVIDERS.get(host, host or "unknown")
+
+
+def endpoint_of(url: str) -> str:
+    """Last path segment without the query string, e.g. 'video:batchCheckAsyncVideoGenerationStatus'."""
+    path = urlparse(url or "").path.rstrip("/")
+    return path.rsplit("/", 1)[-1] or path or "/"
+
+
+def _key_from_url(url: str) -> str:
+    return (parse_qs(urlparse(url or "").query).get("key") or [""])[0]
+
+
+def _escape(value: Any) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _pct(xs: List[float], p: float) -> float:
+    if not xs:
+        return 0.0
+    xs = sorted(xs)
+    return xs[min(len(xs) - 1, max(0, math.ceil(p / 100.0 * len(xs)) - 1))]
+
+
+class _Series:
+    __slots__ = ("calls", "errors", "statuses", "seconds", "buckets", "bytes_in", "bytes_out", "retries",
+                 "recent", "keys", "last_ts")
+
+    def __init__(self, window: int):
+        self.calls = 0
+        self.errors = 0
+        self.statuses: Dict[str, int] = {}
+        self.seconds = 0.0
+        self.buckets = [0] * (len(BUCKETS) + 1)
+        self.bytes_in = 0
+        self.bytes_out = 0
+        self.retries = 0
+        self.recent: Deque[float] = deque(maxlen=window)
+        self.keys: Dict[str, int] = {}
+        self.last_ts = 0.0
+
+
+class MetricsRegistry:
+    """
+    Args:
+        jsonl_path: Append every call as one JSON line here (None = off)
+        window: Latest latencies kept per series for p50/p95
+        recent: Latest call records kept for the live view
+    """
+
+    def __init__(self, jsonl_path: Optional[str] = None, window: int = 512, recent: int = 200):
+        self.jsonl_path = jsonl_path
+        self.window = int(window)
+        self._series: Dict[tuple, _Series] = {}
+        self._recent: Deque[Dict[str, Any]] = deque(maxlen=int(recent))
+        self._lock = threading.Lock()
+        self.started = time.time()
+
+    def record(self, provider: str, endpoint: str, status: int, seconds: float, key: str = "", retries: int = 0,
+               bytes_out: int = 0, bytes_in: int = 0, error: str = ""):
+        """Record one HTTP attempt (status 0 = no response, e.g. timeout / connection error)."""
+        ok = 200 <= int(status or 0) < 400 and not error
+        rec = {"ts": round(time.time(), 3), "provider": provider, "endpoint": endpoint, "status": int(status or 0),
+               "ok": ok, "seconds": round(float(seconds), 4), "key": fingerprint(key), "retries": int(retries),
+               "bytes_out": int(bytes_out or 0), "bytes_in": int(bytes_in or 0)}
+        if error:
+            rec["error"] = str(error)[:200]
+        with self._lock:
+            s = self._series.get((provider, endpoint))
+            if s is None:
+                s = self._series[(provider, endpoint)] = _Series(self.window)
+            s.calls += 1
+            s.errors += 0 if ok else 1
+            code = str(rec["status"])
+            s.statuses[code] = s.statuses.get(code, 0) + 1
+            s.seconds += rec["seconds"]
+            i = 0
+            while i < len(BUCKETS) and rec["seconds"] > BUCKETS[i]:
+                i += 1
+            s.buckets[i] += 1
+            s.bytes_in += rec["bytes_in"]
+            s.bytes_out += rec["bytes_out"]
+            s.retries += 1 if rec["retries"] else 0
+            s.recent.append(rec["seconds"])
+            if rec["key"]:
+                s.keys[rec["key"]] = s.keys.get(rec["key"], 0) + 1
+            s.last_ts = rec["ts"]
+            self._recent.append(rec)
+        if self.jsonl_path:
+            self._append(rec)
+
+    def _append(self, rec: Dict[str, Any]):
+        try:
+            line = json.dumps(rec, ensure_ascii=False)
+            with self._lock:
+                with open(self.jsonl_path, "a", encoding="utf-8") as f:
+                    f.write(line + "\n")
+        except OSError:
+            pass
+
+    def snapshot(self) -> List[Dict[str, Any]]:
+        """One row per (provider, endpoint), busiest first."""
+        with self._lock:
+            rows = []
+            for (provider, endpoint), s in self._series.items():
+                lat = list(s.recent)
+                rows.append({"provider": provider, "endpoint": endpoint, "calls": s.calls, "errors": s.errors,
+                             "statuses": dict(s.statuses), "avg": round(s.seconds / max(1, s.calls), 3),
+                             "p50": round(_pct(lat, 50), 3), "p95": round(_pct(lat, 95), 3),
+                             "total_seconds": round(s.seconds, 2), "retries": s.retries,
+                             "bytes_in": s.bytes_in, "bytes_out": s.bytes_out, "keys": dict(s.keys),
+                             "last_ts": s.last_ts})
+        return sorted(rows, key=lambda r: -r["total_seconds"])
+
+    def recent(self, n: int = 50) -> List[Dict[str, Any]]:
+        with self._lock:
+            return list(self._recent)[-n:]
+
+    def prometheus(self, prefix: str = "veo_api") -> str:
+        """Prometheus text exposition format."""
+        def lbl(**kv):
+            return ",".join(f'{k}="{_escape(v)}"' for k, v in kv.items())
+        out = [f"# HELP {prefix}_call_seconds Outbound API call latency.",
+               f"# TYPE {prefix}_call_seconds histogram"]
+        with self._lock:
+            items = sorted(self._series.items())
+            for (provider, endpoint), s in items:
+                acc = 0
+                for le, n in zip([str(b) for b in BUCKETS] + ["+Inf"], s.buckets):
+                    acc += n
+                    out.append(f"{prefix}_call_seconds_bucket{{{lbl(provider=provider, endpoint=endpoint, le=le)}}} {acc}")
+                out.append(f"{prefix}_call_seconds_sum{{{lbl(provider=provider, endpoint=endpoint)}}} {s.seconds:.4f}")
+                out.append(f"{prefix}_call_seconds_count{{{lbl(provider=provider, endpoint=endpoint)}}} {s.calls}")
+            out += [f"# HELP {prefix}_calls_total Outbound API calls by HTTP status (0 = no response).",
+                    f"# TYPE {prefix}_calls_total counter"]
+            for (provider, endpoint), s in items:
+                for code, n in sorted(s.statuses.items()):
+                    out.append(f"{prefix}_calls_total{{{lbl(provider=provider, endpoint=endpoint, status=code)}}} {n}")
+            out += [f"# HELP {prefix}_retries_total Calls that were a retry of an earlier attempt.",
+                    f"# TYPE {prefix}_retries_total counter"]
+            for (provider, endpoint), s in items:
+                out.append(f"{prefix}_retries_total{{{lbl(provider=provider, endpoint=endpoint)}}} {s.retries}")
+            out += [f"# HELP {prefix}_bytes_total Request/response body bytes.",
+                    f"# TYPE {prefix}_bytes_total counter"]
+            for (provider, endpoint), s in items:
+                out.append(f"{prefix}_bytes_total{{{lbl(provider=provider, endpoint=endpoint, direction='out')}}} {s.bytes_out}")
+                out.append(f"{prefix}_bytes_total{{{lbl(provider=provider, endpoint=endpoint, direction='in')}}} {s.bytes_in}")
+        return "\n".join(out) + "\n"
+
+    def export_jsonl(self, path: str) -> int:
+        """Write the retained recent call records to path; returns the count."""
+        rows = self.recent(len(self._recent) or 1)
+        with open(path, "w", encoding="utf-8") as f:
+            for rec in rows:
+                f.write(json.dumps(rec, ensure_ascii=False) + "\n")
+        return len(rows)
+
+    def reset(self):
+        with self._lock:
+            self._series.clear()
+            self._recent.clear()
+            self.started = time.time()
+
+
+_METRICS: Optional[MetricsRegistry] = None
+_METRICS_LOCK = threading.Lock()
+
+
+def get_metrics() -> MetricsRegistry:
+    """Process-wide registry; optional 'metrics' config section {"jsonl_path": ..., "enabled": ...}."""
+    global _METRICS
+    with _METRICS_LOCK:
+        if _METRICS is None:
+            try:
+                from utils import config as cfg
+                c = (cfg.load() or {}).get("metrics") or {}
+            except Exception:
+                c = {}
+            _METRICS = MetricsRegistry(jsonl_path=c.get("jsonl_path") if c.get("enabled", True) else None)
+        return _METRICS
+
+
+def observe(provider: Optional[str], url: str, t0: float, response=None, error: Any = None, key: str = "",
+            retries: int = 0, bytes_in: Optional[int] = None, endpoint: Optional[str] = None,
+            status: Optional[int] = None):
+    """
+    Record one attempt that started at t0 (time.monotonic()).
+
+    Status, request size and (for non-streamed responses) response size are
+    read from response; key defaults to the ?key= of url. Never raises.
+    """
+    try:
+        if status is None:
+            status = getattr(response, "status_code", 0) if response is not None else 0
+        out = 0
+        req = getattr(response, "request", None)
+        body = getattr(req, "body", None)
+        if body:
+            out = len(body)
+        if bytes_in is None:
+            bytes_in = 0
+            if response is not None:
+                cl = (getattr(response, "headers", None) or {}).get("content-length")
+                if cl and str(cl).isdigit():
+                    bytes_in = int(cl)
+                elif getattr(response, "_content_consumed", False) and isinstance(getattr(response, "_content", None), bytes):
+                    bytes_in = len(response._content)
+        err = ""
+        if error is not None:
+            err = type(error).__name__ if isinstance(error, BaseException) else str(error)
+        get_metrics().record(provider or provider_of(url), endpoint or endpoint_of(url), status,
+                             time.monotonic() - t0, key=key or _key_from_url(url), retries=retries,
+                             bytes_out=out, bytes_in=bytes_in, error=err)
+    except Exception:
+        pass
+
+
+def timed_request(method: str, url: str, provider: Optional[str] = None, key: str = "", retries: int = 0,
+                  session=None, **kwargs):
+    """requests.request(method, url, **kwargs) recorded through observe(); exceptions are recorded and re-raised."""
+    import requests
+    t0 = time.monotonic()
+    try:
+        r = (session or requests).request(method, url, **kwargs)
+    except Exception as e:
+        observe(provider, url, t0, error=e, key=key, retries=retries)
+        raise
+    observe(provider, url, t0, response=r, key=key, retries=retries)
+    return r
@@ -0,0 +1,350 @@
+# -*- coding: utf-8 -*-
+"""
+Process-wide per-key rate limiter (token bucket per provider + key)
+
+Every API key gets a token bucket sized from the provider quota (requests per
+minute + burst). Callers do not sleep under a lock: reserve() debits a bucket
+and returns a Reservation carrying the monotonic time at which the call may be
+made. The caller decides what to do until then - wait() on it (optionally
+interruptible), schedule other work, or cancel() to give the slot back.
+
+Failures feed back into the same state: 429/quota errors put the key into an
+exponential cooldown, 401/403 into a long one, so image, script and TTS jobs
+running concurrently all respect the same per-key quotas.
+
+Quotas come from the optional 'rate_limits' config section:
+    {"rate_limits": {"google": {"rpm": 15, "burst": 3, "max_in_flight": 1}, "openai": {"rpm": 60}}}
+
+max_in_flight caps concurrent requests per key: reserve() prefers keys below
+it, and call() (every key rotator) waits for a free slot before reserving, so
+N parallel workers over N keys end up with one request per key.
+"""
+import threading
+import time
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+
+class APIKeyRotationError(Exception):
+    """Error raised when all API keys fail"""
+    pass
+
+
+DEFAULT_LIMITS = {
+    'google': {'rpm': 15, 'burst': 3, 'max_in_flight': 1},  # Gemini free tier
+    'openai': {'rpm': 60, 'burst': 5},
+    'elevenlabs': {'rpm': 30, 'burst': 3},
+    'labs': {'rpm': 120, 'burst': 10},
+    # voice-over synthesis has its own quotas, separate from the text/image APIs on the same keys
+    'google_tts': {'rpm': 300, 'burst': 10},
+    'openai_tts': {'rpm': 50, 'burst': 5},
+}
+FALLBACK_LIMIT = {'rpm': 60, 'burst': 5}
+
+AUTH_COOLDOWN_SECONDS = 600.0
+RATE_LIMIT_COOLDOWN_SECONDS = 10.0
+MAX_COOLDOWN_SECONDS = 300.0
+MAX_CALL_WAIT_SECONDS = 30.0  # call() gives up rather than wait out a longer cooldown
+
+
+def classify_error(err: Any) -> str:
+    """'rate_limit' | 'auth' | 'server' | 'other' from an exception or message (status codes in text)."""
+    msg = str(err).lower()
+    if any(s in msg for s in ('429', 'rate limit', 'quota', 'resource_exhausted', 'too many requests')):
+        return 'rate_limit'
+    if any(s in msg for s in ('401', '403', 'unauthorized', 'forbidden', 'invalid api key', 'api_key_invalid')):
+        return 'auth'
+    if any(s in msg for s in ('500', '502', '503', '504', 'unavailable', 'timed out', 'timeout', 'connection')):
+        return 'server'
+    return 'other'
+
+
+def key_preview(key: str) -> str:
+    return f"...{key[-6:]}" if key and len(key) > 6 else "***"
+
+
+@dataclass
+class _Bucket:
+    rate: float  # tokens per second
+    capacity: float
+    tokens: float
+    updated: float
+    cooldown_until: float = 0.0
+    consecutive_failures: int = 0
+    total_calls: int = 0
+    failed_calls: int = 0
+    rate_limit_hits: int = 0
+    last_reserved: float = 0.0
+    in_flight: int = 0
+    max_in_flight: int = 0  # 0 = no cap
+
+    def refill(self, now: float):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def eta(self, now: float) -> float:
+        """Earliest monotonic time a new reservation could run."""
+        wait = (1.0 - self.tokens) / self.rate if self.tokens < 1.0 else 0.0
+        return max(now + wait, self.cooldown_until)
+
+    def busy(self) -> bool:
+        return bool(self.max_in_flight) and self.in_flight >= self.max_in_flight
+
+    def rank(self, now: float) -> tuple:
+        return (self.busy(), self.eta(now), self.last_reserved)
+
+
+@dataclass
+class Reservation:
+    """A granted slot on one key; run the call at or after ready_at."""
+    provider: str
+    key: str
+    ready_at: float
+    _limiter: Any = field(repr=False, default=None)
+    _done: bool = field(repr=False, default=False)
+
+    def delay(self) -> float:
+        return max(0.0, self.ready_at - time.monotonic())
+
+    def ready(self) -> bool:
+        return self.delay() <= 0.0
+
+    def wait(self, stop_event: Optional[threading.Event] = None) -> bool:
+        """Block (outside any lock) until ready; False if stop_event fired first."""
+        d = self.delay()
+        if d <= 0:
+            return True
+        if stop_event is not None:
+            return not stop_event.wait(d)
+        time.sleep(d)
+        return True
+
+    def cancel(self):
+        """Give the slot back if the call will not be made."""
+        if not self._done and self._limiter is not None:
+            self._done = True
+            self._limiter._refund(self.provider, self.key)
+
+    def report(self, ok: bool = True, error: Any = None):
+        """Record the outcome of the call made with this reservation."""
+        if self._limiter is not None:
+            if not self._done:
+                self._limiter._release(self.provider, self.key)
+            self._limiter.report(self.provider, self.key, ok=ok, error=error)
+        self._done = True
+
+
+class RateLimiter:
+    """Token bucket per (provider, key) with reservations and failure cooldowns."""
+
+    def __init__(self, limits: Optional[Dict[str, Dict[str, float]]] = None):
+        self._lock = threading.Lock()
+        self._slots = threading.Condition(self._lock)  # notified when an in-flight slot frees
+        self._buckets: Dict[Tuple[str, str], _Bucket] = {}
+        self._limits = {p: dict(v) for p, v in DEFAULT_LIMITS.items()}
+        for p, v in (limits or {}).items():
+            if isinstance(v, dict):
+                self._limits.setdefault(p, dict(FALLBACK_LIMIT)).update(v)
+
+    def _bucket(self, provider: str, key: str, now: float) -> _Bucket:
+        b = self._buckets.get((provider, key))
+        if b is None:
+            lim = self._limits.get(provider, FALLBACK_LIMIT)
+            rate = max(0.01, float(lim.get('rpm', 60)) / 60.0)
+            cap = max(1.0, float(lim.get('burst', 1)))
+            b = self._buckets[(provider, key)] = _Bucket(rate=rate, capacity=cap, tokens=cap, updated=now,
+                                                         max_in_flight=max(0, int(lim.get('max_in_flight', 0) or 0)))
+        b.refill(now)
+        return b
+
+    # ---- reservations -------------------------------------------------
+    def reserve(self, provider: str, keys: List[str], exclude: Optional[set] = None) -> Optional[Reservation]:
+        """Reserve the key of keys that can run soonest (below its in-flight cap first); never blocks. None if no keys."""
+        keys = [k for k in keys or [] if k and k not in (exclude or ())]
+        if not keys:
+            return None
+        with self._lock:
+            return self._reserve(provider, keys, time.monotonic())
+
+    def reserve_slot(self, provider: str, keys: List[str],
+                     stop_event: Optional[threading.Event] = None) -> Optional[Reservation]:
+        """Like reserve(), but first waits until some key is below max_in_flight. None if no keys or stopped."""
+        keys = [k for k in keys or [] if k]
+        if not keys:
+            return None
+        with self._slots:
+            while all(self._bucket(provider, k, time.monotonic()).busy() for k in keys):
+                if stop_event is not None and stop_event.is_set():
+                    return None
+                self._slots.wait(0.5)
+            return self._reserve(provider, keys, time.monotonic())
+
+    def _reserve(self, provider: str, keys: List[str], now: float) -> Reservation:
+        best = min(keys, key=lambda k: self._bucket(provider, k, now).rank(now))
+        b = self._buckets[(provider, best)]
+        ready_at = b.eta(now)
+        b.tokens -= 1.0  # may go negative: later reservations queue behind this one
+        b.last_reserved = now
+        b.in_flight += 1
+        return Reservation(provider, best, ready_at, self)
+
+    def try_acquire(self, provider: str, keys: List[str]) -> Optional[Reservation]:
+        """Reservation only if some key is usable right now, else None (nothing is debited)."""
+        res = self.reserve(provider, keys)
+        if res is not None and not res.ready():
+            res.cancel()
+            return None
+        return res
+
+    def _refund(self, provider: str, key: str):
+        with self._lock:
+            b = self._buckets.get((provider, key))
+            if b is not None:
+                b.tokens = min(b.capacity, b.tokens + 1.0)
+                b.in_flight = max(0, b.in_flight - 1)
+                self._slots.notify_all()
+
+    def _release(self, provider: str, key: str):
+        with self._lock:
+            b = self._buckets.get((provider, key))
+            if b is not None:
+                b.in_flight = max(0, b.in_flight - 1)
+                self._slots.notify_all()
+
+    def report(self, provider: str, key: str, ok: bool = True, error: Any = None):
+        now = time.monotonic()
+        kind = 'ok' if ok else classify_error(error)
+        with self._lock:
+            b = self._bucket(provider, key, now)
+            b.total_calls += 1
+            if kind == 'ok':
+                b.consecutive_failures = 0
+                return
+            b.failed_calls += 1
+            b.consecutive_failures += 1
+            if kind == 'rate_limit':
+                b.rate_limit_hits += 1
+                b.cooldown_until = now + min(MAX_COOLDOWN_SECONDS,
+                                             RATE_LIMIT_COOLDOWN_SECONDS * 2 ** (b.consecutive_failures - 1))
+            elif kind == 'auth':
+                b.cooldown_until = now + AUTH_COOLDOWN_SECONDS
+            elif kind == 'server' and b.consecutive_failures >= 2:
+                b.cooldown_until = now + min(60.0, 2.0 ** b.consecutive_failures)
+
+    def cooldown(self, provider: str, keys: List[str]) -> float:
+        """Seconds until the first of keys leaves its failure cooldown (0 if one is usable)."""
+        now = time.monotonic()
+        with self._lock:
+            return min((max(0.0, self._bucket(provider, k, now).cooldown_until - now) for k in keys or [] if k),
+                       default=0.0)
+
+    def order(self, provider: str, keys: List[str]) -> List[str]:
+        """keys sorted by how soon each could be used (no reservation is made)."""
+        now = time.monotonic()
+        with self._lock:
+            return sorted([k for k in keys or [] if k], key=lambda k: self._bucket(provider, k, now).rank(now))
+
+    def concurrency(self, provider: str, keys: List[str]) -> int:
+        """Parallel requests keys can carry under the provider's in-flight cap (0 = uncapped)."""
+        cap = int(self._limits.get(provider, FALLBACK_LIMIT).get('max_in_flight', 0) or 0)
+        return len([k for k in keys or [] if k]) * cap
+
+    # ---- convenience --------------------------------------------------
+    def call(self, provider: str, keys: List[str], api_call: Callable[[str], Any],
+             max_attempts: Optional[int] = None, stop_event: Optional[threading.Event] = None,
+             log: Optional[Callable[[str], None]] = None, max_wait: float = MAX_CALL_WAIT_SECONDS) -> Any:
+        """
+        Run api_call(key) on the best key, rotating on failure.
+
+        Waits for each reservation outside the limiter lock; failed keys go
+        into cooldown so the next attempt lands on the healthiest key. Only
+        transient errors (429, 5xx, timeouts) are retried: a key failing auth
+        is dropped for the rest of the call, any other error ends it, and the
+        call gives up once every remaining key is cooling down for longer
+        than max_wait.
+
+        Raises:
+            APIKeyRotationError: If every attempt fails
+        """
+        log = log or (lambda m: None)
+        keys = [k for k in keys or [] if k]
+        if not keys:
+            raise APIKeyRotationError("No API keys provided")
+        attempts = max_attempts or len(keys) + 2
+        last_error = None
+        dead = set()
+        for attempt in range(1, attempts + 1):
+            live = [k for k in keys if k not in dead]
+            if not live:
+                break
+            cool = self.cooldown(provider, live)
+            if cool > max_wait:
+                log(f"[RATE LIMIT] Mọi key đang nghỉ thêm {cool:.0f}s, dừng thử.")
+                break
+            res = self.reserve_slot(provider, live, stop_event)
+            if res is None:
+                raise APIKeyRotationError("Stopped")
+            if res.delay() > 0.5:
+                log(f"[RATE LIMIT] Key {key_preview(res.key)} sẵn sàng sau {res.delay():.1f}s")
+            if not res.wait(stop_event):
+                res.cancel()
+                raise APIKeyRotationError("Stopped")
+            try:
+                result = api_call(res.key)
+            except Exception as e:
+                res.report(ok=False, error=e)
+                last_error = e
+                kind = classify_error(e)
+                log(f"[{kind.upper()}] Key {key_preview(res.key)} ({attempt}/{attempts}): {str(e)[:120]}")
+                if kind == 'auth':
+                    dead.add(res.key)
+                elif kind == 'other':
+                    break  # not transient: another key or attempt would fail the same way
+                continue
+            res.report(ok=True)
+            return result
+        summary = f"All {len(keys)} API keys failed"
+        if last_error:
+            summary += f". Last error: {str(last_error)[:200]}"
+        log(f"[EXHAUSTED] {summary}")
+        raise APIKeyRotationError(summary)
+
+    def stats(self, provider: Optional[str] = None) -> List[Dict[str, Any]]:
+        now = time.monotonic()
+        with self._lock:
+            out = []
+            for (p, k), b in self._buckets.items():
+                if provider and p != provider:
+                    continue
+                b.refill(now)
+                out.append({
+                    'provider': p,
+                    'key_preview': key_preview(k),
+                    'total_calls': b.total_calls,
+                    'failed_calls': b.failed_calls,
+                    'rate_limit_hits': b.rate_limit_hits,
+                    'consecutive_failures': b.consecutive_failures,
+                    'tokens': round(b.tokens, 2),
+                    'in_flight': b.in_flight,
+                    'is_available': b.eta(now) <= now,
+                    'cooldown_remaining': round(max(0.0, b.cooldown_until - now), 1),
+                })
+            return out
+
+
+_LIMITER: Optional[RateLimiter] = None
+_LIMITER_LOCK = threading.Lock()
+
+
+def get_rate_limiter() -> RateLimiter:
+    """Process-wide limiter; quotas from the optional 'rate_limits' config section."""
+    global _LIMITER
+    with _LIMITER_LOCK:
+        if _LIMITER is None:
+            try:
+                from services.core.config import load as load_config
+                limits = (load_config() or {}).get('rate_limits') or {}
+            except Exception:
+                limits = {}
+            _LIMITER = RateLimiter(limits)
+        return _LIMITER
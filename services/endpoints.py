@@ -1,4 +1,7 @@
-LABS_BASE='https://aisandbox-pa.googleapis.com'
+import os
+
+# VEO_LABS_BASE points every Labs client at another host (e.g. bench/mock_server.py)
+LABS_BASE=os.environ.get('VEO_LABS_BASE','https://aisandbox-pa.googleapis.com').rstrip('/')
 UPLOAD_IMAGE_URL=f"{LABS_BASE}/v1:uploadUserImage"
 T2V_URL=f"{LABS_BASE}/v1/video:batchAsyncGenerateVideoText"
 I2V_URL=f"{LABS_BASE}/v1/video:batchAsyncGenerateVideoStartImage"
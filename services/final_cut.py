@@ -0,0 +1,389 @@
+# -*- coding: utf-8 -*-
+"""
+Final-cut assembly: one clip per scene -> finished video.
+
+    cut = FinalCut(dir_videos, out_path, audio=dirs["audio"], subtitles=dirs["subtitle"])
+    cut.choose(3, 2)          # optional: use copy 2 of scene 3
+    res = cut.run()
+
+Clips are found by the names the pipelines write:
+  text2video      {title}_scene{n}_copy{m}.mp4   (03_Videos)
+  sales           scene_{n}_copy_{m}.mp4         (Video/)
+  project panel   {project}_canh_{n}_video_{m}.mp4
+An upscaled "_4k" variant is preferred when it exists.
+
+Clips whose streams match the most common format are stream-copied through
+ffmpeg's concat demuxer; the others get one re-encode pass to that format.
+Conformed segments and ffprobe results are kept in <video_dir>/.final_cut
+with a manifest, so a re-run only re-processes scenes whose chosen clip
+changed, and does nothing when neither clips nor audio/subtitles changed.
+Voice-over is mixed over the clip audio and cut to the video length. A folder
+of per-scene files (scene_NNN.mp3/.wav, as written by the TTS engine) is laid
+out on the timeline: each file starts with its scene's clip and is padded or
+trimmed to that clip's length. Any other audio (one file, or a folder joined
+in name order) starts at 0. Subtitles are attached as a soft track or burned
+in (burn-in re-encodes the whole video).
+"""
+import hashlib
+import json
+import os
+import re
+import shutil
+import subprocess
+import time
+from collections import Counter
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from services.utils.ffmpeg_pool import get_ffmpeg_pool
+
+MANIFEST = "final_cut.json"
+WORK_DIR = ".final_cut"
+AUDIO_EXTS = (".mp3", ".wav", ".m4a", ".aac", ".ogg", ".flac")
+_CLIP_RES = (re.compile(r"_scene(\d+)_copy(\d+)(_4k)?\.mp4$", re.I),
+             re.compile(r"^scene_(\d+)_copy_(\d+)(_4k)?\.mp4$", re.I),
+             re.compile(r"_canh_(\d+)_video_(\d+)(_4k)?\.mp4$", re.I))
+_ENCODERS = {"h264": "libx264", "hevc": "libx265"}
+_SCENE_AUDIO = re.compile(r"^scene_(\d+)\.\w+$", re.I)
+_VOICE_FMT = "aresample=44100,aformat=sample_fmts=fltp:channel_layouts=stereo"
+
+
+class FinalCutError(Exception):
+    pass
+
+
+def find_clips(video_dir: str, prefer_4k: bool = True) -> Dict[int, Dict[int, str]]:
+    """{scene: {copy: path}} for every recognised clip in video_dir."""
+    out: Dict[int, Dict[int, str]] = {}
+    try:
+        names = sorted(os.listdir(video_dir))
+    except OSError:
+        return out
+    for name in names:
+        for rx in _CLIP_RES:
+            m = rx.search(name)
+            if not m:
+                continue
+            scene, copy, is4k = int(m.group(1)), int(m.group(2)), bool(m.group(3))
+            have = out.setdefault(scene, {}).get(copy)
+            if have is None or (is4k == prefer_4k):
+                out[scene][copy] = os.path.join(video_dir, name)
+            break
+    return out
+
+
+def audio_files(path: Optional[str]) -> List[str]:
+    if not path:
+        return []
+    path = str(path)
+    if os.path.isfile(path):
+        return [path]
+    if os.path.isdir(path):
+        return [os.path.join(path, n) for n in sorted(os.listdir(path)) if n.lower().endswith(AUDIO_EXTS)]
+    return []
+
+
+def scene_audio(paths: List[str]) -> Optional[Dict[int, str]]:
+    """{scene: file} when every file is a per-scene voice-over (scene_NNN.ext), else None."""
+    out = {}
+    for p in paths:
+        m = _SCENE_AUDIO.match(os.path.basename(p))
+        if not m:
+            return None
+        out[int(m.group(1))] = p
+    return out or None
+
+
+def _file_key(path: str) -> str:
+    st = os.stat(path)
+    return f"{os.path.abspath(path)}|{int(st.st_mtime)}|{st.st_size}"
+
+
+def _concat_line(path: str) -> str:
+    return "file '" + os.path.abspath(path).replace("'", "'\\''") + "'"
+
+
+class FinalCut:
+    """
+    Args:
+        video_dir: Folder with the downloaded clips
+        out_path: Finished video (default: <video_dir>/../<folder>_final.mp4)
+        audio: Voice-over file, or folder of per-scene files (scene_NNN.*) or files joined in name order
+        subtitles: .srt file
+        burn_subtitles: Burn subtitles into the picture instead of a soft track
+        clip_volume: Clip audio level under the voice-over (0 = voice-over only)
+        prefer_4k: Use the "_4k" upscale of a clip when present
+        pool: FfmpegPool (default: the shared one)
+        on_log: callable(str)
+    """
+
+    def __init__(self, video_dir: str, out_path: Optional[str] = None, audio: Optional[str] = None,
+                 subtitles: Optional[str] = None, burn_subtitles: bool = False, clip_volume: float = 0.3,
+                 prefer_4k: bool = True, pool=None, on_log: Optional[Callable[[str], None]] = None):
+        self.video_dir = str(video_dir)
+        parent = os.path.dirname(os.path.abspath(self.video_dir))
+        self.out_path = str(out_path) if out_path else os.path.join(parent, f"{os.path.basename(parent)}_final.mp4")
+        self.audio = audio_files(audio)
+        self.subtitles = str(subtitles) if subtitles and os.path.isfile(str(subtitles)) else None
+        self.burn_subtitles = bool(burn_subtitles)
+        self.clip_volume = max(0.0, float(clip_volume))
+        self.prefer_4k = prefer_4k
+        self.pool = pool or get_ffmpeg_pool()
+        self.on_log = on_log or (lambda msg: None)
+        self.work_dir = os.path.join(self.video_dir, WORK_DIR)
+        self._manifest_path = os.path.join(self.work_dir, MANIFEST)
+        self._manifest = self._load()
+        self._running = None
+        self._cancelled = False
+
+    # ---- manifest ---------------------------------------------------
+    def _load(self) -> Dict[str, Any]:
+        try:
+            with open(self._manifest_path, "r", encoding="utf-8") as f:
+                m = json.load(f)
+        except (OSError, ValueError):
+            m = {}
+        for k in ("choices", "probes", "segments"):
+            m.setdefault(k, {})
+        return m
+
+    def _save(self):
+        os.makedirs(self.work_dir, exist_ok=True)
+        tmp = self._manifest_path + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(self._manifest, f, ensure_ascii=False, indent=2)
+        os.replace(tmp, self._manifest_path)
+
+    # ---- selection --------------------------------------------------
+    def choose(self, scene: int, copy: int):
+        """Use this copy for the scene in this and later runs."""
+        self._manifest["choices"][str(int(scene))] = int(copy)
+        self._save()
+
+    def plan(self) -> List[Tuple[int, str]]:
+        """(scene, clip path) in scene order: the chosen copy, else the lowest copy available."""
+        out = []
+        for scene, copies in sorted(find_clips(self.video_dir, self.prefer_4k).items()):
+            want = self._manifest["choices"].get(str(scene))
+            copy = want if want in copies else min(copies)
+            out.append((scene, copies[copy]))
+        return out
+
+    # ---- ffmpeg -----------------------------------------------------
+    def _ffprobe(self) -> str:
+        d, b = os.path.split(self.pool.binary)
+        return os.path.join(d, b.replace("ffmpeg", "ffprobe")) if "ffmpeg" in b else "ffprobe"
+
+    def probe(self, path: str) -> Dict[str, Any]:
+        """Stream format of a clip (cached per file in the manifest)."""
+        key = _file_key(path)
+        hit = self._manifest["probes"].get(key)
+        if hit:
+            return hit
+        cmd = [self._ffprobe(), "-v", "error", "-show_entries",
+               "stream=codec_type,codec_name,width,height,r_frame_rate,pix_fmt,sample_rate,channels:format=duration",
+               "-of", "json", path]
+        try:
+            data = json.loads(subprocess.run(cmd, capture_output=True, timeout=60, check=True).stdout or b"{}")
+        except (OSError, subprocess.SubprocessError, ValueError) as e:
+            raise FinalCutError(f"Không đọc được {os.path.basename(path)}: {e}")
+        v = next((s for s in data.get("streams", []) if s.get("codec_type") == "video"), None)
+        a = next((s for s in data.get("streams", []) if s.get("codec_type") == "audio"), None)
+        if not v:
+            raise FinalCutError(f"{os.path.basename(path)} không có hình")
+        info = {"v": [v.get("codec_name"), v.get("width"), v.get("height"), v.get("r_frame_rate"), v.get("pix_fmt")],
+                "a": [a.get("codec_name"), a.get("sample_rate"), a.get("channels")] if a else None,
+                "duration": float((data.get("format") or {}).get("duration") or 0)}
+        self._manifest["probes"][key] = info
+        return info
+
+    def _ffmpeg(self, args: List[str], label: str, duration: Optional[float] = None, cwd: Optional[str] = None):
+        step = [0]
+
+        def progress(pct, _secs):
+            if pct >= step[0] + 25:
+                step[0] = pct - pct % 25
+                self.on_log(f"[INFO] {label}: {pct}%")
+
+        if self._cancelled:
+            raise FinalCutError("đã hủy")
+        self._running = self.pool.submit(args, label=label, duration=duration, on_progress=progress, cwd=cwd)
+        res = self._running.result()
+        self._running = None
+        if not res["ok"]:
+            raise FinalCutError("đã hủy" if res["cancelled"] else f"{label}: {res['error']}")
+        return res
+
+    def cancel(self):
+        """Stop the running ffmpeg step; later steps are skipped."""
+        self._cancelled = True
+        if self._running is not None:
+            self.pool.cancel(self._running)
+
+    @staticmethod
+    def _target(probes: List[Dict[str, Any]]) -> Dict[str, Any]:
+        """Most common stream format; clips in any other format get conformed to it."""
+        sig = Counter(json.dumps([p["v"], p["a"]]) for p in probes).most_common(1)[0][0]
+        v, a = json.loads(sig)
+        if v[0] not in _ENCODERS:
+            v = ["h264"] + v[1:4] + ["yuv420p"]
+        return {"v": v, "a": a}
+
+    def _conform_args(self, src: str, dst: str, info: Dict[str, Any], target: Dict[str, Any]) -> List[str]:
+        codec, w, h, fps, pix = target["v"]
+        args = ["-y", "-i", src]
+        ta = target["a"]
+        if ta and not info["a"]:
+            layout = "mono" if str(ta[2]) == "1" else "stereo"
+            args += ["-f", "lavfi", "-i", f"anullsrc=r={ta[1]}:cl={layout}", "-shortest"]
+        args += ["-map", "0:v:0", "-vf",
+                 f"scale={w}:{h}:force_original_aspect_ratio=decrease,pad={w}:{h}:(ow-iw)/2:(oh-ih)/2,fps={fps},format={pix}",
+                 "-c:v", _ENCODERS[codec], "-preset", "fast", "-crf", "18"]
+        if ta:
+            args += ["-map", "1:a:0" if not info["a"] else "0:a:0", "-c:a", "aac", "-ar", str(ta[1]), "-ac", str(ta[2])]
+        else:
+            args += ["-an"]
+        return args + [dst]
+
+    # ---- run --------------------------------------------------------
+    def run(self) -> Dict[str, Any]:
+        """
+        Assemble the final video. Returns {"ok", "path", "scenes", "reencoded",
+        "unchanged", "seconds", "error"}; never raises.
+        """
+        t0 = time.monotonic()
+        res = {"ok": False, "path": self.out_path, "scenes": 0, "reencoded": 0, "unchanged": False,
+               "seconds": 0.0, "error": ""}
+        try:
+            self._run(res)
+            res["ok"] = True
+        except FinalCutError as e:
+            res["error"] = str(e)
+        except OSError as e:
+            res["error"] = str(e)
+        try:
+            self._save()
+        except OSError:
+            pass
+        res["seconds"] = round(time.monotonic() - t0, 2)
+        return res
+
+    def _run(self, res: Dict[str, Any]):
+        if not self.pool.available():
+            raise FinalCutError("Không tìm thấy ffmpeg trong PATH")
+        clips = self.plan()
+        if not clips:
+            raise FinalCutError(f"Không có clip nào trong {self.video_dir}")
+        res["scenes"] = len(clips)
+        os.makedirs(self.work_dir, exist_ok=True)
+        probes = [self.probe(p) for _, p in clips]
+        live = {_file_key(p) for _, p in clips}
+        self._manifest["probes"] = {k: v for k, v in self._manifest["probes"].items() if k in live}
+        target = self._target(probes)
+        tkey = json.dumps(target)
+
+        segments, keys = [], []
+        for (scene, path), info in zip(clips, probes):
+            key = _file_key(path)
+            if info["v"] == target["v"] and info["a"] == target["a"]:
+                segments.append(path)   # stream copy
+                keys.append(key)
+                continue
+            seg = os.path.join(self.work_dir, f"seg_{scene:03d}.mp4")
+            prev = self._manifest["segments"].get(str(scene)) or {}
+            if not (prev.get("src") == key and prev.get("target") == tkey and os.path.isfile(seg)):
+                self.on_log(f"[INFO] Chuẩn hoá cảnh {scene} ({os.path.basename(path)})…")
+                self._ffmpeg(self._conform_args(path, seg + ".tmp.mp4", info, target), f"Cảnh {scene}",
+                             info["duration"] or None)
+                os.replace(seg + ".tmp.mp4", seg)
+                self._manifest["segments"][str(scene)] = {"src": key, "target": tkey}
+                res["reencoded"] += 1
+            segments.append(seg)
+            keys.append(key + "|" + tkey)
+
+        by_scene = scene_audio(self.audio)
+        if by_scene is not None:
+            # only voice-overs of scenes in the cut; stale files of other scenes are ignored
+            voice_in = [by_scene[sc] for sc, _ in clips if sc in by_scene]
+        else:
+            voice_in = list(self.audio)
+        extras = [_file_key(a) for a in voice_in] + ([_file_key(self.subtitles)] if self.subtitles else [])
+        fingerprint = hashlib.sha1(json.dumps([keys, extras, self.burn_subtitles, self.clip_volume,
+                                               os.path.abspath(self.out_path)]).encode("utf-8")).hexdigest()
+        if self._manifest.get("final") == fingerprint and os.path.isfile(self.out_path):
+            res["unchanged"] = True
+            self.on_log("[INFO] Không có cảnh nào thay đổi, giữ nguyên video hoàn chỉnh.")
+            return
+
+        list_path = os.path.join(self.work_dir, "concat.txt")
+        with open(list_path, "w", encoding="utf-8") as f:
+            f.write("\n".join(_concat_line(s) for s in segments) + "\n")
+        total = sum(p["duration"] for p in probes) or None
+        args = ["-y", "-f", "concat", "-safe", "0", "-i", list_path]
+        for a in voice_in:
+            args += ["-i", a]
+        soft_subs = bool(self.subtitles) and not self.burn_subtitles
+        if soft_subs:
+            args += ["-i", self.subtitles]
+        filters, vmap, amap = [], "0:v:0", "0:a?"
+        if self.subtitles and self.burn_subtitles:
+            # the filter runs in work_dir on a copy, so the (Vietnamese) file name needs no escaping
+            shutil.copyfile(self.subtitles, os.path.join(self.work_dir, "subs.srt"))
+            filters.append("[0:v:0]subtitles=subs.srt[vout]")
+            vmap = "[vout]"
+        if voice_in:
+            if by_scene is not None:
+                filters += self._aligned_voice(clips, probes, by_scene, voice_in)
+            else:
+                voice = "".join(f"[{i + 1}:a:0]" for i in range(len(voice_in)))
+                filters.append(f"{voice}concat=n={len(voice_in)}:v=0:a=1[voice]" if len(voice_in) > 1
+                               else f"{voice}anull[voice]")
+            # never longer than the video: pad short voice-overs, cut long ones
+            fit = f"apad,atrim=duration={total:.3f}" if total else "anull"
+            if target["a"] and self.clip_volume > 0:
+                filters.append(f"[voice]{fit}[vo]")
+                filters.append(f"[0:a:0]volume={self.clip_volume}[bed]")
+                filters.append("[bed][vo]amix=inputs=2:duration=first:dropout_transition=0[aout]")
+            else:
+                filters.append(f"[voice]{fit}[aout]")
+            amap = "[aout]"
+        if filters:
+            args += ["-filter_complex", ";".join(filters)]
+        args += ["-map", vmap, "-map", amap]
+        if soft_subs:
+            args += ["-map", f"{len(voice_in) + 1}:0", "-c:s", "mov_text", "-metadata:s:s:0", "language=vie"]
+        args += ["-c:v", "libx264" if vmap == "[vout]" else "copy"]
+        if vmap == "[vout]":
+            args += ["-preset", "fast", "-crf", "18"]
+        args += (["-c:a", "aac", "-b:a", "192k"] if voice_in else ["-c:a", "copy"])
+        tmp = self.out_path + ".tmp.mp4"
+        args += ["-movflags", "+faststart", tmp]
+        os.makedirs(os.path.dirname(os.path.abspath(self.out_path)) or ".", exist_ok=True)
+        self.on_log(f"[INFO] Ghép {len(segments)} cảnh"
+                    + (" + lồng tiếng" if voice_in else "") + (" + phụ đề" if self.subtitles else "") + "…")
+        self._ffmpeg(args, "Ghép video", total, cwd=self.work_dir)
+        os.replace(tmp, self.out_path)
+        self._manifest["final"] = fingerprint
+
+    @staticmethod
+    def _aligned_voice(clips, probes, by_scene: Dict[int, str], voice_in: List[str]) -> List[str]:
+        """One voice piece per clip, exactly as long as the clip (silence where a scene has none), joined."""
+        idx = {p: i + 1 for i, p in enumerate(voice_in)}
+        filters, labels = [], ""
+        for n, ((scene, _), info) in enumerate(zip(clips, probes)):
+            dur = f"{max(0.0, info['duration']):.3f}"
+            src = by_scene.get(scene)
+            head = f"[{idx[src]}:a:0]{_VOICE_FMT},apad" if src else f"anullsrc=r=44100:cl=stereo,{_VOICE_FMT}"
+            filters.append(f"{head},atrim=duration={dur},asetpts=PTS-STARTPTS[s{n}]")
+            labels += f"[s{n}]"
+        filters.append(f"{labels}concat=n={len(clips)}:v=0:a=1[voice]")
+        return filters
+
+
+def for_sales_project(project_name: str, base_dir=None, **kwargs) -> FinalCut:
+    """FinalCut over a sales-video project: Video/ clips, Audio/ voice-over, Phụ đề.srt."""
+    from services.sales_video_service import ensure_project_dirs
+    dirs = ensure_project_dirs(project_name, base_dir)
+    kwargs.setdefault("audio", dirs["audio"])
+    kwargs.setdefault("subtitles", dirs["subtitle"])
+    kwargs.setdefault("out_path", dirs["root"] / f"{project_name}_final.mp4")
+    return FinalCut(dirs["video"], **kwargs)
@@ -3,7 +3,10 @@ import requests, time, random
 from typing import List, Optional
 from services.core.config import load as load_config
 from services.core.key_manager import get_all_keys, refresh
-from services.core.api_config import GEMINI_TEXT_MODEL, gemini_text_endpoint
+from services.core.metrics import timed_request
+from services.core.api_config import GEMINI_BASE, GEMINI_TEXT_MODEL, gemini_text_endpoint
+from services.llm_cache import cached_text
+from services.llm_stream import collect, gemini_stream
 
 class MissingAPIKey(Exception): pass
 class GeminiClient:
@@ -18,15 +21,25 @@ class GeminiClient:
     def _endpoint(self, key): 
         if self.model == GEMINI_TEXT_MODEL:
             return gemini_text_endpoint(key)
-        return f"https://generativelanguage.googleapis.com/v1beta/models/{self.model}:generateContent?key={key}"
-    def generate(self, system_text: str, user_text: str, timeout: int = 180)->str:
+        return f"{GEMINI_BASE}/models/{self.model}:generateContent?key={key}"
+    def generate(self, system_text: str, user_text: str, timeout: int = 180, on_item=None, item_key: str = "scenes",
+                 bypass_cache: bool = False, validate=None)->str:
+        """Full response text; with on_item(i, item) the reply is streamed and each item of
+        the JSON array item_key is delivered as soon as it is complete. Identical prompts are
+        served from the on-disk LLM cache (services.llm_cache) unless bypass_cache."""
+        return cached_text(self.model, system_text, user_text,
+                           lambda: self._generate(system_text, user_text, timeout, on_item, item_key),
+                           bypass=bypass_cache, on_item=on_item, item_key=item_key, validate=validate)
+    def _generate(self, system_text, user_text, timeout, on_item, item_key)->str:
         last=None
         for i in range(5):
             key=self._next_key()
             try:
                 body={"system_instruction":{"parts":[{"text":system_text}]},
                       "contents":[{"role":"user","parts":[{"text":user_text}]}]}
-                r=requests.post(self._endpoint(key), json=body, timeout=timeout)
+                if on_item:
+                    return collect(gemini_stream(self._endpoint(key), body, timeout), on_item, item_key)
+                r=timed_request("POST", self._endpoint(key), "gemini", key=key, retries=i, json=body, timeout=timeout)
                 if r.status_code in (429,408) or r.status_code>=500: raise requests.HTTPError(str(r.status_code), response=r)
                 r.raise_for_status()
                 data=r.json()
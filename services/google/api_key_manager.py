@@ -1,23 +1,28 @@
 # -*- coding: utf-8 -*-
 """
-API Key Rotation Manager with Exponential Backoff and Per-Key Tracking
+API Key Rotation Manager with Per-Key Rate Limiting and Tracking
 
 Features:
 - Per-key usage tracking (calls, failures, last used time)
-- Exponential backoff: 2s → 4s → 8s before retries
-- 60s cooldown after exhausting retries on a key
-- Minimum 2s interval between calls on same key
+- Per-key token buckets (rpm + burst) instead of a fixed minimum interval
+- Exponential cooldown on 429, long cooldown on 401/403
 - Smart rotation that skips rate-limited keys automatically
 - Thread-safe key rotation with locks
 
 Based on the pattern from geminiService.ts (executeWithKeyRotation)
+
+Scheduling, backoff and cooldowns are delegated to the process-wide rate
+limiter (services.core.rate_limiter), so no call sleeps while holding the
+manager lock and all managers/rotators share per-key quotas.
 """
 
 import time
 import threading
-from dataclasses import dataclass, field
+from dataclasses import dataclass
 from typing import Callable, List, Optional, Any, Dict
 
+from services.core.rate_limiter import APIKeyRotationError, classify_error, get_rate_limiter
+
 
 @dataclass
 class KeyUsageTracker:
@@ -38,29 +43,27 @@ class APIKeyRotationManager:
     
     Features:
     - Tracks usage per key (calls, failures, cooldowns)
-    - Exponential backoff: 2s, 4s, 8s for retries
-    - 60s cooldown after max retries
-    - Minimum 2s between calls on same key
+    - Per-key token buckets shared process-wide (services.core.rate_limiter)
+    - Exponential cooldown on rate limits, long cooldown on 401/403
     - Automatically skips rate-limited keys
     """
     
     # Configuration constants
-    MAX_RETRIES_PER_KEY = 3  # Try each key up to 3 times with backoff
-    INITIAL_BACKOFF_SECONDS = 2.0  # Start with 2 seconds
-    COOLDOWN_SECONDS = 60.0  # 60 seconds cooldown after exhausting retries
-    MIN_CALL_INTERVAL_SECONDS = 2.0  # Minimum 2 seconds between calls on same key
-    EXHAUSTED_KEYS_RETRY_INTERVAL_SECONDS = 5.0  # Wait 5s before rechecking when all keys exhausted
+    MAX_RETRIES_PER_KEY = 3  # Attempts per key before giving up
     
-    def __init__(self, api_keys: List[str], log_callback: Optional[Callable[[str], None]] = None):
+    def __init__(self, api_keys: List[str], log_callback: Optional[Callable[[str], None]] = None,
+                 provider: str = 'google'):
         """
         Initialize the rotation manager
         
         Args:
             api_keys: List of API keys to rotate through
             log_callback: Optional callback for logging messages
+            provider: Quota bucket the keys belong to
         """
         self.api_keys = [key for key in api_keys if key and key.strip()]
         self.log_callback = log_callback
+        self.provider = provider
         self.lock = threading.Lock()
         
         # Initialize trackers for each key
@@ -82,72 +85,40 @@ class APIKeyRotationManager:
             return f"...{key[-6:]}"
         return "***"
     
-    def _is_key_available(self, tracker: KeyUsageTracker) -> bool:
-        """Check if a key is available (not in cooldown)"""
-        current_time = time.time()
-        return current_time >= tracker.cooldown_until
-    
     def _get_available_keys(self) -> List[KeyUsageTracker]:
-        """Get list of available keys (not in cooldown)"""
-        current_time = time.time()
-        available = []
-        
-        for key in self.api_keys:
-            tracker = self.key_trackers[key]
-            if current_time >= tracker.cooldown_until:
-                available.append(tracker)
-        
-        return available
-    
-    def _wait_for_min_interval(self, tracker: KeyUsageTracker):
-        """Wait if minimum interval hasn't passed since last call"""
-        if tracker.last_used_time > 0:
-            elapsed = time.time() - tracker.last_used_time
-            if elapsed < self.MIN_CALL_INTERVAL_SECONDS:
-                wait_time = self.MIN_CALL_INTERVAL_SECONDS - elapsed
-                self._log(f"[MIN INTERVAL] Waiting {wait_time:.1f}s before reusing key {self._key_preview(tracker.key)}")
-                time.sleep(wait_time)
+        """Keys ordered by how soon the shared limiter can run them"""
+        return [self.key_trackers[k] for k in get_rate_limiter().order(self.provider, self.api_keys)]
     
-    def _handle_rate_limit(self, tracker: KeyUsageTracker, retry_count: int) -> bool:
-        """
-        Handle rate limit error with exponential backoff
-        
-        Args:
-            tracker: Key tracker that hit rate limit
-            retry_count: Current retry attempt (0-based)
-            
-        Returns:
-            True if should retry, False if max retries exceeded
-        """
-        tracker.rate_limit_hits += 1
-        tracker.last_rate_limit_time = time.time()
-        tracker.consecutive_failures += 1
-        
-        if retry_count >= self.MAX_RETRIES_PER_KEY:
-            # Max retries exceeded - put key in cooldown
-            tracker.cooldown_until = time.time() + self.COOLDOWN_SECONDS
-            self._log(
-                f"[COOLDOWN] Key {self._key_preview(tracker.key)} exhausted {self.MAX_RETRIES_PER_KEY} retries. "
-                f"Cooldown for {self.COOLDOWN_SECONDS}s"
-            )
-            return False
-        
-        # Calculate exponential backoff: 2s, 4s, 8s
-        backoff_delay = self.INITIAL_BACKOFF_SECONDS * (2 ** retry_count)
-        self._log(
-            f"[RATE LIMIT] Key {self._key_preview(tracker.key)} hit limit. "
-            f"Retry {retry_count + 1}/{self.MAX_RETRIES_PER_KEY} after {backoff_delay}s"
-        )
-        time.sleep(backoff_delay)
-        return True
+    def _tracked(self, api_call: Callable[[str], Any]) -> Callable[[str], Any]:
+        """Wrap api_call so per-key usage stats stay up to date"""
+        def run(key: str) -> Any:
+            tracker = self.key_trackers[key]
+            with self.lock:
+                tracker.last_used_time = time.time()
+                tracker.total_calls += 1
+            try:
+                result = api_call(key)
+            except Exception as e:
+                with self.lock:
+                    tracker.failed_calls += 1
+                    tracker.consecutive_failures += 1
+                    if classify_error(e) == 'rate_limit':
+                        tracker.rate_limit_hits += 1
+                        tracker.last_rate_limit_time = time.time()
+                raise
+            with self.lock:
+                tracker.consecutive_failures = 0
+            return result
+        return run
     
-    def execute_with_rotation(self, api_call: Callable[[str], Any]) -> Any:
+    def execute_with_rotation(self, api_call: Callable[[str], Any], stop_event: Optional[threading.Event] = None) -> Any:
         """
         Execute API call with intelligent key rotation
         
         Args:
             api_call: Function that takes an API key and returns result.
                      Should raise exception on failure (e.g., requests.HTTPError)
+            stop_event: Optional threading.Event that aborts waiting for a key
         
         Returns:
             Result from successful API call
@@ -155,97 +126,16 @@ class APIKeyRotationManager:
         Raises:
             Exception: If all keys fail or are exhausted
         """
-        with self.lock:
-            all_keys_tried = set()
-            
-            while True:
-                # Get available keys
-                available_keys = self._get_available_keys()
-                
-                if not available_keys:
-                    self._log("[EXHAUSTED] All keys are in cooldown. Waiting for cooldown to expire...")
-                    # Wait and check again
-                    time.sleep(self.EXHAUSTED_KEYS_RETRY_INTERVAL_SECONDS)
-                    available_keys = self._get_available_keys()
-                    
-                    if not available_keys:
-                        raise Exception(
-                            f"All {len(self.api_keys)} API keys are rate-limited or in cooldown. "
-                            f"Please wait {self.COOLDOWN_SECONDS}s before retrying."
-                        )
-                
-                # Try each available key with exponential backoff
-                for tracker in available_keys:
-                    if tracker.key in all_keys_tried:
-                        continue
-                    
-                    # Wait for minimum interval if key was recently used
-                    self._wait_for_min_interval(tracker)
-                    
-                    retry_count = 0
-                    while retry_count <= self.MAX_RETRIES_PER_KEY:
-                        try:
-                            self._log(
-                                f"[KEY {len(all_keys_tried) + 1}/{len(self.api_keys)}] "
-                                f"Trying key {self._key_preview(tracker.key)}"
-                            )
-                            
-                            # Update usage stats
-                            tracker.last_used_time = time.time()
-                            tracker.total_calls += 1
-                            
-                            # Make the API call
-                            result = api_call(tracker.key)
-                            
-                            # Success! Reset failure counters
-                            tracker.consecutive_failures = 0
-                            self._log(
-                                f"[SUCCESS] Key {self._key_preview(tracker.key)} succeeded "
-                                f"(call #{tracker.total_calls})"
-                            )
-                            return result
-                            
-                        except Exception as e:
-                            error_msg = str(e).lower()
-                            tracker.failed_calls += 1
-                            
-                            # Check if it's a rate limit error
-                            is_rate_limit = any(
-                                keyword in error_msg
-                                for keyword in ['429', 'rate limit', 'quota', 'too many requests']
-                            )
-                            
-                            if is_rate_limit:
-                                # Handle rate limit with backoff
-                                should_retry = self._handle_rate_limit(tracker, retry_count)
-                                if should_retry:
-                                    retry_count += 1
-                                    continue  # Retry with backoff
-                                else:
-                                    # Max retries exceeded, mark key as tried and move to next
-                                    all_keys_tried.add(tracker.key)
-                                    break
-                            else:
-                                # Non-rate-limit error - log and try next key
-                                self._log(
-                                    f"[ERROR] Key {self._key_preview(tracker.key)} failed: "
-                                    f"{str(e)[:100]}"
-                                )
-                                tracker.consecutive_failures += 1
-                                all_keys_tried.add(tracker.key)
-                                break
-                    
-                    # If we exhausted retries, mark as tried
-                    if retry_count > self.MAX_RETRIES_PER_KEY:
-                        all_keys_tried.add(tracker.key)
-                
-                # Check if we've tried all keys
-                if len(all_keys_tried) >= len(self.api_keys):
-                    raise Exception(
-                        f"All {len(self.api_keys)} API keys failed after retries. "
-                        f"Total calls made: {sum(t.total_calls for t in self.key_trackers.values())}, "
-                        f"Total failures: {sum(t.failed_calls for t in self.key_trackers.values())}"
-                    )
+        try:
+            return get_rate_limiter().call(self.provider, self.api_keys, self._tracked(api_call),
+                                           max_attempts=len(self.api_keys) * self.MAX_RETRIES_PER_KEY,
+                                           stop_event=stop_event, log=self._log)
+        except APIKeyRotationError as e:
+            raise Exception(
+                f"All {len(self.api_keys)} API keys failed after retries. "
+                f"Total calls made: {sum(t.total_calls for t in self.key_trackers.values())}, "
+                f"Total failures: {sum(t.failed_calls for t in self.key_trackers.values())}. {e}"
+            )
     
     def get_status(self) -> Dict[str, Any]:
         """
@@ -254,30 +144,23 @@ class APIKeyRotationManager:
         Returns:
             Dictionary with key statistics and availability
         """
-        current_time = time.time()
-        available_count = sum(
-            1 for t in self.key_trackers.values()
-            if current_time >= t.cooldown_until
-        )
-        rate_limited_count = sum(
-            1 for t in self.key_trackers.values()
-            if current_time < t.cooldown_until
-        )
-        
+        limiter = {s['key_preview']: s for s in get_rate_limiter().stats(self.provider)}
+        details = []
+        for t in self.key_trackers.values():
+            lim = limiter.get(self._key_preview(t.key), {})
+            details.append({
+                'key_preview': self._key_preview(t.key),
+                'total_calls': t.total_calls,
+                'failed_calls': t.failed_calls,
+                'rate_limit_hits': t.rate_limit_hits,
+                'consecutive_failures': t.consecutive_failures,
+                'is_available': lim.get('is_available', True),
+                'cooldown_remaining': lim.get('cooldown_remaining', 0.0)
+            })
+        available_count = sum(1 for d in details if d['is_available'])
         return {
             'total_keys': len(self.api_keys),
             'available_keys': available_count,
-            'rate_limited_keys': rate_limited_count,
-            'key_details': [
-                {
-                    'key_preview': self._key_preview(t.key),
-                    'total_calls': t.total_calls,
-                    'failed_calls': t.failed_calls,
-                    'rate_limit_hits': t.rate_limit_hits,
-                    'consecutive_failures': t.consecutive_failures,
-                    'is_available': current_time >= t.cooldown_until,
-                    'cooldown_remaining': max(0, t.cooldown_until - current_time)
-                }
-                for t in self.key_trackers.values()
-            ]
+            'rate_limited_keys': len(details) - available_count,
+            'key_details': details
         }
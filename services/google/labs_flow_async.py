@@ -0,0 +1,289 @@
+# -*- coding: utf-8 -*-
+"""
+Asyncio variant of LabsFlowClient.
+
+One aiohttp session (keep-alive connection pool) is shared by every call made
+through the client, so a single event loop can drive hundreds of scenes
+without paying a TLS handshake per upload/start/batch-check request.
+
+Usage:
+    async with AsyncLabsFlowClient(tokens) as client:
+        mid = await client.upload_image_file(path)
+        await client.start_many(jobs, model_key, aspect_ratio)
+        statuses = await client.batch_check_operations(names)
+"""
+import asyncio
+import json
+import time
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from services.core.metrics import observe
+from services.endpoints import BATCH_CHECK_URL, I2V_URL, T2V_URL, UPLOAD_IMAGE_URL
+from services.google.labs_flow_client import (
+    DEFAULT_PROJECT_ID,
+    _encode_image_file,
+    _headers,
+    _image_aspect,
+    _is_invalid,
+    _model_ladder,
+    _op_name,
+    _parse_batch_check,
+    _start_body,
+    _trim_prompt_text,
+    _wrap_ops,
+)
+from services.google.labs_token_scheduler import get_token_scheduler
+from services.google.media_cache import get_media_cache
+
+
+class LabsHTTPError(RuntimeError):
+    """Non-200 response from Labs; message keeps the status code for _is_invalid()."""
+
+    def __init__(self, status: int, detail: str = ""):
+        super().__init__(f"HTTP {status}: {detail}")
+        self.status = status
+        self.detail = detail
+
+
+def _aiohttp():
+    try:
+        import aiohttp
+    except ImportError:
+        raise ImportError("aiohttp is required for AsyncLabsFlowClient. Install with: pip install aiohttp>=3.9")
+    return aiohttp
+
+
+class AsyncLabsFlowClient:
+    """
+    Async Labs client with a pooled keep-alive HTTP session.
+
+    Args:
+        bearers: Labs bearer tokens (round-robin)
+        timeout: (connect, read) timeout in seconds, same shape as LabsFlowClient
+        on_event: Optional callback receiving {"kind": ..., ...} dicts
+        max_connections: Size of the shared connection pool
+        max_in_flight: Upper bound on concurrent requests issued by this client
+    """
+
+    def __init__(self, bearers: List[str], timeout: Tuple[int, int] = (20, 180),
+                 on_event: Optional[Callable[[dict], None]] = None,
+                 max_connections: int = 64, max_in_flight: int = 32):
+        self.tokens = [t.strip() for t in (bearers or []) if t.strip()]
+        if not self.tokens:
+            raise ValueError("No Labs tokens provided")
+        self.timeout = timeout
+        self.on_event = on_event
+        self.max_connections = max(1, int(max_connections))
+        self.max_in_flight = max(1, int(max_in_flight))
+        self._session = None
+        self._sem: Optional[asyncio.Semaphore] = None
+
+    async def __aenter__(self):
+        await self._ensure_session()
+        return self
+
+    async def __aexit__(self, *exc):
+        await self.close()
+
+    async def _ensure_session(self):
+        if self._session is None or self._session.closed:
+            aiohttp = _aiohttp()
+            connector = aiohttp.TCPConnector(limit=self.max_connections, keepalive_timeout=60)
+            timeout = aiohttp.ClientTimeout(sock_connect=self.timeout[0], sock_read=self.timeout[1])
+            self._session = aiohttp.ClientSession(connector=connector, timeout=timeout)
+            self._sem = asyncio.Semaphore(self.max_in_flight)
+        return self._session
+
+    async def close(self):
+        if self._session is not None and not self._session.closed:
+            await self._session.close()
+        self._session = None
+
+    def _tok(self) -> str:
+        """Healthiest token right now; must be paired with _report()."""
+        return get_token_scheduler().acquire(self.tokens)
+
+    def _report(self, tok: str, code: int, t0: float):
+        tr = get_token_scheduler().release(tok, code, time.monotonic() - t0)
+        if code != 200:
+            self._emit("token_health", token=tr.preview(), code=code, stats=self.token_stats())
+
+    def token_stats(self) -> List[dict]:
+        return get_token_scheduler().stats(self.tokens)
+
+    def _emit(self, kind: str, **kw):
+        if self.on_event:
+            try:
+                self.on_event({"kind": kind, **kw})
+            except Exception:
+                pass
+
+    async def _post(self, url: str, payload: dict) -> dict:
+        sess = await self._ensure_session()
+        aiohttp = _aiohttp()
+        last = None
+        sched = get_token_scheduler()
+        for attempt in range(3):
+            status, text = 0, ""
+            async with self._sem:
+                tok = self._tok()
+                t0 = time.monotonic()
+                try:
+                    async with sess.post(url, headers=_headers(tok), json=payload) as r:
+                        status = r.status
+                        raw = await r.read()
+                        observe("labs", url, t0, status=status, bytes_in=len(raw), key=tok, retries=attempt)
+                        if status == 200:
+                            try:
+                                data = json.loads(raw) if raw else {}
+                            except Exception:
+                                data = {}
+                            self._report(tok, 200, t0)
+                            self._emit("http_ok", code=200)
+                            return data
+                        text = raw.decode("utf-8", "replace")
+                except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                    observe("labs", url, t0, error=e, key=tok, retries=attempt)
+                    last = e
+            self._report(tok, status, t0)
+            if status == 0:
+                await asyncio.sleep(0.7 * (attempt + 1))
+                continue
+            det = ""
+            try:
+                det = json.loads(text).get("error", {}).get("message", "")[:300]
+            except Exception:
+                det = (text or "")[:300]
+            self._emit("http_other_err", code=status, detail=det)
+            last = LabsHTTPError(status, det)
+            # a bad/throttled token is retried at once on another healthy token
+            if status not in (401, 403, 429) or not any(sched.available(t) for t in self.tokens if t != tok):
+                await asyncio.sleep(0.7 * (attempt + 1))
+        raise last
+
+    async def upload_image_file(self, image_path: str, aspect_hint="IMAGE_ASPECT_RATIO_PORTRAIT",
+                                use_cache: bool = True) -> Optional[str]:
+        loop = asyncio.get_running_loop()
+        cache = get_media_cache() if use_cache else None
+        # Hashing, file read and base64 are CPU/disk bound; keep them off the event loop
+        key = await loop.run_in_executor(None, cache.key_for, image_path, aspect_hint) if cache else None
+        if key:
+            mid = cache.get(key)
+            if mid:
+                self._emit("upload_cache_hit", media_id=mid)
+                return mid
+        b64, mime = await loop.run_in_executor(None, _encode_image_file, image_path, aspect_hint)
+        payload = {"imageInput": {"rawImageBytes": b64, "mimeType": mime, "isUserUploaded": True, "aspectRatio": aspect_hint},
+                   "clientContext": {"sessionId": f"{int(time.time() * 1000)}"}}
+        data = await self._post(UPLOAD_IMAGE_URL, payload) or {}
+        mid = (data.get("mediaGenerationId") or {}).get("mediaGenerationId")
+        if mid and key:
+            cache.put(key, mid)
+        return mid
+
+    async def start_one(self, job: Dict, model_key: str, aspect_ratio: str, prompt_text: Any, copies: int = 1,
+                        project_id: Optional[str] = DEFAULT_PROJECT_ID, settle_delay: float = 1.0) -> int:
+        """Async start_one with the same fallbacks as LabsFlowClient.start_one.
+
+        settle_delay only applies to I2V jobs (lets the backend index the freshly uploaded image)
+        and yields to the event loop instead of blocking a thread.
+        """
+        copies = max(1, int(copies))
+        base_seed = int(job.get("seed", 0)) if str(job.get("seed", "")).isdigit() else 0
+        mid = job.get("media_id")
+        if mid and settle_delay > 0:
+            await asyncio.sleep(settle_delay)
+
+        models = _model_ladder(model_key, aspect_ratio, bool(mid))
+        prompt = _trim_prompt_text(prompt_text)
+
+        async def _try(use_model, mid_val, copies_n):
+            body = _start_body(use_model, aspect_ratio, prompt, base_seed, copies_n, mid_val, project_id)
+            return await self._post(I2V_URL if mid_val else T2V_URL, body) or {}
+
+        async def _ladder(mid_val):
+            err = None
+            for mkey in models:
+                try:
+                    return await _try(mkey, mid_val, copies), None
+                except Exception as e:
+                    err = e
+                    if not _is_invalid(e):
+                        break
+            return None, err
+
+        # 1) Batch with model fallbacks
+        data, last_err = await _ladder(mid)
+
+        # 2) Invalid with image -> reupload once then retry ladder (I2V only)
+        if last_err and _is_invalid(last_err) and mid and job.get("image_path"):
+            try:
+                get_media_cache().invalidate_media(mid)
+                new_mid = await self.upload_image_file(job["image_path"], _image_aspect(aspect_ratio))
+                if new_mid:
+                    job["media_id"] = new_mid
+                    mid = new_mid
+                    data, last_err = await _ladder(mid)
+            except Exception as e3:
+                last_err = e3
+
+        job.setdefault("operation_names", [])
+        job.setdefault("video_by_idx", [None] * copies)
+        job.setdefault("thumb_by_idx", [None] * copies)
+        job.setdefault("op_index_map", {})
+
+        # 3) Per-copy fallback (still invalid)
+        if data is None and last_err is not None:
+            for k in range(copies):
+                for mkey in models:
+                    try:
+                        dat = await _try(mkey, mid, 1)
+                        ops = dat.get("operations", []) if isinstance(dat, dict) else []
+                        nm = _op_name(ops[0]) if ops else ""
+                        if nm:
+                            job["operation_names"].append(nm)
+                            job["op_index_map"][nm] = k
+                            break
+                    except Exception:
+                        continue
+            return len(job.get("operation_names", []))
+
+        # 4) Batch success
+        ops = data.get("operations", []) if isinstance(data, dict) else []
+        for ci, op in enumerate(ops):
+            nm = _op_name(op)
+            if nm:
+                job["operation_names"].append(nm)
+                job["op_index_map"][nm] = ci
+        if job.get("operation_names"):
+            job["status"] = "PENDING"
+        return len(job.get("operation_names", []))
+
+    async def start_many(self, jobs: List[Dict], model_key: str, aspect_ratio: str, copies: int = 1,
+                         project_id: Optional[str] = DEFAULT_PROJECT_ID) -> List[Any]:
+        """Upload (when needed) and start every job concurrently on the current loop.
+
+        Returns one entry per job: the number of operations started, or the exception raised.
+        """
+        async def _one(job):
+            if job.get("image_path") and not job.get("media_id"):
+                job["media_id"] = await self.upload_image_file(job["image_path"], _image_aspect(aspect_ratio))
+            return await self.start_one(job, model_key, aspect_ratio, job.get("prompt", ""),
+                                        copies=copies, project_id=project_id)
+        return await asyncio.gather(*[_one(j) for j in jobs], return_exceptions=True)
+
+    async def batch_check_operations(self, op_names: List[str]) -> Dict[str, Dict]:
+        if not op_names:
+            return {}
+        data = await self._post(BATCH_CHECK_URL, _wrap_ops(op_names)) or {}
+        return _parse_batch_check(data)
+
+    async def generate_videos_batch(self, prompt: str, num_videos: int = 1, model_key: str = "veo_3_1_t2v_fast_ultra",
+                                    aspect_ratio: str = "VIDEO_ASPECT_RATIO_LANDSCAPE",
+                                    project_id: Optional[str] = DEFAULT_PROJECT_ID) -> List[str]:
+        """Async counterpart of LabsFlowClient.generate_videos_batch (max 4 videos per request)."""
+        num_videos = min(int(num_videos), 4)
+        seed = int(time.time() * 1000)
+        payload = _start_body(model_key, aspect_ratio, _trim_prompt_text(prompt), seed, num_videos, None, project_id)
+        data = await self._post(T2V_URL, payload) or {}
+        return [nm for nm in (_op_name(op) for op in data.get("operations", [])) if nm]
@@ -1,4 +1,5 @@
-import base64, mimetypes, json, time, requests, os, re
+import base64, json, time, requests, os, re, threading
+import requests.adapters
 from typing import List, Dict, Optional, Tuple, Callable, Any
 
 
@@ -21,6 +22,11 @@ try:
 except Exception:  # pragma: no cover
     from endpoints import UPLOAD_IMAGE_URL, I2V_URL, T2V_URL, BATCH_CHECK_URL
 
+from services.core.metrics import observe
+from services.google.labs_token_scheduler import get_token_scheduler
+from services.google.media_cache import get_media_cache
+from utils.image_utils import prepare_upload_image
+
 DEFAULT_PROJECT_ID = "87b19267-13d6-49cd-a7ed-db19a90c9339"
 
 def _headers(bearer: str) -> dict:
@@ -32,13 +38,18 @@ def _headers(bearer: str) -> dict:
         "user-agent": "Mozilla/5.0"
     }
 
-def _encode_image_file(path: str):
+def _encode_image_file(path: str, aspect_hint: Optional[str]=None):
+    # downscale/strip EXIF/re-encode first; falls back to the raw file without Pillow
+    path, mime = prepare_upload_image(path, aspect_hint)
     with open(path, "rb") as f:
         raw = f.read()
     b64 = base64.b64encode(raw).decode("utf-8")
-    mime = mimetypes.guess_type(path)[0] or "image/jpeg"
     return b64, mime
 
+def _image_aspect(video_aspect: str)->str:
+    """VIDEO_ASPECT_RATIO_X -> IMAGE_ASPECT_RATIO_X (upload hint matching the video frame)."""
+    return (video_aspect or "VIDEO_ASPECT_RATIO_PORTRAIT").replace("VIDEO_ASPECT_RATIO_", "IMAGE_ASPECT_RATIO_")
+
 _URL_PAT = re.compile(r'^(https?://|gs://)', re.I)
 def _collect_urls_any(obj: Any) -> List[str]:
     urls=set(); KEYS={"gcsUrl","gcsUri","signedUrl","signedUri","downloadUrl","downloadUri","videoUrl","url","uri","fileUri"}
@@ -60,7 +71,7 @@ def _normalize_status(item: dict) -> str:
         if item.get("error"): return "FAILED"
         return "DONE"
     s=item.get("status") or ""
-    if s in ("MEDIA_GENERATION_STATUS_SUCCEEDED","SUCCEEDED","SUCCESS"): return "DONE"
+    if s in ("MEDIA_GENERATION_STATUS_SUCCESSFUL","MEDIA_GENERATION_STATUS_SUCCEEDED","SUCCEEDED","SUCCESS"): return "DONE"
     if s in ("MEDIA_GENERATION_STATUS_FAILED","FAILED","ERROR"): return "FAILED"
     return "PROCESSING"
 
@@ -95,14 +106,106 @@ def _trim_prompt_text(prompt_text: Any)->str:
     except Exception:
         return str(obj)[:1800]
 
+_FALLBACKS_I2V={
+    "VIDEO_ASPECT_RATIO_PORTRAIT":[
+        "veo_3_1_i2v_s_fast_portrait_ultra","veo_3_1_i2v_s_fast_portrait","veo_3_1_i2v_s_portrait","veo_3_1_i2v_s"
+    ],
+    "VIDEO_ASPECT_RATIO_LANDSCAPE":[
+        "veo_3_1_i2v_s_fast_ultra","veo_3_1_i2v_s_fast","veo_3_1_i2v_s"
+    ],
+    "VIDEO_ASPECT_RATIO_SQUARE":[
+        "veo_3_1_i2v_s_fast","veo_3_1_i2v_s"
+    ]
+}
+_FALLBACKS_T2V={
+    "VIDEO_ASPECT_RATIO_PORTRAIT":[
+        "veo_3_1_t2v_fast_ultra","veo_3_1_t2v"
+    ],
+    "VIDEO_ASPECT_RATIO_LANDSCAPE":[
+        "veo_3_1_t2v_fast_ultra","veo_3_1_t2v"
+    ],
+    "VIDEO_ASPECT_RATIO_SQUARE":[
+        "veo_3_1_t2v_fast_ultra","veo_3_1_t2v"
+    ]
+}
+
+def _model_ladder(model_key: str, aspect_ratio: str, has_image: bool)->List[str]:
+    """User's chosen model first, then same-family fallbacks (I2V vs T2V) for the aspect."""
+    fallbacks=_FALLBACKS_I2V if has_image else _FALLBACKS_T2V
+    return [model_key]+[m for m in fallbacks.get(aspect_ratio, []) if m!=model_key]
+
+def _start_body(model_key: str, aspect_ratio: str, prompt: str, base_seed: int, copies: int,
+                media_id: Optional[str]=None, project_id: Optional[str]=None)->dict:
+    reqs=[]
+    for k in range(copies):
+        item={"aspectRatio":aspect_ratio,"seed":base_seed+k,"videoModelKey":model_key,"textInput":{"prompt":prompt}}
+        if media_id: item["startImage"]={"mediaId":media_id}
+        reqs.append(item)
+    body={"requests":reqs}
+    if project_id: body["clientContext"]={"projectId":project_id}
+    return body
+
+def _is_invalid(e: Exception)->bool:
+    s=str(e).lower()
+    return ("400" in str(e)) or ("invalid json" in s) or ("invalid argument" in s)
+
+def _op_name(op: dict)->str:
+    return (op.get("operation") or {}).get("name") or op.get("name") or ""
+
+def _wrap_ops(op_names: List[str])->dict:
+    uniq=[]; seen=set()
+    for s in op_names or []:
+        if s and s not in seen: seen.add(s); uniq.append(s)
+    return {"operations":[{"operation":{"name":s}} for s in uniq]}
+
+def _parse_batch_check(data: dict)->Dict[str,Dict]:
+    out={}
+    def _dedup(xs):
+        seen=set(); r=[]
+        for x in xs:
+            if x not in seen: seen.add(x); r.append(x)
+        return r
+    for item in (data or {}).get("operations",[]):
+        key=_op_name(item)
+        st=_normalize_status(item)
+        urls=_collect_urls_any(item.get("response",{})) or _collect_urls_any(item)
+        vurls=[u for u in urls if "/video/" in u]; iurls=[u for u in urls if "/image/" in u]
+        # Veo 3 puts the signed clip URL at operation.metadata.video.fifeUrl
+        fife=(((item.get("operation") or {}).get("metadata") or {}).get("video") or {}).get("fifeUrl")
+        if fife: vurls.insert(0, fife)
+        out[key or "unknown"]={"status": ("COMPLETED" if st=="DONE" and vurls else ("DONE_NO_URL" if st=="DONE" else st)),
+                               "video_urls": _dedup(vurls), "image_urls": _dedup(iurls), "raw": item}
+    return out
+
+_SESSION=None
+_SESSION_LOCK=threading.Lock()
+def _session()->requests.Session:
+    """Process-wide keep-alive session so upload/start/check calls reuse TLS connections."""
+    global _SESSION
+    with _SESSION_LOCK:
+        if _SESSION is None:
+            sess=requests.Session()
+            adapter=requests.adapters.HTTPAdapter(pool_connections=4, pool_maxsize=32)
+            sess.mount("https://", adapter); sess.mount("http://", adapter)
+            _SESSION=sess
+        return _SESSION
+
 class LabsFlowClient:
     def __init__(self, bearers: List[str], timeout: Tuple[int,int]=(20,180), on_event: Optional[Callable[[dict], None]]=None):
         self.tokens=[t.strip() for t in (bearers or []) if t.strip()]
         if not self.tokens: raise ValueError("No Labs tokens provided")
-        self._idx=0; self.timeout=timeout; self.on_event=on_event
+        self.timeout=timeout; self.on_event=on_event
 
     def _tok(self)->str:
-        t=self.tokens[self._idx % len(self.tokens)]; self._idx+=1; return t
+        """Healthiest token right now; must be paired with _report()."""
+        return get_token_scheduler().acquire(self.tokens)
+
+    def _report(self, tok: str, code: int, t0: float):
+        tr=get_token_scheduler().release(tok, code, time.monotonic()-t0)
+        if code!=200: self._emit("token_health", token=tr.preview(), code=code, stats=self.token_stats())
+
+    def token_stats(self)->List[dict]:
+        return get_token_scheduler().stats(self.tokens)
 
     def _emit(self, kind: str, **kw):
         if self.on_event:
@@ -112,85 +215,68 @@ class LabsFlowClient:
     def _post(self, url: str, payload: dict) -> dict:
         last=None
         for attempt in range(3):
+            tok=self._tok(); t0=time.monotonic()
             try:
-                r=requests.post(url, headers=_headers(self._tok()), json=payload, timeout=self.timeout)
-                if r.status_code==200:
-                    self._emit("http_ok", code=200)
-                    try: return r.json()
-                    except Exception: return {}
-                det=""
-                try: det=r.json().get("error",{}).get("message","")[:300]
-                except Exception: det=(r.text or "")[:300]
-                self._emit("http_other_err", code=r.status_code, detail=det); r.raise_for_status()
+                r=_session().post(url, headers=_headers(tok), json=payload, timeout=self.timeout)
             except Exception as e:
-                last=e; time.sleep(0.7*(attempt+1))
+                observe("labs", url, t0, error=e, key=tok, retries=attempt)
+                self._report(tok, 0, t0); last=e; time.sleep(0.7*(attempt+1)); continue
+            observe("labs", url, t0, response=r, key=tok, retries=attempt)
+            self._report(tok, r.status_code, t0)
+            if r.status_code==200:
+                self._emit("http_ok", code=200)
+                try: return r.json()
+                except Exception: return {}
+            det=""
+            try: det=r.json().get("error",{}).get("message","")[:300]
+            except Exception: det=(r.text or "")[:300]
+            self._emit("http_other_err", code=r.status_code, detail=det)
+            try: r.raise_for_status()
+            except Exception as e: last=e
+            # a bad/throttled token is retried at once on another healthy token
+            sched=get_token_scheduler()
+            if r.status_code not in (401,403,429) or not any(sched.available(t) for t in self.tokens if t!=tok):
+                time.sleep(0.7*(attempt+1))
         raise last
 
-    def upload_image_file(self, image_path: str, aspect_hint="IMAGE_ASPECT_RATIO_PORTRAIT")->Optional[str]:
-        b64,mime=_encode_image_file(image_path)
+    def upload_image_file(self, image_path: str, aspect_hint="IMAGE_ASPECT_RATIO_PORTRAIT", use_cache: bool=True)->Optional[str]:
+        """Upload an image and return its mediaGenerationId; identical bytes+aspect reuse the cached id."""
+        cache=get_media_cache() if use_cache else None
+        key=cache.key_for(image_path, aspect_hint) if cache else None
+        if key:
+            mid=cache.get(key)
+            if mid: self._emit("upload_cache_hit", media_id=mid); return mid
+        b64,mime=_encode_image_file(image_path, aspect_hint)
         payload={"imageInput":{"rawImageBytes":b64,"mimeType":mime,"isUserUploaded":True,"aspectRatio":aspect_hint},
                  "clientContext":{"sessionId":f"{int(time.time()*1000)}"}}
         data=self._post(UPLOAD_IMAGE_URL,payload) or {}
         mid=(data.get("mediaGenerationId") or {}).get("mediaGenerationId")
+        if mid and key: cache.put(key, mid)
         return mid
 
-    def start_one(self, job: Dict, model_key: str, aspect_ratio: str, prompt_text: str, copies:int=1, project_id: Optional[str]=DEFAULT_PROJECT_ID)->int:
-        """Start a scene with robust fallbacks: delay-after-upload, model ladder (I2V vs T2V), reupload-on-400, per-copy fallback, prompt trimming."""
+    def start_one(self, job: Dict, model_key: str, aspect_ratio: str, prompt_text: str, copies:int=1, project_id: Optional[str]=DEFAULT_PROJECT_ID, settle_delay: float=1.0)->int:
+        """Start a scene with robust fallbacks: delay-after-upload, model ladder (I2V vs T2V), reupload-on-400, per-copy fallback, prompt trimming.
+
+        settle_delay: seconds to wait before starting an I2V job; pass 0 when the caller already spaced the upload.
+        """
         copies=max(1,int(copies)); base_seed=int(job.get("seed",0)) if str(job.get("seed","")).isdigit() else 0
         mid=job.get("media_id")
 
         # Give backend a moment to index the uploaded image (avoids 400/500 immediately after upload)
-        time.sleep(1.0)
-
-        # IMPORTANT: choose fallbacks based on whether we're doing I2V (has start image) or T2V (no image)
-        FALLBACKS_I2V={
-            "VIDEO_ASPECT_RATIO_PORTRAIT":[
-                "veo_3_1_i2v_s_fast_portrait_ultra","veo_3_1_i2v_s_fast_portrait","veo_3_1_i2v_s_portrait","veo_3_1_i2v_s"
-            ],
-            "VIDEO_ASPECT_RATIO_LANDSCAPE":[
-                "veo_3_1_i2v_s_fast_ultra","veo_3_1_i2v_s_fast","veo_3_1_i2v_s"
-            ],
-            "VIDEO_ASPECT_RATIO_SQUARE":[
-                "veo_3_1_i2v_s_fast","veo_3_1_i2v_s"
-            ]
-        }
-        FALLBACKS_T2V={
-            "VIDEO_ASPECT_RATIO_PORTRAIT":[
-                "veo_3_1_t2v_fast_ultra","veo_3_1_t2v"
-            ],
-            "VIDEO_ASPECT_RATIO_LANDSCAPE":[
-                "veo_3_1_t2v_fast_ultra","veo_3_1_t2v"
-            ],
-            "VIDEO_ASPECT_RATIO_SQUARE":[
-                "veo_3_1_t2v_fast_ultra","veo_3_1_t2v"
-            ]
-        }
-        fallbacks = FALLBACKS_I2V if mid else FALLBACKS_T2V
-        # start with the user's chosen model, then ladder through same-family models for the aspect
-        models=[model_key]+[m for m in fallbacks.get(aspect_ratio, []) if m!=model_key]
+        if mid and settle_delay>0: time.sleep(settle_delay)
+
+        models=_model_ladder(model_key, aspect_ratio, bool(mid))
 
         # compose prompt text (trim if huge/complex)
         prompt=_trim_prompt_text(prompt_text)
 
         def _make_body(use_model, mid_val, copies_n):
-            reqs=[]
-            for k in range(copies_n):
-                seed=base_seed+k
-                item={"aspectRatio":aspect_ratio,"seed":seed,"videoModelKey":use_model,"textInput":{"prompt":prompt}}
-                if mid_val: item["startImage"]={"mediaId":mid_val}
-                reqs.append(item)
-            body={"requests":reqs}
-            if project_id: body["clientContext"]={"projectId":project_id}
-            return body
+            return _start_body(use_model, aspect_ratio, prompt, base_seed, copies_n, mid_val, project_id)
 
         def _try(body):
             url=I2V_URL if mid else T2V_URL
             return self._post(url, body) or {}
 
-        def _is_invalid(e: Exception)->bool:
-            s=str(e).lower()
-            return ("400" in str(e)) or ("invalid json" in s) or ("invalid argument" in s)
-
         # 1) Try batch with model fallbacks
         data=None; last_err=None
         for mkey in models:
@@ -204,7 +290,8 @@ class LabsFlowClient:
         # 2) If invalid and have image -> reupload once then retry ladder (I2V only)
         if last_err and _is_invalid(last_err) and mid and job.get("image_path"):
             try:
-                new_mid=self.upload_image_file(job["image_path"])
+                get_media_cache().invalidate_media(mid)
+                new_mid=self.upload_image_file(job["image_path"], _image_aspect(aspect_ratio))
                 if new_mid:
                     job["media_id"]=new_mid; mid=new_mid
                     for mkey in models:
@@ -239,28 +326,12 @@ class LabsFlowClient:
         return len(job.get("operation_names",[]))
 
     def _wrap_ops(self, op_names: List[str])->dict:
-        uniq=[]; seen=set()
-        for s in op_names or []:
-            if s and s not in seen: seen.add(s); uniq.append(s)
-        return {"operations":[{"operation":{"name":s}} for s in uniq]}
+        return _wrap_ops(op_names)
 
     def batch_check_operations(self, op_names: List[str])->Dict[str,Dict]:
         if not op_names: return {}
         data=self._post(BATCH_CHECK_URL, self._wrap_ops(op_names)) or {}
-        out={}
-        def _dedup(xs):
-            seen=set(); r=[]
-            for x in xs:
-                if x not in seen: seen.add(x); r.append(x)
-            return r
-        for item in data.get("operations",[]):
-            key=(item.get("operation") or {}).get("name") or item.get("name") or ""
-            st=_normalize_status(item)
-            urls=_collect_urls_any(item.get("response",{})) or _collect_urls_any(item)
-            vurls=[u for u in urls if "/video/" in u]; iurls=[u for u in urls if "/image/" in u]
-            out[key or "unknown"]={"status": ("COMPLETED" if st=="DONE" and vurls else ("DONE_NO_URL" if st=="DONE" else st)),
-                                   "video_urls": _dedup(vurls), "image_urls": _dedup(iurls), "raw": item}
-        return out
+        return _parse_batch_check(data)
 
     def generate_videos_batch(self, prompt: str, num_videos: int = 1, model_key: str = "veo_3_1_t2v_fast_ultra", 
                               aspect_ratio: str = "VIDEO_ASPECT_RATIO_LANDSCAPE", 
@@ -0,0 +1,178 @@
+# -*- coding: utf-8 -*-
+"""
+Health-scored scheduler for Labs bearer tokens.
+
+Replaces blind round-robin: every Labs call reports its outcome here, and the
+next call goes to the healthiest token of the client's token list.
+
+- Per-token tracking (calls, latency EMA, 401/403/429/5xx/network counts)
+- 401/403 -> long cooldown (token expired or revoked)
+- 429 -> exponential cooldown 15s, 30s, 60s ... up to 5 min
+- 5xx / network errors -> short exponential cooldown after 2 in a row
+- Score = latency EMA x failure penalty x (1 + in-flight + recent load),
+  lowest wins, so load also spreads across equally healthy tokens
+- Health is process-wide: every client sharing a token sees the same state
+
+Like KeyUsageTracker in services/google/api_key_manager.py, but for Labs
+bearers and without blocking: when every token is cooling down the one that
+recovers first is returned and the caller's own retry/backoff applies.
+"""
+
+import threading
+import time
+from dataclasses import dataclass
+from typing import Dict, List, Optional
+
+
+@dataclass
+class TokenHealth:
+    """Health statistics for a single Labs bearer token"""
+    token: str
+    total_calls: int = 0
+    ok_calls: int = 0
+    auth_errors: int = 0  # 401 / 403
+    rate_limit_hits: int = 0  # 429
+    server_errors: int = 0  # 5xx + network
+    latency_ema: float = 0.0  # seconds
+    in_flight: int = 0
+    recent_load: float = 0.0  # acquisitions, decaying with a 30s half-life
+    last_used_time: float = 0.0
+    cooldown_until: float = 0.0  # monotonic time when the token is usable again
+    consecutive_failures: int = 0
+    last_status: int = 0
+
+    def preview(self) -> str:
+        return f"...{self.token[-6:]}" if len(self.token) > 6 else "***"
+
+    def cooling(self, now: float) -> bool:
+        return now < self.cooldown_until
+
+    def decayed_load(self, now: float) -> float:
+        return self.recent_load * 0.5 ** ((now - self.last_used_time) / 30.0) if self.last_used_time else 0.0
+
+    def score(self, now: float) -> float:
+        if not self.total_calls:
+            return 0.0  # untried tokens get probed first
+        lat = self.latency_ema or 1.0
+        fail_rate = (self.total_calls - self.ok_calls) / self.total_calls
+        penalty = 1.0 + 4.0 * fail_rate + 2.0 * self.consecutive_failures
+        return lat * penalty * (1 + self.in_flight + 0.2 * self.decayed_load(now))
+
+
+class LabsTokenScheduler:
+    """Pick the healthiest token for each Labs request and learn from the outcome."""
+
+    AUTH_COOLDOWN_SECONDS = 600.0
+    RATE_LIMIT_COOLDOWN_SECONDS = 15.0
+    MAX_COOLDOWN_SECONDS = 300.0
+    ERROR_COOLDOWN_SECONDS = 5.0
+    LATENCY_ALPHA = 0.3
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.trackers: Dict[str, TokenHealth] = {}
+
+    def _tracker(self, token: str) -> TokenHealth:
+        tr = self.trackers.get(token)
+        if tr is None:
+            tr = self.trackers[token] = TokenHealth(token=token)
+        return tr
+
+    def acquire(self, tokens: List[str]) -> str:
+        """Return the best token of tokens and count it as in flight until release()."""
+        now = time.monotonic()
+        with self.lock:
+            trs = [self._tracker(t) for t in tokens]
+            ready = [tr for tr in trs if not tr.cooling(now)]
+            if ready:
+                best = min(ready, key=lambda tr: (tr.score(now), tr.last_used_time))
+            else:
+                best = min(trs, key=lambda tr: tr.cooldown_until)
+            best.in_flight += 1
+            best.recent_load = best.decayed_load(now) + 1
+            best.last_used_time = now
+            return best.token
+
+    def release(self, token: str, status: int, latency: float) -> TokenHealth:
+        """
+        Record the outcome of a call made with token.
+
+        Args:
+            token: Token returned by acquire()
+            status: HTTP status code, or 0 for a network error / timeout
+            latency: Seconds the call took
+        """
+        now = time.monotonic()
+        with self.lock:
+            tr = self._tracker(token)
+            tr.in_flight = max(0, tr.in_flight - 1)
+            tr.total_calls += 1
+            tr.last_status = status
+            if status in (401, 403):
+                tr.auth_errors += 1
+                tr.consecutive_failures += 1
+                tr.cooldown_until = now + self.AUTH_COOLDOWN_SECONDS
+            elif status == 429:
+                tr.rate_limit_hits += 1
+                tr.consecutive_failures += 1
+                tr.cooldown_until = now + min(self.MAX_COOLDOWN_SECONDS,
+                                              self.RATE_LIMIT_COOLDOWN_SECONDS * 2 ** (tr.consecutive_failures - 1))
+            elif status == 0 or status >= 500:
+                tr.server_errors += 1
+                tr.consecutive_failures += 1
+                if tr.consecutive_failures >= 2:
+                    tr.cooldown_until = now + min(60.0, self.ERROR_COOLDOWN_SECONDS * 2 ** (tr.consecutive_failures - 2))
+            else:
+                # 2xx and request errors (400 invalid argument, ...) say nothing bad about the token
+                tr.ok_calls += 1
+                tr.consecutive_failures = 0
+                tr.cooldown_until = 0.0
+                a = self.LATENCY_ALPHA
+                tr.latency_ema = latency if not tr.latency_ema else (1 - a) * tr.latency_ema + a * latency
+            return tr
+
+    def available(self, token: str) -> bool:
+        with self.lock:
+            return not self._tracker(token).cooling(time.monotonic())
+
+    def cooldown_remaining(self, token: str) -> float:
+        with self.lock:
+            return max(0.0, self._tracker(token).cooldown_until - time.monotonic())
+
+    def reset(self, token: Optional[str] = None):
+        """Forget health data (e.g. after the user pastes fresh tokens)."""
+        with self.lock:
+            if token is None:
+                self.trackers.clear()
+            else:
+                self.trackers.pop(token, None)
+
+    def stats(self, tokens: Optional[List[str]] = None) -> List[Dict]:
+        now = time.monotonic()
+        with self.lock:
+            trs = [self._tracker(t) for t in tokens] if tokens is not None else list(self.trackers.values())
+            return [{
+                "token": tr.preview(),
+                "calls": tr.total_calls,
+                "ok": tr.ok_calls,
+                "auth_errors": tr.auth_errors,
+                "rate_limits": tr.rate_limit_hits,
+                "server_errors": tr.server_errors,
+                "latency_ms": int(tr.latency_ema * 1000),
+                "in_flight": tr.in_flight,
+                "cooldown_sec": round(max(0.0, tr.cooldown_until - now), 1),
+                "last_status": tr.last_status,
+            } for tr in trs]
+
+
+_SCHEDULER: Optional[LabsTokenScheduler] = None
+_SCHEDULER_LOCK = threading.Lock()
+
+
+def get_token_scheduler() -> LabsTokenScheduler:
+    """Process-wide scheduler shared by every Labs client."""
+    global _SCHEDULER
+    with _SCHEDULER_LOCK:
+        if _SCHEDULER is None:
+            _SCHEDULER = LabsTokenScheduler()
+        return _SCHEDULER
@@ -0,0 +1,131 @@
+# -*- coding: utf-8 -*-
+"""
+Content-addressed cache of Labs image uploads.
+
+Maps sha256(image bytes) + aspect hint -> mediaGenerationId so re-running a
+project, or starting many scenes from the same model/product photo, skips
+re-encoding and re-uploading multi-megabyte images. Entries expire after a
+TTL and are dropped when Labs rejects a media id ("invalid argument").
+"""
+import hashlib
+import json
+import os
+import threading
+import time
+from typing import Dict, Optional, Tuple
+
+from utils.config import _atomic_write_json
+
+CACHE_PATH = os.path.join(os.path.expanduser("~"), ".veo_media_cache.json")
+
+
+class MediaUploadCache:
+    """
+    Args:
+        path: JSON file backing the cache
+        ttl_sec: Entry lifetime in seconds
+        max_entries: Oldest entries are pruned beyond this size
+    """
+
+    def __init__(self, path: str = CACHE_PATH, ttl_sec: float = 24 * 3600, max_entries: int = 5000):
+        self.path = path
+        self.ttl_sec = float(ttl_sec)
+        self.max_entries = int(max_entries)
+        self._lock = threading.Lock()
+        self._entries: Optional[Dict[str, Dict]] = None
+        # (path, mtime, size) -> digest, so unchanged files are hashed once per process
+        self._digests: Dict[Tuple[str, float, int], str] = {}
+        self.hits = 0
+        self.misses = 0
+
+    def _load(self) -> Dict[str, Dict]:
+        if self._entries is None:
+            try:
+                with open(self.path, "r", encoding="utf-8") as f:
+                    data = json.load(f)
+                self._entries = data if isinstance(data, dict) else {}
+            except Exception:
+                self._entries = {}
+        return self._entries
+
+    def _save(self):
+        try:
+            _atomic_write_json(self.path, self._entries or {})
+        except Exception:
+            pass
+
+    def digest(self, image_path: str) -> str:
+        st = os.stat(image_path)
+        sig = (os.path.abspath(image_path), st.st_mtime, st.st_size)
+        d = self._digests.get(sig)
+        if d is None:
+            h = hashlib.sha256()
+            with open(image_path, "rb") as f:
+                for block in iter(lambda: f.read(1024 * 1024), b""):
+                    h.update(block)
+            d = self._digests[sig] = h.hexdigest()
+        return d
+
+    def key_for(self, image_path: str, aspect_hint: str) -> Optional[str]:
+        try:
+            return f"{self.digest(image_path)}:{aspect_hint or ''}"
+        except OSError:
+            return None
+
+    def get(self, key: str) -> Optional[str]:
+        with self._lock:
+            ent = self._load().get(key)
+            if ent and time.time() - float(ent.get("ts", 0)) < self.ttl_sec:
+                self.hits += 1
+                return ent.get("media_id")
+            if ent:
+                self._entries.pop(key, None)
+                self._save()
+            self.misses += 1
+            return None
+
+    def put(self, key: str, media_id: str):
+        if not key or not media_id:
+            return
+        with self._lock:
+            entries = self._load()
+            entries[key] = {"media_id": media_id, "ts": time.time()}
+            if len(entries) > self.max_entries:
+                for k, _ in sorted(entries.items(), key=lambda kv: kv[1].get("ts", 0))[:len(entries) - self.max_entries]:
+                    entries.pop(k, None)
+            self._save()
+
+    def invalidate_media(self, media_id: str):
+        """Drop every entry pointing at media_id (called when Labs rejects it)."""
+        if not media_id:
+            return
+        with self._lock:
+            entries = self._load()
+            stale = [k for k, v in entries.items() if v.get("media_id") == media_id]
+            for k in stale:
+                entries.pop(k, None)
+            if stale:
+                self._save()
+
+    def clear(self):
+        with self._lock:
+            self._entries = {}
+            self._save()
+
+
+_CACHE: Optional[MediaUploadCache] = None
+_CACHE_LOCK = threading.Lock()
+
+
+def get_media_cache() -> MediaUploadCache:
+    """Process-wide cache; TTL comes from the optional 'media_cache' config section."""
+    global _CACHE
+    with _CACHE_LOCK:
+        if _CACHE is None:
+            try:
+                from utils import config as cfg
+                c = (cfg.load() or {}).get("media_cache") or {}
+            except Exception:
+                c = {}
+            _CACHE = MediaUploadCache(ttl_sec=float(c.get("ttl_hours", 24)) * 3600)
+        return _CACHE
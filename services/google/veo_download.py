@@ -10,6 +10,9 @@ from typing import Any, Dict, List, Optional, Tuple
 
 import requests
 
+from services.operation_poller import get_poller
+from services.utils.download_manager import get_download_manager
+
 
 class VeoDownloader:
     """
@@ -154,6 +157,10 @@ class VeoDownloader:
             self.log(f"[Veo] Error checking status: {e}")
             return {}
 
+    def batch_check_operations(self, operation_names: List[str]) -> Dict[str, Dict[str, Any]]:
+        """Adapter so the shared OperationPoller can batch-check through this downloader."""
+        return self.check_generation_status(operation_names)
+
     def _normalize_status(self, item: dict) -> str:
         """Normalize status from API response"""
         if item.get("done") is True:
@@ -162,7 +169,7 @@ class VeoDownloader:
             return "COMPLETED"
 
         status = item.get("status") or ""
-        if status in ("MEDIA_GENERATION_STATUS_SUCCEEDED", "SUCCEEDED", "SUCCESS"):
+        if status in ("MEDIA_GENERATION_STATUS_SUCCESSFUL", "MEDIA_GENERATION_STATUS_SUCCEEDED", "SUCCEEDED", "SUCCESS"):
             return "COMPLETED"
         if status in ("MEDIA_GENERATION_STATUS_FAILED", "FAILED", "ERROR"):
             return "FAILED"
@@ -226,63 +233,24 @@ class VeoDownloader:
         """
         Download video from URL to output path.
 
+        Streams into "<output_path>.part" through the shared DownloadManager,
+        resuming with HTTP Range on retry and verifying the final size.
+
         Args:
             url: Video URL to download
             output_path: Local path to save video
-            timeout: Download timeout in seconds
+            timeout: Kept for backward compatibility (manager timeouts apply)
 
         Returns:
             True if download succeeded, False otherwise
         """
-        try:
-            self.log(f"[Veo] Downloading video: {os.path.basename(output_path)}")
-
-            # Ensure output directory exists
-            os.makedirs(os.path.dirname(output_path), exist_ok=True)
-
-            # Download with streaming
-            with requests.get(url, stream=True, timeout=timeout, allow_redirects=True) as r:
-                r.raise_for_status()
-
-                total = int(r.headers.get('content-length', 0))
-                downloaded = 0
-
-                with open(output_path, 'wb') as f:
-                    for chunk in r.iter_content(chunk_size=8192):
-                        if chunk:
-                            f.write(chunk)
-                            downloaded += len(chunk)
-
-                # Log progress
-                if total > 0:
-                    progress = (downloaded / total) * 100
-                    self.log(f"[Veo] Downloaded {downloaded}/{total} bytes ({progress:.1f}%)")
-
-            # Verify download
-            if not os.path.exists(output_path) or os.path.getsize(output_path) == 0:
-                self.log("[Veo] Download verification failed - file empty or missing")
-                # Clean up empty or corrupted file
-                if os.path.exists(output_path):
-                    try:
-                        os.remove(output_path)
-                        self.log("[Veo] Removed corrupted file")
-                    except OSError:
-                        pass
-                return False
-
-            self.log(f"[Veo] Download complete: {output_path}")
-            return True
-
-        except Exception as e:
-            self.log(f"[Veo] Download error: {e}")
-            # Clean up partial download on error
-            if os.path.exists(output_path):
-                try:
-                    os.remove(output_path)
-                    self.log("[Veo] Removed partial download")
-                except OSError:
-                    pass
+        self.log(f"[Veo] Downloading video: {os.path.basename(output_path)}")
+        res = get_download_manager().download(url, output_path)
+        if not res["ok"]:
+            self.log(f"[Veo] Download error: {res['error']}")
             return False
+        self.log(f"[Veo] Download complete: {output_path} ({res['mbps']} MB/s)")
+        return True
 
     def poll_and_download(
         self,
@@ -301,56 +269,46 @@ class VeoDownloader:
             output_dir: Directory to save downloaded videos
             filename_prefix: Prefix for output filenames
             quality: Quality indicator for filename
-            max_polls: Maximum number of polling attempts
-            poll_interval: Seconds between polls
+            max_polls: Together with poll_interval, bounds the total wait
+            poll_interval: Seconds per poll budget (intervals are set by the shared poller)
 
         Returns:
             List of tuples (operation_name, local_path) for completed downloads
         """
         completed = []
-        pending = operation_names.copy()
-
-        for poll_count in range(max_polls):
-            if not pending:
-                break
-
-            self.log(f"[Veo] Polling status (attempt {poll_count + 1}/{max_polls})...")
-            statuses = self.check_generation_status(pending)
-
-            still_pending = []
-            for op_name in pending:
-                status_info = statuses.get(op_name, {})
-                status = status_info.get("status", "PROCESSING")
-
-                if status == "COMPLETED":
-                    video_urls = status_info.get("video_urls", [])
-                    if video_urls:
-                        # Download first video URL
-                        url = video_urls[0]
-                        filename = f"{filename_prefix}_{quality}_{len(completed) + 1}.mp4"
-                        output_path = os.path.join(output_dir, filename)
-
-                        if self.download_video(url, output_path):
-                            completed.append((op_name, output_path))
-                            self.log(f"[Veo] Completed: {filename}")
-                        else:
-                            self.log(f"[Veo] Download failed for {op_name}")
-                    else:
-                        self.log(f"[Veo] No video URL for completed operation {op_name}")
-                elif status == "FAILED":
-                    self.log(f"[Veo] Generation failed: {op_name}")
+        downloads = []
+        pending = set(operation_names)
+        timeout = max_polls * poll_interval
+        manager = get_download_manager()
+
+        self.log(f"[Veo] Waiting for {len(pending)} operation(s) (timeout {timeout}s)...")
+        for op_name, status_info in get_poller().iter_updates(operation_names, client=self, timeout=timeout):
+            status = status_info.get("status", "PROCESSING")
+            if status == "COMPLETED":
+                pending.discard(op_name)
+                video_urls = status_info.get("video_urls", [])
+                if video_urls:
+                    # Queue the first video URL; downloads run on the pool while polling continues
+                    filename = f"{filename_prefix}_{quality}_{len(downloads) + 1}.mp4"
+                    output_path = os.path.join(output_dir, filename)
+                    downloads.append((op_name, manager.submit(video_urls[0], output_path)))
                 else:
-                    # Still processing
-                    still_pending.append(op_name)
-
-            pending = still_pending
-
-            if pending:
-                time.sleep(poll_interval)
+                    self.log(f"[Veo] No video URL for completed operation {op_name}")
+            elif status == "FAILED":
+                pending.discard(op_name)
+                self.log(f"[Veo] Generation failed: {op_name}")
+
+        for op_name, fut in downloads:
+            res = fut.result()
+            if res["ok"]:
+                completed.append((op_name, res["path"]))
+                self.log(f"[Veo] Completed: {os.path.basename(res['path'])} ({res['mbps']} MB/s)")
+            else:
+                self.log(f"[Veo] Download failed for {op_name}: {res['error']}")
 
         if pending:
             msg = f"[Veo] Warning: {len(pending)} operations still pending"
-            msg += f" after {max_polls} polls"
+            msg += f" after {timeout}s"
             self.log(msg)
 
         return completed
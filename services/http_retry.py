@@ -2,6 +2,8 @@
 import time, random, requests
 from typing import Dict, Any, Tuple
 
+from services.core.metrics import observe
+
 
 def _knob(name:str, default):
     from services.core.config import load as load_config
@@ -15,16 +17,24 @@ def _sleep(i:int):
     base = min((_knob('base_backoff_sec', 1.2) ** i), _knob('max_backoff_sec', 30.0))
     time.sleep(random.random() * base)
 
+def _call_key(headers, params) -> str:
+    h = {k.lower(): v for k, v in (headers or {}).items()}
+    k = (params or {}).get('key') or h.get('xi-api-key') or h.get('authorization') or ''
+    return k[7:] if k.lower().startswith('bearer ') else k
+
 def request_json(method:str, url:str, *, headers:Dict[str,str]=None, params:Dict[str,Any]=None,
                  json_body:Any=None, data:Any=None, timeout=None) -> Tuple[bool, Any, str, int, Dict[str,str]]:
     sess = requests.Session()
     max_attempts = int(_knob('max_attempts', 5))
     timeout = timeout or (_knob('conn_timeout', 15), _knob('read_timeout', 60))
     last_err, last_code, last_headers = "", 0, {}
+    key = _call_key(headers, params)
     for attempt in range(1, max_attempts+1):
+        t0 = time.monotonic()
         try:
             r = sess.request(method=method, url=url, headers=headers, params=params, json=json_body,
                              data=data, timeout=timeout)
+            observe(None, url, t0, response=r, key=key, retries=attempt-1)
             last_code = r.status_code; last_headers = dict(r.headers or {})
             if 200 <= r.status_code < 300:
                 try:
@@ -37,6 +47,7 @@ def request_json(method:str, url:str, *, headers:Dict[str,str]=None, params:Dict
                 continue
             return False, None, f"HTTP {r.status_code}: {r.text[:500]}", r.status_code, last_headers
         except requests.RequestException as e:
+            observe(None, url, t0, error=e, key=key, retries=attempt-1)
             last_err = f"REQ ERR: {e}"
             _sleep(attempt)
             continue
@@ -1,8 +1,9 @@
 # -*- coding: utf-8 -*-
-import os, base64, json, requests, mimetypes, uuid, time
+import os, base64, json, mimetypes, uuid
 from typing import Optional, Dict, Any, List
 from services.core.api_config import GEMINI_IMAGE_MODEL, GEMINI_BASE, gemini_image_endpoint, IMAGE_GEN_TIMEOUT
 from services.core.key_manager import get_all_keys, refresh
+from services.core.metrics import timed_request
 from services.core.api_key_rotator import APIKeyRotator, APIKeyRotationError
 
 
@@ -51,8 +52,8 @@ def generate_image_gemini(prompt: str, timeout: int = None, retry_delay: float =
     Args:
         prompt: Text prompt for image generation
         timeout: Request timeout in seconds (default from api_config)
-        retry_delay: Base delay before first API call (15.0s for Gemini free tier safety)
-        enforce_rate_limit: If True, wait before first API call (default True)
+        retry_delay: Legacy, ignored - per-key pacing comes from the shared rate limiter
+        enforce_rate_limit: Legacy, ignored - the rate limiter always applies
         log_callback: Optional callback function for logging (receives string messages)
         
     Returns:
@@ -73,10 +74,10 @@ def generate_image_gemini(prompt: str, timeout: int = None, retry_delay: float =
     
     log(f"[DEBUG] Tìm thấy {len(keys)} Google API keys")
     
-    # Enforce rate limit before first call
-    if enforce_rate_limit:
-        log(f"[RATE LIMIT] Đợi {retry_delay}s trước khi gọi API...")
-        time.sleep(retry_delay)
+    # Pacing comes from the shared per-key rate limiter (APIKeyRotator waits on
+    # a reservation for the chosen key), so no fixed sleep before the first call
+    if not enforce_rate_limit:
+        log("[RATE LIMIT] enforce_rate_limit=False bị bỏ qua: giới hạn theo key luôn được áp dụng")
     
     # PR#5: Define API call function for APIKeyRotator
     def api_call_with_key(api_key: str) -> bytes:
@@ -96,7 +97,7 @@ def generate_image_gemini(prompt: str, timeout: int = None, retry_delay: float =
             }
         }
         
-        response = requests.post(url, json=payload, timeout=timeout)
+        response = timed_request("POST", url, "gemini", json=payload, timeout=timeout)
         response.raise_for_status()
         
         data = response.json()
@@ -112,23 +113,54 @@ def generate_image_gemini(prompt: str, timeout: int = None, retry_delay: float =
         raise ImageGenError(str(e))
 
 
+def parallel_image_workers(api_keys: List[str]) -> int:
+    """
+    Number of scene images to generate concurrently for api_keys
+    
+    Optional 'image_gen' config section:
+        {"image_gen": {"parallel": true, "workers": 0}}
+    parallel=false restores one-by-one generation; workers=0 means one worker per
+    in-flight slot, i.e. keys x rate_limits.google.max_in_flight (default 1).
+    """
+    from services.core.config import load as load_cfg
+    from services.core.rate_limiter import get_rate_limiter
+    try:
+        opts = (load_cfg() or {}).get('image_gen') or {}
+    except Exception:
+        opts = {}
+    keys = [k for k in api_keys or [] if k]
+    if not opts.get('parallel', True) or not keys:
+        return 1
+    workers = int(opts.get('workers') or 0) or get_rate_limiter().concurrency('google', keys) or len(keys)
+    return max(1, workers)
+
+
 # New implementation: Intelligent rate-limited image generation with API key rotation
 def generate_image_with_rate_limit(
+    text: str = None,
+    api_keys: List[str] = None,
+    model: str = "gemini",
     aspect_ratio: str = "1:1",
+    size: str = None,
+    delay_before: float = 0,
+    rate_limit_delay: float = None,
+    max_calls_per_minute: int = None,
+    logger=None,
+    log_callback=None,
     reference_images: list = None,
+    prompt: str = None,
 ) -> Optional[bytes]:
     """
     Generate image with intelligent API key rotation and rate limiting
     
-    This function uses the new APIKeyRotationManager to handle:
-    - Per-key usage tracking and cooldowns
-    - Exponential backoff (2s, 4s, 8s) on rate limits
-    - 60s cooldown after exhausting retries on a key
-    - Minimum 2s interval between calls on same key
+    Key rotation runs through the shared rate limiter (services.core.rate_limiter):
+    - Per-key token buckets (rate_limits config section)
+    - Exponential cooldown on rate limits, long cooldown on 401/403
     - Smart rotation that skips rate-limited keys
     
     Args:
-        prompt: Image generation prompt (REQUIRED)
+        text: Image generation prompt (alias of prompt)
+        prompt: Image generation prompt (REQUIRED, either text or prompt)
         api_keys: List of API keys to rotate through (optional, uses config if not provided)
         model: Model to use (gemini, dalle, imagen_4, etc.)
         aspect_ratio: Image aspect ratio (e.g., "9:16", "16:9", "1:1", "4:5")
@@ -138,6 +170,7 @@ def generate_image_with_rate_limit(
         max_calls_per_minute: Maximum API calls per minute (default 6)
         logger: Optional callback function for logging (alias for log_callback)
         log_callback: Optional callback function for logging
+        reference_images: Optional image paths (or raw bytes) sent inline with the prompt
         
         # Legacy parameters (kept for backwards compatibility, ignored):
         delay_before: Ignored - rotation manager handles delays
@@ -155,6 +188,7 @@ def generate_image_with_rate_limit(
     """
     # Support both logger and log_callback parameter names
     log_fn = logger or log_callback
+    prompt = prompt or text or ""
     
     def log(msg):
         if log_fn:
@@ -202,6 +236,19 @@ def generate_image_with_rate_limit(
                     aspect_hint = " (landscape orientation, horizontal format)"
             
             enhanced_prompt = prompt + aspect_hint if aspect_hint else prompt
+            parts = [{"text": enhanced_prompt}]
+            for ref in reference_images or []:
+                try:
+                    if isinstance(ref, (bytes, bytearray)):
+                        ref_data, ref_mime = bytes(ref), "image/png"
+                    else:
+                        with open(ref, "rb") as f:
+                            ref_data = f.read()
+                        ref_mime = mimetypes.guess_type(ref)[0] or "image/png"
+                    parts.append({"inline_data": {"mime_type": ref_mime,
+                                                  "data": base64.b64encode(ref_data).decode("ascii")}})
+                except Exception as e:
+                    log(f"[WARN] Bỏ qua ảnh tham chiếu: {e}")
             
             # Use APIKeyRotator for key rotation with shared API call logic
             def api_call_with_key(api_key: str) -> bytes:
@@ -215,7 +262,7 @@ def generate_image_with_rate_limit(
                     "generationConfig": generation_config
                 }
                 
-                response = requests.post(url, json=payload, timeout=IMAGE_GEN_TIMEOUT)
+                response = timed_request("POST", url, "gemini", json=payload, timeout=IMAGE_GEN_TIMEOUT)
                 response.raise_for_status()
                 
                 data = response.json()
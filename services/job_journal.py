@@ -0,0 +1,189 @@
+# -*- coding: utf-8 -*-
+"""
+Append-only per-project journal of video jobs.
+
+Every submission, operation status change and finished download is appended
+as one JSON line, so a crash or restart mid-run loses nothing: the journal is
+folded back into per-scene state and unfinished operations are polled and
+downloaded again instead of being re-generated (and paid for) from scratch.
+
+Event lines ({"ts": ..., "event": ..., ...}):
+  run       run metadata (title, model, aspect, copies, ...)
+  scene     scene fields known before submission (prompt, image, ...)
+  submit    operation names returned by the start call (replaces older ones)
+  status    status / urls of one operation
+  download  local file of one operation
+  snapshot  folded state written by compact()
+"""
+import hashlib
+import json
+import os
+import threading
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+JOURNAL_NAME = "jobs_journal.jsonl"
+DEAD_STATUSES = {"FAILED", "DONE_NO_URL"}
+
+
+def prompt_hash(prompt: str) -> str:
+    return hashlib.sha1((prompt or "").encode("utf-8")).hexdigest()[:16]
+
+
+def _new_scene(sid: str) -> Dict[str, Any]:
+    return {"scene": sid, "ops": [], "op_status": {}, "downloads": {}}
+
+
+class JobJournal:
+    """
+    Args:
+        directory: Folder holding the journal (created on first write)
+        filename: Journal file name
+    """
+
+    def __init__(self, directory: str, filename: str = JOURNAL_NAME):
+        self.directory = directory
+        self.path = os.path.join(directory, filename)
+        self._lock = threading.Lock()
+
+    def exists(self) -> bool:
+        return os.path.isfile(self.path)
+
+    # ---- writing ----------------------------------------------------
+    def append(self, event: str, **fields):
+        line = json.dumps(dict(fields, ts=time.time(), event=event), ensure_ascii=False)
+        with self._lock:
+            os.makedirs(self.directory, exist_ok=True)
+            with open(self.path, "a", encoding="utf-8") as f:
+                f.write(line + "\n")
+                f.flush()
+
+    def begin(self, **meta):
+        """Start a run: fold the history into one snapshot line, then record the run metadata."""
+        self.compact()
+        self.append("run", **meta)
+
+    def scene(self, scene, **fields):
+        self.append("scene", scene=str(scene), **fields)
+
+    def submitted(self, scene, operation_names: List[str], **fields):
+        self.append("submit", scene=str(scene), ops=[n for n in operation_names or [] if n], **fields)
+
+    def status(self, op_name: str, status: str, video_url: str = "", thumb_url: str = ""):
+        self.append("status", op=op_name, status=status, video_url=video_url or "", thumb_url=thumb_url or "")
+
+    def downloaded(self, op_name: str, path: str):
+        self.append("download", op=op_name, path=path)
+
+    def compact(self):
+        if not self.exists():
+            return
+        tmp = self.path + ".tmp"
+        with self._lock:
+            st = self.state()
+            with open(tmp, "w", encoding="utf-8") as f:
+                f.write(json.dumps({"ts": time.time(), "event": "snapshot", **st}, ensure_ascii=False) + "\n")
+            os.replace(tmp, self.path)
+
+    # ---- reading ----------------------------------------------------
+    def events(self) -> List[Dict[str, Any]]:
+        out = []
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                for line in f:
+                    try:
+                        ev = json.loads(line)
+                    except ValueError:
+                        continue  # torn last line after a crash
+                    if isinstance(ev, dict):
+                        out.append(ev)
+        except OSError:
+            pass
+        return out
+
+    def state(self) -> Dict[str, Any]:
+        """Fold the journal into {"meta": {...}, "scenes": {scene_id: record}}."""
+        meta: Dict[str, Any] = {}
+        scenes: Dict[str, Dict[str, Any]] = {}
+        op_scene: Dict[str, str] = {}
+        for ev in self.events():
+            kind = ev.get("event")
+            if kind == "snapshot":
+                meta = dict(ev.get("meta") or {})
+                scenes = {k: dict(v) for k, v in (ev.get("scenes") or {}).items()}
+                op_scene = {op: sid for sid, rec in scenes.items() for op in rec.get("ops", [])}
+            elif kind == "run":
+                meta.update({k: v for k, v in ev.items() if k not in ("ts", "event")})
+            elif kind in ("scene", "submit"):
+                sid = str(ev.get("scene"))
+                rec = scenes.setdefault(sid, _new_scene(sid))
+                if kind == "scene" and ev.get("prompt_hash") not in (None, rec.get("prompt_hash")):
+                    rec = scenes[sid] = _new_scene(sid)  # different prompt -> old operations no longer apply
+                rec.update({k: v for k, v in ev.items() if k not in ("ts", "event", "scene", "ops")})
+                if kind == "submit":
+                    rec["ops"] = list(ev.get("ops") or [])
+                    rec["op_status"] = {}
+                    rec["downloads"] = {}
+                    rec["submitted_at"] = ev.get("ts")
+                    for op in rec["ops"]:
+                        op_scene[op] = sid
+            elif kind in ("status", "download"):
+                rec = scenes.get(op_scene.get(ev.get("op"), ""))
+                if rec is None:
+                    continue
+                if kind == "status":
+                    prev = rec["op_status"].get(ev["op"]) or {}
+                    rec["op_status"][ev["op"]] = {"status": ev.get("status", ""),
+                                                  "video_url": ev.get("video_url") or prev.get("video_url", ""),
+                                                  "thumb_url": ev.get("thumb_url") or prev.get("thumb_url", "")}
+                else:
+                    rec["downloads"][ev["op"]] = ev.get("path", "")
+        return {"meta": meta, "scenes": scenes}
+
+    @staticmethod
+    def unfinished_ops(rec: Dict[str, Any]) -> List[str]:
+        """Ops of a scene record that still need polling and/or downloading."""
+        out = []
+        for op in rec.get("ops", []):
+            path = (rec.get("downloads") or {}).get(op)
+            if path and os.path.isfile(path):
+                continue
+            if ((rec.get("op_status") or {}).get(op) or {}).get("status") in DEAD_STATUSES:
+                continue
+            out.append(op)
+        return out
+
+    def pending(self, state: Optional[Dict[str, Any]] = None) -> List[Tuple[str, str]]:
+        """(scene_id, op_name) pairs that a resume should pick up."""
+        st = state or self.state()
+        return [(sid, op) for sid, rec in st["scenes"].items() for op in self.unfinished_ops(rec)]
+
+
+def apply_record(job, rec, copies):
+    """Copy journaled operations/urls/downloads of a scene onto a job dict (resume without re-submitting)."""
+    ops=list(rec.get("ops") or []); n=max(copies, len(ops))
+    job["operation_names"]=ops; job["op_index_map"]={nm:ci for ci,nm in enumerate(ops)}
+    job["video_by_idx"]=[None]*n; job["thumb_by_idx"]=[None]*n; job["downloaded_idx"]=set(); job["local_paths"]=[]
+    for ci,nm in enumerate(ops):
+        info=(rec.get("op_status") or {}).get(nm) or {}
+        if info.get("video_url"): job["video_by_idx"][ci]=info["video_url"]
+        if info.get("thumb_url"): job["thumb_by_idx"][ci]=info["thumb_url"]
+        path=(rec.get("downloads") or {}).get(nm)
+        if path and os.path.isfile(path): job["downloaded_idx"].add(ci+1); job["local_paths"].append(path)
+    if rec.get("media_id"): job["media_id"]=rec["media_id"]
+    if ops: job["status"]=((rec.get("op_status") or {}).get(ops[-1]) or {}).get("status") or "PENDING"
+    return job
+
+
+def find_unfinished(root: str, subdir: str = "03_Videos", filename: str = JOURNAL_NAME) -> List[JobJournal]:
+    """Journals under <root>/<project>/<subdir> with pending work, newest first."""
+    found = []
+    try:
+        names = os.listdir(root)
+    except OSError:
+        return []
+    for name in names:
+        jr = JobJournal(os.path.join(root, name, subdir), filename)
+        if jr.exists() and jr.pending():
+            found.append((os.path.getmtime(jr.path), jr))
+    return [jr for _, jr in sorted(found, key=lambda x: x[0], reverse=True)]
@@ -0,0 +1,184 @@
+# -*- coding: utf-8 -*-
+"""
+Persistent cache of LLM text responses.
+
+Keyed by sha256(model, system prompt, user prompt), so re-running a project
+or an A/B variant with identical inputs returns the stored script instead of
+paying another 60-240 s round trip. One JSON file per entry under CACHE_DIR;
+a hit refreshes the file mtime, and the least recently used entries are
+pruned beyond max_entries / max_bytes. Entries expire after ttl_sec.
+
+Streaming callers still get their per-scene callbacks on a hit: the cached
+text is replayed through services.llm_stream.collect().
+"""
+import hashlib
+import json
+import os
+import threading
+import time
+from typing import Any, Callable, Dict, Optional
+
+CACHE_DIR = os.path.join(os.path.expanduser("~"), ".veo_llm_cache")
+
+
+class LLMResponseCache:
+    """
+    Args:
+        directory: Folder holding one <key>.json file per entry
+        ttl_sec: Entry lifetime in seconds
+        max_entries: Least recently used entries are pruned beyond this count
+        max_bytes: ... or beyond this total size
+    """
+
+    def __init__(self, directory: str = CACHE_DIR, ttl_sec: float = 7 * 24 * 3600,
+                 max_entries: int = 500, max_bytes: int = 200 * 1024 * 1024):
+        self.directory = directory
+        self.ttl_sec = float(ttl_sec)
+        self.max_entries = int(max_entries)
+        self.max_bytes = int(max_bytes)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def key(model: str, system_prompt: str, user_prompt: str) -> str:
+        h = hashlib.sha256()
+        for part in (model or "", system_prompt or "", user_prompt or ""):
+            h.update(part.encode("utf-8"))
+            h.update(b"\0")
+        return h.hexdigest()
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.directory, key + ".json")
+
+    def get(self, key: str) -> Optional[str]:
+        path = self._path(key)
+        with self._lock:
+            try:
+                with open(path, "r", encoding="utf-8") as f:
+                    ent = json.load(f)
+                if time.time() - float(ent.get("ts", 0)) < self.ttl_sec and isinstance(ent.get("text"), str):
+                    os.utime(path, None)  # LRU: mtime = last access
+                    self.hits += 1
+                    return ent["text"]
+                os.remove(path)
+            except (OSError, ValueError):
+                pass
+            self.misses += 1
+            return None
+
+    def put(self, key: str, text: str, model: str = ""):
+        if not key or not text:
+            return
+        with self._lock:
+            try:
+                os.makedirs(self.directory, exist_ok=True)
+                tmp = self._path(key) + ".tmp"
+                with open(tmp, "w", encoding="utf-8") as f:
+                    json.dump({"ts": time.time(), "model": model, "text": text}, f, ensure_ascii=False)
+                os.replace(tmp, self._path(key))
+                self._prune()
+            except OSError:
+                pass
+
+    def invalidate(self, key: str):
+        with self._lock:
+            try:
+                os.remove(self._path(key))
+            except OSError:
+                pass
+
+    def _entries(self):
+        out = []
+        try:
+            for name in os.listdir(self.directory):
+                if name.endswith(".json"):
+                    p = os.path.join(self.directory, name)
+                    try:
+                        st = os.stat(p)
+                    except OSError:
+                        continue
+                    out.append((st.st_mtime, st.st_size, p))
+        except OSError:
+            pass
+        return out
+
+    def _prune(self):
+        entries = sorted(self._entries())
+        total = sum(e[1] for e in entries)
+        while entries and (len(entries) > self.max_entries or total > self.max_bytes):
+            _, size, p = entries.pop(0)
+            try:
+                os.remove(p)
+            except OSError:
+                pass
+            total -= size
+
+    def clear(self):
+        with self._lock:
+            for _, _, p in self._entries():
+                try:
+                    os.remove(p)
+                except OSError:
+                    pass
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            entries = self._entries()
+            return {"hits": self.hits, "misses": self.misses, "entries": len(entries),
+                    "bytes": sum(e[1] for e in entries)}
+
+
+_CACHE: Optional[LLMResponseCache] = None
+_CACHE_LOCK = threading.Lock()
+_ENABLED = True
+
+
+def get_llm_cache() -> Optional[LLMResponseCache]:
+    """Process-wide cache (None when disabled); tuning from the optional 'llm_cache' config section."""
+    global _CACHE, _ENABLED
+    with _CACHE_LOCK:
+        if _CACHE is None and _ENABLED:
+            try:
+                from utils import config as cfg
+                c = (cfg.load() or {}).get("llm_cache") or {}
+            except Exception:
+                c = {}
+            _ENABLED = bool(c.get("enabled", True))
+            if _ENABLED:
+                _CACHE = LLMResponseCache(ttl_sec=float(c.get("ttl_hours", 168)) * 3600,
+                                          max_entries=int(c.get("max_entries", 500)),
+                                          max_bytes=int(float(c.get("max_mb", 200)) * 1024 * 1024))
+        return _CACHE
+
+
+def cached_text(model: str, system_prompt: str, user_prompt: str, fetch: Callable[[], str],
+                bypass: bool = False, on_item: Optional[Callable[[int, Dict[str, Any]], None]] = None,
+                item_key: str = "scenes", validate: Optional[Callable[[str], Any]] = None) -> str:
+    """
+    Return the cached response for (model, system_prompt, user_prompt) or fetch() and store it.
+
+    Args:
+        fetch: Makes the real call, returns the response text
+        bypass: Skip the lookup (the fresh response still replaces the cached one)
+        on_item: Streaming callback; replayed from the cached text on a hit
+        validate: Only responses for which validate(text) succeeds are stored
+    """
+    cache = get_llm_cache()
+    key = LLMResponseCache.key(model, system_prompt, user_prompt) if cache else ""
+    if cache and not bypass:
+        text = cache.get(key)
+        if text is not None:
+            if on_item:
+                from services.llm_stream import collect
+                collect([text], on_item, item_key)
+            return text
+    text = fetch()
+    if cache:
+        try:
+            ok = validate is None or validate(text)
+        except Exception:
+            ok = False
+        if ok:
+            cache.put(key, text, model)
+    return text
@@ -1,5 +1,9 @@
 # -*- coding: utf-8 -*-
 import os, json, requests
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from services.core.metrics import timed_request
+from services.llm_cache import cached_text
+from services.llm_stream import collect, gemini_stream, openai_stream
 from services.core.key_manager import get_key, get_all_keys, refresh
 from services.core.api_key_rotator import APIKeyRotator, APIKeyRotationError
 
@@ -110,8 +114,169 @@ Trả về **JSON hợp lệ** theo schema EXACT (không thêm ký tự ngoài J
 {schema}
 """
 
-def _call_openai(prompt, api_key, model="gpt-4-turbo"):
-    """FIXED: Changed from gpt-5 to gpt-4-turbo"""
+# ---- LONG mode: outline first, then scene chunks in parallel ----------------
+LONG_CHUNK_SCENES = 12  # scenes per expansion call
+CHUNK_RETRIES = 2       # extra rounds for chunks that failed or came back malformed
+
+SCENE_KEYS = ("prompt_vi", "prompt_tgt", "duration", "characters", "location", "dialogues")
+
+def _script_gen_cfg():
+    """Optional 'script_gen' config section: {"hierarchical": true, "chunk_scenes": 12, "workers": 0}"""
+    try:
+        from services.core.config import load as load_config
+        return (load_config() or {}).get('script_gen') or {}
+    except Exception:
+        return {}
+
+def _chunk_ranges(n, size):
+    return [(a, min(n, a+size)) for a in range(0, n, max(1, size))]
+
+def _outline_prompt(idea, style_vi, out_lang, n, per, mode, ranges):
+    """Phase 1: everything except scenes, plus one beat summary per scene chunk."""
+    full = _schema_prompt(idea, style_vi, out_lang, n, per, mode)
+    head = full[:full.index("Trả về **JSON hợp lệ**")]
+    chunks = ",\n    ".join(f'{{"from": {a+1}, "to": {b}, "summary_vi": "Diễn biến cảnh {a+1}–{b}"}}' for a, b in ranges)
+    return f"""{head}
+BƯỚC 1/2 — CHỈ viết phần khung (chưa viết từng cảnh). Chia {n} cảnh thành {len(ranges)} đoạn liên tiếp như dưới đây,
+mỗi đoạn tóm tắt 2–4 câu những gì xảy ra (Hồi, Midpoint, Twist phải rơi đúng đoạn).
+
+Trả về **JSON hợp lệ** theo schema EXACT (không thêm ký tự ngoài JSON):
+
+{{
+  "title_vi": "Tiêu đề ngắn (VI)",
+  "title_tgt": "Title in {out_lang}",
+  "character_bible": [{{"name":"","role":"","key_trait":"","motivation":"","default_behavior":"","visual_identity":"","archetype":"","fatal_flaw":"","goal_external":"","goal_internal":""}}],
+  "character_bible_tgt": [{{"name":"","role":"","key_trait":"","motivation":"","default_behavior":"","visual_identity":"","archetype":"","fatal_flaw":"","goal_external":"","goal_internal":""}}],
+  "outline_vi": "Dàn ý tóm tắt (nêu rõ chế độ {mode}, sự kiện chính theo Hồi)",
+  "outline_tgt": "Outline in {out_lang}",
+  "chunks": [
+    {chunks}
+  ]
+}}
+"""
+
+def _chunk_prompt(outline, a, b, per, out_lang, mode, n):
+    """Phase 2: expand scenes a+1..b against the outline and character bible."""
+    beats = outline.get("chunks") or []
+    def beat(i):
+        return (beats[i].get("summary_vi") or "") if 0 <= i < len(beats) and isinstance(beats[i], dict) else ""
+    ci = next((i for i, c in enumerate(beats) if isinstance(c, dict) and c.get("from") == a+1), -1)
+    bible = json.dumps(outline.get("character_bible") or [], ensure_ascii=False)
+    return f"""Bạn là **Biên kịch Đa năng AI**, đang viết tiếp một kịch bản {mode} đã có dàn ý.
+Ngôn ngữ đích: {LANGUAGE_NAMES.get(out_lang, 'Vietnamese (Tiếng Việt)')} (thoại/lời dẫn bằng ngôn ngữ này).
+
+TIÊU ĐỀ: {outline.get("title_vi", "")}
+CHARACTER BIBLE (cố định, không đổi tên/đặc điểm): {bible}
+DÀN Ý TOÀN BỘ: {outline.get("outline_vi", "")}
+
+BƯỚC 2/2 — Viết cảnh {a+1} đến {b} (trên tổng {n} cảnh, mỗi cảnh {per[a]}s).
+- Đoạn trước: {beat(ci-1) or "(mở đầu — cần Hook mạnh)"}
+- ĐOẠN NÀY: {beat(ci) or "(theo dàn ý)"}
+- Đoạn sau: {beat(ci+1) or "(kết thúc — Twist/Thông điệp mạnh)"}
+
+Trả về **JSON hợp lệ** theo schema EXACT, "scenes" có ĐÚNG {b-a} phần tử:
+
+{{
+  "screenplay_vi": "Screenplay (SCENE/ACTION/DIALOGUE) cho cảnh {a+1}–{b}",
+  "screenplay_tgt": "Screenplay in {out_lang}",
+  "scenes": [
+    {{
+      "prompt_vi":"Mô tả ngắn (1–2 câu) bám Character Bible cho cảnh",
+      "prompt_tgt":"{out_lang} version",
+      "duration": 8,
+      "characters": ["Tên nhân vật xuất hiện"],
+      "location": "Địa điểm",
+      "dialogues": [
+        {{"speaker":"Tên","text_vi":"Câu thoại VI","text_tgt":"Line in {out_lang}"}}
+      ]
+    }}
+  ]
+}}
+"""
+
+def _valid_scene(sc):
+    return isinstance(sc, dict) and bool(sc.get("prompt_vi") or sc.get("prompt_tgt"))
+
+def _normalize_scene(sc):
+    sc.setdefault("prompt_tgt", sc.get("prompt_vi", ""))
+    sc.setdefault("prompt_vi", sc.get("prompt_tgt", ""))
+    if not isinstance(sc.get("characters"), list): sc["characters"] = []
+    if not isinstance(sc.get("dialogues"), list): sc["dialogues"] = []
+    sc.setdefault("location", "")
+    return sc
+
+def _outline_ok(out):
+    return isinstance(out, dict) and bool(out.get("character_bible"))
+
+def _chunk_scenes(out):
+    return [sc for sc in (out.get("scenes") if isinstance(out, dict) else None) or [] if _valid_scene(sc)]
+
+def _script_ok(out):
+    return isinstance(out, dict) and isinstance(out.get("scenes"), list) and len(out["scenes"]) > 0
+
+def _generate_long(call, prefix, idea, style, out_lang, n, per, mode, chunk, workers, log, on_scene=None):
+    """
+    Two-phase LONG-mode script: one outline/character-bible call, then scene
+    chunks expanded in parallel; chunks that fail or come back malformed are
+    retried on their own instead of restarting the whole script.
+
+    call(prompt, on_scene, check, fresh): only replies passing check are cached,
+    and retried chunks skip the cache.
+    """
+    ranges = _chunk_ranges(n, chunk)
+    log(f"[SCRIPT] LONG: dàn ý + {len(ranges)} đoạn × ≤{chunk} cảnh ({workers} luồng)")
+    outline = call(prefix + _outline_prompt(idea, style, out_lang, n, per, mode, ranges), None, _outline_ok)
+    if not _outline_ok(outline):
+        raise RuntimeError("LLM không trả về đúng schema (dàn ý).")
+
+    done = {}
+    errors = {}
+    def expand(a, b, fresh=False):
+        emit = (lambda i, sc: on_scene(a + i, sc) if i < b - a and _valid_scene(sc) else None) if on_scene else None
+        out = call(prefix + _chunk_prompt(outline, a, b, per, out_lang, mode, n), emit,
+                   lambda o: len(_chunk_scenes(o)) >= b - a, fresh)
+        scenes = _chunk_scenes(out)
+        if len(scenes) < b - a:
+            raise RuntimeError(f"đoạn {a+1}–{b}: nhận {len(scenes)}/{b-a} cảnh hợp lệ")
+        return out, scenes[:b-a]
+
+    todo = list(ranges)
+    for rnd in range(CHUNK_RETRIES + 1):
+        if not todo:
+            break
+        if rnd:
+            log(f"[SCRIPT] Thử lại {len(todo)} đoạn lỗi (lần {rnd})")
+        with ThreadPoolExecutor(max_workers=max(1, min(workers, len(todo)))) as pool:
+            futs = {pool.submit(expand, a, b, rnd > 0): (a, b) for a, b in todo}
+            for fut in as_completed(futs):
+                rng = futs[fut]
+                try:
+                    done[rng] = fut.result()
+                    errors.pop(rng, None)
+                    log(f"[SCRIPT] Xong cảnh {rng[0]+1}–{rng[1]} ({len(done)}/{len(ranges)})")
+                except Exception as e:
+                    errors[rng] = e
+        todo = [r for r in ranges if r not in done]
+    if todo:
+        raise RuntimeError("Không tạo được các đoạn: " +
+                           "; ".join(f"{a+1}–{b}: {str(errors.get((a, b)))[:120]}" for a, b in todo))
+
+    res = {k: v for k, v in outline.items() if k != "chunks"}
+    res["scenes"] = [_normalize_scene(sc) for r in ranges for sc in done[r][1]]
+    for lang in ("vi", "tgt"):
+        res[f"screenplay_{lang}"] = "\n\n".join((done[r][0].get(f"screenplay_{lang}") or "").strip() for r in ranges).strip()
+    return res
+
+def _json_check(check):
+    """Cache validator: the reply parses as JSON and passes the caller's schema check."""
+    return lambda text: (check or _script_ok)(json.loads(text))
+
+def _call_openai(prompt, api_key, model="gpt-4-turbo", on_scene=None, bypass_cache=False, check=None):
+    """FIXED: Changed from gpt-5 to gpt-4-turbo. on_scene(i, scene) streams scenes as they complete."""
+    return json.loads(cached_text(model, "", prompt, lambda: _openai_text(prompt, api_key, model, on_scene),
+                                  bypass=bypass_cache, on_item=on_scene, validate=_json_check(check)))
+
+def _openai_text(prompt, api_key, model, on_scene=None):
     url="https://api.openai.com/v1/chat/completions"
     headers={"Authorization":f"Bearer {api_key}","Content-Type":"application/json"}
     data={
@@ -123,35 +288,55 @@ def _call_openai(prompt, api_key, model="gpt-4-turbo"):
         "response_format":{"type":"json_object"},
         "temperature":0.9
     }
-    r=requests.post(url,headers=headers,json=data,timeout=240); r.raise_for_status()
-    txt=r.json()["choices"][0]["message"]["content"]
-    return json.loads(txt)
+    if on_scene:
+        return collect(openai_stream(url, headers, data, 240), on_scene)
+    r=timed_request("POST",url,"openai",key=api_key,headers=headers,json=data,timeout=240); r.raise_for_status()
+    return r.json()["choices"][0]["message"]["content"]
 
-def _call_gemini(prompt, api_key, model="gemini-2.5-flash"):
+def _call_gemini(prompt, api_key, model="gemini-2.5-flash", on_scene=None, bypass_cache=False, log=None, check=None):
+    """
+    Gemini JSON response; identical prompts are answered from the on-disk LLM cache unless bypass_cache.
+    Only replies passing check(obj) (default: a non-empty "scenes" list) are cached.
+    """
+    return json.loads(cached_text(model, "", prompt, lambda: _gemini_text(prompt, api_key, model, on_scene, log),
+                                  bypass=bypass_cache, on_item=on_scene, validate=_json_check(check)))
+
+def _gemini_text(prompt, api_key, model="gemini-2.5-flash", on_scene=None, log=None):
     """
     Call Gemini API with retry logic for 503 errors
     
+    With on_scene(i, scene) the streaming endpoint is used and every scene is
+    delivered as soon as it is complete (a retry delivers from scene 0 again).
+    
     Strategy:
-    1. Try primary API key
-    2. If 503 error, try up to 2 additional keys from config
-    3. Add exponential backoff (1s, 2s, 4s)
+    1. Keys are ordered by the shared rate limiter (primary key first when ready)
+    2. If 503 error, try up to 2 additional keys; the failed key is put into
+       cooldown and the next attempt waits for its reservation instead of a
+       fixed backoff
     """
-    from services.core.api_config import gemini_text_endpoint
+    from services.core.api_config import GEMINI_BASE, gemini_text_endpoint
     from services.core.key_manager import get_all_keys
-    import time
+    from services.core.rate_limiter import get_rate_limiter
+    log = log or (lambda m: None)
     
     # Build key rotation list
     keys = [api_key]
     all_keys = get_all_keys('google')
     keys.extend([k for k in all_keys if k != api_key])
+    limiter = get_rate_limiter()
+    keys = limiter.order('google', keys) or keys
     
     last_error = None
     
     for attempt, key in enumerate(keys[:3]):  # Try up to 3 keys
+        res = limiter.reserve('google', [key])
+        if res.delay() > 0.5:
+            log(f"[INFO] Gemini key ...{key[-6:]} sẵn sàng sau {res.delay():.1f}s")
+        res.wait()
         try:
             # Build endpoint
             url = gemini_text_endpoint(key) if model == "gemini-2.5-flash" else \
-                  f"https://generativelanguage.googleapis.com/v1beta/models/{model}:generateContent?key={key}"
+                  f"{GEMINI_BASE}/models/{model}:generateContent?key={key}"
             
             headers = {"Content-Type": "application/json"}
             data = {
@@ -159,34 +344,36 @@ def _call_gemini(prompt, api_key, model="gemini-2.5-flash"):
                 "generationConfig": {"temperature": 0.9, "response_mime_type": "application/json"}
             }
             
+            if on_scene:
+                txt = collect(gemini_stream(url, data, 240), on_scene)
+                res.report(ok=True)
+                return txt
+            
             # Make request
-            r = requests.post(url, headers=headers, json=data, timeout=240)
+            r = timed_request("POST", url, "gemini", key=key, retries=attempt, headers=headers, json=data, timeout=240)
             
             # Check for 503 specifically
             if r.status_code == 503:
                 last_error = requests.HTTPError(f"503 Service Unavailable (Key attempt {attempt+1})", response=r)
-                if attempt < 2:  # Don't sleep on last attempt
-                    backoff = 2 ** attempt  # 1s, 2s, 4s
-                    print(f"[WARN] Gemini 503 error, retrying in {backoff}s with next key...")
-                    time.sleep(backoff)
+                res.report(ok=False, error=last_error)
+                log("[WARN] Gemini 503 error, retrying with next key...")
                 continue  # Try next key
             
             # Raise for other HTTP errors
             r.raise_for_status()
+            res.report(ok=True)
             
             # Parse response
             out = r.json()
-            txt = out["candidates"][0]["content"]["parts"][0]["text"]
-            return json.loads(txt)
+            return out["candidates"][0]["content"]["parts"][0]["text"]
             
         except requests.exceptions.HTTPError as e:
+            code = e.response.status_code if getattr(e, 'response', None) is not None else 0
+            res.report(ok=False, error=f"{code} {e}")
             # Only retry 503 errors
-            if hasattr(e, 'response') and e.response.status_code == 503:
+            if code == 503:
                 last_error = e
-                if attempt < 2:
-                    backoff = 2 ** attempt
-                    print(f"[WARN] HTTP 503, trying key {attempt+2}/{min(3, len(keys))} in {backoff}s...")
-                    time.sleep(backoff)
+                log(f"[WARN] HTTP 503, trying key {attempt+2}/{min(3, len(keys))}...")
                 continue
             else:
                 # Other HTTP errors (429, 400, 401, etc.) - raise immediately
@@ -194,6 +381,7 @@ def _call_gemini(prompt, api_key, model="gemini-2.5-flash"):
                 
         except Exception as e:
             # Non-HTTP errors - raise immediately
+            res.report(ok=False, error=e)
             last_error = e
             raise
     
@@ -203,7 +391,7 @@ def _call_gemini(prompt, api_key, model="gemini-2.5-flash"):
     else:
         raise RuntimeError("Gemini API failed with unknown error")
 
-def generate_script(idea, style, duration_seconds, provider='Gemini 2.5', api_key=None, output_lang='vi', domain=None, topic=None, voice_config=None):
+def generate_script(idea, style, duration_seconds, provider='Gemini 2.5', api_key=None, output_lang='vi', domain=None, topic=None, voice_config=None, log_callback=None, on_scene=None, bypass_cache=False):
     """
     Generate video script with optional domain/topic expertise and voice settings
     
@@ -217,25 +405,31 @@ def generate_script(idea, style, duration_seconds, provider='Gemini 2.5', api_ke
         domain: Optional domain expertise (e.g., "Marketing & Branding")
         topic: Optional topic within domain (e.g., "Giới thiệu sản phẩm")
         voice_config: Optional voice configuration dict with provider, voice_id, language_code
+        log_callback: Optional callback(str) for progress of LONG-mode chunked generation
+        on_scene: Optional callback(index, scene) called as each scene is streamed in
+            (0-based index, duration already set); the returned dict stays authoritative
+        bypass_cache: Force fresh LLM calls instead of the on-disk response cache
     
     Returns:
         Script data dict with scenes, character_bible, etc.
+    
+    LONG mode with more scenes than one chunk is generated in two phases
+    (outline + character bible, then parallel scene chunks), see _generate_long.
     """
+    log = log_callback or (lambda m: None)
     gk, ok=_load_keys()
     n, per = _n_scenes(duration_seconds)
     mode = _mode_from_duration(duration_seconds)
     
-    # Build base prompt
-    prompt=_schema_prompt(idea=idea, style_vi=style, out_lang=output_lang, n=n, per=per, mode=mode)
-    
     # Prepend expert intro if domain/topic selected
+    prefix = ""
     if domain and topic:
         try:
             from services.domain_prompts import build_expert_intro
             # Map language code to vi/en for domain prompts
             prompt_lang = "vi" if output_lang == "vi" else "en"
             expert_intro = build_expert_intro(domain, topic, prompt_lang)
-            prompt = f"{expert_intro}\n\n{prompt}"
+            prefix = f"{expert_intro}\n\n"
         except Exception as e:
             # Log but don't fail if domain prompt loading fails
             print(f"[WARN] Could not load domain prompt: {e}")
@@ -244,12 +438,33 @@ def generate_script(idea, style, duration_seconds, provider='Gemini 2.5', api_ke
     if provider.lower().startswith("gemini"):
         key=api_key or gk
         if not key: raise RuntimeError("Chưa cấu hình Google API Key cho Gemini.")
-        res=_call_gemini(prompt,key,"gemini-2.5-flash")
+        # without an explicit key every call (incl. parallel chunks) starts on the next pooled key
+        call=lambda pr, cb=None, check=None, fresh=False: _call_gemini(pr,api_key or get_key('google') or key,"gemini-2.5-flash",cb,bypass_cache or fresh,log,check)
+        keys=[k for k in [key]+get_all_keys('google') if k]
+        from services.core.rate_limiter import get_rate_limiter
+        workers=get_rate_limiter().concurrency('google', list(dict.fromkeys(keys))) or 2
     else:
         key=api_key or ok
         if not key: raise RuntimeError("Chưa cấu hình OpenAI API Key cho GPT-4 Turbo.")
         # FIXED: Use gpt-4-turbo instead of gpt-5
-        res=_call_openai(prompt,key,"gpt-4-turbo")
+        call=lambda pr, cb=None, check=None, fresh=False: _call_openai(pr,key,"gpt-4-turbo",cb,bypass_cache or fresh,check)
+        workers=4
+    
+    sg=_script_gen_cfg()
+    emit=None
+    if on_scene and sg.get("stream", True):
+        def emit(i, sc):
+            if i < n:
+                sc["duration"]=int(per[i])
+                on_scene(i, _normalize_scene(sc))
+    chunk=max(4, int(sg.get("chunk_scenes") or LONG_CHUNK_SCENES))
+    if mode == "LONG" and n > chunk and sg.get("hierarchical", True):
+        res=_generate_long(call, prefix, idea, style, output_lang, n, per, mode, chunk,
+                           int(sg.get("workers") or 0) or workers, log, emit)
+    else:
+        # Build base prompt
+        res=call(prefix+_schema_prompt(idea=idea, style_vi=style, out_lang=output_lang, n=n, per=per, mode=mode), emit,
+                 lambda o: _script_ok(o) and len([sc for sc in o["scenes"] if _valid_scene(sc)]) >= n)
     if "scenes" not in res: raise RuntimeError("LLM không trả về đúng schema.")
     
     # Store voice configuration in result for consistency
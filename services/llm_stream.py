@@ -0,0 +1,177 @@
+# -*- coding: utf-8 -*-
+"""
+Streaming LLM responses with incremental delivery of array items.
+
+The script generators ask for one JSON object with a "scenes" array and used
+to wait minutes for the complete body. With the providers' streaming
+endpoints (Gemini :streamGenerateContent?alt=sse, OpenAI stream=true) the
+text arrives in pieces; JsonArrayStream scans it once and hands out every
+element of the target array as soon as its closing brace arrives, so the UI
+can show (and start working on) early scenes while later ones are written.
+"""
+import json
+import time
+from typing import Any, Callable, Dict, Iterator, List, Optional
+
+import requests
+
+from services.core.metrics import observe
+
+
+class JsonArrayStream:
+    """
+    Incremental scanner for the object items of one top-level array.
+
+    Args:
+        key: Name of the array inside the top-level JSON object
+    """
+
+    def __init__(self, key: str = "scenes"):
+        self.key = key
+        self.buf = ""
+        self.count = 0
+        self._i = 0
+        self._depth = 0
+        self._in_str = False
+        self._esc = False
+        self._str_start = 0
+        self._last_str = None
+        self._armed = False  # just saw '"key":' at depth 1
+        self._arr_depth = None  # depth inside the target array
+        self._elem_start = None
+        self._finished = False
+
+    def feed(self, text: str) -> List[Dict[str, Any]]:
+        """Add text; return the array items completed by it (in order)."""
+        self.buf += text or ""
+        out = []
+        buf = self.buf
+        i = self._i
+        while i < len(buf):
+            c = buf[i]
+            if self._in_str:
+                if self._esc:
+                    self._esc = False
+                elif c == "\\":
+                    self._esc = True
+                elif c == '"':
+                    self._in_str = False
+                    if self._depth == 1:
+                        self._last_str = buf[self._str_start + 1:i]
+            elif c == '"':
+                self._in_str = True
+                self._str_start = i
+                if self._depth == 1 and self._armed:
+                    self._armed = False  # string value, not our array
+            elif c == ":":
+                if self._depth == 1:
+                    self._armed = self._last_str == self.key and not self._finished
+            elif c in "{[":
+                if c == "[" and self._depth == 1 and self._armed:
+                    self._arr_depth = self._depth + 1
+                elif c == "{" and self._arr_depth is not None and self._depth == self._arr_depth:
+                    self._elem_start = i
+                self._armed = False
+                self._depth += 1
+            elif c in "}]":
+                self._depth -= 1
+                if self._arr_depth is not None:
+                    if c == "}" and self._depth == self._arr_depth and self._elem_start is not None:
+                        try:
+                            item = json.loads(buf[self._elem_start:i + 1])
+                        except ValueError:
+                            item = None
+                        self._elem_start = None
+                        if isinstance(item, dict):
+                            out.append(item)
+                            self.count += 1
+                    elif c == "]" and self._depth == self._arr_depth - 1:
+                        self._arr_depth = None
+                        self._finished = True
+            elif c == "," and self._depth == 1:
+                self._armed = False
+            i += 1
+        self._i = i
+        return out
+
+
+def collect(pieces: Iterator[str], on_item: Optional[Callable[[int, Dict[str, Any]], None]] = None,
+            key: str = "scenes") -> str:
+    """Join streamed text pieces, calling on_item(index, item) for each completed array item."""
+    parser = JsonArrayStream(key)
+    for piece in pieces:
+        for item in parser.feed(piece):
+            if on_item:
+                on_item(parser.count - 1, item)
+    return parser.buf
+
+
+def gemini_stream_url(url: str) -> str:
+    """generateContent URL -> streamGenerateContent with server-sent events."""
+    base, _, query = url.partition("?")
+    base = base.replace(":generateContent", ":streamGenerateContent")
+    return f"{base}?alt=sse" + (f"&{query}" if query else "")
+
+
+def _sse_data(resp, counter: Optional[List[int]] = None) -> Iterator[str]:
+    for line in resp.iter_lines(decode_unicode=True):
+        if counter is not None and line:
+            counter[0] += len(line) + 2
+        if line and line.startswith("data:"):
+            data = line[5:].strip()
+            if data and data != "[DONE]":
+                yield data
+
+
+def gemini_stream(url: str, body: Dict[str, Any], timeout: float = 240) -> Iterator[str]:
+    """Text pieces of a Gemini response; url is the normal generateContent URL (with ?key=)."""
+    t0, got, r, err = time.monotonic(), [0], None, None
+    try:
+        with requests.post(gemini_stream_url(url), json=body, timeout=timeout, stream=True) as r:
+            r.raise_for_status()
+            for data in _sse_data(r, got):
+                try:
+                    ev = json.loads(data)
+                except ValueError:
+                    continue
+                for cand in ev.get("candidates") or []:
+                    for part in (cand.get("content") or {}).get("parts") or []:
+                        if part.get("text"):
+                            yield part["text"]
+    except Exception as e:
+        err = e
+        raise
+    finally:
+        observe("gemini", gemini_stream_url(url), t0, response=r, error=err, bytes_in=got[0])
+
+
+def openai_stream(url: str, headers: Dict[str, str], body: Dict[str, Any], timeout: float = 240) -> Iterator[str]:
+    """Text pieces of an OpenAI chat completion (body gets stream=true)."""
+    t0, got, r, err = time.monotonic(), [0], None, None
+    key = (headers or {}).get("Authorization", "")[7:]
+    try:
+        with requests.post(url, headers=headers, json=dict(body, stream=True), timeout=timeout, stream=True) as r:
+            r.raise_for_status()
+            for data in _sse_data(r, got):
+                try:
+                    ev = json.loads(data)
+                except ValueError:
+                    continue
+                for ch in ev.get("choices") or []:
+                    txt = (ch.get("delta") or {}).get("content")
+                    if txt:
+                        yield txt
+    except Exception as e:
+        err = e
+        raise
+    finally:
+        observe("openai", url, t0, response=r, error=err, key=key, bytes_in=got[0])
+
+
+def streaming_enabled() -> bool:
+    """Optional 'script_gen' config flag {"stream": true} (default on)."""
+    try:
+        from services.core.config import load as load_config
+        return bool(((load_config() or {}).get("script_gen") or {}).get("stream", True))
+    except Exception:
+        return True
@@ -0,0 +1,376 @@
+# -*- coding: utf-8 -*-
+"""
+Process-wide Labs operation poller.
+
+Every panel/project registers its operation names here instead of running its
+own batch-check loop. One background thread:
+  - merges all pending operations that share a token set into maximally sized
+    batch_check_operations calls (other pending ops piggyback on due ones)
+  - schedules each operation adaptively from its age and the observed
+    completion time of earlier operations (EMA), backing off on errors
+  - publishes status changes to per-registration callbacks and global subscribers;
+    a late registrant immediately gets the last known status of each op
+  - token groups are checked concurrently on a small pool (one request in
+    flight per group), so a slow group does not hold up the others
+
+Usage:
+    poller = get_poller()
+    poller.register(names, client=client, owner=self, callback=on_update)
+    # or, from a worker thread:
+    for name, info in poller.iter_updates(names, client=client, timeout=600):
+        ...
+"""
+import math
+import queue
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+
+TERMINAL_STATUSES = {"COMPLETED", "DONE_NO_URL", "FAILED"}
+_RAW_TERMINAL = {"MEDIA_GENERATION_STATUS_SUCCESSFUL", "MEDIA_GENERATION_STATUS_SUCCEEDED", "MEDIA_GENERATION_STATUS_FAILED"}
+
+Callback = Callable[[str, Dict[str, Any], Any], None]
+
+
+def is_terminal(info: Dict[str, Any]) -> bool:
+    """True once an operation no longer needs polling."""
+    if (info or {}).get("status") in TERMINAL_STATUSES:
+        return True
+    raw = (info or {}).get("raw") or {}
+    return raw.get("status") in _RAW_TERMINAL
+
+
+def _status_key(info: Dict[str, Any]) -> Tuple[str, str]:
+    raw = (info or {}).get("raw") or {}
+    return (info or {}).get("status") or "", raw.get("status") or ""
+
+
+def _group_key(client) -> Any:
+    toks = getattr(client, "tokens", None)
+    if toks:
+        return ("tokens",) + tuple(toks)
+    key = getattr(client, "api_key", None)
+    if key:
+        return ("key", key)
+    return ("id", id(client))
+
+
+class _Op:
+    __slots__ = ("name", "group", "registered_at", "next_at", "checks", "last", "info", "watchers")
+
+    def __init__(self, name: str, group, now: float):
+        self.name = name
+        self.group = group
+        self.registered_at = now
+        self.next_at = now
+        self.checks = 0
+        self.last: Optional[Tuple[str, str]] = None
+        self.info: Optional[Dict[str, Any]] = None
+        self.watchers: List[Tuple[Any, Optional[Callback]]] = []
+
+
+class OperationPoller:
+    """
+    Shared background poller for Labs video operations.
+
+    Args:
+        max_batch: Operation names per batch-check request
+        min_interval: Shortest delay between checks of one operation (seconds)
+        max_interval: Longest delay between checks of one operation (seconds)
+        expected_duration: Initial guess of generation time, refined from observations
+        workers: Token groups checked at the same time
+        keep_done: Terminal statuses remembered for late registrants
+    """
+
+    def __init__(self, max_batch: int = 50, min_interval: float = 4.0, max_interval: float = 30.0,
+                 expected_duration: float = 90.0, workers: int = 4, keep_done: int = 2000):
+        self.max_batch = max(1, int(max_batch))
+        self.min_interval = max(0.5, float(min_interval))
+        self.max_interval = max(self.min_interval, float(max_interval))
+        self._expected = float(expected_duration)
+        self._ops: Dict[str, _Op] = {}
+        self._clients: Dict[Any, Any] = {}
+        self._done: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        self._keep_done = max(0, int(keep_done))
+        self._busy = set()  # groups with a check in flight
+        self._workers = max(1, int(workers))
+        self._pool: Optional[ThreadPoolExecutor] = None
+        self._subscribers: List[Callback] = []
+        self._check_listeners: List[Callable[[List[str], float, float, bool], None]] = []
+        self._cv = threading.Condition()
+        self._thread: Optional[threading.Thread] = None
+        self._stopped = False
+        self._stats = {"calls": 0, "ops_checked": 0, "errors": 0, "completed": 0}
+
+    # ---- public API -------------------------------------------------
+    def register(self, op_names: Iterable[str], client, owner: Any = None, callback: Optional[Callback] = None):
+        """
+        Start polling op_names with client; callback(name, info, owner) fires on every status change,
+        and right away with the last known status of ops that were already being polled or are finished.
+        """
+        group = _group_key(client)
+        now = time.monotonic()
+        known = []
+        with self._cv:
+            self._clients[group] = client  # newest client wins (fresh session / tokens)
+            for nm in op_names or []:
+                if not nm:
+                    continue
+                done = self._done.get(nm)
+                if done is not None:
+                    known.append((nm, done))
+                    continue
+                op = self._ops.get(nm)
+                if op is None:
+                    op = self._ops[nm] = _Op(nm, group, now)
+                if not any(o is owner and c is callback for o, c in op.watchers):
+                    op.watchers.append((owner, callback))
+                    if op.info is not None:
+                        known.append((nm, op.info))
+            self._ensure_thread()
+            self._cv.notify_all()
+        if callback:
+            for nm, info in known:
+                try:
+                    callback(nm, info, owner)
+                except Exception:
+                    pass
+
+    def unregister(self, op_names: Optional[Iterable[str]] = None, owner: Any = None):
+        """Drop watchers of owner (all watchers if owner is None) for op_names (all ops if None)."""
+        with self._cv:
+            names = list(self._ops) if op_names is None else list(op_names)
+            for nm in names:
+                op = self._ops.get(nm)
+                if op is None:
+                    continue
+                op.watchers = [] if owner is None else [w for w in op.watchers if w[0] is not owner]
+                if not op.watchers:
+                    self._ops.pop(nm, None)
+
+    def subscribe(self, callback: Callback):
+        with self._cv:
+            if callback not in self._subscribers:
+                self._subscribers.append(callback)
+
+    def unsubscribe(self, callback: Callback):
+        with self._cv:
+            if callback in self._subscribers:
+                self._subscribers.remove(callback)
+
+    def add_check_listener(self, callback: Callable[[List[str], float, float, bool], None]):
+        """callback(names, started, finished, error) after every batch-check request (monotonic times)."""
+        with self._cv:
+            if callback not in self._check_listeners:
+                self._check_listeners.append(callback)
+
+    def remove_check_listener(self, callback):
+        with self._cv:
+            if callback in self._check_listeners:
+                self._check_listeners.remove(callback)
+
+    def poke(self, op_names: Optional[Iterable[str]] = None):
+        """Check op_names (or everything) on the next tick."""
+        now = time.monotonic()
+        with self._cv:
+            for nm in (list(self._ops) if op_names is None else op_names):
+                op = self._ops.get(nm)
+                if op:
+                    op.next_at = now
+            self._cv.notify_all()
+
+    def pending(self, owner: Any = None) -> List[str]:
+        with self._cv:
+            return [n for n, op in self._ops.items() if owner is None or any(o is owner for o, _ in op.watchers)]
+
+    def stats(self) -> Dict[str, Any]:
+        with self._cv:
+            return dict(self._stats, pending=len(self._ops), expected_duration=round(self._expected, 1))
+
+    def iter_updates(self, op_names: Iterable[str], client, timeout: Optional[float] = None,
+                     should_stop: Optional[Callable[[], bool]] = None) -> Iterator[Tuple[str, Dict[str, Any]]]:
+        """Blocking helper for worker threads: yield (name, info) on each status change until all are terminal."""
+        q: "queue.Queue" = queue.Queue()
+        owner = object()
+        pending = {n for n in op_names or [] if n}
+        self.register(pending, client=client, owner=owner, callback=lambda n, info, _o: q.put((n, info)))
+        deadline = time.monotonic() + timeout if timeout else None
+        try:
+            while pending:
+                if should_stop and should_stop():
+                    return
+                if deadline and time.monotonic() >= deadline:
+                    return
+                try:
+                    n, info = q.get(timeout=0.5)
+                except queue.Empty:
+                    continue
+                if is_terminal(info):
+                    pending.discard(n)
+                yield n, info
+        finally:
+            self.unregister(list(pending), owner=owner)
+
+    def stop(self):
+        with self._cv:
+            self._stopped = True
+            self._cv.notify_all()
+        if self._pool is not None:
+            self._pool.shutdown(wait=False)
+            self._pool = None
+
+    # ---- scheduling -------------------------------------------------
+    def _ensure_thread(self):
+        if self._thread is None or not self._thread.is_alive():
+            self._stopped = False
+            if self._pool is None:
+                self._pool = ThreadPoolExecutor(max_workers=self._workers, thread_name_prefix="OperationCheck")
+            self._thread = threading.Thread(target=self._loop, name="OperationPoller", daemon=True)
+            self._thread.start()
+
+    def _interval(self, op: _Op, now: float) -> float:
+        """Sleep long while an op is young relative to typical completion, then poll tightly and back off."""
+        age = now - op.registered_at
+        warmup = self._expected * 0.6
+        if age < warmup:
+            iv = warmup - age
+        else:
+            overdue = max(0, op.checks - 1)
+            iv = self.min_interval * (1.25 ** min(overdue, 20))
+        return min(self.max_interval, max(self.min_interval, iv))
+
+    def _take_batches(self, now: float) -> List[Tuple[Any, List[str]]]:
+        batches = []
+        by_group: Dict[Any, List[_Op]] = {}
+        for op in self._ops.values():
+            if op.group not in self._busy:
+                by_group.setdefault(op.group, []).append(op)
+        for group, ops in by_group.items():
+            due = [op for op in ops if op.next_at <= now]
+            if not due:
+                continue
+            # top up with the soonest-due ops so every request is as full as possible
+            slots = math.ceil(len(due) / self.max_batch) * self.max_batch
+            rest = sorted((op for op in ops if op.next_at > now), key=lambda o: o.next_at)
+            chosen = due + rest[:max(0, slots - len(due))]
+            names = [op.name for op in chosen]
+            for i in range(0, len(names), self.max_batch):
+                batches.append((group, names[i:i + self.max_batch]))
+        return batches
+
+    def _loop(self):
+        while True:
+            with self._cv:
+                if self._stopped:
+                    return
+                now = time.monotonic()
+                batches = self._take_batches(now)
+                if not batches:
+                    wake = min((op.next_at for op in self._ops.values() if op.group not in self._busy), default=None)
+                    self._cv.wait(None if wake is None else max(0.05, wake - now))
+                    continue
+                by_group: Dict[Any, List[List[str]]] = {}
+                for g, names in batches:
+                    by_group.setdefault(g, []).append(names)
+                self._busy.update(by_group)
+                pool = self._pool
+            for g, chunks in by_group.items():
+                pool.submit(self._check_group, g, chunks)
+
+    def _check_group(self, group, chunks: List[List[str]]):
+        try:
+            for names in chunks:
+                with self._cv:
+                    client = self._clients.get(group)
+                self._check(client, names)
+        finally:
+            with self._cv:
+                self._busy.discard(group)
+                self._cv.notify_all()
+
+    def _check(self, client, names: List[str]):
+        started = time.monotonic()
+        try:
+            rs = client.batch_check_operations(names) or {}
+            err = False
+        except Exception:
+            rs, err = {}, True
+        now = time.monotonic()
+        events = []
+        with self._cv:
+            listeners = list(self._check_listeners)
+        for cb in listeners:
+            try:
+                cb(names, started, now, err)
+            except Exception:
+                pass
+        with self._cv:
+            self._stats["calls"] += 1
+            self._stats["ops_checked"] += len(names)
+            if err:
+                self._stats["errors"] += 1
+            for nm in names:
+                op = self._ops.get(nm)
+                if op is None:
+                    continue
+                op.checks += 1
+                info = rs.get(nm)
+                if err or info is None:
+                    op.next_at = now + min(self.max_interval, self._interval(op, now) * 2)
+                    continue
+                key = _status_key(info)
+                changed = key != op.last
+                op.last = key
+                op.info = info
+                if is_terminal(info):
+                    self._observe(now - op.registered_at)
+                    self._ops.pop(nm, None)
+                    if self._keep_done:
+                        self._done[nm] = info
+                        while len(self._done) > self._keep_done:
+                            self._done.popitem(last=False)
+                else:
+                    op.next_at = now + self._interval(op, now)
+                if changed:
+                    events.append((nm, info, list(op.watchers)))
+            subscribers = list(self._subscribers)
+        for nm, info, watchers in events:
+            for owner, cb in watchers:
+                if cb:
+                    try:
+                        cb(nm, info, owner)
+                    except Exception:
+                        pass
+            for cb in subscribers:
+                try:
+                    cb(nm, info, None)
+                except Exception:
+                    pass
+
+    def _observe(self, duration: float):
+        self._stats["completed"] += 1
+        self._expected = 0.8 * self._expected + 0.2 * max(self.min_interval, duration)
+
+
+_POLLER: Optional[OperationPoller] = None
+_POLLER_LOCK = threading.Lock()
+
+
+def get_poller() -> OperationPoller:
+    """Process-wide poller; tuning knobs come from the optional 'poller' config section."""
+    global _POLLER
+    with _POLLER_LOCK:
+        if _POLLER is None:
+            try:
+                from utils import config as cfg
+                c = (cfg.load() or {}).get("poller") or {}
+            except Exception:
+                c = {}
+            _POLLER = OperationPoller(max_batch=int(c.get("max_batch", 50)),
+                                      min_interval=float(c.get("min_interval_sec", 4.0)),
+                                      max_interval=float(c.get("max_interval_sec", 30.0)),
+                                      expected_duration=float(c.get("expected_duration_sec", 90.0)),
+                                      workers=int(c.get("workers", 4)))
+        return _POLLER
@@ -0,0 +1,250 @@
+# -*- coding: utf-8 -*-
+"""
+Cross-project scheduling for Labs video generation.
+
+StartGate (process-wide, get_start_gate()) sits in front of every start call
+of every SceneSubmitPipeline:
+  - start calls on one token are spaced by start_interval across *all*
+    projects, not per project
+  - while several projects wait for the same token, the grant goes to the
+    highest priority, then to the project that got the fewest grants so far
+    (fair-share interleaving instead of first come, first served)
+  - at most max_inflight_per_token operations per token are generating at
+    once; a slot frees when the shared OperationPoller reports the operation
+    terminal (or after op_ttl_sec as a safety net); the gate registers a full
+    token's operations with the poller itself, since projects usually only
+    start polling once all their scenes are submitted
+
+ProjectQueue holds the projects waiting to run and hands out up to
+max_projects at a time, highest priority first.
+
+Tuning from the optional 'scheduler' config section
+{"max_projects": 2, "max_inflight_per_token": 16, "op_ttl_sec": 1800}.
+"""
+import itertools
+import threading
+import time
+from typing import Dict, Iterable, List, Optional, Tuple
+
+PRIORITY_HIGH = 1
+PRIORITY_NORMAL = 0
+PRIORITY_LOW = -1
+
+
+class _Waiter:
+    __slots__ = ("project", "priority", "seq")
+
+    def __init__(self, project: str, priority: int, seq: int):
+        self.project = project
+        self.priority = priority
+        self.seq = seq
+
+
+class StartGate:
+    """
+    Args:
+        max_inflight_per_token: Generating operations allowed per token (0 = no cap)
+        op_ttl_sec: Operations never reported terminal free their slot after this long
+    """
+
+    def __init__(self, max_inflight_per_token: int = 16, op_ttl_sec: float = 1800.0):
+        self.max_inflight = max(0, int(max_inflight_per_token))
+        self.op_ttl = float(op_ttl_sec)
+        self._cv = threading.Condition()
+        self._seq = itertools.count()
+        self._waiting: Dict[str, List[_Waiter]] = {}
+        self._served: Dict[str, int] = {}
+        self._next_at: Dict[str, float] = {}
+        self._inflight: Dict[str, Dict[str, float]] = {}  # token -> {op name: started at}
+        self._op_token: Dict[str, str] = {}
+        self._op_client: Dict[str, object] = {}  # not yet registered with the poller
+        self._poller = None
+
+    # ---- start calls ------------------------------------------------
+    def _best(self, token: str) -> Optional[_Waiter]:
+        ws = self._waiting.get(token)
+        if not ws:
+            return None
+        return min(ws, key=lambda w: (-w.priority, self._served.get(w.project, 0), w.seq))
+
+    def _has_room(self, token: str, now: float) -> bool:
+        if not self.max_inflight:
+            return True
+        ops = self._inflight.get(token)
+        if not ops:
+            return True
+        for nm in [n for n, t in ops.items() if now - t > self.op_ttl]:
+            ops.pop(nm, None)
+            self._op_token.pop(nm, None)
+            self._op_client.pop(nm, None)
+        if len(ops) < self.max_inflight:
+            return True
+        self._poll(ops)
+        return False
+
+    def _poll(self, ops):
+        # token is full: make sure its operations are being polled so their slots come back
+        todo: Dict[int, Tuple[object, List[str]]] = {}
+        for nm in ops:
+            client = self._op_client.pop(nm, None)
+            if client is not None:
+                todo.setdefault(id(client), (client, []))[1].append(nm)
+        if not todo:
+            return
+        try:
+            poller = self._subscribe()
+            for client, names in todo.values():
+                poller.register(names, client=client, owner=self)
+        except Exception:
+            pass
+
+    def _subscribe(self):
+        # every terminal status seen by the shared poller frees a slot, whoever registered the operation
+        if self._poller is None:
+            from services.operation_poller import get_poller
+            self._poller = get_poller()
+            self._poller.subscribe(self._on_update)
+        return self._poller
+
+    def acquire(self, token: Optional[str], project: str = "", priority: int = PRIORITY_NORMAL,
+                interval: float = 0.0, stop_event: Optional[threading.Event] = None) -> bool:
+        """
+        Block until this project may call start on token. Returns False if
+        stop_event was set while waiting.
+        """
+        token = token or ""
+        with self._cv:
+            ws = self._waiting.setdefault(token, [])
+            if project not in self._served or not any(w.project == project for v in self._waiting.values() for w in v):
+                # a project (re)joining starts level with the others instead of claiming a backlog of turns
+                others = [self._served.get(w.project, 0) for v in self._waiting.values() for w in v]
+                self._served[project] = max(self._served.get(project, 0), min(others) if others else 0)
+            me = _Waiter(project, int(priority), next(self._seq))
+            ws.append(me)
+            try:
+                while True:
+                    if stop_event is not None and stop_event.is_set():
+                        return False
+                    now = time.monotonic()
+                    delay = 0.5
+                    if self._best(token) is me and self._has_room(token, now):
+                        wait = self._next_at.get(token, 0.0) - now
+                        if wait <= 0:
+                            self._served[project] = self._served.get(project, 0) + 1
+                            self._next_at[token] = now + max(0.0, float(interval))
+                            return True
+                        delay = min(delay, wait)
+                    self._cv.wait(delay)
+            finally:
+                ws.remove(me)
+                self._cv.notify_all()
+
+    def started(self, token: Optional[str], op_names: Iterable[str], client=None):
+        """Count op_names against token's in-flight cap; client is used to poll them once the token is full."""
+        names = [n for n in op_names or [] if n]
+        if not names or not self.max_inflight:
+            return
+        token = token or ""
+        now = time.monotonic()
+        try:
+            self._subscribe()
+        except Exception:
+            pass
+        with self._cv:
+            ops = self._inflight.setdefault(token, {})
+            for nm in names:
+                ops[nm] = now
+                self._op_token[nm] = token
+                if client is not None:
+                    self._op_client[nm] = client
+
+    def finished(self, op_name: str):
+        with self._cv:
+            token = self._op_token.pop(op_name, None)
+            self._op_client.pop(op_name, None)
+            if token is not None:
+                self._inflight.get(token, {}).pop(op_name, None)
+                self._cv.notify_all()
+
+    def _on_update(self, name, info, _owner):
+        from services.operation_poller import is_terminal
+        if is_terminal(info):
+            self.finished(name)
+
+    def stats(self) -> Dict[str, Dict[str, int]]:
+        with self._cv:
+            tokens = set(self._inflight) | set(self._waiting)
+            return {(t[-6:] if t else "-"): {"inflight": len(self._inflight.get(t, {})),
+                                              "waiting": len(self._waiting.get(t, []))} for t in tokens}
+
+
+class ProjectQueue:
+    """
+    Projects waiting to run; start() returns those that may begin now.
+
+    Args:
+        max_projects: Projects running at the same time
+    """
+
+    def __init__(self, max_projects: int = 2):
+        self.max_projects = max(1, int(max_projects))
+        self._seq = itertools.count()
+        self._pending: Dict[str, Tuple[int, int]] = {}  # name -> (priority, seq)
+        self.running: List[str] = []
+
+    def add(self, name: str, priority: int = PRIORITY_NORMAL):
+        if name not in self.running:
+            seq = self._pending.get(name, (0, next(self._seq)))[1]
+            self._pending[name] = (int(priority), seq)
+
+    def set_priority(self, name: str, priority: int):
+        if name in self._pending:
+            self._pending[name] = (int(priority), self._pending[name][1])
+
+    def remove(self, name: str):
+        self._pending.pop(name, None)
+        if name in self.running:
+            self.running.remove(name)
+
+    def done(self, name: str):
+        if name in self.running:
+            self.running.remove(name)
+
+    def start(self) -> List[str]:
+        """Move the next projects (highest priority, then queue order) into running."""
+        out = []
+        while self._pending and len(self.running) < self.max_projects:
+            name = min(self._pending, key=lambda n: (-self._pending[n][0], self._pending[n][1]))
+            del self._pending[name]
+            self.running.append(name)
+            out.append(name)
+        return out
+
+    def pending(self) -> List[str]:
+        return sorted(self._pending, key=lambda n: (-self._pending[n][0], self._pending[n][1]))
+
+    def idle(self) -> bool:
+        return not self._pending and not self.running
+
+
+def scheduler_config() -> Dict:
+    try:
+        from utils import config as cfg
+        return (cfg.load() or {}).get("scheduler") or {}
+    except Exception:
+        return {}
+
+
+_GATE: Optional[StartGate] = None
+_GATE_LOCK = threading.Lock()
+
+
+def get_start_gate() -> StartGate:
+    """Process-wide gate; sized from the optional 'scheduler' config section."""
+    global _GATE
+    with _GATE_LOCK:
+        if _GATE is None:
+            c = scheduler_config()
+            _GATE = StartGate(max_inflight_per_token=int(c.get("max_inflight_per_token", 16)),
+                              op_ttl_sec=float(c.get("op_ttl_sec", 1800)))
+        return _GATE
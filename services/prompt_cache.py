@@ -0,0 +1,101 @@
+# -*- coding: utf-8 -*-
+"""
+Compiled scene prompts.
+
+A compiled prompt is the prompt JSON of one scene, its pretty-printed text,
+the trimmed payload that is actually sent to Labs and the generation seed.
+Entries are keyed by everything that goes into the prompt (scene index and
+text, language, ratio, style, character bible version, voice settings, ...),
+so opening the prompt viewer again or resubmitting a scene costs a dict
+lookup, and the same inputs always give the same text and seed (stable
+journal prompt hashes, reproducible generations).
+"""
+import hashlib
+import json
+import threading
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Optional
+
+
+def _digest(obj: Any) -> str:
+    raw = json.dumps(obj, ensure_ascii=False, sort_keys=True, separators=(",", ":"), default=str)
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+def prompt_key(**parts) -> str:
+    return _digest(parts)
+
+
+def seed_for(key: str) -> int:
+    """Deterministic 31-bit seed for a prompt key."""
+    return int(key[:8], 16) & 0x7FFFFFFF
+
+
+def bible_version(character_bible=None, enhanced_bible=None) -> str:
+    """Short content hash of the character bible(s); changes whenever a character changes."""
+    enhanced = None
+    if enhanced_bible is not None:
+        try:
+            enhanced = enhanced_bible.to_dict()
+        except Exception:
+            enhanced = getattr(enhanced_bible, "characters", None)
+    if not character_bible and enhanced is None:
+        return ""
+    return _digest([character_bible or [], enhanced])[:16]
+
+
+class PromptCache:
+    """
+    Args:
+        max_entries: Least recently used entries are dropped beyond this count
+    """
+
+    def __init__(self, max_entries: int = 512):
+        self.max_entries = max(1, int(max_entries))
+        self._items: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            ent = self._items.get(key)
+            if ent is not None:
+                self._items.move_to_end(key)
+            return ent
+
+    def put(self, key: str, entry: Dict[str, Any]):
+        with self._lock:
+            self._items[key] = entry
+            self._items.move_to_end(key)
+            while len(self._items) > self.max_entries:
+                self._items.popitem(last=False)
+
+    def get_or_build(self, key: str, build: Callable[[], Dict[str, Any]]) -> Dict[str, Any]:
+        ent = self.get(key)
+        if ent is not None:
+            self.hits += 1
+            return ent
+        self.misses += 1
+        ent = build()
+        self.put(key, ent)
+        return ent
+
+    def clear(self):
+        with self._lock:
+            self._items.clear()
+
+    def stats(self) -> Dict[str, int]:
+        return {"hits": self.hits, "misses": self.misses, "entries": len(self._items)}
+
+
+_CACHE: Optional[PromptCache] = None
+_CACHE_LOCK = threading.Lock()
+
+
+def get_prompt_cache() -> PromptCache:
+    global _CACHE
+    with _CACHE_LOCK:
+        if _CACHE is None:
+            _CACHE = PromptCache()
+        return _CACHE
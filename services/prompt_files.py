@@ -0,0 +1,61 @@
+# -*- coding: utf-8 -*-
+"""
+Prompt/image input helpers shared by the project panel and the headless batch runner.
+"""
+import glob
+import json
+import os
+import re
+from typing import List
+
+IMAGE_GLOB = ("*.png","*.jpg","*.jpeg","*.webp","*.bmp")
+
+def safe_name(s: str)->str:
+    s = s or ""
+    s = s.lower().strip()
+    s = re.sub(r"\s+", "_", s)
+    s = re.sub(r"[^a-z0-9._-]+", "_", s)
+    s = re.sub(r"_+", "_", s).strip("_")
+    return s or "project"
+
+def parse_prompt_any(obj):
+    scenes=[]
+    def _to_text(p):
+        if isinstance(p, str):
+            return p
+        try:
+            return json.dumps(p, ensure_ascii=False)
+        except Exception:
+            return str(p)
+    if isinstance(obj, list):
+        for it in obj:
+            if isinstance(it, dict) and "prompt" in it:
+                scenes.append(_to_text(it["prompt"]))
+            else:
+                scenes.append(_to_text(it))
+    elif isinstance(obj, dict):
+        if "scenes" in obj and isinstance(obj["scenes"], list):
+            for it in obj["scenes"]:
+                if isinstance(it, dict) and "prompt" in it:
+                    scenes.append(_to_text(it["prompt"]))
+                else:
+                    scenes.append(_to_text(it))
+        elif "prompt" in obj:
+            scenes.append(_to_text(obj["prompt"]))
+        else:
+            scenes.append(_to_text(obj))
+    return scenes
+
+def parse_prompt_file(path):
+    try:
+        with open(path,"r",encoding="utf-8") as f:
+            obj=json.load(f)
+    except Exception:
+        return []
+    return parse_prompt_any(obj)
+
+def list_images(directory: str) -> List[str]:
+    """Image files of directory, sorted by name (scene order)."""
+    files=[]
+    for pat in IMAGE_GLOB: files.extend(glob.glob(os.path.join(directory, pat)))
+    return sorted(set(files))
@@ -18,6 +18,8 @@ _SEMAPHORES = {
     'google': threading.Semaphore(_limit('google', 5)),
     'openai': threading.Semaphore(_limit('openai', 5)),
     'elevenlabs': threading.Semaphore(_limit('elevenlabs', 3)),
+    'google_tts': threading.Semaphore(_limit('google_tts', 8)),
+    'openai_tts': threading.Semaphore(_limit('openai_tts', 4)),
 }
 
 @contextmanager
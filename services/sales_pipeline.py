@@ -1,8 +1,10 @@
 # -*- coding: utf-8 -*-
-import os, time
+import os
 from typing import List, Dict, Any
 from utils import config as cfg
-from services.labs_flow_service import LabsClient, DEFAULT_PROJECT_ID
+from services.labs_flow_service import LabsClient, DEFAULT_PROJECT_ID, _image_aspect
+from services.operation_poller import get_poller, is_terminal
+from services.utils.download_manager import get_download_manager
 
 _RATIO_MAP = {
     '16:9': 'VIDEO_ASPECT_RATIO_LANDSCAPE',
@@ -30,8 +32,8 @@ def start_pipeline(project_name:str, ratio_str:str, scenes:List[Dict[str,Any]],
 
     media_id = None
     try:
-        if product_imgs: media_id = client.upload_image_file(product_imgs[0])
-        elif model_imgs: media_id = client.upload_image_file(model_imgs[0])
+        if product_imgs: media_id = client.upload_image_file(product_imgs[0], _image_aspect(aspect))
+        elif model_imgs: media_id = client.upload_image_file(model_imgs[0], _image_aspect(aspect))
     except Exception:
         media_id = None
 
@@ -45,36 +47,31 @@ def start_pipeline(project_name:str, ratio_str:str, scenes:List[Dict[str,Any]],
             jobs.append({"scene": sc.get("index"), "copy": 1, "op": nm})
     return {"jobs": jobs, "project_id": proj_id}
 
-def poll_and_download(client:LabsClient, jobs:List[Dict[str,Any]], out_dir:str, on_progress=None, sleep_sec:int=5)->List[Dict[str,Any]]:
+def poll_and_download(client:LabsClient, jobs:List[Dict[str,Any]], out_dir:str, on_progress=None, sleep_sec:int=5, timeout:float=1800)->List[Dict[str,Any]]:
+    """Wait for jobs via the shared operation poller and download finished clips.
+
+    sleep_sec is kept for backward compatibility; check intervals are managed by the poller.
+    """
     os.makedirs(out_dir, exist_ok=True)
     done = []
-    ops = [j["op"] for j in jobs]
-    while ops:
-        rs = client.batch_check_operations(ops) or {}
-        new_ops = []
-        for j in jobs:
-            info = rs.get(j["op"]) or {}
-            st = info.get("status") or "PROCESSING"
-            if st in ("DONE","COMPLETED","DONE_NO_URL","FAILED","ERROR"):
-                url = (info.get("video_urls") or [None])[0]
-                if url and st in ("DONE","COMPLETED"):
-                    import requests
-                    fp = os.path.join(out_dir, f"scene_{j['scene']}_copy_{j['copy']}.mp4")
-                    try:
-                        r = requests.get(url, timeout=600); r.raise_for_status()
-                        with open(fp, "wb") as f: f.write(r.content)
-                        j["path"] = fp
-                    except Exception:
-                        pass
-                j["status"] = st
-                done.append(j)
-            else:
-                new_ops.append(j["op"])
-            if callable(on_progress):
-                try: on_progress(j, info)
-                except Exception: pass
-        ops = new_ops
-        if ops:
-            try: time.sleep(sleep_sec)
+    downloads = []
+    manager = get_download_manager()
+    by_op = {j["op"]: j for j in jobs}
+    for op, info in get_poller().iter_updates(list(by_op), client=client, timeout=timeout):
+        j = by_op.get(op)
+        if j is None: continue
+        st = info.get("status") or "PROCESSING"
+        if is_terminal(info):
+            url = (info.get("video_urls") or [None])[0]
+            if url and st in ("DONE","COMPLETED"):
+                fp = os.path.join(out_dir, f"scene_{j['scene']}_copy_{j['copy']}.mp4")
+                downloads.append((j, manager.submit(url, fp)))
+            j["status"] = st
+            done.append(j)
+        if callable(on_progress):
+            try: on_progress(j, info)
             except Exception: pass
+    for j, fut in downloads:
+        res = fut.result()
+        if res["ok"]: j["path"] = res["path"]
     return done
@@ -3,6 +3,7 @@ from typing import Dict, Any, List, Optional
 import datetime, json, re
 from pathlib import Path
 from services.gemini_client import GeminiClient, MissingAPIKey
+from services.llm_stream import streaming_enabled
 
 def _scene_count(total_sec:int)->int:
     return max(1, (int(total_sec)+8-1)//8)
@@ -184,7 +185,24 @@ Output MUST be valid JSON with this structure:
 }}"""
 
 
-def build_outline(cfg:Dict[str,Any])->Dict[str,Any]:
+def _outline_scene(sc:Dict[str,Any], cfg:Dict[str,Any], sceneCount:int, visualStyleString:str)->Dict[str,Any]:
+    struct = (((sc or {}).get("prompt",{}) or {}).get("Output_Format",{}) or {}).get("Structure",{}) or {}
+    img_prompt = _build_image_prompt(struct, visualStyleString)
+    return {
+        "index": sc.get("scene"),
+        "title": f"Cảnh {sc.get('scene')}",
+        "desc": sc.get("description",""),
+        "speech": sc.get("voiceover",""),
+        "emotion": struct.get("emotion", ""),
+        "duration": float(cfg.get("duration_sec", 32)) / sceneCount,
+        "prompt_video": json.dumps(sc.get("prompt",{}), ensure_ascii=False),
+        "prompt_image": img_prompt
+    }
+
+def build_outline(cfg:Dict[str,Any], on_scene=None, bypass_cache:bool=False)->Dict[str,Any]:
+    """on_scene(outline_scene) is called for each scene while the reply is still streaming.
+    LLM replies come from the on-disk cache for identical prompts unless bypass_cache (or cfg["bypass_llm_cache"])."""
+    bypass_cache = bypass_cache or bool(cfg.get("bypass_llm_cache"))
     sceneCount = _scene_count(int(cfg.get("duration_sec") or 0))
     models_json = cfg.get("first_model_json") or ""
     product_count = int(cfg.get("product_count") or 0)
@@ -197,7 +215,15 @@ def build_outline(cfg:Dict[str,Any])->Dict[str,Any]:
     
     client = GeminiClient()
     sys_prompt = _build_system_prompt(cfg, sceneCount, models_json, product_count)
-    raw = client.generate(sys_prompt, "Return ONLY the JSON object. No prose.", timeout=240)
+    visualStyleString = cfg.get("image_style") or "Cinematic"
+    on_item = None
+    if on_scene and streaming_enabled():
+        def on_item(i, sc):
+            if i < sceneCount:
+                sc.setdefault("scene", i + 1)
+                on_scene(_outline_scene(sc, cfg, sceneCount, visualStyleString))
+    raw = client.generate(sys_prompt, "Return ONLY the JSON object. No prose.", timeout=240, on_item=on_item,
+                          bypass_cache=bypass_cache, validate=_try_parse_json)
     script_json = _try_parse_json(raw)
 
     scenes = script_json.get("scenes", [])
@@ -211,29 +237,18 @@ def build_outline(cfg:Dict[str,Any])->Dict[str,Any]:
                            "prompt":{"Output_Format":{"Structure": {"character_details":"","setting_details":"","key_action":"","camera_direction":"","original_language_dialogue":"","dialogue_or_voiceover":""}}}})
     script_json["scenes"] = scenes
 
-    visualStyleString = cfg.get("image_style") or "Cinematic"
     outline_scenes = []
     outline_vi = ""
     for sc in scenes:
-        struct = (((sc or {}).get("prompt",{}) or {}).get("Output_Format",{}) or {}).get("Structure",{}) or {}
-        img_prompt = _build_image_prompt(struct, visualStyleString)
-        outline_scenes.append({
-            "index": sc.get("scene"),
-            "title": f"Cảnh {sc.get('scene')}",
-            "desc": sc.get("description",""),
-            "speech": sc.get("voiceover",""),
-            "emotion": struct.get("emotion", ""),
-            "duration": float(cfg.get("duration_sec", 32)) / sceneCount,
-            "prompt_video": json.dumps(sc.get("prompt",{}), ensure_ascii=False),
-            "prompt_image": img_prompt
-        })
+        outline_scenes.append(_outline_scene(sc, cfg, sceneCount, visualStyleString))
         outline_vi += f"Cảnh {sc.get('scene')}: {sc.get('description', '')}\n"
     
     # Generate social media content (3 versions)
     social_media = {"versions": []}
     try:
         social_prompt = _build_social_media_prompt(cfg, outline_vi)
-        social_raw = client.generate(social_prompt, "Return ONLY valid JSON.", timeout=120)
+        social_raw = client.generate(social_prompt, "Return ONLY valid JSON.", timeout=120,
+                                     bypass_cache=bypass_cache, validate=_try_parse_json)
         social_json = _try_parse_json(social_raw)
         social_media = social_json if "versions" in social_json else {"versions": []}
     except Exception:
@@ -260,7 +275,7 @@ def build_outline(cfg:Dict[str,Any])->Dict[str,Any]:
     try:
         # Extract character info from script if available
         existing_bible = script_json.get("character_bible", [])
-        video_concept = f"{idea} {content}"
+        video_concept = f"{cfg.get('idea') or ''} {cfg.get('product_main') or ''}"
         screenplay = json.dumps(script_json, ensure_ascii=False)
         
         # Create character bible
@@ -0,0 +1,261 @@
+# -*- coding: utf-8 -*-
+"""
+Concurrent scene submission pipeline for Labs video generation.
+
+Two stages replace the old upload -> start -> sleep loop:
+  1. uploads run in parallel on a small thread pool
+  2. a shared start queue is drained by one lane per Labs token; each lane
+     spaces its own start calls (start_interval) so tokens are rate limited
+     independently instead of the whole project waiting on one global sleep;
+     a lane whose token is cooling down in the token scheduler stops pulling
+     work while healthy lanes remain
+
+Every network call runs under services.resilience.acquire('labs'), so the
+configured provider concurrency still caps total in-flight requests. Start
+calls also pass the process-wide StartGate (services.project_scheduler), which
+interleaves projects sharing a token and caps generating operations per token.
+Progress is reported per scene as soon as it finishes, i.e. out of order.
+"""
+import heapq
+import itertools
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, List, Optional
+
+from services.google.labs_flow_client import _image_aspect
+from services.google.labs_token_scheduler import get_token_scheduler
+from services.project_scheduler import get_start_gate
+from services.resilience import acquire
+
+
+class _ReadyQueue:
+    """Start queue ordered by ready time: get() hands out the earliest item once it is ready."""
+
+    def __init__(self):
+        self._heap = []
+        self._seq = itertools.count()
+        self._cv = threading.Condition()
+
+    def put(self, item, ready_at: float = 0.0):
+        with self._cv:
+            heapq.heappush(self._heap, (ready_at, next(self._seq), item))
+            self._cv.notify_all()
+
+    def close(self, n: int):
+        """Queue n end markers (one per lane) behind every real item."""
+        for _ in range(n):
+            self.put(None, float("inf"))
+
+    def get(self, stop_event: threading.Event):
+        with self._cv:
+            while True:
+                if self._heap:
+                    ready_at, _, item = self._heap[0]
+                    wait = ready_at - time.monotonic()
+                    # once stopping, drain everything at once so each scene gets reported
+                    if item is None or wait <= 0 or stop_event.is_set():
+                        heapq.heappop(self._heap)
+                        return item
+                    self._cv.wait(min(wait, 0.5))
+                else:
+                    self._cv.wait(0.5)
+
+
+class _Lane:
+    """One Labs token with its own start-rate budget."""
+
+    def __init__(self, client):
+        self.client = client
+        toks = getattr(client, "tokens", None) or []
+        self.token = toks[0] if len(toks) == 1 else None
+        self.next_at = 0.0
+
+
+class SceneSubmitPipeline:
+    """
+    Submit many scenes concurrently.
+
+    Args:
+        client: LabsFlowClient (or compatible) holding one or more tokens
+        model: Video model key
+        aspect: VIDEO_ASPECT_RATIO_* value
+        copies: Videos per scene
+        project_id: Labs project id
+        upload_workers: Parallel uploads
+        start_interval: Minimum seconds between two start calls on the same token
+        settle_delay: Seconds between an image upload and the start call that uses it
+        on_log: callback(level, message)
+        on_row: callback(index, job) when a scene finishes submitting (any order)
+        on_progress: callback(percent, text)
+        timeline: Optional services.scene_timeline.SceneTimeline recording queue/upload/start spans
+        project: Name used for fair sharing of tokens between projects
+        priority: Start-gate priority (services.project_scheduler.PRIORITY_*)
+        gate: StartGate (default: the process-wide one)
+    """
+
+    def __init__(self, client, model: str, aspect: str, copies: int = 1, project_id: Optional[str] = None,
+                 upload_workers: int = 4, start_interval: float = 1.2, settle_delay: float = 1.0,
+                 on_log: Optional[Callable[[str, str], None]] = None,
+                 on_row: Optional[Callable[[int, Dict], None]] = None,
+                 on_progress: Optional[Callable[[int, str], None]] = None, timeline=None,
+                 project: str = "", priority: int = 0, gate=None):
+        self.client = client
+        self.model = model
+        self.aspect = aspect
+        self.copies = max(1, int(copies))
+        self.project_id = project_id
+        self.upload_workers = max(1, int(upload_workers))
+        self.start_interval = max(0.0, float(start_interval))
+        self.settle_delay = max(0.0, float(settle_delay))
+        self.on_log = on_log
+        self.on_row = on_row
+        self.on_progress = on_progress
+        self.timeline = timeline
+        self.project = project or str(id(self))
+        self.priority = int(priority)
+        self.gate = gate or get_start_gate()
+        self._t_run = 0.0
+        self._stop = threading.Event()
+        self._lock = threading.Lock()
+        self._done = 0
+        self._started = 0
+        self._total = 0
+        self._lanes = self._make_lanes(client)
+
+    @staticmethod
+    def _make_lanes(client) -> List[_Lane]:
+        tokens = list(getattr(client, "tokens", []) or [])
+        if len(tokens) <= 1:
+            return [_Lane(client)]
+        lanes = []
+        for t in tokens:
+            try:
+                lanes.append(_Lane(client.__class__([t], timeout=client.timeout, on_event=client.on_event)))
+            except Exception:
+                return [_Lane(client)]
+        return lanes
+
+    def stop(self):
+        self._stop.set()
+
+    def _log(self, level: str, msg: str):
+        if self.on_log:
+            try:
+                self.on_log(level, msg)
+            except Exception:
+                pass
+
+    def _finish(self, i: int, job: Dict, started: bool):
+        with self._lock:
+            self._done += 1
+            if started:
+                self._started += 1
+            done, total = self._done, self._total
+        if self.on_row:
+            try:
+                self.on_row(i, job)
+            except Exception:
+                pass
+        if self.on_progress:
+            try:
+                self.on_progress(int(done * 100 / max(1, total)), f"Đã gửi {done}/{total} cảnh")
+            except Exception:
+                pass
+
+    def _scene(self, i: int, job: Dict):
+        return job.get("scene_id") or i + 1
+
+    def _upload(self, i: int, job: Dict, starts: _ReadyQueue):
+        if self._stop.is_set():
+            self._finish(i, job, False)
+            return
+        t_up = time.monotonic()
+        if self.timeline:
+            self.timeline.complete(self._scene(i, job), "queue_upload", self._t_run, t_up)
+        try:
+            with acquire('labs'):
+                mid = self.client.upload_image_file(job["image_path"], _image_aspect(self.aspect))
+            if self.timeline:
+                self.timeline.complete(self._scene(i, job), "upload", t_up)
+            job["media_id"] = mid
+            self._log("HTTP", f"[{i + 1}/{self._total}] UPLOAD OK mediaId={mid}")
+        except Exception as e:
+            self._log("ERR", f"[{i + 1}/{self._total}] Upload lỗi: {e}")
+            job["status"] = "UPLOAD_FAILED"
+            self._finish(i, job, False)
+            return
+        now = time.monotonic()
+        starts.put((i, job, now), now + self.settle_delay)
+
+    def _lane_loop(self, lane: _Lane, starts: _ReadyQueue):
+        sched = get_token_scheduler()
+        while True:
+            # a lane whose token is cooling down (401/403/429) leaves the queue to healthy lanes
+            if lane.token and not sched.available(lane.token) and \
+                    any(sched.available(o.token) for o in self._lanes if o is not lane and o.token):
+                if not self._stop.wait(min(5.0, sched.cooldown_remaining(lane.token))):
+                    continue
+            # space this lane's own starts before taking work, so other lanes can pick up ready scenes meanwhile
+            wait = lane.next_at - time.monotonic()
+            if wait > 0:
+                self._stop.wait(wait)
+            # scenes still settling after their upload stay queued; lanes only take ready ones
+            item = starts.get(self._stop)
+            if item is None:
+                return
+            i, job, queued_at = item
+            if self._stop.is_set():
+                self._finish(i, job, False)
+                continue
+            # other projects on the same token take turns here; also waits for a free in-flight slot
+            if not self.gate.acquire(lane.token, self.project, self.priority, self.start_interval, self._stop):
+                self._finish(i, job, False)
+                continue
+            ok = False
+            t_start = time.monotonic()
+            if self.timeline:
+                self.timeline.complete(self._scene(i, job), "queue_start", queued_at, t_start,
+                                       lane=self._lanes.index(lane) + 1)
+            try:
+                with acquire('labs'):
+                    rc = lane.client.start_one(job, self.model, self.aspect, job.get("prompt", ""),
+                                               copies=self.copies, project_id=self.project_id, settle_delay=0)
+                ok = rc > 0
+                self.gate.started(lane.token, job.get("operation_names") or [], self.client)
+                if self.timeline:
+                    self.timeline.complete(self._scene(i, job), "start", t_start, refs=rc)
+                    self.timeline.submitted(self._scene(i, job), job.get("operation_names") or [])
+                self._log("HTTP", f"[{i + 1}/{self._total}] START OK -> {rc} ref(s).")
+            except Exception as e:
+                self._log("ERR", f"[{i + 1}/{self._total}] Start thất bại: {e}")
+            finally:
+                lane.next_at = time.monotonic() + self.start_interval
+            self._finish(i, job, ok)
+
+    def run(self, jobs: List[Dict]) -> int:
+        """Submit all jobs; blocks until every scene is started or failed. Returns started scene count."""
+        self._total = len(jobs)
+        self._done = self._started = 0
+        self._t_run = time.monotonic()
+        if not jobs:
+            return 0
+        starts = _ReadyQueue()
+        lanes = [threading.Thread(target=self._lane_loop, args=(ln, starts), daemon=True) for ln in self._lanes]
+        for t in lanes:
+            t.start()
+
+        with ThreadPoolExecutor(max_workers=self.upload_workers) as pool:
+            for i, job in enumerate(jobs):
+                if job.get("operation_names"):
+                    # already started (e.g. resumed from the job journal)
+                    self._finish(i, job, True)
+                elif job.get("image_path") and not job.get("media_id"):
+                    pool.submit(self._upload, i, job, starts)
+                else:
+                    starts.put((i, job, self._t_run))
+        # all uploads have queued their start (or failed) once the pool exits
+        starts.close(len(lanes))
+        for t in lanes:
+            t.join()
+        return self._started
@@ -0,0 +1,238 @@
+# -*- coding: utf-8 -*-
+"""
+Per-scene timeline of a project run, exported as Chrome trace-event JSON.
+
+Every scene gets its own track ("Cảnh N") with spans for each pipeline step:
+
+  queue_upload  waiting for a free upload worker
+  upload        image upload
+  queue_start   settle delay + per-token start spacing (our own sleeps)
+  start         start call
+  generate vN   start call returned -> operation vN finished on the server
+  poll          one batch status check covering the scene
+  status        operation status change (instant)
+  download vN   video download (queue_download = waiting for a download slot)
+  thumbnail     poster frame / thumbnail
+  upscale vN    4K upscale (queue_post = waiting for an ffmpeg slot)
+
+Open the written file in chrome://tracing or https://ui.perfetto.dev.
+critical_path() breaks the last scene to finish down into queueing,
+generation and transfer time, so it is obvious where a run spends its time.
+"""
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Dict, List, Optional, Tuple
+
+from services.operation_poller import is_terminal
+
+TRACE_NAME = "timeline.trace.json"
+
+# span name -> bucket reported by critical_path()
+_BUCKETS = {"queue_upload": "chờ", "queue_start": "chờ", "queue_download": "chờ", "queue_post": "chờ",
+            "upload": "upload", "start": "start", "generate": "tạo video", "download": "tải",
+            "thumbnail": "thumbnail", "upscale": "upscale"}
+
+
+def _bucket(name: str) -> str:
+    return _BUCKETS.get(name.split(" ", 1)[0], name)
+
+
+class SceneTimeline:
+    """
+    Args:
+        directory: Project folder the trace is written to
+        title: Process name shown in the trace viewer
+        filename: Trace file name
+    """
+
+    def __init__(self, directory: str, title: str = "project", filename: str = TRACE_NAME):
+        self.directory = directory
+        self.path = os.path.join(directory, filename)
+        self.title = title
+        self._t0 = time.monotonic()
+        self._wall0 = time.time()
+        self._lock = threading.Lock()
+        self._events: List[Dict[str, Any]] = []
+        self._tids: Dict[str, int] = {}
+        self._open: Dict[Tuple[str, str], float] = {}
+        self._ops: Dict[str, Tuple[str, int, float]] = {}  # op name -> (scene, copy, submitted at)
+        self._poller = None
+
+    # ---- recording --------------------------------------------------
+    def _tid(self, scene) -> int:
+        scene = str(scene)
+        tid = self._tids.get(scene)
+        if tid is None:
+            tid = self._tids[scene] = len(self._tids) + 1
+            self._events.append({"ph": "M", "name": "thread_name", "pid": 1, "tid": tid,
+                                 "args": {"name": f"Cảnh {scene}"}})
+            self._events.append({"ph": "M", "name": "thread_sort_index", "pid": 1, "tid": tid,
+                                 "args": {"sort_index": tid}})
+        return tid
+
+    def _us(self, t: float) -> int:
+        return int(max(0.0, t - self._t0) * 1e6)
+
+    def complete(self, scene, name: str, start: float, end: Optional[float] = None, cat: str = "pipeline", **args):
+        """Span from start to end (time.monotonic() values)."""
+        end = time.monotonic() if end is None else end
+        ev = {"ph": "X", "name": name, "cat": cat, "pid": 1, "ts": self._us(start),
+              "dur": max(0, int((end - start) * 1e6))}
+        if args:
+            ev["args"] = args
+        with self._lock:
+            ev["tid"] = self._tid(scene)
+            self._events.append(ev)
+
+    def instant(self, scene, name: str, cat: str = "pipeline", **args):
+        ev = {"ph": "i", "s": "t", "name": name, "cat": cat, "pid": 1, "ts": self._us(time.monotonic())}
+        if args:
+            ev["args"] = args
+        with self._lock:
+            ev["tid"] = self._tid(scene)
+            self._events.append(ev)
+
+    def begin(self, scene, name: str):
+        with self._lock:
+            self._open[(str(scene), name)] = time.monotonic()
+
+    def end(self, scene, name: str, cat: str = "pipeline", **args) -> Optional[float]:
+        """Close a span opened with begin(); returns its duration or None if it was never opened."""
+        with self._lock:
+            start = self._open.pop((str(scene), name), None)
+        if start is None:
+            return None
+        end = time.monotonic()
+        self.complete(scene, name, start, end, cat, **args)
+        return end - start
+
+    @contextmanager
+    def span(self, scene, name: str, cat: str = "pipeline", **args):
+        start = time.monotonic()
+        try:
+            yield args
+        finally:
+            self.complete(scene, name, start, None, cat, **args)
+
+    # ---- operations -------------------------------------------------
+    def submitted(self, scene, op_names: List[str], at: Optional[float] = None, first_copy: int = 1):
+        """Operations returned by the start call; their 'generate' spans start here (first registration wins)."""
+        at = time.monotonic() if at is None else at
+        with self._lock:
+            for ci, name in enumerate(op_names or []):
+                if name:
+                    self._ops.setdefault(name, (str(scene), ci + first_copy, at))
+
+    def op_status(self, op_name: str, info: Dict[str, Any]):
+        """Poller update of one operation; closes 'generate vN' once it is terminal."""
+        done = is_terminal(info)
+        with self._lock:
+            rec = self._ops.pop(op_name, None) if done else self._ops.get(op_name)
+        if rec is None:
+            return
+        scene, copy, at = rec
+        status = (info or {}).get("status") or ""
+        self.instant(scene, "status", cat="poll", copy=copy, status=status)
+        if done:
+            self.complete(scene, f"generate v{copy}", at, None, cat="server", status=status)
+
+    def on_check(self, names: List[str], started: float, finished: float, error: bool):
+        """OperationPoller check listener: one 'poll' span per scene covered by a batch check."""
+        with self._lock:
+            counts: Dict[str, int] = {}
+            for n in names:
+                rec = self._ops.get(n)
+                if rec is not None:
+                    counts[rec[0]] = counts.get(rec[0], 0) + 1
+        for scene, n in counts.items():
+            self.complete(scene, "poll", started, finished, cat="poll", ops=n, error=error)
+
+    def attach_poller(self, poller):
+        self.detach_poller()
+        try:
+            poller.add_check_listener(self.on_check)
+            self._poller = poller
+        except Exception:
+            self._poller = None
+
+    def detach_poller(self):
+        if self._poller is not None:
+            try:
+                self._poller.remove_check_listener(self.on_check)
+            except Exception:
+                pass
+            self._poller = None
+
+    # ---- analysis / export ------------------------------------------
+    def events(self) -> List[Dict[str, Any]]:
+        with self._lock:
+            return list(self._events)
+
+    def _spans(self) -> Dict[int, List[Dict[str, Any]]]:
+        out: Dict[int, List[Dict[str, Any]]] = {}
+        for ev in self.events():
+            if ev.get("ph") == "X" and ev.get("cat") != "poll":
+                out.setdefault(ev["tid"], []).append(ev)
+        return out
+
+    def critical_path(self) -> Dict[str, Any]:
+        """
+        Scene that finished last, with seconds per bucket (chờ / upload / start /
+        tạo video / tải / ...) and 'trống' for time no span covers on its track.
+        """
+        spans = self._spans()
+        if not spans:
+            return {}
+        tid = max(spans, key=lambda t: max(e["ts"] + e["dur"] for e in spans[t]))
+        evs = sorted(spans[tid], key=lambda e: e["ts"])
+        buckets: Dict[str, float] = {}
+        cursor = 0
+        for e in evs:
+            # parallel copies overlap; only count the part past what is already covered
+            end = e["ts"] + e["dur"]
+            if end <= cursor:
+                continue
+            start = max(e["ts"], cursor)
+            if start > cursor:
+                buckets["trống"] = buckets.get("trống", 0.0) + (start - cursor) / 1e6
+            b = _bucket(e["name"])
+            buckets[b] = buckets.get(b, 0.0) + (end - start) / 1e6
+            cursor = end
+        scene = next((k for k, v in self._tids.items() if v == tid), str(tid))
+        return {"scene": scene, "seconds": round(cursor / 1e6, 2),
+                "buckets": {k: round(v, 2) for k, v in sorted(buckets.items(), key=lambda kv: -kv[1])}}
+
+    def totals(self) -> Dict[str, float]:
+        """Seconds per bucket summed over all scenes (overlapping spans counted once each)."""
+        out: Dict[str, float] = {}
+        for evs in self._spans().values():
+            for e in evs:
+                b = _bucket(e["name"])
+                out[b] = out.get(b, 0.0) + e["dur"] / 1e6
+        return {k: round(v, 2) for k, v in sorted(out.items(), key=lambda kv: -kv[1])}
+
+    def summary_text(self) -> str:
+        cp = self.critical_path()
+        if not cp:
+            return "Timeline trống."
+        parts = ", ".join(f"{k} {v:.1f}s" for k, v in cp["buckets"].items())
+        return f"Cảnh chậm nhất: {cp['scene']} ({cp['seconds']:.1f}s) — {parts}"
+
+    def trace(self) -> Dict[str, Any]:
+        meta = [{"ph": "M", "name": "process_name", "pid": 1, "tid": 0, "args": {"name": self.title}}]
+        return {"traceEvents": meta + self.events(), "displayTimeUnit": "ms",
+                "otherData": {"title": self.title, "started": self._wall0,
+                              "critical_path": self.critical_path(), "totals": self.totals()}}
+
+    def export(self, path: Optional[str] = None) -> str:
+        """Write the trace (atomically) and return its path."""
+        path = path or self.path
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        tmp = path + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(self.trace(), f, ensure_ascii=False)
+        os.replace(tmp, path)
+        return path
@@ -1,8 +1,11 @@
 # -*- coding: utf-8 -*-
-import os, base64, json, requests, re
-from typing import List, Tuple
+import os, base64, hashlib, json, requests, re, threading, time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import Any, Callable, Dict, List, Optional, Tuple
 from services.core.config import load as load_config
 from services.core.key_manager import refresh, rotated_list
+from services.core.metrics import timed_request
+from services.resilience import acquire
 
 def _tokens_of(kinds:Tuple[str,...])->List[str]:
     out=[]; c=load_config(); refresh()
@@ -33,3 +36,197 @@ def _tokens_of(kinds:Tuple[str,...])->List[str]:
     except Exception:
         pass
     return arr
+
+
+# ---------------------------------------------------------------------------
+# Batched voice-over synthesis
+#
+# Every scene is synthesised in parallel: calls run under
+# services.resilience.acquire() and the shared rate limiter, both under a TTS
+# provider of their own (google_tts / openai_tts), so voice-overs neither wait
+# behind nor eat into the Gemini / GPT quota of the same keys. Audio is cached
+# on disk by sha256(provider, voice, text, prosody), so re-running a project
+# or changing one scene only pays for the lines that changed. Output goes to
+# <audio_dir>/scene_NNN.mp3 (scene_NNN.wav silence for scenes without text);
+# FinalCut places each file at the start of its scene's clip.
+#
+# Optional 'tts' config section:
+#     {"tts": {"workers": 8, "cache": true, "cache_max_mb": 500, "openai_model": "tts-1",
+#              "elevenlabs_model": "eleven_multilingual_v2", "auto_voiceover": false}}
+# auto_voiceover: synthesize every scene right after the script is generated
+# (text2video panel); off by default because each scene is a paid TTS call.
+# ---------------------------------------------------------------------------
+TTS_CACHE_DIR = os.path.join(os.path.expanduser("~"), ".veo_tts_cache")
+_KEY_KINDS = {"google": ("google", "google_tts"), "elevenlabs": ("elevenlabs",), "openai": ("openai",)}
+_LIMITS = {"google": "google_tts", "elevenlabs": "elevenlabs", "openai": "openai_tts"}
+_SCENE_FILE = re.compile(r"^scene_(\d+)\.(mp3|wav)$")
+
+def _opts()->Dict[str,Any]:
+    try: return (load_config() or {}).get("tts") or {}
+    except Exception: return {}
+
+def scene_text(scene:Dict[str,Any], field:str="text_tgt")->str:
+    """Voice-over text of a script scene: its dialogue lines (field, falling back to text_vi)."""
+    lines=[(d.get(field) or d.get("text_vi") or "").strip() for d in (scene.get("dialogues") or []) if isinstance(d, dict)]
+    return " ".join(l for l in lines if l) or (scene.get("voiceover") or "").strip()
+
+def tts_cache_key(provider:str, voice:str, text:str, prosody:Dict[str,Any]=None)->str:
+    h=hashlib.sha256()
+    for part in (provider or "", voice or "", text or "", json.dumps(prosody or {}, sort_keys=True)):
+        h.update(part.encode("utf-8")); h.update(b"\0")
+    return h.hexdigest()
+
+def _check(r):
+    if r.status_code>=400:
+        raise requests.HTTPError(f"{r.status_code} {r.text[:200]}", response=r)
+    return r
+
+def _google_tts(key:str, text:str, voice:str, prosody:Dict[str,Any])->bytes:
+    from services.voice_options import get_google_tts_ssml
+    ssml=get_google_tts_ssml(text, voice, prosody.get("style") or "storytelling", float(prosody.get("rate", 1.0)),
+                             int(prosody.get("pitch", 0)), prosody.get("volume"))
+    lang="-".join(voice.split("-")[:2]) if voice.count("-")>=2 else "vi-VN"
+    body={"input":{"ssml":ssml}, "voice":{"languageCode":lang, "name":voice}, "audioConfig":{"audioEncoding":"MP3"}}
+    r=_check(timed_request("POST", f"https://texttospeech.googleapis.com/v1/text:synthesize?key={key}",
+                           provider="google_tts", key=key, json=body, timeout=60))
+    return base64.b64decode(r.json().get("audioContent") or "")
+
+def _elevenlabs_tts(key:str, text:str, voice:str, prosody:Dict[str,Any])->bytes:
+    from services.voice_options import get_elevenlabs_settings
+    body={"text":text, "model_id":_opts().get("elevenlabs_model") or "eleven_multilingual_v2",
+          "voice_settings":get_elevenlabs_settings(prosody.get("style") or "storytelling",
+                                                   float(prosody.get("stability_adjust", 0.0)), float(prosody.get("style_adjust", 0.0)))}
+    r=_check(timed_request("POST", f"https://api.elevenlabs.io/v1/text-to-speech/{voice}", provider="elevenlabs", key=key,
+                           headers={"xi-api-key":key, "Accept":"audio/mpeg"}, json=body, timeout=120))
+    return r.content
+
+def _openai_tts(key:str, text:str, voice:str, prosody:Dict[str,Any])->bytes:
+    body={"model":_opts().get("openai_model") or "tts-1", "voice":voice or "alloy", "input":text, "response_format":"mp3",
+          "speed":max(0.25, min(4.0, float(prosody.get("rate", 1.0))))}
+    r=_check(timed_request("POST", "https://api.openai.com/v1/audio/speech", provider="openai", key=key,
+                           headers={"Authorization":f"Bearer {key}"}, json=body, timeout=120))
+    return r.content
+
+_SYNTH = {"google": _google_tts, "elevenlabs": _elevenlabs_tts, "openai": _openai_tts}
+
+def _remove(path:str):
+    try: os.remove(path)
+    except OSError: pass
+
+def _write_silence(path:str, seconds:float=0.1, rate:int=24000):
+    """Placeholder for a scene without voice-over (FinalCut pads it to the clip length)."""
+    import wave
+    with wave.open(path+".tmp", "wb") as w:
+        w.setnchannels(1); w.setsampwidth(2); w.setframerate(rate)
+        w.writeframes(b"\0\0"*int(rate*seconds))
+    os.replace(path+".tmp", path)
+
+class TTSEngine:
+    """
+    Args:
+        provider: 'google' | 'elevenlabs' | 'openai'
+        voice: Provider voice id
+        prosody: style / rate / pitch / volume / stability_adjust / style_adjust
+        keys: API keys (default: every configured key of the provider)
+        workers: Parallel scenes (default: 'tts.workers', 8); resilience.acquire still caps in-flight calls
+        cache_dir: Audio cache folder (None = no cache)
+        log: callable(str)
+    """
+
+    def __init__(self, provider:str, voice:str, prosody:Optional[Dict[str,Any]]=None, keys:Optional[List[str]]=None,
+                 workers:Optional[int]=None, cache_dir:Optional[str]=TTS_CACHE_DIR, log:Optional[Callable[[str],None]]=None):
+        if provider not in _SYNTH: raise ValueError(f"TTS provider không hỗ trợ: {provider}")
+        o=_opts()
+        self.provider=provider; self.voice=voice; self.prosody=dict(prosody or {})
+        self.limit=_LIMITS[provider]  # rate limiter / resilience provider name
+        self.keys=[k for k in (keys if keys is not None else _tokens_of(_KEY_KINDS[provider])) if k]
+        self.workers=max(1, int(workers or o.get("workers") or 8))
+        self.cache_dir=cache_dir if o.get("cache", True) else None
+        self.cache_max=int(float(o.get("cache_max_mb", 500))*1024*1024)
+        self.log=log or (lambda m: None)
+        self.hits=0; self.misses=0
+        self._lock=threading.Lock()
+        self._stop=threading.Event()
+
+    def stop(self): self._stop.set()
+
+    def _cache_path(self, key:str)->Optional[str]:
+        return os.path.join(self.cache_dir, key+".mp3") if self.cache_dir else None
+
+    def _prune(self):
+        try:
+            ents=[(e.stat().st_mtime, e.stat().st_size, e.path) for e in os.scandir(self.cache_dir) if e.name.endswith(".mp3")]
+        except OSError:
+            return
+        total=sum(s for _, s, _ in ents)
+        for _, size, path in sorted(ents):
+            if total<=self.cache_max: break
+            try: os.remove(path); total-=size
+            except OSError: pass
+
+    def synthesize(self, text:str)->Tuple[bytes, bool]:
+        """Audio bytes for text (cache first); returns (audio, from_cache)."""
+        key=tts_cache_key(self.provider, self.voice, text, self.prosody)
+        cp=self._cache_path(key)
+        if cp and os.path.isfile(cp):
+            with self._lock: self.hits+=1
+            os.utime(cp, None)
+            with open(cp, "rb") as f: return f.read(), True
+        with self._lock: self.misses+=1
+        if not self.keys: raise RuntimeError(f"Chưa có API key cho {self.provider}")
+        from services.core.rate_limiter import get_rate_limiter
+        def call(k):
+            with acquire(self.limit):
+                return _SYNTH[self.provider](k, text, self.voice, self.prosody)
+        audio=get_rate_limiter().call(self.limit, self.keys, call, stop_event=self._stop, log=self.log)
+        if not audio: raise RuntimeError("TTS trả về audio rỗng")
+        if cp:
+            try:
+                os.makedirs(self.cache_dir, exist_ok=True)
+                with open(cp+".tmp", "wb") as f: f.write(audio)
+                os.replace(cp+".tmp", cp)
+            except OSError:
+                pass
+        return audio, False
+
+    def _one(self, scene:int, text:str, out_dir:str)->Dict[str,Any]:
+        t0=time.monotonic(); dest=os.path.join(out_dir, f"scene_{int(scene):03d}.mp3")
+        res={"scene":scene, "path":dest, "ok":False, "cached":False, "seconds":0.0, "error":""}
+        try:
+            if self._stop.is_set(): raise RuntimeError("Đã dừng")
+            audio, res["cached"]=self.synthesize(text)
+            with open(dest+".tmp", "wb") as f: f.write(audio)
+            os.replace(dest+".tmp", dest)
+            _remove(os.path.join(out_dir, f"scene_{int(scene):03d}.wav"))
+            res["ok"]=True
+        except Exception as e:
+            res["error"]=str(e)[:200]
+        res["seconds"]=round(time.monotonic()-t0, 3)
+        return res
+
+    def synthesize_all(self, texts:Dict[int,str], out_dir:str, on_item:Optional[Callable[[Dict[str,Any]],None]]=None)->List[Dict[str,Any]]:
+        """
+        Synthesise {scene: text} into out_dir/scene_NNN.mp3 in parallel; results in scene order.
+        Scenes without text get a short silent scene_NNN.wav so every scene keeps its own file,
+        and files of scenes past the last one (left by a longer earlier script) are removed.
+        """
+        os.makedirs(out_dir, exist_ok=True)
+        todo={int(s): t.strip() for s, t in texts.items() if (t or "").strip()}
+        last=max((int(s) for s in texts), default=0)
+        for name in os.listdir(out_dir):
+            m=_SCENE_FILE.match(name)
+            if m and int(m.group(1))>last: _remove(os.path.join(out_dir, name))
+        for s in texts:
+            if int(s) not in todo:
+                _remove(os.path.join(out_dir, f"scene_{int(s):03d}.mp3"))
+                _write_silence(os.path.join(out_dir, f"scene_{int(s):03d}.wav"))
+        out=[]
+        with ThreadPoolExecutor(max_workers=min(self.workers, max(1, len(todo)))) as ex:
+            futs=[ex.submit(self._one, s, t, out_dir) for s, t in sorted(todo.items())]
+            for f in as_completed(futs):
+                r=f.result(); out.append(r)
+                if on_item:
+                    try: on_item(r)
+                    except Exception: pass
+        if self.cache_dir: self._prune()
+        return sorted(out, key=lambda r: r["scene"])
@@ -0,0 +1,232 @@
+# -*- coding: utf-8 -*-
+"""
+Parallel, resumable video download manager.
+
+- bounded worker pool so downloads never run inside a polling loop
+- large configurable chunks streamed into "<dest>.part"
+- HTTP Range resume of an existing .part after a failure or restart; the
+  source URL and ETag/Last-Modified are kept in "<dest>.part.json" and sent
+  back as If-Range, so a .part left by a different or changed file is
+  discarded instead of being completed with the wrong bytes
+- size verification against Content-Length / Content-Range before the
+  .part file is renamed into place
+- per-file throughput metrics (bytes, seconds, MB/s, resumed)
+"""
+import json
+import os
+import re
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, Optional
+from urllib.parse import urlparse
+
+import requests
+import requests.adapters
+
+from services.core.metrics import observe
+
+_RANGE_TOTAL = re.compile(r"/(\d+)\s*$")
+
+
+class DownloadError(Exception):
+    pass
+
+
+def _host(url: str) -> str:
+    return urlparse(url).hostname or "unknown"
+
+
+def _total_from_content_range(value: str) -> Optional[int]:
+    m = _RANGE_TOTAL.search(value or "")
+    return int(m.group(1)) if m else None
+
+
+def _source(url: str) -> str:
+    # signed media URLs get a fresh query string on every poll; the object is the path
+    u = urlparse(url)
+    return f"{u.scheme}://{u.netloc}{u.path}"
+
+
+def _read_meta(path: str) -> Dict[str, Any]:
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            meta = json.load(f)
+        return meta if isinstance(meta, dict) else {}
+    except (OSError, ValueError):
+        return {}
+
+
+def _write_meta(path: str, url: str, r):
+    meta = {"source": _source(url), "etag": r.headers.get("etag") or "",
+            "last_modified": r.headers.get("last-modified") or ""}
+    try:
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(meta, f)
+    except OSError:
+        pass
+
+
+def _remove(*paths: str):
+    for p in paths:
+        try:
+            os.remove(p)
+        except OSError:
+            pass
+
+
+class DownloadManager:
+    """
+    Args:
+        workers: Concurrent downloads
+        chunk_size: Bytes per streamed chunk
+        max_retries: Attempts per file (each retry resumes the .part file)
+        timeout: (connect, read) timeout in seconds
+        log_callback: Optional callable(str)
+    """
+
+    def __init__(self, workers: int = 4, chunk_size: int = 1024 * 1024, max_retries: int = 5,
+                 timeout=(15, 300), log_callback: Optional[Callable[[str], None]] = None):
+        self.workers = max(1, int(workers))
+        self.chunk_size = max(64 * 1024, int(chunk_size))
+        self.max_retries = max(1, int(max_retries))
+        self.timeout = timeout
+        self.log = log_callback or (lambda msg: None)
+        self._pool = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="download")
+        self._inflight: Dict[str, Future] = {}
+        self._metrics: List[Dict[str, Any]] = []
+        self._lock = threading.Lock()
+        self._sess = requests.Session()
+        adapter = requests.adapters.HTTPAdapter(pool_connections=4, pool_maxsize=self.workers * 2)
+        self._sess.mount("https://", adapter)
+        self._sess.mount("http://", adapter)
+
+    def submit(self, url: str, dest: str, on_done: Optional[Callable[[Dict[str, Any]], None]] = None) -> Future:
+        """Queue a download; a second submit for the same dest returns the in-flight future."""
+        with self._lock:
+            fut = self._inflight.get(dest)
+            if fut is None or fut.done():
+                fut = self._pool.submit(self._run, url, dest)
+                self._inflight[dest] = fut
+        if on_done:
+            fut.add_done_callback(lambda f: on_done(f.result()))
+        return fut
+
+    def download(self, url: str, dest: str) -> Dict[str, Any]:
+        """Blocking download with retries + resume; returns the result dict (see _run)."""
+        return self._run(url, dest)
+
+    def metrics(self) -> List[Dict[str, Any]]:
+        with self._lock:
+            return list(self._metrics)
+
+    def shutdown(self, wait: bool = True):
+        self._pool.shutdown(wait=wait)
+
+    def _run(self, url: str, dest: str) -> Dict[str, Any]:
+        part = dest + ".part"
+        t0 = time.monotonic()
+        start_size = os.path.getsize(part) if os.path.exists(part) else 0
+        result = {"url": url, "path": dest, "ok": False, "bytes": 0, "seconds": 0.0, "mbps": 0.0,
+                  "resumed": start_size > 0, "attempts": 0, "error": ""}
+        os.makedirs(os.path.dirname(dest) or ".", exist_ok=True)
+        for attempt in range(1, self.max_retries + 1):
+            result["attempts"] = attempt
+            ta = time.monotonic()
+            have = os.path.getsize(part) if os.path.exists(part) else 0
+            try:
+                status = self._fetch(url, part)
+                observe("download", url, ta, status=status, retries=attempt - 1, endpoint=_host(url),
+                        bytes_in=os.path.getsize(part) - have)
+                os.replace(part, dest)
+                _remove(part + ".json")
+                result["ok"] = True
+                result["error"] = ""
+                break
+            except Exception as e:
+                observe("download", url, ta, status=getattr(getattr(e, "response", None), "status_code", 0),
+                        error=e, retries=attempt - 1, endpoint=_host(url),
+                        bytes_in=max(0, (os.path.getsize(part) if os.path.exists(part) else 0) - have))
+                result["error"] = str(e)
+                self.log(f"[Download] {os.path.basename(dest)} lỗi ({attempt}/{self.max_retries}): {e}")
+                if attempt < self.max_retries:
+                    time.sleep(min(10.0, 1.5 * attempt))
+        elapsed = max(1e-6, time.monotonic() - t0)
+        fetched = (os.path.getsize(dest) if result["ok"] else
+                   (os.path.getsize(part) if os.path.exists(part) else 0)) - start_size
+        result["bytes"] = max(0, fetched)
+        result["seconds"] = round(elapsed, 3)
+        result["mbps"] = round(result["bytes"] / elapsed / (1024 * 1024), 2)
+        with self._lock:
+            self._metrics.append(result)
+            del self._metrics[:-500]
+        if result["ok"]:
+            self.log(f"[Download] ✓ {os.path.basename(dest)} {result['bytes'] / 1048576:.1f} MB @ {result['mbps']} MB/s")
+        return result
+
+    def _fetch(self, url: str, part: str):
+        meta_path = part + ".json"
+        have = os.path.getsize(part) if os.path.exists(part) else 0
+        meta = _read_meta(meta_path) if have else {}
+        if have and meta.get("source") != _source(url):
+            # no record of where this .part came from, or it belongs to another file
+            _remove(part, meta_path)
+            have, meta = 0, {}
+        headers = {}
+        if have:
+            headers["Range"] = f"bytes={have}-"
+            etag = meta.get("etag") or ""
+            # If-Range needs a strong validator; the server sends the whole file if it changed
+            validator = etag if etag and not etag.startswith("W/") else meta.get("last_modified")
+            if validator:
+                headers["If-Range"] = validator
+        with self._sess.get(url, headers=headers, stream=True, timeout=self.timeout, allow_redirects=True) as r:
+            if r.status_code == 416 and have:
+                total = _total_from_content_range(r.headers.get("content-range", ""))
+                if total == have:
+                    return r.status_code  # .part already complete
+                _remove(part, meta_path)
+                raise DownloadError("stale partial file discarded (HTTP 416)")
+            r.raise_for_status()
+            if r.status_code == 206:
+                etag = r.headers.get("etag") or ""
+                if meta.get("etag") and etag and etag != meta["etag"]:
+                    _remove(part, meta_path)
+                    raise DownloadError("source changed since the partial download (ETag mismatch)")
+                total = _total_from_content_range(r.headers.get("content-range", ""))
+                mode = "ab"
+            else:
+                # server ignored Range or If-Range did not match -> start over
+                total = int(r.headers.get("content-length") or 0) or None
+                mode = "wb"
+                _write_meta(meta_path, url, r)
+            with open(part, mode) as f:
+                for chunk in r.iter_content(self.chunk_size):
+                    if chunk:
+                        f.write(chunk)
+        size = os.path.getsize(part)
+        if size == 0:
+            raise DownloadError("empty response")
+        if total is not None and size != total:
+            raise DownloadError(f"size mismatch {size}/{total} bytes")
+        return r.status_code
+
+
+_MANAGER: Optional[DownloadManager] = None
+_MANAGER_LOCK = threading.Lock()
+
+
+def get_download_manager() -> DownloadManager:
+    """Process-wide manager; sized from the optional 'download' config section."""
+    global _MANAGER
+    with _MANAGER_LOCK:
+        if _MANAGER is None:
+            try:
+                from utils import config as cfg
+                c = (cfg.load() or {}).get("download") or {}
+            except Exception:
+                c = {}
+            _MANAGER = DownloadManager(workers=int(c.get("workers", 4)),
+                                       chunk_size=int(c.get("chunk_size_kb", 1024)) * 1024,
+                                       max_retries=int(c.get("max_retries", 5)))
+        return _MANAGER
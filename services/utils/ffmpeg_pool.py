@@ -0,0 +1,210 @@
+# -*- coding: utf-8 -*-
+"""
+Background ffmpeg post-processing (thumbnails, 4K upscale).
+
+- bounded pool: at most `workers` ffmpeg processes run at once, the rest wait
+  in the queue, so post-processing never runs inside a polling loop
+- progress parsed from ffmpeg's stderr ("Duration: ..." / "time=...")
+- cancel(future) drops a queued task or terminates a running process;
+  cancel_all() does that for everything
+- per-task result dict: ok, returncode, seconds, cancelled, error
+
+Sized from the optional 'ffmpeg' config section
+{"workers": 2, "binary": "ffmpeg", "upscale_preset": "fast"}.
+"""
+import os
+import re
+import shutil
+import subprocess
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, Optional
+
+_DURATION = re.compile(r"Duration:\s*(\d+):(\d+):(\d+(?:\.\d+)?)")
+_TIME = re.compile(r"time=\s*(\d+):(\d+):(\d+(?:\.\d+)?)")
+
+Progress = Callable[[int, float], None]  # (percent, seconds processed)
+
+
+def _seconds(m) -> float:
+    return int(m.group(1)) * 3600 + int(m.group(2)) * 60 + float(m.group(3))
+
+
+def thumbnail_args(src: str, dst: str) -> List[str]:
+    return ["-y", "-ss", "00:00:00", "-i", src, "-frames:v", "1", "-q:v", "3", dst]
+
+
+def upscale_args(src: str, dst: str, width: int = 3840, preset: str = "fast") -> List[str]:
+    return ["-y", "-i", src, "-vf", f"scale={int(width)}:-2", "-c:v", "libx264", "-preset", preset, dst]
+
+
+class _Task:
+    __slots__ = ("args", "label", "duration", "on_progress", "cwd", "proc", "cancelled")
+
+    def __init__(self, args, label, duration, on_progress, cwd=None):
+        self.args = args
+        self.cwd = cwd
+        self.label = label
+        self.duration = duration
+        self.on_progress = on_progress
+        self.proc: Optional[subprocess.Popen] = None
+        self.cancelled = False
+
+
+class FfmpegPool:
+    """
+    Args:
+        workers: Concurrent ffmpeg processes
+        binary: ffmpeg executable (name on PATH or full path)
+        log_callback: Optional callable(str)
+    """
+
+    def __init__(self, workers: int = 2, binary: str = "ffmpeg", log_callback: Optional[Callable[[str], None]] = None):
+        self.workers = max(1, int(workers))
+        self.binary = binary or "ffmpeg"
+        self.log = log_callback or (lambda msg: None)
+        self._pool = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="ffmpeg")
+        self._tasks: Dict[Future, _Task] = {}
+        self._lock = threading.Lock()
+
+    def available(self) -> bool:
+        return bool(shutil.which(self.binary))
+
+    def submit(self, args: List[str], label: str = "", duration: Optional[float] = None,
+               on_progress: Optional[Progress] = None,
+               on_done: Optional[Callable[[Dict[str, Any]], None]] = None, cwd: Optional[str] = None) -> Future:
+        """
+        Queue `ffmpeg <args>` (run in cwd if given). duration (seconds of input) is read
+        from ffmpeg's own output when not given; on_progress(percent, seconds) runs on the pool thread.
+        """
+        task = _Task(list(args), label or os.path.basename(args[-1] if args else ""), duration, on_progress, cwd)
+        with self._lock:
+            fut = self._pool.submit(self._run, task)
+            self._tasks[fut] = task
+        fut.add_done_callback(self._forget)
+        if on_done:
+            fut.add_done_callback(lambda f: on_done(f.result() if not f.cancelled() else
+                                                    {"label": task.label, "ok": False, "cancelled": True,
+                                                     "returncode": None, "seconds": 0.0, "error": "cancelled"}))
+        return fut
+
+    def cancel(self, fut: Future) -> bool:
+        """Drop a queued task or terminate its running ffmpeg process."""
+        with self._lock:
+            task = self._tasks.get(fut)
+        if task is None:
+            return False
+        task.cancelled = True
+        if fut.cancel():
+            return True
+        proc = task.proc
+        if proc is not None and proc.poll() is None:
+            try:
+                proc.terminate()
+            except OSError:
+                pass
+        return True
+
+    def cancel_all(self):
+        with self._lock:
+            futs = list(self._tasks)
+        for f in futs:
+            self.cancel(f)
+
+    def pending(self) -> int:
+        with self._lock:
+            return len(self._tasks)
+
+    def shutdown(self, wait: bool = True):
+        if not wait:
+            self.cancel_all()
+        self._pool.shutdown(wait=wait)
+
+    def _forget(self, fut: Future):
+        with self._lock:
+            self._tasks.pop(fut, None)
+
+    def _run(self, task: _Task) -> Dict[str, Any]:
+        t0 = time.monotonic()
+        res = {"label": task.label, "ok": False, "cancelled": False, "returncode": None, "seconds": 0.0, "error": ""}
+        if task.cancelled:
+            res.update(cancelled=True, error="cancelled")
+            return res
+        tail: List[str] = []
+        try:
+            task.proc = proc = subprocess.Popen([self.binary, "-hide_banner", "-nostdin"] + task.args,
+                                                stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, cwd=task.cwd)
+            if task.cancelled:  # cancelled while the process was starting
+                proc.terminate()
+            self._read_progress(task, proc, tail)
+            res["returncode"] = proc.wait()
+            res["ok"] = res["returncode"] == 0 and not task.cancelled
+        except OSError as e:
+            res["error"] = str(e)
+        res["cancelled"] = task.cancelled
+        if not res["ok"] and not res["error"]:
+            res["error"] = "cancelled" if task.cancelled else (tail[-1] if tail else f"exit {res['returncode']}")
+        res["seconds"] = round(time.monotonic() - t0, 3)
+        if not res["ok"] and not task.cancelled:
+            self.log(f"[ffmpeg] {task.label} lỗi: {res['error']}")
+        return res
+
+    @staticmethod
+    def _read_progress(task: _Task, proc: subprocess.Popen, tail: List[str]):
+        # ffmpeg rewrites its status line with \r, so split on both line endings
+        buf = b""
+        last = -1
+        while True:
+            chunk = proc.stderr.read1(4096) if hasattr(proc.stderr, "read1") else proc.stderr.read(4096)
+            if not chunk:
+                break
+            buf += chunk
+            parts = re.split(rb"[\r\n]", buf)
+            buf = parts.pop()
+            for raw in parts:
+                line = raw.decode("utf-8", "replace").strip()
+                if not line:
+                    continue
+                tail.append(line)
+                del tail[:-5]
+                if task.duration is None:
+                    m = _DURATION.search(line)
+                    if m:
+                        task.duration = _seconds(m)
+                m = _TIME.search(line)
+                if m and task.on_progress and task.duration:
+                    done = _seconds(m)
+                    pct = max(0, min(100, int(done * 100 / task.duration)))
+                    if pct != last:
+                        last = pct
+                        try:
+                            task.on_progress(pct, done)
+                        except Exception:
+                            pass
+
+
+_POOL: Optional[FfmpegPool] = None
+_POOL_LOCK = threading.Lock()
+
+
+def get_ffmpeg_pool() -> FfmpegPool:
+    """Process-wide pool; sized from the optional 'ffmpeg' config section."""
+    global _POOL
+    with _POOL_LOCK:
+        if _POOL is None:
+            try:
+                from utils import config as cfg
+                c = (cfg.load() or {}).get("ffmpeg") or {}
+            except Exception:
+                c = {}
+            _POOL = FfmpegPool(workers=int(c.get("workers", 2)), binary=c.get("binary") or "ffmpeg")
+        return _POOL
+
+
+def upscale_preset() -> str:
+    try:
+        from utils import config as cfg
+        return ((cfg.load() or {}).get("ffmpeg") or {}).get("upscale_preset") or "fast"
+    except Exception:
+        return "fast"
@@ -1,22 +1,23 @@
 """Shared video download logic"""
-import os, requests
+import os
+
+from services.utils.download_manager import get_download_manager
+
 
 class VideoDownloader:
-    def __init__(self, log_callback=None):
+    def __init__(self, log_callback=None, manager=None):
         self.log = log_callback or print
-    
+        self.manager = manager or get_download_manager()
+
     def download(self, url: str, output_path: str, timeout=300) -> str:
+        """Blocking, resumable download (Range into .part); raises on failure."""
         self.log(f"[Download] {os.path.basename(output_path)}")
-        with requests.get(url, stream=True, timeout=timeout, allow_redirects=True) as r:
-            r.raise_for_status()
-            total = int(r.headers.get('content-length', 0))
-            downloaded = 0
-            with open(output_path, 'wb') as f:
-                for chunk in r.iter_content(8192):
-                    if chunk:
-                        f.write(chunk)
-                        downloaded += len(chunk)
-        if not os.path.exists(output_path) or os.path.getsize(output_path) == 0:
-            raise Exception("Download failed")
-        self.log(f"[Download] ✓ Complete")
+        res = self.manager.download(url, output_path)
+        if not res["ok"]:
+            raise Exception(f"Download failed: {res['error']}")
+        self.log(f"[Download] ✓ Complete ({res['mbps']} MB/s)")
         return output_path
+
+    def submit(self, url: str, output_path: str, on_done=None):
+        """Queue a download on the shared worker pool; on_done(result) runs on a pool thread."""
+        return self.manager.submit(url, output_path, on_done=on_done)
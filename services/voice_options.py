@@ -125,6 +125,25 @@ def get_voice_info(provider: str, voice_id: str):
             return voice
     return None
 
+def get_voice_config(provider: str, voice_id: str, language_code: str = "vi") -> Dict[str, Any]:
+    """Voice selection stored with a script and used to synthesise its voice-over
+    
+    Args:
+        provider: Provider key
+        voice_id: Voice ID
+        language_code: Output language code
+    
+    Returns:
+        Dictionary with provider, voice_id, language_code and voice_name
+    """
+    info = get_voice_info(provider, voice_id) or {}
+    return {
+        "provider": provider,
+        "voice_id": voice_id,
+        "language_code": language_code,
+        "voice_name": info.get("name", voice_id)
+    }
+
 def get_default_voice(provider: str, language: str = "vi"):
     """Get default voice for a provider and language
     
@@ -10,6 +10,8 @@ import time
 import uuid
 from typing import Optional, Dict, Any, Callable
 
+from utils.image_utils import prepare_upload_image
+
 
 class WhiskError(Exception):
     """Whisk API error"""
@@ -46,12 +48,13 @@ def caption_image(image_path: str, log_callback: Optional[Callable] = None) -> O
             log_callback(msg)
     
     try:
-        # Read and encode image
-        with open(image_path, 'rb') as f:
+        # Downscale/re-encode, then read and encode image
+        upload_path, mime = prepare_upload_image(image_path)
+        with open(upload_path, 'rb') as f:
             image_data = f.read()
         
         b64_image = base64.b64encode(image_data).decode('utf-8')
-        data_uri = f"data:image/png;base64,{b64_image}"
+        data_uri = f"data:{mime};base64,{b64_image}"
         
         # Generate IDs
         workflow_id = str(uuid.uuid4())
@@ -132,12 +135,13 @@ def upload_image_whisk(image_path: str, workflow_id: str, session_id: str, log_c
             log_callback(msg)
     
     try:
-        # Read and encode image
-        with open(image_path, 'rb') as f:
+        # Downscale/re-encode, then read and encode image
+        upload_path, mime = prepare_upload_image(image_path)
+        with open(upload_path, 'rb') as f:
             image_data = f.read()
         
         b64_image = base64.b64encode(image_data).decode('utf-8')
-        data_uri = f"data:image/png;base64,{b64_image}"
+        data_uri = f"data:{mime};base64,{b64_image}"
         
         url = "https://labs.google/fx/api/trpc/backbone.uploadImage"
         
@@ -2,13 +2,13 @@ import datetime
 import glob
 import json
 import os
-import re
 import shutil
 import time
 import webbrowser
+from concurrent.futures import as_completed
 
-from PyQt5.QtCore import QByteArray, QObject, Qt, QThread, QTimer, pyqtSignal
-from PyQt5.QtGui import QFont, QIcon, QPixmap
+from PyQt5.QtCore import QObject, Qt, QThread, QTimer, pyqtSignal
+from PyQt5.QtGui import QFont, QIcon
 from PyQt5.QtWidgets import (
     QAbstractItemView,
     QApplication,
@@ -23,8 +23,7 @@ from PyQt5.QtWidgets import (
     QPushButton,
     QSpinBox,
     QSplitter,
-    QTableWidget,
-    QTableWidgetItem,
+    QTableView,
     QTextEdit,
     QVBoxLayout,
     QWidget,
@@ -40,63 +39,29 @@ except Exception:  # pragma: no cover
 
 try:
     from services.google.labs_flow_client import DEFAULT_PROJECT_ID, LabsFlowClient
+    from services.job_journal import JobJournal, apply_record as _apply_record, prompt_hash
+    from services.operation_poller import get_poller, is_terminal
+    from services.prompt_files import IMAGE_GLOB, parse_prompt_any, safe_name
+    from services.scene_submit_pipeline import SceneSubmitPipeline
+    from services.scene_timeline import SceneTimeline
     from services.utils.video_downloader import VideoDownloader
 except Exception:  # pragma: no cover
     from google.labs_flow_client import DEFAULT_PROJECT_ID, LabsFlowClient
+    from job_journal import JobJournal, apply_record as _apply_record, prompt_hash
+    from operation_poller import get_poller, is_terminal
+    from prompt_files import IMAGE_GLOB, parse_prompt_any, safe_name
+    from scene_submit_pipeline import SceneSubmitPipeline
+    from scene_timeline import SceneTimeline
     from utils.video_downloader import VideoDownloader
 
-def safe_name(s: str)->str:
-    s = s or ""
-    s = s.lower().strip()
-    s = re.sub(r"\s+", "_", s)
-    s = re.sub(r"[^a-z0-9._-]+", "_", s)
-    s = re.sub(r"_+", "_", s).strip("_")
-    return s or "project"
-
-BASE_COLS = ["Dự án","Cảnh","Image","Prompt","Trạng thái"]
-def _video_labels(n): return [f"Video {i+1}" for i in range(max(0,n))]
-TAIL_COLS = ["Hoàn thành"]
-IMAGE_GLOB = ("*.png","*.jpg","*.jpeg","*.webp","*.bmp")
-
-def short_text(s, n=90):
-    s=(s or "").replace("\n"," ").strip()
-    return s if len(s)<=n else s[:n-1]+"…"
-
-def parse_prompt_any(obj):
-    scenes=[]
-    def _to_text(p):
-        if isinstance(p, str):
-            return p
-        try:
-            return json.dumps(p, ensure_ascii=False)
-        except Exception:
-            return str(p)
-    if isinstance(obj, list):
-        for it in obj:
-            if isinstance(it, dict) and "prompt" in it:
-                scenes.append(_to_text(it["prompt"]))
-            else:
-                scenes.append(_to_text(it))
-    elif isinstance(obj, dict):
-        if "scenes" in obj and isinstance(obj["scenes"], list):
-            for it in obj["scenes"]:
-                if isinstance(it, dict) and "prompt" in it:
-                    scenes.append(_to_text(it["prompt"]))
-                else:
-                    scenes.append(_to_text(it))
-        elif "prompt" in obj:
-            scenes.append(_to_text(obj["prompt"]))
-        else:
-            scenes.append(_to_text(obj))
-    return scenes
-
-def parse_prompt_file(path):
-    try:
-        with open(path,"r",encoding="utf-8") as f:
-            obj=json.load(f)
-    except Exception:
-        return []
-    return parse_prompt_any(obj)
+try:
+    from ui.widgets.scene_table_model import COL_PROMPT, COL_STATUS, FIRST_VIDEO_COL, SceneTableModel
+    from ui.widgets.spinner_delegate import SpinnerDelegate
+    from ui.thumbnail_service import get_thumbnail_service
+except Exception:  # pragma: no cover
+    from widgets.scene_table_model import COL_PROMPT, COL_STATUS, FIRST_VIDEO_COL, SceneTableModel
+    from widgets.spinner_delegate import SpinnerDelegate
+    from thumbnail_service import get_thumbnail_service
 
 class SeqWorker(QObject):
     log = pyqtSignal(str,str)
@@ -104,127 +69,96 @@ class SeqWorker(QObject):
     row_update = pyqtSignal(int, dict)
     started = pyqtSignal()
     finished = pyqtSignal(int)
-    def __init__(self, client, jobs, model, aspect, copies, project_id):
+    def __init__(self, client, jobs, model, aspect, copies, project_id, upload_workers=4, start_interval=1.2, journal=None, timeline=None,
+                 project="", priority=0):
         super().__init__(); self.client=client; self.jobs=jobs; self.model=model; self.aspect=aspect; self.copies=copies; self.project_id=project_id
+        self.journal=journal
+        self.pipeline=SceneSubmitPipeline(client, model, aspect, copies=copies, project_id=project_id,
+                                          upload_workers=upload_workers, start_interval=start_interval,
+                                          on_log=self.log.emit, on_row=self._on_row, on_progress=self.progress.emit,
+                                          timeline=timeline, project=project, priority=priority)
+    def stop(self): self.pipeline.stop()
+    def _on_row(self, idx, job):
+        if self.journal and job.get("operation_names"):
+            try: self.journal.submitted(job.get("scene_id",""), job["operation_names"], media_id=job.get("media_id"))
+            except Exception as e: self.log.emit("WARN", f"Không ghi được nhật ký: {e}")
+        self.row_update.emit(idx, job)
     def run(self):
         self.started.emit()
-        total=max(1,len(self.jobs)); done=0
-        for i,j in enumerate(self.jobs):
-            if j.get("image_path"):
-                self.log.emit("INFO", f"[{i+1}/{len(self.jobs)}] Upload ảnh…")
-                self.progress.emit(int(done*100/total), f"Cảnh {i+1}/{len(self.jobs)}: upload…")
-                if not j.get("media_id"):
-                    try:
-                        mid=self.client.upload_image_file(j["image_path"]); j["media_id"]=mid
-                        self.log.emit("HTTP", f"UPLOAD OK mediaId={mid}")
-                    except Exception as e:
-                        self.log.emit("ERR", f"Upload lỗi: {e}")
-                        j["status"]="UPLOAD_FAILED"; self.row_update.emit(i,j); continue
-            self.log.emit("INFO", f"[{i+1}/{len(self.jobs)}] Start generate…")
-            try:
-                self.progress.emit(int(done*100/total), f"Cảnh {i+1}/{len(self.jobs)}: start…")
-                rc=self.client.start_one(j, self.model, self.aspect, j.get("prompt",""), copies=self.copies, project_id=self.project_id)
-                self.log.emit("HTTP", f"START OK -> {rc} ref(s).")
-            except Exception as e:
-                self.log.emit("ERR", f"Start thất bại: {e}")
-            self.row_update.emit(i,j); done+=1; self.progress.emit(int(done*100/total), f"Đã gửi {done}/{len(self.jobs)} cảnh")
-            time.sleep(1.2)
-        self.progress.emit(100, "Hoàn tất gửi tuần tự"); self.finished.emit(1)
-
-class CheckWorker(QObject):
-    log = pyqtSignal(str,str); progress = pyqtSignal(int, str); row_update = pyqtSignal(int, dict); finished = pyqtSignal()
-    def __init__(self, client, jobs): super().__init__(); self.client=client; self.jobs=jobs
-    def run(self):
-        names=[n for j in self.jobs for n in j.get("operation_names",[])]
-        if not names: self.log.emit("INFO","[Check] chưa có operation."); self.finished.emit(); return
-        self.progress.emit(0, "Đang check…")
-        try:
-            rs=self.client.batch_check_operations(names)
-        except Exception as e:
-            self.log.emit("ERR", f"Check lỗi: {e.__class__.__name__}: {e}"); self.finished.emit(); return
-        total=max(1,len(self.jobs)); done=0
-        for idx,j in enumerate(self.jobs):
-            found=False
-            for nm in j.get("operation_names",[]):
-                if nm in rs:
-                    v=rs[nm]; found=True
-                    if v.get("video_urls"):
-                        vids=v["video_urls"]; ci=j.get("op_index_map",{}).get(nm,0)
-                        while len(j["video_by_idx"]) <= ci: j["video_by_idx"].append(None); j["thumb_by_idx"].append(None)
-                        if not j["video_by_idx"][ci]: j["video_by_idx"][ci]=vids[0]
-                        if v.get("image_urls"): j["thumb_by_idx"][ci]=v["image_urls"][0]
-                    j["status"]=v.get("status","PROCESSING")
-            if not found and j.get("status")=="PENDING": j["status"]="PROCESSING"
-            self.row_update.emit(idx,j); done+=1; self.progress.emit(int(done*100/total), f"Đã check {done}/{len(self.jobs)} cảnh")
-        self.log.emit("HTTP","Check xong."); self.finished.emit()
-
-class ThumbWorker(QObject):
-    done = pyqtSignal(int, int, object)
-    def __init__(self, row, idx, url): super().__init__(); self.row=row; self.idx=idx; self.url=url
-    def run(self):
-        import requests
-        try:
-            r=requests.get(self.url, timeout=15); r.raise_for_status(); data=r.content
-        except Exception:
-            self.done.emit(self.row,self.idx,None); return
-        pix=QPixmap(); pix.loadFromData(QByteArray(data))
-        if not pix.isNull():
-            pix=pix.scaled(64, 64, Qt.KeepAspectRatio, Qt.SmoothTransformation)
-            self.done.emit(self.row,self.idx, QIcon(pix))
-        else:
-            self.done.emit(self.row,self.idx,None)
+        self.progress.emit(0, f"Đang gửi {len(self.jobs)} cảnh song song…")
+        started=self.pipeline.run(self.jobs)
+        self.progress.emit(100, f"Hoàn tất gửi {started}/{len(self.jobs)} cảnh"); self.finished.emit(1)
+
+THUMB_SIZE = 64
 
 class DownloadWorker(QObject):
     log = pyqtSignal(str,str); progress = pyqtSignal(int, str); row_update = pyqtSignal(int, dict); finished = pyqtSignal(int,int, bool)
-    def __init__(self, jobs, outdir, only_missing=True, expected_copies=1, project_name="project", video_downloader=None):
+    def __init__(self, jobs, outdir, only_missing=True, expected_copies=1, project_name="project", video_downloader=None, journal=None, timeline=None):
         super().__init__(); self.jobs=jobs; self.outdir=outdir; self.only_missing=only_missing; self.expected_copies=expected_copies; self.project_name=project_name
-        self.video_downloader = video_downloader
+        self.video_downloader = video_downloader; self.journal=journal; self.timeline=timeline
     def run(self):
         os.makedirs(self.outdir, exist_ok=True)
-        total=max(1,len(self.jobs)); done=0; ok=0; attempts=0
-        all_success=True
+        dl=self.video_downloader or VideoDownloader(log_callback=lambda m: self.log.emit("INFO", m))
+        ok=0; all_success=True; futs={}
         for idx,j in enumerate(self.jobs):
             vids=j.get("video_by_idx") or []
-            if not vids: done+=1; self.progress.emit(int(done*100/total), f"Đã tải {ok}/{attempts}"); all_success=False; continue
+            if not vids: all_success=False; continue
             j.setdefault("downloaded_idx", set())
             for i,u in enumerate(vids, start=1):
                 if not u: continue
                 if self.only_missing and (i in j["downloaded_idx"]): continue
-                attempts+=1
                 base = f"{safe_name(self.project_name)}_canh_{j.get('scene_id','')}_video_{i}"
                 dest=os.path.join(self.outdir, f"{base}.mp4")
-                try:
-                    if self.video_downloader:
-                        self.video_downloader.download(u, dest)
-                    else:
-                        import requests
-                        with requests.get(u, stream=True, timeout=300, allow_redirects=True) as r:
-                            r.raise_for_status(); open(dest,"wb").write(r.content)
-                    j["downloaded_idx"].add(i); j.setdefault("local_paths",[]).append(dest); j["status"]="DOWNLOADED"; ok+=1
-                    # nếu đủ số lượng video mong đợi -> set thời gian hoàn thành
-                    if len(j["downloaded_idx"]) >= min(self.expected_copies, len(vids)):
-                        j["completed_at"] = datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-                    self.log.emit("HTTP", f"Tải OK -> {dest}")
-                except Exception:
-                    self.log.emit("ERR", f"Tải thất bại: {u}")
-                    all_success=False
-            self.row_update.emit(idx,j); done+=1; self.progress.emit(int(done*100/total), f"Đã tải {ok}/{attempts}")
+                # tải song song trên pool dùng chung (resume .part, kiểm tra dung lượng)
+                futs[dl.submit(u, dest)]=(idx, j, i, u, time.monotonic())
+        attempts=len(futs); done=0
+        if not attempts: self.progress.emit(100, "Không có video mới để tải")
+        for fut in as_completed(futs):
+            idx, j, i, u, t_sub = futs[fut]; res=fut.result(); done+=1
+            if self.timeline:
+                # time in the shared pool before the transfer started is queueing, not download
+                t_end=time.monotonic(); t_dl=max(t_sub, t_end-float(res.get("seconds") or 0))
+                self.timeline.complete(j.get("scene_id", idx+1), f"queue_download v{i}", t_sub, t_dl)
+                self.timeline.complete(j.get("scene_id", idx+1), f"download v{i}", t_dl, t_end, ok=res["ok"], mbps=res.get("mbps"))
+            if res["ok"]:
+                j["downloaded_idx"].add(i); j.setdefault("local_paths",[]).append(res["path"]); j["status"]="DOWNLOADED"; ok+=1
+                j.get("download_failed", set()).discard(i)
+                op=next((nm for nm,ci in (j.get("op_index_map") or {}).items() if ci==i-1), "")
+                if self.journal and op: self.journal.downloaded(op, res["path"])
+                # nếu đủ số lượng video mong đợi -> set thời gian hoàn thành
+                if len(j["downloaded_idx"]) >= min(self.expected_copies, len(j.get("video_by_idx") or [])):
+                    j["completed_at"] = datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+                self.log.emit("HTTP", f"Tải OK -> {res['path']} ({res['mbps']} MB/s)")
+            else:
+                self.log.emit("ERR", f"Tải thất bại: {u} ({res['error']})")
+                j.setdefault("download_failed", set()).add(i)
+                all_success=False
+            self.row_update.emit(idx,j); self.progress.emit(int(done*100/attempts), f"Đã tải {ok}/{attempts}")
         self.finished.emit(ok, attempts, all_success)
 
 class ProjectPanel(QWidget):
     project_completed = pyqtSignal(str)  # emit project_name when all videos downloaded
+    run_stopped = pyqtSignal(str)  # emit project_name when the user stops a run
     run_all_requested = pyqtSignal()
+    op_update = pyqtSignal(str, dict)  # poller thread -> UI thread
     def __init__(self, project_name:str, base_dir:str, settings_provider=None, parent=None):
         super().__init__(parent)
         self.project_name=project_name; self.base_dir=base_dir; self.project_dir=os.path.join(base_dir, project_name)
         os.makedirs(self.project_dir, exist_ok=True)
         self.settings_provider = settings_provider or (lambda: load_cfg())
-        self.tokens=[]; self.client=None; self.jobs=[]; self.max_videos=4
+        self.tokens=[]; self.client=None; self.jobs=[]; self.max_videos=4; self._thumb_loading=set()
+        self.priority=0  # start-gate / run-queue priority (services.project_scheduler.PRIORITY_*)
         self.scenes=[]; self.image_files=[]; self._seq_running=False
         self._build_ui()
         self.video_downloader = VideoDownloader(log_callback=self.console.info)
         self.console.info(f"Dự án '{project_name}' đã sẵn sàng.")
-        self._timer=None
+        self._op_rows={}; self._dl_running=False; self._dl_again=False
+        self._op_final={}; self._completed=False  # op name -> terminal status; project_completed sent
+        self._timeline=None
+        self._poll_cb=self._on_poll
+        self.op_update.connect(self._on_op_update)
+        # tiếp tục các video dang dở từ nhật ký (sau crash / đóng app giữa chừng)
+        QTimer.singleShot(0, self._resume_from_journal)
 
     def _build_ui(self):
         root=QVBoxLayout(self); root.setContentsMargins(6,6,6,6); root.setSpacing(4)
@@ -349,10 +283,16 @@ class ProjectPanel(QWidget):
         self.pb=QProgressBar(); self.pb.setFormat("%p%"); rv.addWidget(self.pb)
         self.pb_text=QLabel("Sẵn sàng"); rv.addWidget(self.pb_text)
 
-        self.table=QTableWidget(0, 0)
+        # model/view: updates are coalesced into a few dataChanged ranges per second
+        self.model=SceneTableModel(self.jobs, self.project_name, int(self.sp_copies.value()),
+                                   max_fps=float((self._settings().get("ui") or {}).get("table_fps", 4)), parent=self)
+        self.table=QTableView(); self.table.setModel(self.model)
         self.table.setWordWrap(False); self.table.setEditTriggers(QAbstractItemView.NoEditTriggers)
-        self.table.horizontalHeader().setSectionResizeMode(QHeaderView.ResizeToContents)
-        self.table.cellDoubleClicked.connect(self._open_cell)
+        self.table.setSelectionBehavior(QAbstractItemView.SelectRows)
+        hh=self.table.horizontalHeader(); hh.setSectionResizeMode(QHeaderView.ResizeToContents)
+        hh.setResizeContentsPrecision(64)  # size columns from a sample of rows, not all of them
+        self.table.doubleClicked.connect(lambda ix: self._open_cell(ix.row(), ix.column()))
+        self._spinner=SpinnerDelegate(self.table, column=COL_STATUS)
         rv.addWidget(self.table, 1)
 
         # PR#5: Reduce console height to give more space to result table
@@ -362,10 +302,7 @@ class ProjectPanel(QWidget):
         self._ensure_columns()
 
     def _ensure_columns(self):
-        n=int(self.sp_copies.value())
-        headers = BASE_COLS + _video_labels(n) + TAIL_COLS
-        self.table.setColumnCount(len(headers))
-        self.table.setHorizontalHeaderLabels(headers)
+        self.model.set_copies(int(self.sp_copies.value()))
 
     # Pickers
     def _pick_prompt_file(self):
@@ -399,11 +336,14 @@ class ProjectPanel(QWidget):
         k=ev.get("kind")
         if k=="http_ok": self.console.http("HTTP 200")
         elif k=="http_other_err": self.console.err(f"HTTP {ev.get('code')}: {ev.get('detail','')}")
+        elif k=="token_health" and ev.get("code") in (401,403,429):
+            st=next((x for x in ev.get("stats",[]) if x.get("token")==ev.get("token")), {})
+            self.console.warn(f"Token {ev.get('token')} lỗi {ev.get('code')} — tạm nghỉ {st.get('cooldown_sec',0)}s, dùng token khác.")
 
     def _settings(self):
         return (self.settings_provider() if callable(self.settings_provider) else load_cfg())
 
-    def _project_paths(self):
+    def _project_paths(self, create=True):
         cfg = self._settings()
         root = cfg.get("download_root")
         if not root: root = os.path.join(os.path.expanduser("~"), "Downloads", "VeoProjects")
@@ -415,12 +355,40 @@ class ProjectPanel(QWidget):
             "images": os.path.join(proj_dir, "Ảnh tham chiếu"),
             "videos": os.path.join(proj_dir, "Video"),
         }
-        for d in dirs.values():
-            if isinstance(d, str): os.makedirs(d, exist_ok=True)
+        if create:
+            for d in dirs.values():
+                if isinstance(d, str): os.makedirs(d, exist_ok=True)
         return dirs
 
+    def _journal(self):
+        d=self._project_paths(create=False)["prompts"]
+        if getattr(self,"_jr",None) is None or self._jr.directory!=d: self._jr=JobJournal(d)
+        return self._jr
+
+    def _resume_from_journal(self):
+        try:
+            jr=self._journal()
+            if not jr.exists() or self.jobs: return
+            state=jr.state()
+            if not jr.pending(state): return
+            copies=int(state["meta"].get("copies") or 1)
+            self.sp_copies.setValue(copies); self.model.set_jobs(self.jobs)
+            for sid,rec in sorted(state["scenes"].items(), key=lambda kv: int(kv[0]) if kv[0].isdigit() else 0):
+                job={"scene_id":sid,"prompt":rec.get("prompt",""),"image_path":rec.get("image_path"),"image_name":rec.get("image_name",""),
+                     "media_id":None,"status":"NEW","thumb_icons":{},"completed_at":""}
+                _apply_record(job, rec, copies)
+                self._refresh_row(self.model.append(job), job)
+            toks=[t.strip() for t in self._settings().get("tokens", []) if t.strip()]
+            if not toks:
+                self.console.warn("Có video dang dở trong nhật ký nhưng chưa có token — nhập token rồi bấm chạy lại để tiếp tục."); return
+            if not self.client: self.client=LabsFlowClient(toks, on_event=self._on_event)
+            self.console.info(f"Tiếp tục {len(jr.pending(state))} video dang dở từ nhật ký (không gửi lại).")
+            self._check()
+        except Exception as e:
+            self.console.err(f"Không đọc được nhật ký dự án: {e}")
+
     def _prepare_jobs(self):
-        self.jobs=[]; self.table.setRowCount(0)
+        self.jobs=[]; self.model.set_jobs(self.jobs)
         # lấy scenes từ text box nếu chưa có
         if not self.scenes and self.ed_json.toPlainText().strip():
             try:
@@ -448,6 +416,8 @@ class ProjectPanel(QWidget):
         copies=int(self.sp_copies.value())
 
         paths = self._project_paths()
+        journal=self._journal(); prior=journal.state()["scenes"]
+        journal.begin(model=model_str, aspect=getattr(self.cb_aspect, "currentText", lambda: "")(), copies=copies)
         # Lưu prompt + copy ảnh vào thư mục dự án, đặt tên chuẩn
         for i in range(n):
             scene_id = i+1
@@ -476,47 +446,42 @@ class ProjectPanel(QWidget):
             else:
                 dst = None
 
-            row=self.table.rowCount(); self.table.insertRow(row)
             job={"scene_id":f"{scene_id}","prompt":prompt_text,"image_path":dst,"image_name":os.path.basename(dst) if dst else "",
                  "media_id":None,"operation_names":[],"status":"NEW","video_by_idx":[None]*copies,"thumb_by_idx":[None]*copies,"op_index_map":{},
                  "downloaded_idx":set(),"thumb_icons":{},"completed_at":""}
-            self.jobs.append(job); self._refresh_row(row, job)
+            ph=prompt_hash(prompt_text); rec=prior.get(job["scene_id"])
+            journal.scene(job["scene_id"], prompt_hash=ph, prompt=prompt_text, image_path=dst, image_name=job["image_name"])
+            if rec and rec.get("prompt_hash")==ph and rec.get("image_name","")==job["image_name"] and JobJournal.unfinished_ops(rec):
+                # cảnh đã gửi nhưng chưa xong -> theo dõi tiếp, không gửi lại
+                _apply_record(job, rec, copies)
+                self.console.info(f"Cảnh {scene_id}: tiếp tục từ nhật ký, không gửi lại.")
+            self._refresh_row(self.model.append(job), job)
         if n==0: self.console.warn("Không có cặp (prompt, ảnh) nào.")
         return n
 
-    def _set_cell(self, row, col, text, tooltip=None, icon=None):
-        it=self.table.item(row,col)
-        if it is None: it=QTableWidgetItem(text); self.table.setItem(row,col,it)
-        else: it.setText(text)
-        if tooltip is not None: it.setToolTip(tooltip)
-        if icon is not None: it.setIcon(icon)
-
     def _refresh_row(self, idx, job):
-        col = 0
-        self._set_cell(idx,col,self.project_name); col+=1
-        self._set_cell(idx,col,str(job.get("scene_id",""))); col+=1
-        self._set_cell(idx,col,job.get("image_name","")); col+=1
-        self._set_cell(idx,col,short_text(job.get("prompt",""))); col+=1
-        self._set_cell(idx,col,job.get("status","")); col+=1
+        # the model reads the job dict itself; this only queues a repaint of the row
         vids=job.get("video_by_idx") or []; thumbs=job.get("thumb_by_idx") or []
         for i in range(len(vids)):
-            label=f"Video {i+1}"
-            if vids[i]:
-                if i+1 in job.get("downloaded_idx", set()): label+=" ✓"
-                icon=job["thumb_icons"].get(i)
-                if not icon and i < len(thumbs) and thumbs[i]: self._load_thumb_async(idx, i, thumbs[i])
-                self._set_cell(idx, col+i, label, tooltip=vids[i], icon=icon)
-            else: self._set_cell(idx, col+i, "")
-        col += len(vids)
-        self._set_cell(idx,col, job.get("completed_at",""))
-
-    def _load_thumb_async(self, row, idx, url):
-        th=QThread(self); w=ThumbWorker(row, idx, url); w.moveToThread(th)
-        th.started.connect(w.run); w.done.connect(self._on_thumb); w.done.connect(th.quit); w.done.connect(w.deleteLater); th.finished.connect(th.deleteLater); th.start()
-
-    def _on_thumb(self, row, idx, icon):
-        if 0 <= row < len(self.jobs) and icon:
-            self.jobs[row]["thumb_icons"][idx]=icon; self._refresh_row(row, self.jobs[row])
+            if vids[i] and i not in job["thumb_icons"] and i < len(thumbs) and thumbs[i]:
+                self._load_thumb_async(job, i, thumbs[i])
+        self.model.update_row(idx)
+
+    def _load_thumb_async(self, job, idx, url):
+        key=(str(job.get("scene_id","")), idx)
+        if key in self._thumb_loading: return
+        t0=time.monotonic()
+        pix=get_thumbnail_service().request(url, THUMB_SIZE, lambda p: self._on_thumb(key[0], idx, p, t0))
+        if pix is not None: job["thumb_icons"][idx]=QIcon(pix)
+        else: self._thumb_loading.add(key)
+
+    def _on_thumb(self, scene, idx, pix, t0):
+        self._thumb_loading.discard((scene, idx))
+        if self._timeline: self._timeline.complete(scene, f"thumbnail v{idx+1}", t0)
+        row=self.model.row_of(scene)
+        if row >= 0:
+            # a failed load is remembered as None so refreshes don't retry it
+            self.jobs[row]["thumb_icons"][idx]=None if pix.isNull() else QIcon(pix); self.model.update_row(row)
 
     # Actions
     def _ensure_client(self):
@@ -546,31 +511,37 @@ class ProjectPanel(QWidget):
             cfg = self._settings()
             model=self.cb_model.currentText(); aspect=self.cb_aspect.currentText(); copies=int(self.sp_copies.value()); pid=cfg.get("default_project_id") or DEFAULT_PROJECT_ID
             if self._seq_running: self.console.warn("Đang chạy tuần tự, vui lòng chờ…"); return
-            self._seq_running=True
+            self._seq_running=True; self._op_final={}; self._completed=False
             # PR#4: Enable stop button when running
             self.btn_run.setEnabled(False); self.btn_run.setText("ĐANG TẠO…")
             self.btn_stop.setEnabled(True)
             QApplication.setOverrideCursor(Qt.WaitCursor)
             self.pb.setValue(0); self.pb_text.setText(f"Bắt đầu: {n} cảnh, {copies} video/cảnh")
-            self.console.info(f"Bắt đầu gửi tuần tự {n} cảnh; copies={copies}.")
+            self.console.info(f"Bắt đầu gửi song song {n} cảnh; copies={copies}.")
+            labs_cfg = cfg.get("labs") or {}
+            self._new_timeline()
             self._t=QThread(self)
-            self._w=SeqWorker(self.client,self.jobs,model,aspect,copies,pid)
+            self._w=SeqWorker(self.client,self.jobs,model,aspect,copies,pid,
+                              upload_workers=int(labs_cfg.get("upload_workers", 4)),
+                              start_interval=float(labs_cfg.get("start_interval_sec", 1.2)), journal=self._journal(),
+                              timeline=self._timeline, project=self.project_name, priority=self.priority)
+            self._seq_worker=self._w
             self._w.moveToThread(self._t)
             self._t.started.connect(self._w.run)
             self._w.progress.connect(self._on_prog); self._w.row_update.connect(self._refresh_row)
             self._w.log.connect(lambda lv,msg: getattr(self.console, lv.lower())(msg) if hasattr(self.console, lv.lower()) else self.console.info(msg))
             def on_finish(_):
-                self.console.info("Đã gửi xong theo tuần tự.")
+                self.console.info("Đã gửi xong toàn bộ cảnh.")
+                self._seq_worker=None
                 # PR#4: Disable stop button when done
                 self.btn_run.setEnabled(True); self.btn_run.setText("BẮT ĐẦU TẠO VIDEO")
                 self.btn_stop.setEnabled(False)
                 QApplication.restoreOverrideCursor()
                 self.pb_text.setText("Hoàn tất gửi.")
                 self._seq_running=False
-                # start auto-check (hidden) mỗi 10s
-                if not self._timer:
-                    self._timer=QTimer(self); self._timer.setInterval(10000); self._timer.timeout.connect(self._check)
-                self._timer.start()
+                # theo dõi trạng thái qua poller dùng chung
+                self._check()
+                self._maybe_complete()  # e.g. every scene failed to start
             # FIXED: Add missing .start()
             self._w.finished.connect(on_finish)
             self._w.finished.connect(self._t.quit)
@@ -584,6 +555,18 @@ class ProjectPanel(QWidget):
 
     def _on_prog(self, v, t): self.pb.setValue(v); self.pb_text.setText(t)
 
+    def _all_settled(self):
+        # true khi mọi operation đã kết thúc: video đã tải (hoặc tải lỗi), thất bại hoặc không có URL
+        for j in self.jobs:
+            vids = j.get("video_by_idx") or []
+            for nm in j.get("operation_names") or []:
+                if nm not in self._op_final: return False
+                i = (j.get("op_index_map") or {}).get(nm, 0) + 1
+                if i <= len(vids) and vids[i-1] and i not in j.get("downloaded_idx", set()) \
+                        and i not in j.get("download_failed", set()):
+                    return False
+        return True
+
     def _all_downloaded(self):
         # true nếu mọi cảnh đều đã có đủ số video & được download
         exp = int(self.sp_copies.value())
@@ -593,33 +576,85 @@ class ProjectPanel(QWidget):
             if len(j.get("downloaded_idx", set())) < exp: return False
         return True
 
+    def _maybe_complete(self):
+        """Emit project_completed once, when every operation is terminal (downloaded, failed or no URL)."""
+        if self._completed or self._seq_running or self._dl_running or not self.jobs or not self._all_settled(): return
+        self._completed=True
+        get_poller().unregister(owner=self)
+        self._export_timeline(final=True)
+        if self._all_downloaded(): self.console.info("Đã tải xong toàn bộ video. Dừng kiểm tra.")
+        else: self.console.warn("Mọi video đã kết thúc (có cảnh lỗi / không có video). Dừng kiểm tra.")
+        self.project_completed.emit(self.project_name)
+
     def _check(self):
+        """Register every submitted operation with the shared poller (idempotent)."""
         if not getattr(self,"client",None) or not self.jobs: return
-        self._t2=QThread(self); self._w2=CheckWorker(self.client,self.jobs); self._w2.moveToThread(self._t2)
-        self._t2.started.connect(self._w2.run); self._w2.progress.connect(self._on_prog); self._w2.row_update.connect(self._refresh_row)
-        self._w2.log.connect(lambda lv,msg: getattr(self.console, lv.lower())(msg) if hasattr(self.console, lv.lower()) else self.console.info(msg))
-        def on_finished():
-            # auto-download về thư mục dự án/<Video>
-            out = self._project_paths()["videos"]
-            self._download(True, out)
-        self._w2.finished.connect(on_finished)
-        self._w2.finished.connect(self._t2.quit)
-        self._w2.finished.connect(self._w2.deleteLater)
-        self._t2.finished.connect(self._t2.deleteLater)
-        self._t2.start()
+        self._op_rows={nm: idx for idx,j in enumerate(self.jobs) for nm in j.get("operation_names",[])}
+        names=[nm for nm in self._op_rows if nm]
+        if not names: self.console.info("[Check] chưa có operation."); return
+        if self._timeline is None: self._new_timeline()
+        # resumed operations start their 'generate' span here; submitted ones keep the start-call time
+        for j in self.jobs: self._timeline.submitted(j.get("scene_id",""), j.get("operation_names",[]))
+        get_poller().register(names, client=self.client, owner=self, callback=self._poll_cb)
+
+    def _on_poll(self, name, info, _owner):
+        # poller thread: record the status change at its real time, then hand over to the UI thread
+        if self._timeline: self._timeline.op_status(name, info)
+        self.op_update.emit(name, info)
+
+    def _new_timeline(self):
+        if self._timeline: self._timeline.detach_poller()
+        self._timeline=SceneTimeline(self._project_paths()["project"], title=self.project_name)
+        self._timeline.attach_poller(get_poller())
+
+    def _export_timeline(self, final=False):
+        if not self._timeline: return
+        try:
+            path=self._timeline.export()
+            if final:
+                self._timeline.detach_poller()
+                self.console.info(f"[Timeline] {self._timeline.summary_text()} — {path}")
+        except Exception as e:
+            self.console.warn(f"Không ghi được timeline: {e}")
+
+    def _on_op_update(self, name, v):
+        idx=self._op_rows.get(name)
+        if idx is None or idx>=len(self.jobs): return
+        j=self.jobs[idx]
+        if v.get("video_urls"):
+            vids=v["video_urls"]; ci=j.get("op_index_map",{}).get(name,0)
+            while len(j["video_by_idx"]) <= ci: j["video_by_idx"].append(None); j["thumb_by_idx"].append(None)
+            if not j["video_by_idx"][ci]: j["video_by_idx"][ci]=vids[0]
+            if v.get("image_urls"): j["thumb_by_idx"][ci]=v["image_urls"][0]
+            self._schedule_download()
+        j["status"]=v.get("status","PROCESSING")
+        if is_terminal(v): self._op_final[name]=j["status"]
+        try: self._journal().status(name, j["status"], (v.get("video_urls") or [""])[0], (v.get("image_urls") or [""])[0])
+        except Exception: pass
+        self._refresh_row(idx, j)
+        if is_terminal(v): self._maybe_complete()
+
+    def _schedule_download(self):
+        # gộp nhiều video xong cùng lúc vào một lượt tải
+        if self._dl_running: self._dl_again=True; return
+        self._dl_running=True
+        QTimer.singleShot(500, lambda: self._download(True, self._project_paths()["videos"]))
 
     def _download(self, only_missing, outdir):
         self._t3=QThread(self)
-        self._w3=DownloadWorker(self.jobs,outdir,only_missing=only_missing, expected_copies=int(self.sp_copies.value()), project_name=self.project_name, video_downloader=self.video_downloader)
+        self._w3=DownloadWorker(self.jobs,outdir,only_missing=only_missing, expected_copies=int(self.sp_copies.value()), project_name=self.project_name, video_downloader=self.video_downloader, journal=self._journal(), timeline=self._timeline)
         self._w3.moveToThread(self._t3)
         self._t3.started.connect(self._w3.run); self._w3.progress.connect(self._on_prog); self._w3.row_update.connect(self._refresh_row)
         self._w3.log.connect(lambda lv,msg: getattr(self.console, lv.lower())(msg) if hasattr(self.console, lv.lower()) else self.console.info(msg))
         def on_done(ok, attempts, all_success):
-            if all_success and self._all_downloaded():
-                # stop checking + phát tín hiệu hoàn tất dự án
-                if self._timer: self._timer.stop()
-                self.console.info("Đã tải xong toàn bộ video. Dừng kiểm tra.")
-                self.project_completed.emit(self.project_name)
+            self._dl_running=False
+            if self._dl_again:
+                self._export_timeline()
+                self._dl_again=False; self._schedule_download()
+                return
+            # stop checking + phát tín hiệu hoàn tất dự án khi mọi operation đã kết thúc
+            self._maybe_complete()
+            if not self._completed: self._export_timeline()
         self._w3.finished.connect(on_done)
         self._w3.finished.connect(self._t3.quit)
         self._w3.finished.connect(self._w3.deleteLater)
@@ -629,7 +664,7 @@ class ProjectPanel(QWidget):
     def _open_cell(self, row, col):
         # col==3 (Prompt) -> mở dialog xem đầy đủ
         if row>=len(self.jobs): return
-        if col==3:
+        if col==COL_PROMPT:
             full = self.jobs[row].get("prompt","")
             from PyQt5.QtWidgets import QDialog, QVBoxLayout
             dlg=QDialog(self); dlg.setWindowTitle(f"Prompt — Cảnh {self.jobs[row].get('scene_id','')}"); vv=QVBoxLayout(dlg)
@@ -638,10 +673,9 @@ class ProjectPanel(QWidget):
             dlg.resize(720,480); dlg.exec_(); return
         # video cell -> mở link
         # columns: 0:Dự án,1:Cảnh,2:Image,3:Prompt,4:Trạng thái, [video cols], last:Hoàn thành
-        first_video_col = 5
-        last_col = self.table.columnCount()-1
-        if first_video_col <= col < last_col:
-            idx=col-first_video_col
+        last_col = self.model.columnCount()-1
+        if FIRST_VIDEO_COL <= col < last_col:
+            idx=col-FIRST_VIDEO_COL
             vids=self.jobs[row].get("video_by_idx") or []
             if idx>=len(vids): return
             url=vids[idx]
@@ -650,17 +684,14 @@ class ProjectPanel(QWidget):
             except Exception: pass
 
     def _delete_selected_scenes(self):
-        sel = self.table.selectedItems()
-        rows = sorted(set(it.row() for it in sel), reverse=True)
-        for r in rows:
-            if 0 <= r < len(self.jobs):
-                self.table.removeRow(r)
-                self.jobs.pop(r, None)
-        self.console.info(f"Đã xóa {len(rows)} cảnh đã chọn.")
+        rows = [ix.row() for ix in self.table.selectionModel().selectedRows()]
+        n = self.model.remove_rows(rows)
+        self._op_rows={nm: idx for idx,j in enumerate(self.jobs) for nm in j.get("operation_names",[])}
+        self.console.info(f"Đã xóa {n} cảnh đã chọn.")
 
     def _delete_all_scenes(self):
-        self.jobs.clear()
-        self.table.setRowCount(0)
+        self.model.clear()
+        self._op_rows={}
         self.console.info("Đã xóa toàn bộ cảnh.")
 
     def showEvent(self, event):
@@ -678,22 +709,24 @@ class ProjectPanel(QWidget):
                 self.console.info(f"[INFO] Đã cập nhật {len(tokens)} Google Labs tokens")
                 # Recreate client with new tokens
                 if self.tokens:
-                    self.client = LabsFlowClient(self.tokens, on_event=None)
+                    self.client = LabsFlowClient(self.tokens, on_event=self._on_event)
         except Exception as e:
             self.console.err(f"[ERROR] Không thể tải tokens: {e}")
 
     def stop_processing(self):
         """PR#4: Stop all workers"""
-        if hasattr(self, '_seq_worker') and self._seq_worker:
-            # Signal worker to stop (if it supports it)
+        if getattr(self, '_seq_worker', None):
             self.console.warn("[INFO] Đang dừng xử lý...")
+            self._seq_worker.stop()
             self._seq_running = False
+            self.run_stopped.emit(self.project_name)
 
         self.btn_run.setEnabled(True)
         self.btn_stop.setEnabled(False)
 
     def closeEvent(self, e):
         try:
-            if self._timer: self._timer.stop()
+            get_poller().unregister(owner=self)
+            if self._timeline: self._timeline.detach_poller()
         finally:
             e.accept()
@@ -1,21 +1,26 @@
 # -*- coding: utf-8 -*-
 import datetime
 
+from PyQt5.QtCore import QTimer
 from PyQt5.QtGui import QFont
 from PyQt5.QtWidgets import (
     QFileDialog,
     QGridLayout,
     QGroupBox,
     QHBoxLayout,
+    QHeaderView,
     QLabel,
     QLineEdit,
     QPushButton,
     QRadioButton,
+    QTableWidget,
+    QTableWidgetItem,
     QVBoxLayout,
     QWidget,
 )
 from PyQt5.QtWidgets import QWidget as _QW
 
+from services.core.metrics import get_metrics
 from ui.widgets.key_list import KeyList
 from utils import config as cfg
 from utils.version import get_version
@@ -41,6 +46,11 @@ def _lab(text):
     l.setFont(FONT_LABEL)
     return l
 
+def _fmt_bytes(n):
+    return f"{n / 1048576:.1f} MB" if n >= 1048576 else f"{n / 1024:.0f} KB"
+
+STATS_COLS = ['Nhà cung cấp', 'Endpoint', 'Lượt gọi', 'Lỗi', 'Thử lại', 'p50 (s)', 'p95 (s)', 'Tổng (s)', 'Gửi', 'Nhận', 'Mã trạng thái']
+
 def _decorate_group(gb: QGroupBox):
     # PR#6: Part E #26 - Compact spacing 6px, dark theme styling
     # Styling is now handled by unified theme, so this is optional
@@ -126,7 +136,26 @@ class SettingsPanel(QWidget):
         self.rb_drive.toggled.connect(self._toggle_storage_fields)
         self._toggle_storage_fields()
 
-        # Dòng 5: Lưu + Info app ở bên phải
+        # Dòng 5: Thống kê API trực tiếp
+        stats = QGroupBox('Thống kê gọi API (trực tiếp)'); _decorate_group(stats)
+        vs = QVBoxLayout(stats); vs.setSpacing(4)
+        self.tbl_stats = QTableWidget(0, len(STATS_COLS)); self.tbl_stats.setHorizontalHeaderLabels(STATS_COLS)
+        self.tbl_stats.verticalHeader().setVisible(False); self.tbl_stats.setEditTriggers(QTableWidget.NoEditTriggers)
+        self.tbl_stats.horizontalHeader().setSectionResizeMode(QHeaderView.ResizeToContents)
+        self.tbl_stats.horizontalHeader().setStretchLastSection(True)
+        self.tbl_stats.setMinimumHeight(140); self.tbl_stats.setMaximumHeight(220)
+        vs.addWidget(self.tbl_stats)
+        hs = QHBoxLayout()
+        self.lb_stats = QLabel(''); self.lb_stats.setFont(FONT_LABEL)
+        self.btn_prom = QPushButton('Xuất Prometheus…'); self.btn_prom.clicked.connect(lambda: self._export_stats('prom'))
+        self.btn_jsonl = QPushButton('Xuất JSONL…'); self.btn_jsonl.clicked.connect(lambda: self._export_stats('jsonl'))
+        self.btn_reset_stats = QPushButton('Đặt lại'); self.btn_reset_stats.clicked.connect(self._reset_stats)
+        hs.addWidget(self.lb_stats); hs.addStretch(1); hs.addWidget(self.btn_prom); hs.addWidget(self.btn_jsonl); hs.addWidget(self.btn_reset_stats)
+        vs.addLayout(hs)
+        root.addWidget(stats)
+        self._stats_timer = QTimer(self); self._stats_timer.setInterval(2000); self._stats_timer.timeout.connect(self._refresh_stats)
+
+        # Dòng 6: Lưu + Info app ở bên phải
         row5 = QHBoxLayout()
         self.btn_save = QPushButton('💾 Lưu cấu hình'); self.btn_save.setFont(FONT_BTN_BIG)
         self.btn_save.setObjectName('btn_save')  # Green color
@@ -149,6 +178,43 @@ class SettingsPanel(QWidget):
 
         self.btn_save.clicked.connect(self._save)
 
+    def showEvent(self, e):
+        super().showEvent(e)
+        self._refresh_stats(); self._stats_timer.start()
+
+    def hideEvent(self, e):
+        self._stats_timer.stop()
+        super().hideEvent(e)
+
+    def _refresh_stats(self):
+        m = get_metrics(); rows = m.snapshot()
+        self.tbl_stats.setRowCount(len(rows))
+        for i, r in enumerate(rows):
+            codes = ', '.join(f"{c}×{n}" for c, n in sorted(r['statuses'].items()))
+            vals = [r['provider'], r['endpoint'], r['calls'], r['errors'], r['retries'], f"{r['p50']:.2f}", f"{r['p95']:.2f}",
+                    f"{r['total_seconds']:.1f}", _fmt_bytes(r['bytes_out']), _fmt_bytes(r['bytes_in']), codes]
+            for c, v in enumerate(vals):
+                it = self.tbl_stats.item(i, c)
+                if it is None: it = QTableWidgetItem(); self.tbl_stats.setItem(i, c, it)
+                it.setText(str(v))
+        calls = sum(r['calls'] for r in rows); errs = sum(r['errors'] for r in rows)
+        since = datetime.datetime.fromtimestamp(m.started).strftime('%H:%M:%S')
+        self.lb_stats.setText(f'{calls} lượt gọi, {errs} lỗi (từ {since})')
+
+    def _export_stats(self, kind):
+        m = get_metrics()
+        if kind == 'prom':
+            path, _ = QFileDialog.getSaveFileName(self, 'Xuất số liệu Prometheus', 'veo_metrics.prom', 'Prometheus (*.prom *.txt)')
+            if path:
+                with open(path, 'w', encoding='utf-8') as f: f.write(m.prometheus())
+        else:
+            path, _ = QFileDialog.getSaveFileName(self, 'Xuất lượt gọi gần đây', 'veo_calls.jsonl', 'JSON lines (*.jsonl)')
+            if path: m.export_jsonl(path)
+        if path: self.lb_saved.setText('Đã xuất: ' + _ts())
+
+    def _reset_stats(self):
+        get_metrics().reset(); self._refresh_stats()
+
     def _toggle_storage_fields(self):
         is_local = self.rb_local.isChecked()
         self.ed_local.setEnabled(is_local); self.btn_browse.setEnabled(is_local)
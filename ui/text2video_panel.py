@@ -1,11 +1,10 @@
 
-import json
 import os
 import re
 
 from PyQt5.Qt import QDesktopServices
-from PyQt5.QtCore import QLocale, QSize, Qt, QThread, QUrl
-from PyQt5.QtGui import QColor
+from PyQt5.QtCore import QLocale, QSize, Qt, QThread, QTimer, QUrl
+from PyQt5.QtGui import QColor, QIcon
 from PyQt5.QtWidgets import (
     QScrollArea,
     QCheckBox,
@@ -28,9 +27,12 @@ from PyQt5.QtWidgets import (
 )
 
 from utils import config as cfg
+from services.job_journal import find_unfinished
 from services.voice_options import get_style_list, get_style_info, SPEAKING_STYLES
 
-from .text2video_panel_impl import _ASPECT_MAP, _LANGS, _VIDEO_MODELS, _Worker, build_prompt_json, get_model_key_from_display
+from .thumbnail_service import get_thumbnail_service
+from .widgets.spinner_delegate import BUSY_ROLE, SpinnerDelegate, is_busy
+from .text2video_panel_impl import _ASPECT_MAP, _LANGS, _VIDEO_MODELS, _Worker, compile_prompt, get_model_key_from_display
 
 
 class CollapsibleGroupBox(QGroupBox):
@@ -75,10 +77,18 @@ class Text2VideoPane(QWidget):
         self._title = "Project"
         self._character_bible = None  # Part D: Store character bible
         self._script_data = None  # Store script data for bible generation
+        self._card_items = {}  # scene -> QListWidgetItem
+        # job_card events are buffered and repainted at most a few times per second
+        self._cards_dirty = set()
+        self._cards_timer = QTimer(self); self._cards_timer.setSingleShot(True)
+        self._cards_timer.setInterval(int(1000 / max(0.1, float((cfg.load().get("ui") or {}).get("table_fps", 4)))))
+        self._cards_timer.timeout.connect(self._flush_cards)
         self._build_ui()
         self._apply_styles()
         # Initialize folder label
         self._update_folder_label()
+        # pick up video jobs interrupted by a crash/close (journaled in 03_Videos)
+        QTimer.singleShot(1500, self._resume_unfinished)
 
     def _build_ui(self):
         root = QHBoxLayout(self); root.setSpacing(12); root.setContentsMargins(8,8,8,8)
@@ -377,7 +387,12 @@ class Text2VideoPane(QWidget):
 
         self.btn_open_folder = QPushButton("📁 Mở thư mục dự án")
         self.btn_open_folder.setObjectName("btn_primary_open")
-        colL.addWidget(self.btn_open_folder)
+        self.btn_final_cut = QPushButton("🎬 Ghép video hoàn chỉnh")
+        self.btn_final_cut.setToolTip("Ghép mỗi cảnh một bản (ưu tiên bản 4K), kèm lồng tiếng/phụ đề nếu có; chỉ xử lý lại cảnh thay đổi")
+        hb_out = QHBoxLayout()
+        hb_out.addWidget(self.btn_open_folder)
+        hb_out.addWidget(self.btn_final_cut)
+        colL.addLayout(hb_out)
 
         colL.addWidget(QLabel("<b>Console:</b>"))
         self.console = QTextEdit(); self.console.setReadOnly(True); self.console.setMinimumHeight(120)
@@ -441,6 +456,7 @@ class Text2VideoPane(QWidget):
         self.cards = QListWidget()
         self.cards.setHorizontalScrollBarPolicy(Qt.ScrollBarAlwaysOff)
         self.cards.setIconSize(QSize(240, 135))
+        self._spinner = SpinnerDelegate(self.cards)
         scenes_layout.addWidget(self.cards)
         self.result_tabs.addTab(scenes_widget, "🎬 Kết quả cảnh")
 
@@ -475,6 +491,7 @@ class Text2VideoPane(QWidget):
         self.table.cellDoubleClicked.connect(self._open_prompt_view)
         self.cards.itemDoubleClicked.connect(self._open_card_prompt)
         self.btn_open_folder.clicked.connect(self._open_project_dir)
+        self.btn_final_cut.clicked.connect(self._on_final_cut)
         self.btn_generate_bible.clicked.connect(self._on_generate_bible)
         self.btn_change_folder.clicked.connect(self._on_change_folder)
 
@@ -589,6 +606,7 @@ class Text2VideoPane(QWidget):
             # Voice settings
             tts_provider=tts_provider,
             voice_id=voice_id,
+            voice_settings=self.get_voice_settings(),
             # Domain/topic settings
             domain=domain or None,
             topic=topic or None,
@@ -628,14 +646,14 @@ class Text2VideoPane(QWidget):
             vi = self.table.item(r,1).text() if self.table.item(r,1) else ""
             tgt= self.table.item(r,2).text() if self.table.item(r,2) else vi
 
-            # Part D: Pass enhanced bible and voice settings to build_prompt_json
-            j=build_prompt_json(
+            # Part D: Pass enhanced bible and voice settings to the prompt JSON
+            cp=compile_prompt(
                 r+1, vi, tgt, lang_code, ratio_key, style,
                 character_bible=character_bible_basic,
                 enhanced_bible=self._character_bible,
                 voice_settings=voice_settings
             )
-            scenes.append({"prompt": json.dumps(j, ensure_ascii=False, indent=2), "aspect": ratio})
+            scenes.append({"prompt": cp["text"], "payload": cp["payload"], "seed": cp["seed"], "aspect": ratio})
 
         model_display = self.cb_model.currentText()
         model_key = get_model_key_from_display(model_display)
@@ -663,18 +681,54 @@ class Text2VideoPane(QWidget):
         self.thread.started.connect(self.worker.run)
         self.worker.log.connect(self._append_log)
         if task=="script":
+            self._streamed = set()
+            self.worker.scene_ready.connect(self._on_scene_streamed)
             self.worker.story_done.connect(self._on_story_ready)
         else:
             self.worker.job_card.connect(self._on_job_card)
             self.worker.job_finished.connect(lambda: self._on_worker_finished())
         self.thread.start()
 
+    def _resume_unfinished(self):
+        root = cfg.load().get("download_root") or ""
+        found = find_unfinished(root) if root else []
+        if not found or getattr(self, "thread", None) is not None: return
+        jr = found[0]; state = jr.state()
+        self._title = state["meta"].get("title") or os.path.basename(os.path.dirname(jr.directory))
+        self._ctx = {"title": self._title, "prj_dir": os.path.dirname(jr.directory), "dir_videos": jr.directory}
+        self._reset_cards()
+        for sid in sorted((int(k) for k in state["scenes"] if k.isdigit())):
+            self._cards_state[sid] = {'vi':'','tgt':'','thumb':'','videos':{}}
+            self._add_card(sid)
+        if len(found) > 1:
+            self._append_log(f"[INFO] Còn {len(found)-1} dự án khác có video dang dở (sẽ tiếp tục khi chạy lại dự án đó).")
+        self._append_log(f"[INFO] Phát hiện video dang dở của dự án '{self._title}', tiếp tục theo dõi & tải về...")
+        self.btn_auto.setEnabled(False); self.btn_stop.setEnabled(True)
+        self._run_in_thread("resume", {"dir_videos": jr.directory, "auto_download": True})
+
     def _on_worker_finished(self):
         """PR#4: Re-enable buttons when worker completes"""
         self._append_log("[INFO] Worker hoàn tất.")
         self.btn_auto.setEnabled(True)
         self.btn_stop.setEnabled(False)
 
+    def _on_scene_streamed(self, sid, sc):
+        # scenes arrive while the LLM is still writing (LONG chunks out of order); _on_story_ready rebuilds
+        if not self._streamed:
+            self._reset_cards()
+        self._cards_state[sid] = {'vi': sc.get('prompt_vi',''), 'tgt': sc.get('prompt_tgt',''), 'thumb':'', 'videos':{}}
+        if sid in self._streamed:
+            self._card_items[sid].setText(self._render_card_text(sid))
+        else:
+            pos = self.cards.count()
+            for i in range(self.cards.count()):
+                role = self.cards.item(i).data(Qt.UserRole)
+                if isinstance(role, tuple) and role[1] >= sid:
+                    pos = i; break
+            self._add_card(sid, pos)
+            self._streamed.add(sid)
+        self._append_log(f"[INFO] Cảnh {sid} đã viết xong ({len(self._streamed)} cảnh)")
+
     def _on_story_ready(self, data, ctx):
         self._ctx = ctx
         # title/project
@@ -692,15 +746,12 @@ class Text2VideoPane(QWidget):
         sp_tgt = data.get("screenplay_tgt","" ).strip()
         if sp_vi or sp_tgt: parts.append(f"\n=== KỊCH BẢN (VI) ===\n{sp_vi}\n\n=== SCREENPLAY ===\n{sp_tgt}")
         self.view_story.setPlainText("\n\n".join(parts) if parts else "(Không có dữ liệu)")
-        self.cards.clear()
-        self._cards_state = {}
+        self._reset_cards()
         for i, sc in enumerate(data.get('scenes', []), 1):
             vi = sc.get('prompt_vi','')
             tgt = sc.get('prompt_tgt','')
             self._cards_state[i] = {'vi': vi, 'tgt': tgt, 'thumb':'', 'videos':{}}
-            it = QListWidgetItem(self._render_card_text(i))
-            it.setData(Qt.UserRole, ('scene', i))
-            self.cards.addItem(it)
+            self._add_card(i)
 
         # fill table & save prompts
         self.table.setRowCount(0)
@@ -721,7 +772,7 @@ class Text2VideoPane(QWidget):
                 character_bible_basic = data.get("character_bible", [])
                 # Get current voice settings
                 voice_settings = self.get_voice_settings()
-                j=build_prompt_json(
+                cp=compile_prompt(
                     i, sc.get("prompt_vi","" ), sc.get("prompt_tgt","" ), lang_code,
                     self.cb_ratio.currentText(), self.cb_style.currentText(),
                     character_bible=character_bible_basic,
@@ -729,7 +780,7 @@ class Text2VideoPane(QWidget):
                 )
                 if prdir:
                     with open(os.path.join(prdir, f"scene_{i:02d}.json"), "w", encoding="utf-8") as f:
-                        json.dump(j, f, ensure_ascii=False, indent=2)
+                        f.write(cp["text"])
             except Exception: pass
         self._append_log("[INFO] Kịch bản đã hiển thị & lưu file.")
 
@@ -758,15 +809,28 @@ class Text2VideoPane(QWidget):
         else:
             QMessageBox.information(self,"Chưa có thư mục","Hãy viết kịch bản trước để tạo cấu trúc dự án.")
 
+    def _on_final_cut(self):
+        d = self._ctx.get("dir_videos")
+        if not d or not os.path.isdir(d):
+            QMessageBox.information(self,"Chưa có video","Hãy tạo video trước khi ghép."); return
+        self.btn_auto.setEnabled(False); self.btn_stop.setEnabled(True)
+        self._append_log("[INFO] Bắt đầu ghép video hoàn chỉnh...")
+        self._run_in_thread("final_cut", {"dir_videos": d, "prj_dir": self._ctx.get("prj_dir") or os.path.dirname(d),
+                                          "title": self._title or "Project"})
+
     def _open_prompt_view(self, row):
         if row<0 or row>=self.table.rowCount(): return
         vi = self.table.item(row,1).text() if self.table.item(row,1) else ""
         tgt= self.table.item(row,2).text() if self.table.item(row,2) else ""
         lang_code=self.cb_out_lang.currentData()
         voice_settings = self.get_voice_settings()
-        j=build_prompt_json(row+1, vi, tgt, lang_code, self.cb_ratio.currentText(), self.cb_style.currentText(), voice_settings=voice_settings)
+        # same inputs as _on_create_video_clicked, so the viewer shows (and caches) exactly what gets submitted
+        character_bible_basic = self._script_data.get("character_bible", []) if self._script_data else []
+        cp=compile_prompt(row+1, vi, tgt or vi, lang_code, self.cb_ratio.currentText(), self.cb_style.currentText(),
+                          character_bible=character_bible_basic, enhanced_bible=self._character_bible,
+                          voice_settings=voice_settings)
         from ui.prompt_viewer import PromptViewer
-        dlg = PromptViewer(json.dumps(j, ensure_ascii=False, indent=2), None, self); dlg.exec_()
+        dlg = PromptViewer(cp["text"], None, self); dlg.exec_()
 
 
     def _on_job_card(self, data:dict):
@@ -779,18 +843,40 @@ class Text2VideoPane(QWidget):
             if data.get(k): v[k] = data.get(k)
         if data.get('thumb') and os.path.isfile(data['thumb']):
             st['thumb'] = data['thumb']
-        for i in range(self.cards.count()):
-            it = self.cards.item(i)
-            role = it.data(Qt.UserRole)
-            if isinstance(role, tuple) and role == ('scene', scene):
-                it.setText(self._render_card_text(scene))
-                if st.get('thumb') and os.path.isfile(st['thumb']):
-                    from PyQt5.QtGui import QIcon, QPixmap
-                    pix=QPixmap(st['thumb']).scaled(self.cards.iconSize(), Qt.KeepAspectRatio, Qt.SmoothTransformation)
-                    it.setIcon(QIcon(pix))
-                col = self._t2v_status_color(v.get('status'))
-                if col: it.setBackground(col)
-                break
+        st['last_status'] = v.get('status')
+        self._cards_dirty.add(scene)
+        if not self._cards_timer.isActive(): self._cards_timer.start()
+
+    def _reset_cards(self):
+        self.cards.clear(); self._cards_state = {}; self._card_items = {}; self._cards_dirty.clear()
+
+    def _add_card(self, sid, pos=None):
+        it = QListWidgetItem(self._render_card_text(sid)); it.setData(Qt.UserRole, ('scene', sid))
+        if pos is None: self.cards.addItem(it)
+        else: self.cards.insertItem(pos, it)
+        self._card_items[sid] = it
+        return it
+
+    def _flush_cards(self):
+        dirty, self._cards_dirty = self._cards_dirty, set()
+        for scene in dirty:
+            it = self._card_items.get(scene)
+            if it is None: continue
+            st = self._cards_state.get(scene, {})
+            it.setText(self._render_card_text(scene))
+            # load the thumbnail only when it changed, not on every status event
+            if st.get('thumb') and st.get('thumb_shown') != st['thumb']:
+                st['thumb_shown'] = st['thumb']
+                pix = get_thumbnail_service().request(st['thumb'], self.cards.iconSize(),
+                                                      lambda p, sc=scene: self._set_card_icon(sc, p))
+                if pix is not None: self._set_card_icon(scene, pix)
+            col = self._t2v_status_color(st.get('last_status'))
+            if col: it.setBackground(col)
+            it.setData(BUSY_ROLE, any(is_busy(v.get('status')) for v in st.get('videos', {}).values()))
+
+    def _set_card_icon(self, scene, pix):
+        it = self._card_items.get(scene)
+        if it is not None and not pix.isNull(): it.setIcon(QIcon(pix))
 
     def _t2v_status_color(self, status):
         s = (status or "").upper()
@@ -799,31 +885,6 @@ class Text2VideoPane(QWidget):
         if s in ("ERROR","FAILED"): return QColor("#ED6D6A")
         return None
 
-    def _t2v_tick(self):
-        try:
-            self._spin_idx = (self._spin_idx + 1) % len(self._spin_frames)
-            if hasattr(self, "table") and self.table is not None:
-                rows = self.table.rowCount()
-                for r in range(rows):
-                    it = self.table.item(r, 3)  # status col
-                    if not it:
-                        continue
-                    status = (it.text() or "").upper()
-                    col = self._t2v_status_color(status)
-                    if col: it.setBackground(col)
-                    if status in ("QUEUED","PROCESSING","RENDERING","DOWNLOADING"):
-                        base = status.title()
-                        it.setText(base + " " + self._spin_frames[self._spin_idx])
-            if hasattr(self, "cards") and self.cards is not None:
-                for i in range(self.cards.count()):
-                    it = self.cards.item(i)
-                    txt = it.text()
-                    if any(k in txt for k in ["PROCESSING","RENDERING","DOWNLOADING","QUEUED"]):
-                        tail = " " + self._spin_frames[self._spin_idx]
-                        if not txt.endswith(tail): it.setText(txt + tail)
-        except Exception:
-            pass
-
     def _t2v_get_copies(self):
         # Try common spinbox names; fallback 2
         cand = ["sp_copies","sb_copies","spin_copies","sp_num_videos","spVideos","sp_copies_per_scene"]
@@ -1,12 +1,18 @@
 
 import json
 import os
-import shutil
-import subprocess
+import threading
+import time
 
 from PyQt5.QtCore import QObject, pyqtSignal
 
-from services.google.labs_flow_client import DEFAULT_PROJECT_ID, LabsFlowClient
+from services.google.labs_flow_client import DEFAULT_PROJECT_ID, LabsFlowClient, _trim_prompt_text
+from services.final_cut import FinalCut
+from services.job_journal import JobJournal, prompt_hash
+from services.operation_poller import get_poller, is_terminal
+from services.prompt_cache import bible_version, get_prompt_cache, prompt_key, seed_for
+from services.scene_timeline import SceneTimeline
+from services.utils.ffmpeg_pool import get_ffmpeg_pool, thumbnail_args, upscale_args, upscale_preset
 from services.utils.video_downloader import VideoDownloader
 from utils import config as cfg
 
@@ -50,14 +56,24 @@ def get_model_key_from_display(display_name):
             return key
     return display_name  # Fallback
 
-def build_prompt_json(scene_index:int, desc_vi:str, desc_tgt:str, lang_code:str, ratio_str:str, style:str, seconds:int=8, copies:int=1, resolution_hint:str=None, character_bible=None, enhanced_bible=None, voice_settings=None):
+def _prompt_key(scene_index, desc_vi, desc_tgt, lang_code, ratio_str, style, seconds, copies, resolution_hint, character_bible, enhanced_bible, voice_settings):
+    return prompt_key(scene=int(scene_index), vi=(desc_vi or "").strip(), tgt=(desc_tgt or "").strip(),
+                      lang=lang_code or "", ratio=ratio_str or "", style=style or "", seconds=seconds, copies=copies,
+                      res=resolution_hint or "", bible=bible_version(character_bible, enhanced_bible),
+                      voice=voice_settings or {})
+
+def build_prompt_json(scene_index:int, desc_vi:str, desc_tgt:str, lang_code:str, ratio_str:str, style:str, seconds:int=8, copies:int=1, resolution_hint:str=None, character_bible=None, enhanced_bible=None, voice_settings=None, seed:int=None):
     """
     Strict prompt JSON schema:
     - objective/persona/constraints/assets/hard_locks/character_details/setting_details/key_action/camera_direction/audio/graphics/negatives/generation
     - bilingual localization (vi + target)
     
     Part D: Now supports enhanced_bible (CharacterBible object) for detailed character consistency
+    seed defaults to one derived from the inputs, so the same scene always gives the same JSON.
     """
+    if seed is None:
+        seed = seed_for(_prompt_key(scene_index, desc_vi, desc_tgt, lang_code, ratio_str, style, seconds, copies,
+                                    resolution_hint, character_bible, enhanced_bible, voice_settings))
     ratio_map = {
         '16:9': ('1920x1080', 'VIDEO_ASPECT_RATIO_LANDSCAPE'),
         '21:9': ('2560x1080', 'VIDEO_ASPECT_RATIO_LANDSCAPE'),
@@ -173,14 +189,31 @@ def build_prompt_json(scene_index:int, desc_vi:str, desc_tgt:str, lang_code:str,
             "No brand logos unless present in references.",
             "No unrealistic X-ray views; use graphic overlays only."
         ],
-        "generation": { "seed": __import__("random").randint(0, 2**31-1), "copies": copies },
+        "generation": { "seed": int(seed), "copies": copies },
         "localization": { "vi": {"prompt": (desc_vi or '').strip()}, "tgt": {"lang": lang_code, "prompt": (desc_tgt or desc_vi or '').strip()} }
     }
     return data
 
+def compile_prompt(scene_index:int, desc_vi:str, desc_tgt:str, lang_code:str, ratio_str:str, style:str, seconds:int=8, copies:int=1, resolution_hint:str=None, character_bible=None, enhanced_bible=None, voice_settings=None):
+    """
+    Cached build_prompt_json: {"data", "text" (indented JSON), "payload" (trimmed text sent to Labs), "seed"}.
+    The entry is shared between callers; do not modify it.
+    """
+    key = _prompt_key(scene_index, desc_vi, desc_tgt, lang_code, ratio_str, style, seconds, copies,
+                      resolution_hint, character_bible, enhanced_bible, voice_settings)
+
+    def build():
+        seed = seed_for(key)
+        data = build_prompt_json(scene_index, desc_vi, desc_tgt, lang_code, ratio_str, style, seconds, copies,
+                                 resolution_hint, character_bible, enhanced_bible, voice_settings, seed=seed)
+        text = json.dumps(data, ensure_ascii=False, indent=2)
+        return {"data": data, "text": text, "payload": _trim_prompt_text(text), "seed": seed}
+    return get_prompt_cache().get_or_build(key, build)
+
 class _Worker(QObject):
     log = pyqtSignal(str)
     story_done = pyqtSignal(dict, dict)   # data, context (paths)
+    scene_ready = pyqtSignal(int, dict)   # scene number (1-based), scene - streamed before story_done
     job_card = pyqtSignal(dict)
     job_finished = pyqtSignal()
 
@@ -189,6 +222,11 @@ class _Worker(QObject):
         self.task = task
         self.payload = payload
         self.should_stop = False  # PR#4: Add stop flag
+        self._timeline = None
+        self._post = []             # ffmpeg futures (thumbnails, upscale) of this run
+        self._post_lock = threading.Lock()
+        self._dl_callbacks = 0      # downloads whose on_done has not finished yet
+        self._up4k = False
         self.video_downloader = VideoDownloader(log_callback=lambda msg: self.log.emit(msg))
 
     def run(self):
@@ -197,10 +235,14 @@ class _Worker(QObject):
                 self._run_script()
             elif self.task == "video":
                 self._run_video()
+            elif self.task == "resume":
+                self._run_resume()
+            elif self.task == "final_cut":
+                self._run_final_cut()
         except Exception as e:
             self.log.emit(f"[ERR] {e}")
         finally:
-            if self.task == "video":
+            if self.task in ("video", "resume", "final_cut"):
                 self.job_finished.emit()
 
     def _run_script(self):
@@ -230,8 +272,16 @@ class _Worker(QObject):
             output_lang=p["out_lang_code"],
             domain=p.get("domain"),
             topic=p.get("topic"),
-            voice_config=voice_config
+            voice_config=voice_config,
+            log_callback=lambda msg: self.log.emit(msg),
+            on_scene=lambda i, sc: self.scene_ready.emit(i + 1, dict(sc))
         )
+        try:
+            from services.llm_cache import get_llm_cache
+            c = get_llm_cache()
+            if c: self.log.emit(f"[CACHE] LLM cache: {c.hits} hit / {c.misses} miss")
+        except Exception:
+            pass
         # auto-save to folders
         st = cfg.load()
         root = st.get("download_root") or ""
@@ -272,26 +322,128 @@ class _Worker(QObject):
         ctx = {"title": title, "prj_dir": prj_dir, "dir_script": dir_script, "dir_prompts": dir_prompts, "dir_videos": dir_videos, "scenes": data.get("scenes",[])}
         self.log.emit("[INFO] Hoàn tất sinh kịch bản & lưu file.")
         self.story_done.emit(data, ctx)
+        # paid TTS calls for every scene: only when the user opted in with tts.auto_voiceover
+        if voice_config and (cfg.load().get("tts") or {}).get("auto_voiceover", False):
+            self._synthesize_voiceover(data.get("scenes") or [], os.path.join(prj_dir, "Audio"), voice_config,
+                                       p.get("voice_settings") or {})
 
-    def _download(self, url, dst_path):
+    def _synthesize_voiceover(self, scenes, audio_dir, voice_config, voice_settings):
+        """All scene voice-overs in parallel into <project>/Audio (picked up by the final cut)."""
         try:
-            self.video_downloader.download(url, dst_path)
-            return True
+            from services.tts_service import TTSEngine, scene_text
+            prosody = {"style": voice_settings.get("speaking_style") or "storytelling",
+                       "rate": voice_settings.get("rate_multiplier", 1.0), "pitch": voice_settings.get("pitch_adjust", 0)}
+            eng = TTSEngine(voice_config["provider"], voice_config["voice_id"], prosody, log=self.log.emit)
         except Exception as e:
-            self.log.emit(f"[ERR] Download fail: {e}")
-            return False
-
-    def _make_thumb(self, video_path, out_dir, scene, copy):
+            self.log.emit(f"[WARN] Bỏ qua lồng tiếng: {e}")
+            return
+        if not eng.keys:
+            self.log.emit(f"[WARN] Chưa có API key {voice_config['provider']} — bỏ qua lồng tiếng.")
+            return
+        texts = {i: scene_text(sc) for i, sc in enumerate(scenes, start=1)}
+        self.log.emit(f"[INFO] Lồng tiếng {sum(1 for t in texts.values() if t)} cảnh song song ({voice_config['provider']})...")
+        t0 = time.monotonic()
+        res = eng.synthesize_all(texts, audio_dir,
+                                 on_item=lambda r: None if r["ok"] else self.log.emit(f"[ERR] Lồng tiếng cảnh {r['scene']}: {r['error']}"))
+        ok = sum(1 for r in res if r["ok"])
+        self.log.emit(f"[INFO] Lồng tiếng xong {ok}/{len(res)} cảnh trong {time.monotonic() - t0:.1f}s "
+                      f"(cache: {eng.hits} hit / {eng.misses} miss) -> {audio_dir}")
+
+    def _on_download_done(self, res, card, thumbs_dir, journal=None, op_name="", t_sub=None):
+        # runs on a download pool thread; signals are queued to the UI
+        try:
+            self._handle_download(res, card, thumbs_dir, journal, op_name, t_sub)
+        finally:
+            with self._post_lock:
+                self._dl_callbacks -= 1
+
+    def _handle_download(self, res, card, thumbs_dir, journal, op_name, t_sub):
+        tl = self._timeline
+        if tl and t_sub is not None:
+            # time in the shared pool before the transfer started is queueing, not download
+            t_end = time.monotonic(); t_dl = max(t_sub, t_end - float(res.get("seconds") or 0))
+            tl.complete(card["scene"], f"queue_download v{card['copy']}", t_sub, t_dl)
+            tl.complete(card["scene"], f"download v{card['copy']}", t_dl, t_end, ok=res["ok"], mbps=res.get("mbps"))
+        if res["ok"]:
+            card["status"] = "DOWNLOADED"
+            card["path"] = res["path"]
+            self._make_thumb(res["path"], thumbs_dir, card)
+            if self._up4k:
+                self._upscale(card)
+            if journal and op_name:
+                journal.downloaded(op_name, res["path"])
+            self.log.emit(f"[SUCCESS] ✓ Downloaded: {os.path.basename(res['path'])} ({res['mbps']} MB/s)")
+        else:
+            card["status"] = "DOWNLOAD_FAILED"
+            self.log.emit(f"[ERR] Download failed after {res['attempts']} attempts: {res['error']}")
+        self.job_card.emit(card)
+
+    def _post_process(self, args, card, span, label, on_ok, on_progress=None):
+        """Queue an ffmpeg job on the shared post-processing pool, off the poll and download threads."""
+        t_sub = time.monotonic()
+
+        def done(res):
+            tl = self._timeline
+            if tl:
+                t_end = time.monotonic(); t_run = max(t_sub, t_end - float(res.get("seconds") or 0))
+                tl.complete(card["scene"], f"queue_post {span}", t_sub, t_run)
+                tl.complete(card["scene"], span, t_run, t_end, ok=res["ok"])
+            if res["ok"]:
+                on_ok()
+                self.job_card.emit(card)
+            elif not res["cancelled"]:
+                self.log.emit(f"[ERR] {label} lỗi: {res['error']}")
+
+        fut = get_ffmpeg_pool().submit(args, label=label, on_progress=on_progress, on_done=done)
+        with self._post_lock:
+            self._post.append(fut)
+
+    def _make_thumb(self, video_path, out_dir, card):
+        if not get_ffmpeg_pool().available():
+            return
         try:
             os.makedirs(out_dir, exist_ok=True)
-            thumb = os.path.join(out_dir, f"thumb_c{scene}_v{copy}.jpg")
-            if shutil.which("ffmpeg"):
-                cmd=["ffmpeg","-y","-ss","00:00:00","-i",video_path,"-frames:v","1","-q:v","3",thumb]
-                subprocess.run(cmd, check=True)
-                return thumb
-        except Exception as e:
+        except OSError as e:
             self.log.emit(f"[WARN] Tạo thumbnail lỗi: {e}")
-        return ""
+            return
+        thumb = os.path.join(out_dir, f"thumb_c{card['scene']}_v{card['copy']}.jpg")
+        self._post_process(thumbnail_args(video_path, thumb), card, f"thumbnail v{card['copy']}",
+                           f"Thumbnail cảnh {card['scene']}", lambda: card.update(thumb=thumb))
+
+    def _upscale(self, card):
+        src = card["path"]
+        dst = src.replace(".mp4", "_4k.mp4")
+        label = f"Upscale 4K cảnh {card['scene']} bản {card['copy']}"
+        step = [0]
+
+        def progress(pct, _secs):
+            if pct >= step[0] + 25:
+                step[0] = pct - pct % 25
+                self.log.emit(f"[INFO] {label}: {pct}%")
+
+        self._post_process(upscale_args(src, dst, preset=upscale_preset()), card, f"upscale v{card['copy']}", label,
+                           lambda: card.update(path=dst, status="UPSCALED_4K"), progress)
+
+    def _drain(self, downloads):
+        """Wait for the downloads and the ffmpeg work they queued; cancels pending ffmpeg work on stop."""
+        pool = get_ffmpeg_pool()
+        cancelled = False
+        announced = False
+        while True:
+            with self._post_lock:
+                post = [f for f in self._post if not f.done()]
+                busy = self._dl_callbacks > 0 or any(not f.done() for f in downloads)
+            if not post and not busy:
+                return
+            if post and not busy and not announced:
+                announced = True
+                self.log.emit(f"[INFO] Chờ xử lý hậu kỳ {len(post)} tác vụ ffmpeg...")
+            if self.should_stop and post and not cancelled:
+                cancelled = True
+                for f in post:
+                    pool.cancel(f)
+                self.log.emit(f"[INFO] Đã hủy {len(post)} tác vụ ffmpeg còn lại.")
+            time.sleep(0.2)
 
     def _run_video(self):
         p = self.payload
@@ -302,26 +454,43 @@ class _Worker(QObject):
         copies = p["copies"]
         title = p["title"]
         dir_videos = p["dir_videos"]
-        up4k = p.get("upscale_4k", False)
-        quality = p.get("quality", "1080p")  # Get quality setting
-        auto_download = p.get("auto_download", True)  # Get auto-download setting
-        thumbs_dir = os.path.join(dir_videos, "thumbs")
+        model_key = p.get("model_key","")
+
+        # scenes whose earlier operations are still unfinished are resumed instead of re-submitted
+        journal = JobJournal(dir_videos)
+        prior = journal.state()["scenes"]
+        journal.begin(title=title, model=model_key, copies=copies)
+        self._timeline = SceneTimeline(os.path.dirname(os.path.normpath(dir_videos)) or dir_videos, title=title)
+        t_run = time.monotonic()
 
         jobs = []
         # PR#5: Batch generation - make one call per scene with copies parameter (not N calls)
         for scene_idx, scene in enumerate(p["scenes"], start=1):
             ratio = scene["aspect"]
-            model_key = p.get("model_key","")
+            ph = prompt_hash(scene["prompt"])
+            rec = prior.get(str(scene_idx))
+            if rec and rec.get("prompt_hash") == ph and JobJournal.unfinished_ops(rec):
+                self.log.emit(f"[INFO] Cảnh {scene_idx}: tiếp tục theo dõi từ nhật ký, không gửi lại.")
+                jobs.extend(self._resume_cards(rec, scene_idx, scene["prompt"], dir_videos, journal, title))
+                continue
 
             # Single API call with copies parameter (instead of N calls)
             body = {"prompt": scene["prompt"], "copies": copies, "model": model_key, "aspect_ratio": ratio}
+            if scene.get("seed") is not None:
+                body["seed"] = scene["seed"]
             self.log.emit(f"[INFO] Start scene {scene_idx} with {copies} copies in one batch…")
-            rc = client.start_one(body, model_key, ratio, scene["prompt"], copies=copies, project_id=project_id)
+            # scenes start one after another here, so everything before this call is queueing
+            t_start = time.monotonic()
+            self._timeline.complete(scene_idx, "queue_start", t_run, t_start)
+            rc = client.start_one(body, model_key, ratio, scene.get("payload") or scene["prompt"], copies=copies, project_id=project_id)
+            self._timeline.complete(scene_idx, "start", t_start, refs=rc)
+            self._timeline.submitted(scene_idx, body.get("operation_names", []))
 
             if rc > 0:
                 # Only create cards for operations that actually exist in the API response
                 # The body dict is updated by client.start_one() with operation_names list
                 actual_count = len(body.get("operation_names", []))
+                journal.submitted(scene_idx, body.get("operation_names", []), prompt_hash=ph)
                 
                 if actual_count < copies:
                     self.log.emit(f"[WARN] Scene {scene_idx}: API returned {actual_count} operations but {copies} copies were requested")
@@ -330,205 +499,163 @@ class _Worker(QObject):
                 for copy_idx in range(1, actual_count + 1):
                     card={"scene":scene_idx,"copy":copy_idx,"status":"PROCESSING","json":scene["prompt"],"url":"","path":"","thumb":"","dir":dir_videos}
                     self.job_card.emit(card)
-
-                    # Store card data with copy index for operation name mapping
-                    # copy_idx is 1-based, so we'll use copy_idx-1 to index into operation_names (0-based)
-                    job_info = {
-                        'card': card,
-                        'body': body,
-                        'scene': scene_idx,
-                        'copy': copy_idx  # 1-based index
-                    }
-                    jobs.append(job_info)
+                    jobs.append({'card': card, 'op': body["operation_names"][copy_idx - 1],
+                                 'title': title, 'journal': journal})
             else:
                 # All copies failed to start
                 for copy_idx in range(1, copies+1):
                     card={"scene":scene_idx,"copy":copy_idx,"status":"FAILED_START","json":scene["prompt"],"url":"","path":"","thumb":"","dir":dir_videos}
                     self.job_card.emit(card)
 
-        # polling with improved error handling
-        retry_count = {}  # Track retry attempts per operation
-        download_retry_count = {}  # Track download retry attempts
-        max_retries = 3
-        max_download_retries = 5
+        self._poll_and_download(client, jobs)
 
-        for poll_round in range(120):
-            # PR#4: Check stop flag
+    def _resume_cards(self, rec, scene_idx, prompt, dir_videos, journal, title):
+        """Cards for a journaled scene: finished copies are re-emitted, unfinished ones returned for polling."""
+        jobs = []
+        unfinished = set(JobJournal.unfinished_ops(rec))
+        for copy_idx, op in enumerate(rec.get("ops", []), start=1):
+            info = (rec.get("op_status") or {}).get(op) or {}
+            card = {"scene": scene_idx, "copy": copy_idx, "status": info.get("status") or "PROCESSING", "json": prompt,
+                    "url": info.get("video_url", ""), "path": "", "thumb": "", "dir": dir_videos}
+            if op not in unfinished:
+                path = (rec.get("downloads") or {}).get(op, "")
+                if path:
+                    card["status"] = "DOWNLOADED"; card["path"] = path
+            self.job_card.emit(card)
+            if op in unfinished:
+                jobs.append({'card': card, 'op': op, 'title': title, 'journal': journal})
+        return jobs
+
+    def _run_final_cut(self):
+        """Concatenate one copy per scene (+ voice-over / subtitles when the project has them)."""
+        p = self.payload
+        prj = p["prj_dir"]
+        cut = FinalCut(p["dir_videos"], os.path.join(prj, f"{p['title']}_final.mp4"),
+                       audio=os.path.join(prj, "Audio"), subtitles=os.path.join(prj, "Phụ đề.srt"),
+                       burn_subtitles=p.get("burn_subtitles", False), on_log=self.log.emit)
+        box = {}
+        t = threading.Thread(target=lambda: box.update(res=cut.run()), daemon=True)
+        t.start()
+        while t.is_alive():
+            t.join(0.3)
             if self.should_stop:
-                self.log.emit("[INFO] Đã dừng xử lý theo yêu cầu người dùng.")
-                break
-
-            if not jobs:
-                self.log.emit("[INFO] Tất cả video đã hoàn tất hoặc thất bại.")
-                break
-
-            # Extract all operation names from all jobs
-            names = []
-            for job_info in jobs:
-                job_dict = job_info['body']
-                names.extend(job_dict.get("operation_names", []))
-
-            # Batch check with error handling
-            try:
-                rs = client.batch_check_operations(names)
-            except Exception as e:
-                self.log.emit(f"[WARN] Lỗi kiểm tra trạng thái (vòng {poll_round + 1}): {e}")
-                import time
-                time.sleep(10)  # Wait longer on error before retry
-                continue
-
-            new_jobs=[]
-            for job_info in jobs:
+                cut.cancel()
+        res = box.get("res") or {}
+        if res.get("ok"):
+            self.log.emit(f"[SUCCESS] ✓ Video hoàn chỉnh: {res['path']} ({res['scenes']} cảnh, "
+                          f"chuẩn hoá lại {res['reencoded']}, {res['seconds']}s)")
+        else:
+            self.log.emit(f"[ERR] Ghép video thất bại: {res.get('error')}")
+
+    def _run_resume(self):
+        """Pick up polling/downloading of a journaled run after a restart."""
+        st = cfg.load()
+        client = LabsClient(st.get("tokens") or [], on_event=None)
+        journal = JobJournal(self.payload["dir_videos"])
+        state = journal.state()
+        title = state["meta"].get("title") or "Project"
+        jobs = []
+        for sid, rec in sorted(state["scenes"].items(), key=lambda kv: int(kv[0]) if kv[0].isdigit() else 0):
+            if JobJournal.unfinished_ops(rec):
+                jobs.extend(self._resume_cards(rec, int(sid) if sid.isdigit() else 0, "", journal.directory, journal, title))
+        self.log.emit(f"[INFO] Tiếp tục {len(jobs)} video chưa xong của dự án '{title}' từ nhật ký.")
+        self._timeline = SceneTimeline(os.path.dirname(os.path.normpath(journal.directory)) or journal.directory, title=title)
+        self._poll_and_download(client, jobs)
+
+    def _poll_and_download(self, client, jobs):
+        p = self.payload
+        auto_download = p.get("auto_download", True)  # Get auto-download setting
+        # upscale runs per video on the ffmpeg pool as soon as it is downloaded
+        self._up4k = bool(p.get("upscale_4k", False))
+        if self._up4k and not get_ffmpeg_pool().available():
+            self.log.emit("[WARN] Không tìm thấy ffmpeg trong PATH — bỏ qua upscale 4K.")
+            self._up4k = False
+
+        # polling through the shared operation poller (adaptive intervals, batched across projects)
+        by_op = {}
+        for job_info in jobs:
+            if job_info.get('op'):
+                by_op[job_info['op']] = job_info
+            else:
                 card = job_info['card']
-                job_dict = job_info['body']
-                copy_idx = job_info['copy']  # 1-based copy index
-                
-                # Get operation names list and map this copy to its operation
-                op_names = job_dict.get("operation_names", [])
-                if not op_names:
-                    # No operation name - keep in queue for one more iteration in case it appears
-                    # Initialize skip counter if not present
-                    if 'no_op_count' not in job_info:
-                        job_info['no_op_count'] = 0
-                    job_info['no_op_count'] += 1
-                    
-                    # Only skip after multiple attempts
-                    if job_info['no_op_count'] > 3:
-                        sc = card['scene']
-                        cp = card['copy']
-                        self.log.emit(f"[WARN] Cảnh {sc} video {cp}: không có operation name sau 3 lần thử")
-                    else:
-                        new_jobs.append(job_info)
-                    continue
-
-                # Map copy index to the correct operation name (copy_idx is 1-based, array is 0-based)
-                op_index = copy_idx - 1
-                if op_index >= len(op_names):
-                    # This copy's operation doesn't exist - should not happen due to earlier check
-                    sc = card['scene']
-                    cp = card['copy']
-                    self.log.emit(f"[ERR] Cảnh {sc} video {cp}: operation index {op_index} out of bounds (only {len(op_names)} operations)")
-                    card["status"] = "FAILED"
-                    self.job_card.emit(card)
-                    continue
-                
-                op_name = op_names[op_index]
-                op_result = rs.get(op_name) or {}
-                
-                # VEO3 WORKING STRUCTURE: Check raw API response
-                raw_response = op_result.get('raw', {})
-                status = raw_response.get('status', '')
-                
-                scene = card["scene"]
-                copy_num = card["copy"]
-
-                if status == 'MEDIA_GENERATION_STATUS_SUCCESSFUL':
-                    # Extract video URL from correct path
-                    op_metadata = raw_response.get('operation', {}).get('metadata', {})
-                    video_info = op_metadata.get('video', {})
-                    video_url = video_info.get('fifeUrl', '')
-                    
-                    if video_url:
-                        card["status"] = "READY"
-                        card["url"] = video_url
-                        
-                        self.log.emit(f"[SUCCESS] Scene {scene} Copy {copy_num}: Video ready!")
-                        
-                        # Download logic
-                        if auto_download:
-                            fn = f"{title}_scene{scene}_copy{copy_num}.mp4"
-                            fp = os.path.join(dir_videos, fn)
-                            
-                            self.log.emit(f"[INFO] Downloading scene {scene} copy {copy_num}...")
-                            
-                            try:
-                                if self._download(video_url, fp):
-                                    card["status"] = "DOWNLOADED"
-                                    card["path"] = fp
-                                    
-                                    thumb = self._make_thumb(fp, thumbs_dir, scene, copy_num)
-                                    card["thumb"] = thumb
-                                    
-                                    self.log.emit(f"[SUCCESS] ✓ Downloaded: {os.path.basename(fp)}")
-                                else:
-                                    # Track download retries
-                                    download_key = f"{scene}_{copy_num}"
-                                    retries = download_retry_count.get(download_key, 0)
-                                    if retries < max_download_retries:
-                                        download_retry_count[download_key] = retries + 1
-                                        self.log.emit(f"[WARN] Download failed, will retry ({retries + 1}/{max_download_retries})")
-                                        card["status"] = "DOWNLOAD_FAILED"
-                                        card["url"] = video_url
-                                        self.job_card.emit(card)
-                                        new_jobs.append(job_info)
-                                    else:
-                                        self.log.emit(f"[ERR] Download failed after {max_download_retries} attempts")
-                                        card["status"] = "DOWNLOAD_FAILED"
-                                        card["url"] = video_url
-                                        self.job_card.emit(card)
-                            except Exception as e:
-                                # Track download retries for exceptions
-                                download_key = f"{scene}_{copy_num}"
-                                retries = download_retry_count.get(download_key, 0)
-                                if retries < max_download_retries:
-                                    download_retry_count[download_key] = retries + 1
-                                    self.log.emit(f"[ERR] Download error: {e} - will retry ({retries + 1}/{max_download_retries})")
-                                    card["status"] = "DOWNLOAD_FAILED"
-                                    card["url"] = video_url
-                                    self.job_card.emit(card)
-                                    new_jobs.append(job_info)
-                                else:
-                                    self.log.emit(f"[ERR] Download error after {max_download_retries} attempts: {e}")
-                                    card["status"] = "DOWNLOAD_FAILED"
-                                    card["url"] = video_url
-                                    self.job_card.emit(card)
-                        
-                        self.job_card.emit(card)
-                    else:
-                        # Video marked successful but no URL - this is an error state
-                        self.log.emit(f"[ERR] Scene {scene} Copy {copy_num}: No video URL in response")
-                        card["status"] = "DONE_NO_URL"
-                        self.job_card.emit(card)
-                
-                elif status == 'MEDIA_GENERATION_STATUS_FAILED':
-                    card["status"] = "FAILED"
-                    self.log.emit(f"[ERR] Scene {scene} Copy {copy_num} FAILED")
-                    self.job_card.emit(card)
-                
-                else:
-                    # Still processing (PENDING, ACTIVE, or other states)
-                    card["status"] = "PROCESSING"
-                    self.job_card.emit(card)
-                    new_jobs.append(job_info)
-
-            jobs=new_jobs
-
-            if jobs:
-                poll_info = f"vòng {poll_round + 1}/120"
-                self.log.emit(f"[INFO] Đang chờ {len(jobs)} video ({poll_info})...")
-                try:
-                    import time
-                    time.sleep(5)
-                except Exception:
-                    pass
-
-        # 4K upscale
+                self.log.emit(f"[ERR] Cảnh {card['scene']} video {card['copy']}: không có operation name")
+                card["status"] = "FAILED"
+                self.job_card.emit(card)
+
+        tl = self._timeline
+        if tl:
+            # resumed operations start their 'generate' span now
+            for op_name, job_info in by_op.items():
+                tl.submitted(job_info['card']["scene"], [op_name], first_copy=job_info['card']["copy"])
+            tl.attach_poller(get_poller())
+
+        downloads = []
+        pending = set(by_op)
+        poll_timeout = p.get("poll_timeout_sec", 600)
+        if pending:
+            self.log.emit(f"[INFO] Đang chờ {len(pending)} video...")
+        for op_name, op_result in get_poller().iter_updates(list(by_op), client=client, timeout=poll_timeout,
+                                                             should_stop=lambda: self.should_stop):
+            job_info = by_op.get(op_name)
+            if job_info is None:
+                continue
+            if tl:
+                tl.op_status(op_name, op_result)
+            card = job_info['card']
+            journal = job_info['journal']
+            scene = card["scene"]
+            copy_num = card["copy"]
+            status = op_result.get("status") or "PROCESSING"
+            video_url = (op_result.get("video_urls") or [""])[0]
+            journal.status(op_name, status, video_url)
+            if is_terminal(op_result):
+                pending.discard(op_name)
+
+            if status == "COMPLETED":
+                card["status"] = "READY"
+                card["url"] = video_url
+                self.log.emit(f"[SUCCESS] Scene {scene} Copy {copy_num}: Video ready!")
+
+                if auto_download:
+                    fn = f"{job_info['title']}_scene{scene}_copy{copy_num}.mp4"
+                    fp = os.path.join(card["dir"], fn)
+                    self.log.emit(f"[INFO] Downloading scene {scene} copy {copy_num}...")
+                    # download on the shared pool so status updates keep flowing meanwhile
+                    with self._post_lock:
+                        self._dl_callbacks += 1
+                    downloads.append(self.video_downloader.submit(
+                        video_url, fp, on_done=lambda res, card=card, jr=journal, op=op_name, t=time.monotonic():
+                        self._on_download_done(res, card, os.path.join(card["dir"], "thumbs"), jr, op, t)))
+                self.job_card.emit(card)
+
+            elif status == "DONE_NO_URL":
+                self.log.emit(f"[ERR] Scene {scene} Copy {copy_num}: No video URL in response")
+                card["status"] = "DONE_NO_URL"
+                self.job_card.emit(card)
+
+            elif status == "FAILED":
+                card["status"] = "FAILED"
+                self.log.emit(f"[ERR] Scene {scene} Copy {copy_num} FAILED")
+                self.job_card.emit(card)
 
-        if up4k:
-            has_ffmpeg = shutil.which("ffmpeg") is not None
-            if not has_ffmpeg:
-                self.log.emit("[WARN] Không tìm thấy ffmpeg trong PATH — bỏ qua upscale 4K.")
             else:
-                for job_info in jobs:
-                    card = job_info['card']
-                    if card.get("path"):
-                        src=card["path"]
-                        dst=src.replace(".mp4","_4k.mp4")
-                        cmd=["ffmpeg","-y","-i",src,"-vf","scale=3840:-2","-c:v","libx264","-preset","fast",dst]
-                        try:
-                            subprocess.run(cmd, check=True)
-                            card["path"]=dst
-                            card["status"]="UPSCALED_4K"
-                            self.job_card.emit(card)
-                        except Exception as e:
-                            self.log.emit(f"[ERR] 4K upscale fail: {e}")
+                card["status"] = "PROCESSING"
+                self.job_card.emit(card)
+
+        if self.should_stop:
+            self.log.emit("[INFO] Đã dừng xử lý theo yêu cầu người dùng.")
+        elif pending:
+            self.log.emit(f"[WARN] {len(pending)} video vẫn chưa xong sau {poll_timeout}s (đã lưu nhật ký, có thể tiếp tục sau).")
+        else:
+            self.log.emit("[INFO] Tất cả video đã hoàn tất hoặc thất bại.")
+        if downloads:
+            self.log.emit(f"[INFO] Chờ tải xong {len(downloads)} video...")
+        self._drain(downloads)
+
+        if tl:
+            tl.detach_poller()
+            try:
+                path = tl.export()
+                self.log.emit(f"[INFO] Timeline: {tl.summary_text()} — {path}")
+            except Exception as e:
+                self.log.emit(f"[WARN] Không ghi được timeline: {e}")
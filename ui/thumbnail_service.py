@@ -0,0 +1,278 @@
+# -*- coding: utf-8 -*-
+"""
+Shared asynchronous thumbnail loader.
+
+request(source, size, callback) returns the scaled pixmap at once when it is
+in memory, otherwise loads it on a fixed QThreadPool and calls back on the UI
+thread. Sources are local paths or http(s) URLs.
+
+- images are decoded straight at thumbnail size (QImageReader.setScaledSize),
+  never at full resolution
+- scaled pixmaps live in a bounded in-memory LRU
+- scaled images are also written to an on-disk cache keyed by source + size
+  (+ mtime and file size for local files), so URLs are downloaded once
+- concurrent requests for the same thumbnail share one load
+
+Tuning from the optional 'thumbnails' config section
+{"workers": 4, "memory_mb": 64, "disk_mb": 200, "cache_dir": "..."}.
+"""
+import hashlib
+import os
+import threading
+from collections import OrderedDict
+from typing import Callable, Dict, List, Optional, Tuple, Union
+
+from PyQt5.QtCore import QBuffer, QByteArray, QIODevice, QObject, QRunnable, QSize, Qt, QThreadPool, pyqtSignal
+from PyQt5.QtGui import QImage, QImageReader, QPixmap
+
+THUMB_CACHE_DIR = os.path.join(os.path.expanduser("~"), ".veo_thumb_cache")
+
+Size = Union[int, Tuple[int, int], QSize]
+
+
+def _qsize(size: Size) -> QSize:
+    if isinstance(size, QSize):
+        return QSize(size)
+    if isinstance(size, int):
+        return QSize(size, size)
+    return QSize(int(size[0]), int(size[1]))
+
+
+def _is_url(source: str) -> bool:
+    return source.startswith(("http://", "https://"))
+
+
+def cache_key(source: str, size: Size) -> str:
+    """Source + target size, plus mtime/size for local files (edited files get a new key)."""
+    s = _qsize(size)
+    parts = [source, f"{s.width()}x{s.height()}"]
+    if not _is_url(source):
+        try:
+            st = os.stat(source)
+            parts += [str(int(st.st_mtime_ns)), str(st.st_size)]
+        except OSError:
+            parts.append("missing")
+    return hashlib.sha256("\0".join(parts).encode("utf-8")).hexdigest()
+
+
+def decode_scaled(data_or_path: Union[bytes, str], size: Size) -> QImage:
+    """Decode at (at most) `size`, keeping the aspect ratio; null QImage on failure."""
+    target = _qsize(size)
+    if isinstance(data_or_path, bytes):
+        buf = QBuffer()
+        buf.setData(QByteArray(data_or_path))
+        buf.open(QIODevice.ReadOnly)
+        reader = QImageReader(buf)
+    else:
+        reader = QImageReader(data_or_path)
+    reader.setAutoTransform(True)
+    src = reader.size()
+    if src.isValid() and (src.width() > target.width() or src.height() > target.height()):
+        reader.setScaledSize(src.scaled(target, Qt.KeepAspectRatio))
+    img = reader.read()
+    if not img.isNull() and (img.width() > target.width() or img.height() > target.height()):
+        img = img.scaled(target, Qt.KeepAspectRatio, Qt.SmoothTransformation)
+    return img
+
+
+class _Load(QRunnable):
+    def __init__(self, service, key: str, source: str, size: QSize):
+        super().__init__()
+        self.service = service
+        self.key = key
+        self.source = source
+        self.size = size
+
+    def run(self):
+        img = QImage()
+        try:
+            img = self.service._load(self.key, self.source, self.size)
+        except Exception:
+            img = QImage()
+        self.service._loaded.emit(self.key, img)
+
+
+class ThumbnailService(QObject):
+    """
+    Args:
+        workers: Thread pool size
+        memory_mb: In-memory LRU budget for scaled pixmaps
+        cache_dir: On-disk cache folder (None = memory only)
+        disk_mb: On-disk cache budget; oldest files are pruned beyond it
+    """
+
+    _loaded = pyqtSignal(str, object)  # key, QImage (pool thread -> UI thread)
+
+    def __init__(self, workers: int = 4, memory_mb: float = 64, cache_dir: Optional[str] = THUMB_CACHE_DIR,
+                 disk_mb: float = 200, parent=None):
+        super().__init__(parent)
+        self.pool = QThreadPool(self)
+        self.pool.setMaxThreadCount(max(1, int(workers)))
+        self.cache_dir = cache_dir
+        self.memory_bytes = int(float(memory_mb) * 1024 * 1024)
+        self.disk_bytes = int(float(disk_mb) * 1024 * 1024)
+        self._mem: "OrderedDict[str, QPixmap]" = OrderedDict()
+        self._mem_used = 0
+        self._pending: Dict[str, List[Callable[[QPixmap], None]]] = {}
+        self._disk_lock = threading.Lock()
+        self._writes = 0
+        self.hits = 0
+        self.misses = 0
+        self._loaded.connect(self._on_loaded)
+
+    # ---- public -----------------------------------------------------
+    def cached(self, source: str, size: Size) -> Optional[QPixmap]:
+        return self._mem_get(cache_key(source, size)) if source else None
+
+    def request(self, source: str, size: Size, callback: Optional[Callable[[QPixmap], None]] = None) -> Optional[QPixmap]:
+        """
+        Scaled pixmap of source if it is already in memory (callback is not
+        called then); otherwise None, and callback(pixmap) runs on the UI thread
+        once loaded (a null pixmap if the source could not be read).
+        """
+        if not source:
+            return None
+        key = cache_key(source, size)
+        pix = self._mem_get(key)
+        if pix is not None:
+            self.hits += 1
+            return pix
+        waiting = self._pending.get(key)
+        if waiting is not None:
+            if callback:
+                waiting.append(callback)
+            return None
+        self.misses += 1
+        self._pending[key] = [callback] if callback else []
+        self.pool.start(_Load(self, key, source, _qsize(size)))
+        return None
+
+    def set_pixmap(self, label, source: str, size: Size):
+        """Load source into a QLabel (async unless cached)."""
+        def apply(pix):
+            try:
+                if not pix.isNull():
+                    label.setPixmap(pix)
+            except RuntimeError:  # label deleted meanwhile
+                pass
+        pix = self.request(source, size, apply)
+        if pix is not None:
+            apply(pix)
+
+    def clear_memory(self):
+        self._mem.clear()
+        self._mem_used = 0
+
+    def stats(self) -> Dict[str, int]:
+        return {"hits": self.hits, "misses": self.misses, "memory_items": len(self._mem),
+                "memory_bytes": self._mem_used, "pending": len(self._pending)}
+
+    # ---- memory LRU -------------------------------------------------
+    def _mem_get(self, key: str) -> Optional[QPixmap]:
+        pix = self._mem.get(key)
+        if pix is not None:
+            self._mem.move_to_end(key)
+        return pix
+
+    def _mem_put(self, key: str, pix: QPixmap):
+        cost = max(1, pix.width() * pix.height() * 4)
+        old = self._mem.pop(key, None)
+        if old is not None:
+            self._mem_used -= max(1, old.width() * old.height() * 4)
+        self._mem[key] = pix
+        self._mem_used += cost
+        while self._mem_used > self.memory_bytes and len(self._mem) > 1:
+            _, ev = self._mem.popitem(last=False)
+            self._mem_used -= max(1, ev.width() * ev.height() * 4)
+
+    def _on_loaded(self, key: str, img: QImage):
+        # QPixmap may only be created on the UI thread
+        pix = QPixmap.fromImage(img) if img is not None and not img.isNull() else QPixmap()
+        if not pix.isNull():
+            self._mem_put(key, pix)
+        for cb in self._pending.pop(key, []):
+            try:
+                cb(pix)
+            except RuntimeError:  # receiver widget deleted meanwhile
+                pass
+
+    # ---- pool thread ------------------------------------------------
+    def _disk_path(self, key: str) -> Optional[str]:
+        return os.path.join(self.cache_dir, key + ".png") if self.cache_dir else None
+
+    def _load(self, key: str, source: str, size: QSize) -> QImage:
+        path = self._disk_path(key)
+        if path and os.path.isfile(path):
+            img = QImage(path)
+            if not img.isNull():
+                try:
+                    os.utime(path, None)  # LRU: mtime = last access
+                except OSError:
+                    pass
+                return img
+        if _is_url(source):
+            import requests
+            r = requests.get(source, timeout=15)
+            r.raise_for_status()
+            img = decode_scaled(r.content, size)
+        elif os.path.isfile(source):
+            img = decode_scaled(source, size)
+        else:
+            return QImage()
+        if path and not img.isNull():
+            self._store(path, img)
+        return img
+
+    def _store(self, path: str, img: QImage):
+        with self._disk_lock:
+            try:
+                os.makedirs(self.cache_dir, exist_ok=True)
+                tmp = path + ".tmp"
+                if img.save(tmp, "PNG"):
+                    os.replace(tmp, path)
+                self._writes += 1
+                if self._writes % 50 == 1:
+                    self._prune()
+            except OSError:
+                pass
+
+    def _prune(self):
+        entries = []
+        try:
+            for name in os.listdir(self.cache_dir):
+                if name.endswith(".png"):
+                    p = os.path.join(self.cache_dir, name)
+                    try:
+                        st = os.stat(p)
+                    except OSError:
+                        continue
+                    entries.append((st.st_mtime, st.st_size, p))
+        except OSError:
+            return
+        entries.sort()
+        total = sum(e[1] for e in entries)
+        while entries and total > self.disk_bytes:
+            _, size, p = entries.pop(0)
+            try:
+                os.remove(p)
+            except OSError:
+                pass
+            total -= size
+
+
+_SERVICE: Optional[ThumbnailService] = None
+
+
+def get_thumbnail_service() -> ThumbnailService:
+    """Process-wide loader (UI thread only); tuning from the optional 'thumbnails' config section."""
+    global _SERVICE
+    if _SERVICE is None:
+        try:
+            from utils import config as cfg
+            c = (cfg.load() or {}).get("thumbnails") or {}
+        except Exception:
+            c = {}
+        _SERVICE = ThumbnailService(workers=int(c.get("workers", 4)), memory_mb=float(c.get("memory_mb", 64)),
+                                    cache_dir=c.get("cache_dir") or THUMB_CACHE_DIR,
+                                    disk_mb=float(c.get("disk_mb", 200)))
+    return _SERVICE
@@ -9,11 +9,13 @@ import os
 import platform
 import shutil
 import subprocess
+import threading
 import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from pathlib import Path
 
 from PyQt5.QtCore import Qt, QThread, pyqtSignal
-from PyQt5.QtGui import QFont, QPixmap
+from PyQt5.QtGui import QFont
 from PyQt5.QtWidgets import (
     QApplication,
     QCheckBox,
@@ -41,6 +43,8 @@ from PyQt5.QtWidgets import (
 from services import image_gen_service
 from services import sales_script_service as sscript
 from services import sales_video_service as svc
+from services.final_cut import find_clips, for_sales_project
+from ui.thumbnail_service import get_thumbnail_service
 from ui.widgets.model_selector import ModelSelectorWidget
 from ui.widgets.scene_result_card import SceneResultCard
 from ui.workers.script_worker import ScriptWorker
@@ -57,7 +61,7 @@ THUMBNAIL_SIZE = 72
 MODEL_IMG = 128
 
 # Rate limiting
-RATE_LIMIT_DELAY_SEC = 10.0  # Delay between image generation requests to avoid 429 errors
+RATE_LIMIT_DELAY_SEC = 10.0  # Delay between image generation requests to avoid 429 errors (sequential mode)
 
 
 class SceneCardWidget(QFrame):
@@ -196,6 +200,10 @@ class SceneCardWidget(QFrame):
             )
 
 
+# Whisk has no per-key limiter: parallel scene workers take turns on it
+_WHISK_LOCK = threading.Lock()
+
+
 class ImageGenerationWorker(QThread):
     """Worker thread for generating images (scenes + thumbnails)"""
 
@@ -240,82 +248,43 @@ class ImageGenerationWorker(QThread):
             
             # Generate scene images
             scenes = self.outline.get("scenes", [])
-            for i, scene in enumerate(scenes):
-                if self.should_stop:
-                    break
-
-                # CRITICAL FIX: Add mandatory delay BEFORE every request (except first)
-                # This prevents rate limiting regardless of which key is used
-                if i > 0:
-                    self.progress.emit(
-                        f"[RATE LIMIT] Chờ {RATE_LIMIT_DELAY_SEC}s trước khi tạo ảnh cảnh {scene.get('index')}..."
-                    )
-                    time.sleep(RATE_LIMIT_DELAY_SEC)
-
-                self.progress.emit(f"Tạo ảnh cảnh {scene.get('index')}...")
-
-                # Get prompt
-                prompt = scene.get("prompt_image", "")
-                
-                # Inject character consistency if available
-                if self.character_bible and hasattr(self.character_bible, 'characters'):
-                    try:
-                        from services.google.character_bible import inject_character_consistency
-                        prompt = inject_character_consistency(prompt, self.character_bible)
-                        self.progress.emit(f"[CHARACTER BIBLE] Injected consistency anchors into scene {scene.get('index')}")
-                    except Exception as e:
-                        self.progress.emit(f"[WARNING] Failed to inject character consistency: {e}")
-
-                # Try to generate image
-                img_data = None
-                if self.use_whisk and self.model_paths and self.prod_paths:
-                    # Try Whisk first
-                    try:
-                        from services import whisk_service
-
-                        img_data = whisk_service.generate_image(
-                            prompt=prompt,
-                            model_image=self.model_paths[0] if self.model_paths else None,
-                            product_image=self.prod_paths[0] if self.prod_paths else None,
-                            debug_callback=self.progress.emit,
-                        )
-                        if img_data:
-                            self.progress.emit(f"Cảnh {scene.get('index')}: Whisk ✓")
-                    except Exception as e:
-                        self.progress.emit(f"Whisk failed: {str(e)[:100]}")
-                        img_data = None
-
-                # Fallback to Gemini with rate limiting
-                if img_data is None:
-                    try:
-                        self.progress.emit(f"Cảnh {scene.get('index')}: Dùng Gemini...")
-
-                        # Use rate-limited generation with API key rotation
-                        img_data_url = image_gen_service.generate_image_with_rate_limit(
-                            text=prompt,  # Fixed: 'prompt' → 'text'
-                            api_keys=api_keys,
-                            model=model,
-                            aspect_ratio=aspect_ratio,
-                            delay_before=0,
-                            logger=lambda msg: self.progress.emit(msg),
+            workers = min(len(scenes), image_gen_service.parallel_image_workers(api_keys))
+            if workers > 1:
+                # One in-flight request per key (the shared rate limiter enforces it), Whisk calls
+                # one at a time; images arrive out of order and the panel places them by scene index
+                self.progress.emit(f"[INFO] Tạo song song {len(scenes)} ảnh với {workers} luồng")
+
+                def one(scene):
+                    if self.should_stop:
+                        return
+                    self.progress.emit(f"Tạo ảnh cảnh {scene.get('index')}...")
+                    img_data = self._scene_image(scene, api_keys, model, aspect_ratio)
+                    if img_data:
+                        self.scene_image_ready.emit(scene.get("index"), img_data)
+
+                with ThreadPoolExecutor(max_workers=workers) as pool:
+                    for fut in as_completed([pool.submit(one, sc) for sc in scenes]):
+                        try:
+                            fut.result()
+                        except Exception as e:
+                            self.progress.emit(f"Lỗi tạo ảnh: {e}")
+            else:
+                for i, scene in enumerate(scenes):
+                    if self.should_stop:
+                        break
+
+                    # CRITICAL FIX: Add mandatory delay BEFORE every request (except first)
+                    # This prevents rate limiting regardless of which key is used
+                    if i > 0:
+                        self.progress.emit(
+                            f"[RATE LIMIT] Chờ {RATE_LIMIT_DELAY_SEC}s trước khi tạo ảnh cảnh {scene.get('index')}..."
                         )
+                        time.sleep(RATE_LIMIT_DELAY_SEC)
 
-                        if img_data_url:
-                            # Convert to bytes, handling both formats
-                            img_data, error = convert_to_bytes(img_data_url)
-                            if img_data:
-                                self.progress.emit(f"Cảnh {scene.get('index')}: Gemini ✓")
-                            else:
-                                self.progress.emit(f"Cảnh {scene.get('index')}: {error}")
-                        else:
-                            self.progress.emit(f"Cảnh {scene.get('index')}: Không tạo được ảnh")
-                            img_data = None
-                    except Exception as e:
-                        self.progress.emit(f"Gemini failed for scene {scene.get('index')}: {e}")
-                        img_data = None
-
-                if img_data:
-                    self.scene_image_ready.emit(scene.get("index"), img_data)
+                    self.progress.emit(f"Tạo ảnh cảnh {scene.get('index')}...")
+                    img_data = self._scene_image(scene, api_keys, model, aspect_ratio)
+                    if img_data:
+                        self.scene_image_ready.emit(scene.get("index"), img_data)
 
             # Generate social media thumbnails
             social_media = self.outline.get("social_media", {})
@@ -327,10 +296,12 @@ class ImageGenerationWorker(QThread):
 
                 # CRITICAL FIX: Delay before thumbnails too
                 # First thumbnail comes after all scene images, so always delay
-                self.progress.emit(
-                    f"[RATE LIMIT] Chờ {RATE_LIMIT_DELAY_SEC}s trước thumbnail {i+1}..."
-                )
-                time.sleep(RATE_LIMIT_DELAY_SEC)
+                # (parallel mode relies on the per-key rate limiter instead)
+                if workers <= 1:
+                    self.progress.emit(
+                        f"[RATE LIMIT] Chờ {RATE_LIMIT_DELAY_SEC}s trước thumbnail {i+1}..."
+                    )
+                    time.sleep(RATE_LIMIT_DELAY_SEC)
 
                 self.progress.emit(f"Tạo thumbnail phiên bản {i+1}...")
 
@@ -386,10 +357,99 @@ class ImageGenerationWorker(QThread):
             self.progress.emit(f"Lỗi: {e}")
             self.finished.emit(False)
 
+    def _scene_image(self, scene, api_keys, model, aspect_ratio):
+        """Generate one scene image (Whisk first when enabled, then Gemini); bytes or None."""
+        # Get prompt
+        prompt = scene.get("prompt_image", "")
+        
+        # Inject character consistency if available
+        if self.character_bible and hasattr(self.character_bible, 'characters'):
+            try:
+                from services.google.character_bible import inject_character_consistency
+                prompt = inject_character_consistency(prompt, self.character_bible)
+                self.progress.emit(f"[CHARACTER BIBLE] Injected consistency anchors into scene {scene.get('index')}")
+            except Exception as e:
+                self.progress.emit(f"[WARNING] Failed to inject character consistency: {e}")
+
+        # Try to generate image
+        img_data = None
+        if self.use_whisk and self.model_paths and self.prod_paths:
+            # Try Whisk first
+            try:
+                from services import whisk_service
+
+                with _WHISK_LOCK:
+                    img_data = None if self.should_stop else whisk_service.generate_image(
+                        prompt=prompt,
+                        model_image=self.model_paths[0] if self.model_paths else None,
+                        product_image=self.prod_paths[0] if self.prod_paths else None,
+                        debug_callback=self.progress.emit,
+                    )
+                if img_data:
+                    self.progress.emit(f"Cảnh {scene.get('index')}: Whisk ✓")
+            except Exception as e:
+                self.progress.emit(f"Whisk failed: {str(e)[:100]}")
+                img_data = None
+
+        # Fallback to Gemini with rate limiting
+        if img_data is None:
+            try:
+                self.progress.emit(f"Cảnh {scene.get('index')}: Dùng Gemini...")
+
+                # Use rate-limited generation with API key rotation
+                img_data_url = image_gen_service.generate_image_with_rate_limit(
+                    text=prompt,  # Fixed: 'prompt' → 'text'
+                    api_keys=api_keys,
+                    model=model,
+                    aspect_ratio=aspect_ratio,
+                    delay_before=0,
+                    logger=lambda msg: self.progress.emit(msg),
+                )
+
+                if img_data_url:
+                    # Convert to bytes, handling both formats
+                    img_data, error = convert_to_bytes(img_data_url)
+                    if img_data:
+                        self.progress.emit(f"Cảnh {scene.get('index')}: Gemini ✓")
+                    else:
+                        self.progress.emit(f"Cảnh {scene.get('index')}: {error}")
+                else:
+                    self.progress.emit(f"Cảnh {scene.get('index')}: Không tạo được ảnh")
+                    img_data = None
+            except Exception as e:
+                self.progress.emit(f"Gemini failed for scene {scene.get('index')}: {e}")
+                img_data = None
+
+        return img_data
+
     def stop(self):
         self.should_stop = True
 
 
+class FinalCutWorker(QThread):
+    """Worker thread for assembling the finished video of a sales project"""
+
+    progress = pyqtSignal(str)
+    finished = pyqtSignal(dict)
+
+    def __init__(self, project_name):
+        super().__init__()
+        self.project_name = project_name
+        self.cut = None
+
+    def run(self):
+        try:
+            self.cut = for_sales_project(self.project_name, on_log=self.progress.emit)
+            res = self.cut.run()
+        except Exception as e:
+            res = {"ok": False, "error": str(e)}
+        self.finished.emit(res)
+
+    def stop(self):
+        if self.cut:
+            self.cut.cancel()
+
+
 class VideoBanHangPanel(QWidget):
     """Redesigned Video Bán Hàng panel with 3-step workflow + cache system"""
 
@@ -809,9 +869,31 @@ class VideoBanHangPanel(QWidget):
         )
         self.btn_video.clicked.connect(self._on_generate_video)
 
+        self.btn_final_cut = QPushButton("🎞️ Ghép video")
+        self.btn_final_cut.setMinimumHeight(42)
+        self.btn_final_cut.setToolTip("Ghép mỗi cảnh một bản trong thư mục Video, kèm lồng tiếng/phụ đề nếu có")
+        self.btn_final_cut.setStyleSheet(
+            """
+            QPushButton {
+                background-color: #4CAF50;
+                color: white;
+                font-weight: bold;
+                border: none;
+                border-radius: 4px;
+            }
+            QPushButton:hover { background-color: #388E3C; }
+            QPushButton:disabled {
+                background-color: #CCCCCC;
+                color: #666666;
+            }
+        """
+        )
+        self.btn_final_cut.clicked.connect(self._on_final_cut)
+
         workflow_row.addWidget(self.btn_script)
         workflow_row.addWidget(self.btn_images)
         workflow_row.addWidget(self.btn_video)
+        workflow_row.addWidget(self.btn_final_cut)
 
         layout.addLayout(workflow_row)
 
@@ -1143,11 +1225,7 @@ class VideoBanHangPanel(QWidget):
             thumb = QLabel()
             thumb.setFixedSize(THUMBNAIL_SIZE, THUMBNAIL_SIZE)
             thumb.setScaledContents(True)
-            thumb.setPixmap(
-                QPixmap(path).scaled(
-                    THUMBNAIL_SIZE, THUMBNAIL_SIZE, Qt.KeepAspectRatio, Qt.SmoothTransformation
-                )
-            )
+            get_thumbnail_service().set_pixmap(thumb, path, THUMBNAIL_SIZE)
             thumb.setStyleSheet("border: 1px solid #90CAF9;")
             self.prod_thumb_container.addWidget(thumb)
 
@@ -1282,12 +1360,29 @@ class VideoBanHangPanel(QWidget):
 
         self.script_worker = ScriptWorker(cfg)
         self.script_worker.progress.connect(self._append_log)
+        self.script_worker.scene_ready.connect(self._on_script_scene)
         self.script_worker.done.connect(self._on_script_done)
         self.script_worker.error.connect(self._on_script_error)
         self.script_worker.start()
 
+    def _on_script_scene(self, scene):
+        """Scene streamed in before the script is complete - show its card right away"""
+        if not getattr(self, "_streaming_cards", False):
+            self._display_scene_cards([])
+            self._streaming_cards = True
+        scene_idx = scene.get("index") or len(self.scene_cards) + 1
+        if scene_idx in self.scene_images:
+            return
+        i = len(self.scene_cards)
+        card = SceneResultCard(scene_idx, scene, alternating_color=(i % 2 == 1))
+        self.scenes_layout.insertWidget(i, card)
+        self.scene_cards.append(card)
+        self.scene_images[scene_idx] = {"card": card, "path": None}
+        self._append_log(f"… Cảnh {scene_idx} đã viết xong")
+
     def _on_script_done(self, outline):
         """Script done - with cache system"""
+        self._streaming_cards = False
         try:
             self.last_outline = outline
 
@@ -1348,6 +1443,7 @@ class VideoBanHangPanel(QWidget):
 
     def _on_script_error(self, error_msg):
         """Script error"""
+        self._streaming_cards = False
         if error_msg.startswith("MissingAPIKey:"):
             QMessageBox.warning(
                 self, "Thiếu API Key", "Chưa nhập Google API Key trong tab Cài đặt."
@@ -1446,10 +1542,7 @@ class VideoBanHangPanel(QWidget):
 
         if version_idx < len(self.thumbnail_widgets):
             widget_data = self.thumbnail_widgets[version_idx]
-            pixmap = QPixmap(str(img_path))
-            widget_data["thumbnail"].setPixmap(
-                pixmap.scaled(270, 480, Qt.KeepAspectRatio, Qt.SmoothTransformation)
-            )
+            get_thumbnail_service().set_pixmap(widget_data["thumbnail"], str(img_path), (270, 480))
 
         self._append_log(f"✓ Thumbnail phiên bản {version_idx+1} đã sẵn sàng")
 
@@ -1504,6 +1597,41 @@ class VideoBanHangPanel(QWidget):
         # if video_path and self.chk_auto_download.isChecked():
         #     self._auto_download_video(video_path)
 
+    def _on_final_cut(self):
+        """Assemble the project's clips (+ voice-over / subtitles) off the UI thread"""
+        cfg = self._collect_cfg()
+        name = cfg["project_name"]
+        dirs = svc.ensure_project_dirs(name)
+        if not find_clips(str(dirs["video"])):
+            QMessageBox.information(
+                self, "Chưa có video", f"Chưa có clip cảnh nào trong:\n{dirs['video']}"
+            )
+            return
+
+        self._append_log("Bắt đầu ghép video hoàn chỉnh...")
+        self.btn_final_cut.setEnabled(False)
+        self.btn_stop.setEnabled(True)
+
+        self.final_cut_worker = FinalCutWorker(name)
+        self.final_cut_worker.progress.connect(self._append_log)
+        self.final_cut_worker.finished.connect(self._on_final_cut_finished)
+        self.final_cut_worker.start()
+
+    def _on_final_cut_finished(self, res):
+        """Final cut finished"""
+        if res.get("ok"):
+            self._append_log(
+                f"✓ Video hoàn chỉnh: {res['path']} ({res['scenes']} cảnh, "
+                f"chuẩn hoá lại {res['reencoded']}, {res['seconds']}s)"
+            )
+            if self.chk_auto_download is not None and self.chk_auto_download.isChecked():
+                self._auto_download_video(res["path"])
+        else:
+            self._append_log(f"❌ Ghép video thất bại: {res.get('error')}")
+
+        self.btn_final_cut.setEnabled(True)
+        self.btn_stop.setEnabled(False)
+
     def stop_processing(self):
         """PR#4: Stop all workers"""
         if hasattr(self, "script_worker") and self.script_worker and self.script_worker.isRunning():
@@ -1514,6 +1642,11 @@ class VideoBanHangPanel(QWidget):
             self.image_worker.terminate()
             self._append_log("[INFO] Đã dừng image worker")
 
+        if hasattr(self, "final_cut_worker") and self.final_cut_worker and self.final_cut_worker.isRunning():
+            # ffmpeg is cancelled; the worker reports through _on_final_cut_finished
+            self.final_cut_worker.stop()
+            self._append_log("[INFO] Đã dừng ghép video")
+
         # Re-enable buttons
         self.btn_script.setEnabled(True)
         self.btn_script.setText("📝 Viết kịch bản")
@@ -5,9 +5,11 @@ Model Image Widget - Clickable image frame with delete button
 import os
 
 from PyQt5.QtCore import Qt, pyqtSignal
-from PyQt5.QtGui import QPixmap
+from PyQt5.QtGui import QImageReader
 from PyQt5.QtWidgets import QFileDialog, QLabel, QPushButton, QVBoxLayout, QWidget
 
+from ..thumbnail_service import get_thumbnail_service
+
 
 class ModelImageWidget(QWidget):
     """
@@ -96,17 +98,9 @@ class ModelImageWidget(QWidget):
         if not file_path or not os.path.exists(file_path):
             return
 
-        # Load and display image
-        pixmap = QPixmap(file_path)
-        if not pixmap.isNull():
-            # Scale to fit while maintaining aspect ratio
-            scaled = pixmap.scaled(
-                self.size - 4,  # Account for border
-                self.size - 4,
-                Qt.KeepAspectRatio,
-                Qt.SmoothTransformation
-            )
-            self.image_frame.setPixmap(scaled)
+        # Load and display image (decoded at display size by the shared loader)
+        if QImageReader(file_path).canRead():
+            get_thumbnail_service().set_pixmap(self.image_frame, file_path, self.size - 4)  # Account for border
             self.image_frame.setStyleSheet("""
                 QLabel {
                     border: 2px solid #4CAF50;
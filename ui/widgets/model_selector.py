@@ -5,7 +5,7 @@ ModelSelectorWidget - Collapsible widget for selecting 0-5 models
 import json
 
 from PyQt5.QtCore import Qt, pyqtSignal
-from PyQt5.QtGui import QFont, QPixmap
+from PyQt5.QtGui import QFont, QImageReader
 from PyQt5.QtWidgets import (
     QFileDialog,
     QFrame,
@@ -20,6 +20,8 @@ from PyQt5.QtWidgets import (
     QWidget,
 )
 
+from ..thumbnail_service import get_thumbnail_service
+
 
 class ModelImageWidget(QLabel):
     """
@@ -52,7 +54,7 @@ class ModelImageWidget(QLabel):
 
         self.setFixedSize(128, 128)
         self.setScaledContents(True)
-        self.setPixmap(QPixmap(image_path))
+        get_thumbnail_service().set_pixmap(self, image_path, 128)
         self.setCursor(Qt.PointingHandCursor)
 
         # Delete button (hidden by default)
@@ -205,15 +207,14 @@ class ModelRow(QFrame):
                 QMessageBox.warning(self, "Lỗi", "File không tồn tại")
                 return
 
-            # Issue 4: Try to load the image
-            pixmap = QPixmap(path)
-            if pixmap.isNull():
+            # Issue 4: Check the image is readable (header only, no full decode)
+            if not QImageReader(path).canRead():
                 QMessageBox.warning(self, "Lỗi", "Không thể load ảnh. Vui lòng chọn file ảnh hợp lệ.")
                 return
 
             # Issue 4: Successfully loaded, save path and display
             self.image_path = path
-            self.img_preview.setPixmap(pixmap.scaled(120, 120, Qt.KeepAspectRatio, Qt.SmoothTransformation))
+            get_thumbnail_service().set_pixmap(self.img_preview, path, 120)
 
     def get_data(self):
         """Get model data (image path + JSON)"""
@@ -233,9 +234,7 @@ class ModelRow(QFrame):
         """Set model data"""
         if image_path:
             self.image_path = image_path
-            pixmap = QPixmap(image_path)
-            if not pixmap.isNull():
-                self.img_preview.setPixmap(pixmap.scaled(120, 120, Qt.KeepAspectRatio, Qt.SmoothTransformation))
+            get_thumbnail_service().set_pixmap(self.img_preview, image_path, 120)
 
         if json_data:
             try:
@@ -0,0 +1,189 @@
+# -*- coding: utf-8 -*-
+"""
+Scene result table for ProjectPanel.
+
+The model reads straight from the panel's job dicts (no per-cell items), keeps
+a scene_id -> row index, and coalesces row updates: update_row() only marks
+the row dirty and a timer emits one dataChanged per contiguous dirty range at
+most `max_fps` times per second, however many poll / download events arrive.
+"""
+from typing import Any, Dict, List, Optional
+
+from PyQt5.QtCore import QAbstractTableModel, QModelIndex, Qt, QTimer
+
+from .spinner_delegate import BUSY_ROLE, is_busy
+
+BASE_COLS = ["Dự án", "Cảnh", "Image", "Prompt", "Trạng thái"]
+TAIL_COLS = ["Hoàn thành"]
+COL_PROMPT = 3
+COL_STATUS = 4
+FIRST_VIDEO_COL = len(BASE_COLS)
+
+
+def video_labels(n: int) -> List[str]:
+    return [f"Video {i + 1}" for i in range(max(0, n))]
+
+
+def short_text(s, n=90):
+    s = (s or "").replace("\n", " ").strip()
+    return s if len(s) <= n else s[:n - 1] + "…"
+
+
+class SceneTableModel(QAbstractTableModel):
+    """
+    Args:
+        jobs: The panel's job list (shared, not copied)
+        project_name: Shown in the first column
+        copies: Number of video columns
+        max_fps: Upper bound on dataChanged flushes per second
+    """
+
+    def __init__(self, jobs: Optional[List[Dict[str, Any]]] = None, project_name: str = "", copies: int = 1,
+                 max_fps: float = 4.0, parent=None):
+        super().__init__(parent)
+        self.project_name = project_name
+        self._jobs: List[Dict[str, Any]] = jobs if jobs is not None else []
+        self._copies = max(0, int(copies))
+        self._rows: Dict[str, int] = {}
+        self._dirty = set()
+        self._timer = QTimer(self)
+        self._timer.setSingleShot(True)
+        self._timer.setInterval(max(1, int(1000 / max(0.1, float(max_fps)))))
+        self._timer.timeout.connect(self.flush)
+        self._reindex()
+
+    # ---- jobs -------------------------------------------------------
+    def _reindex(self):
+        self._rows = {str(j.get("scene_id", "")): r for r, j in enumerate(self._jobs)}
+
+    def set_jobs(self, jobs: List[Dict[str, Any]]):
+        self.beginResetModel()
+        self._jobs = jobs
+        self._dirty.clear()
+        self._reindex()
+        self.endResetModel()
+
+    def jobs(self) -> List[Dict[str, Any]]:
+        return self._jobs
+
+    def job(self, row: int) -> Optional[Dict[str, Any]]:
+        return self._jobs[row] if 0 <= row < len(self._jobs) else None
+
+    def row_of(self, scene_id) -> int:
+        """Row of a scene, -1 if it is not in the table."""
+        return self._rows.get(str(scene_id), -1)
+
+    def append(self, job: Dict[str, Any]) -> int:
+        row = len(self._jobs)
+        self.beginInsertRows(QModelIndex(), row, row)
+        self._jobs.append(job)
+        self._rows[str(job.get("scene_id", ""))] = row
+        self.endInsertRows()
+        return row
+
+    def remove_rows(self, rows: List[int]) -> int:
+        n = 0
+        for r in sorted(set(rows), reverse=True):
+            if 0 <= r < len(self._jobs):
+                self.beginRemoveRows(QModelIndex(), r, r)
+                self._jobs.pop(r)
+                self.endRemoveRows()
+                n += 1
+        self._dirty.clear()
+        self._reindex()
+        return n
+
+    def clear(self):
+        self.beginResetModel()
+        self._jobs.clear()
+        self._rows.clear()
+        self._dirty.clear()
+        self.endResetModel()
+
+    def set_copies(self, copies: int):
+        copies = max(0, int(copies))
+        if copies == self._copies:
+            return
+        self.beginResetModel()
+        self._copies = copies
+        self.endResetModel()
+
+    def copies(self) -> int:
+        return self._copies
+
+    # ---- coalesced updates -----------------------------------------
+    def update_row(self, row: int):
+        if 0 <= row < len(self._jobs):
+            self._dirty.add(row)
+            if not self._timer.isActive():
+                self._timer.start()
+
+    def update_scene(self, scene_id):
+        self.update_row(self.row_of(scene_id))
+
+    def flush(self):
+        """Emit dataChanged for every dirty row, one signal per contiguous range."""
+        self._timer.stop()
+        if not self._dirty:
+            return
+        rows = sorted(r for r in self._dirty if r < len(self._jobs))
+        self._dirty.clear()
+        last = self.columnCount() - 1
+        start = prev = None
+        for r in rows + [None]:
+            if start is not None and (r is None or r != prev + 1):
+                self.dataChanged.emit(self.index(start, 0), self.index(prev, last))
+                start = None
+            if r is not None and start is None:
+                start = r
+            prev = r
+
+    # ---- Qt model ---------------------------------------------------
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self._jobs)
+
+    def columnCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(BASE_COLS) + self._copies + len(TAIL_COLS)
+
+    def headerData(self, section, orientation, role=Qt.DisplayRole):
+        if role != Qt.DisplayRole:
+            return None
+        if orientation == Qt.Vertical:
+            return str(section + 1)
+        headers = BASE_COLS + video_labels(self._copies) + TAIL_COLS
+        return headers[section] if 0 <= section < len(headers) else None
+
+    def flags(self, index):
+        return Qt.ItemIsEnabled | Qt.ItemIsSelectable if index.isValid() else Qt.NoItemFlags
+
+    def data(self, index, role=Qt.DisplayRole):
+        job = self.job(index.row()) if index.isValid() else None
+        if job is None or role not in (Qt.DisplayRole, Qt.ToolTipRole, Qt.DecorationRole, BUSY_ROLE):
+            return None
+        col = index.column()
+        if role == BUSY_ROLE:
+            return col == COL_STATUS and is_busy(job.get("status"))
+        if col < FIRST_VIDEO_COL:
+            if role != Qt.DisplayRole:
+                return None
+            if col == 0:
+                return self.project_name
+            if col == 1:
+                return str(job.get("scene_id", ""))
+            if col == 2:
+                return job.get("image_name", "")
+            if col == COL_PROMPT:
+                return short_text(job.get("prompt", ""))
+            return job.get("status", "")
+        i = col - FIRST_VIDEO_COL
+        if i >= self._copies:
+            return job.get("completed_at", "") if role == Qt.DisplayRole else None
+        vids = job.get("video_by_idx") or []
+        url = vids[i] if i < len(vids) else None
+        if not url:
+            return "" if role == Qt.DisplayRole else None
+        if role == Qt.ToolTipRole:
+            return url
+        if role == Qt.DecorationRole:
+            return (job.get("thumb_icons") or {}).get(i)
+        return f"Video {i + 1}" + (" ✓" if i + 1 in job.get("downloaded_idx", set()) else "")
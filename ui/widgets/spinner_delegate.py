@@ -0,0 +1,114 @@
+# -*- coding: utf-8 -*-
+"""
+"In progress" spinner painted by an item delegate.
+
+Items whose BUSY_ROLE data is true get a small rotating arc drawn over their
+normal rendering; the text is never touched. One timer per view advances the
+frame and repaints only the busy rows inside the viewport. The timer stops on
+its own when the view is hidden or no visible row is busy, and wakes up again
+on model changes, scrolling or when the view is shown.
+"""
+from PyQt5.QtCore import QEvent, QRect, Qt, QTimer
+from PyQt5.QtGui import QColor, QPainter, QPen
+from PyQt5.QtWidgets import QStyledItemDelegate
+
+BUSY_ROLE = Qt.UserRole + 1
+BUSY_STATUSES = {"PENDING", "QUEUED", "PROCESSING", "RENDERING", "DOWNLOADING"}
+FRAMES = 12
+
+
+def is_busy(status) -> bool:
+    return (status or "").upper() in BUSY_STATUSES
+
+
+class SpinnerDelegate(QStyledItemDelegate):
+    """
+    Args:
+        view: QListView / QTableView (or their *Widget variants) to install on
+        column: Only draw in this column (None = whole view)
+        interval_ms: Frame interval
+        size: Spinner diameter in pixels
+    """
+
+    def __init__(self, view, column=None, interval_ms: int = 80, size: int = 14, color: str = "#1E88E5"):
+        super().__init__(view)
+        self.view = view
+        self.column = column
+        self.size = int(size)
+        self.color = QColor(color)
+        self.phase = 0
+        self._timer = QTimer(self)
+        self._timer.setInterval(int(interval_ms))
+        self._timer.timeout.connect(self._tick)
+        if column is None:
+            view.setItemDelegate(self)
+        else:
+            view.setItemDelegateForColumn(column, self)
+        view.installEventFilter(self)
+        view.verticalScrollBar().valueChanged.connect(self.wake)
+        model = view.model()
+        for sig in (model.dataChanged, model.rowsInserted, model.modelReset, model.layoutChanged):
+            sig.connect(self.wake)
+
+    def wake(self, *_):
+        try:
+            if not self._timer.isActive() and self.view.isVisible():
+                self._timer.start()
+        except RuntimeError:  # view already destroyed (signals during teardown)
+            pass
+
+    def eventFilter(self, obj, ev):
+        if obj is self.view:
+            if ev.type() == QEvent.Show:
+                self.wake()
+            elif ev.type() == QEvent.Hide:
+                self._timer.stop()
+        return False
+
+    def _visible_busy(self):
+        vp = self.view.viewport()
+        area = vp.rect()
+        model = self.view.model()
+        col = self.column or 0
+        top = self.view.indexAt(area.topLeft())
+        row = top.row() if top.isValid() else 0
+        while row < model.rowCount():
+            ix = model.index(row, col)
+            rect = self.view.visualRect(ix)
+            if rect.top() > area.bottom():
+                break
+            if ix.data(BUSY_ROLE):
+                yield rect
+            row += 1
+
+    def _tick(self):
+        if not self.view.isVisible():
+            self._timer.stop()
+            return
+        self.phase = (self.phase + 1) % FRAMES
+        vp = self.view.viewport()
+        n = 0
+        for rect in self._visible_busy():
+            vp.update(self._spinner_rect(rect))
+            n += 1
+        if not n:
+            self._timer.stop()
+
+    def _spinner_rect(self, rect: QRect) -> QRect:
+        s = min(self.size, max(6, rect.height() - 4))
+        return QRect(rect.right() - s - 4, rect.top() + 4, s, s)
+
+    def paint(self, painter, option, index):
+        super().paint(painter, option, index)
+        if not index.data(BUSY_ROLE):
+            return
+        r = self._spinner_rect(option.rect)
+        painter.save()
+        painter.setRenderHint(QPainter.Antialiasing)
+        pen = QPen(self.color)
+        pen.setWidth(2)
+        pen.setCapStyle(Qt.RoundCap)
+        painter.setPen(pen)
+        # Qt angles are in 1/16 degree, counter-clockwise; rotate clockwise
+        painter.drawArc(r, -self.phase * (360 // FRAMES) * 16, 270 * 16)
+        painter.restore()
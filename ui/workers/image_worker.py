@@ -3,9 +3,11 @@
 Image Worker - Non-blocking image generation using QThread
 """
 import time
+from concurrent.futures import ThreadPoolExecutor
 
 from PyQt5.QtCore import QThread, pyqtSignal
 
+from services.image_gen_service import parallel_image_workers
 from utils.image_utils import convert_to_bytes
 
 
@@ -46,44 +48,55 @@ class ImageWorker(QThread):
             self.all_done.emit()
             return
         
-        for i, scene in enumerate(self.scenes):
-            try:
-                scene_idx = scene.get('index', i)
-                prompt = scene.get('prompt', '')
-                aspect_ratio = scene.get('aspect_ratio', '1:1')
+        workers = min(len(self.scenes), parallel_image_workers(api_keys)) if self.model == "gemini" else 1
+        if workers > 1:
+            # Scenes fan out across keys (one in-flight request per key via the shared
+            # rate limiter); scene_done arrives out of order, keyed by scene index
+            with ThreadPoolExecutor(max_workers=workers) as pool:
+                for i, scene in enumerate(self.scenes):
+                    pool.submit(self._run_scene, i, scene, api_keys)
+        else:
+            for i, scene in enumerate(self.scenes):
+                self._run_scene(i, scene, api_keys)
+                # Rate limiting between requests (reduced since generate_image_with_rate_limit handles it)
+                time.sleep(0.5)
 
-                self.progress.emit(scene_idx, f"Đang tạo ảnh cảnh {scene_idx + 1}...")
+        self.all_done.emit()
 
-                # Generate image based on model using rate-limited function
-                if self.model == "gemini":
-                    from services.image_gen_service import generate_image_with_rate_limit
-                    img_result = generate_image_with_rate_limit(
-                        prompt=prompt,
-                        api_keys=api_keys,
-                        model="gemini",
-                        aspect_ratio=aspect_ratio,
-                        logger=lambda msg: self.progress.emit(scene_idx, msg)
-                    )
-                    
-                    # Handle both bytes and data URL string formats
-                    img_bytes = None
-                    if img_result:
-                        img_bytes, error = convert_to_bytes(img_result)
-                        if not img_bytes and error:
-                            self.error.emit(scene_idx, error)
-                else:
-                    from services.whisk_service import generate_image
-                    img_bytes = generate_image(prompt)
+    def _run_scene(self, i: int, scene: dict, api_keys: list):
+        """Generate one scene image and emit scene_done / error"""
+        scene_idx = scene.get('index', i)
+        try:
+            prompt = scene.get('prompt', '')
+            aspect_ratio = scene.get('aspect_ratio', '1:1')
 
-                if img_bytes:
-                    self.scene_done.emit(scene_idx, img_bytes)
-                else:
-                    self.error.emit(scene_idx, "Không nhận được dữ liệu ảnh")
+            self.progress.emit(scene_idx, f"Đang tạo ảnh cảnh {scene_idx + 1}...")
 
-                # Rate limiting between requests (reduced since generate_image_with_rate_limit handles it)
-                time.sleep(0.5)
+            # Generate image based on model using rate-limited function
+            if self.model == "gemini":
+                from services.image_gen_service import generate_image_with_rate_limit
+                img_result = generate_image_with_rate_limit(
+                    prompt=prompt,
+                    api_keys=api_keys,
+                    model="gemini",
+                    aspect_ratio=aspect_ratio,
+                    logger=lambda msg: self.progress.emit(scene_idx, msg)
+                )
+                
+                # Handle both bytes and data URL string formats
+                img_bytes = None
+                if img_result:
+                    img_bytes, error = convert_to_bytes(img_result)
+                    if not img_bytes and error:
+                        self.error.emit(scene_idx, error)
+            else:
+                from services.whisk_service import generate_image
+                img_bytes = generate_image(prompt)
 
-            except Exception as e:
-                self.error.emit(scene_idx, f"Lỗi: {str(e)}")
+            if img_bytes:
+                self.scene_done.emit(scene_idx, img_bytes)
+            else:
+                self.error.emit(scene_idx, "Không nhận được dữ liệu ảnh")
 
-        self.all_done.emit()
+        except Exception as e:
+            self.error.emit(scene_idx, f"Lỗi: {str(e)}")
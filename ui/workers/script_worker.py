@@ -14,6 +14,7 @@ class ScriptWorker(QThread):
     # Signals
     progress = pyqtSignal(str)  # Progress messages
     done = pyqtSignal(dict)     # Result data
+    scene_ready = pyqtSignal(dict)  # Outline scene, emitted while the script is still streaming
     error = pyqtSignal(str)     # Error messages
 
     def __init__(self, cfg: dict, parent=None):
@@ -34,7 +35,7 @@ class ScriptWorker(QThread):
 
             from services.sales_script_service import build_outline
 
-            result = build_outline(self.cfg)
+            result = build_outline(self.cfg, on_scene=self.scene_ready.emit)
 
             self.progress.emit("Hoàn thành!")
             self.done.emit(result)
@@ -3,7 +3,11 @@
 Image utility functions for format conversion and handling
 """
 import base64
+import hashlib
+import mimetypes
+import os
 import re
+import tempfile
 from typing import Optional, Tuple
 
 
@@ -47,3 +51,119 @@ def convert_to_bytes(data) -> Tuple[Optional[bytes], Optional[str]]:
             return None, "Invalid data URL format"
     else:
         return None, "Unknown image format"
+
+
+# Target frame per Labs aspect hint (width, height); uploads are never upscaled
+_ASPECT_FRAMES = {
+    "IMAGE_ASPECT_RATIO_PORTRAIT": (1080, 1920),
+    "IMAGE_ASPECT_RATIO_LANDSCAPE": (1920, 1080),
+    "IMAGE_ASPECT_RATIO_SQUARE": (1080, 1080),
+}
+
+
+def _upload_settings() -> dict:
+    try:
+        from utils import config as cfg
+        return (cfg.load() or {}).get("upload_image") or {}
+    except Exception:
+        return {}
+
+
+def prepare_upload_image(image_path: str, aspect_hint: Optional[str] = None, max_side: Optional[int] = None,
+                         max_bytes: Optional[int] = None, fmt: Optional[str] = None,
+                         cache_dir: Optional[str] = None) -> Tuple[str, str]:
+    """
+    Downscale/re-encode an image before it is base64-uploaded to Labs or Whisk.
+
+    Applies EXIF orientation then drops all metadata, center-crops to the
+    aspect hint's frame (when given), fits the long side into max_side and
+    re-encodes as JPEG/WebP with decreasing quality until the file fits
+    max_bytes. Results are cached in an "_upload_cache" folder next to the
+    source image, keyed by path + mtime + size + settings; an image that
+    does not get smaller is remembered with a ".orig" marker so it is not
+    decoded again.
+
+    Args:
+        image_path: Source image
+        aspect_hint: IMAGE_ASPECT_RATIO_* value, or None to keep the aspect
+        max_side: Longest output side in pixels (default 1920)
+        max_bytes: Size budget for the encoded file (default 1.5 MB)
+        fmt: "JPEG" or "WEBP" (default JPEG)
+        cache_dir: Override the cache folder
+
+    Returns:
+        tuple: (path, mime) of the prepared file; the original file and its
+        guessed mime if Pillow is missing, the image cannot be decoded or
+        re-encoding does not make it smaller
+    """
+    st = _upload_settings()
+    max_side = int(max_side or st.get("max_side", 1920))
+    max_bytes = int(max_bytes or int(st.get("max_kb", 1536)) * 1024)
+    fmt = (fmt or st.get("format", "JPEG")).upper()
+    if fmt not in ("JPEG", "WEBP"):
+        fmt = "JPEG"
+    ext, mime = (".webp", "image/webp") if fmt == "WEBP" else (".jpg", "image/jpeg")
+    original = (image_path, mimetypes.guess_type(image_path)[0] or "image/jpeg")
+
+    try:
+        stat = os.stat(image_path)
+    except OSError:
+        return original
+    sig = f"{os.path.abspath(image_path)}|{stat.st_mtime}|{stat.st_size}|{aspect_hint}|{max_side}|{max_bytes}|{fmt}"
+    cache_dir = cache_dir or os.path.join(os.path.dirname(os.path.abspath(image_path)), "_upload_cache")
+    key = hashlib.sha1(sig.encode("utf-8")).hexdigest()
+    out_path = os.path.join(cache_dir, key + ext)
+    keep_marker = os.path.join(cache_dir, key + ".orig")
+    if os.path.exists(out_path):
+        return out_path, mime
+    if os.path.exists(keep_marker):
+        return original
+
+    try:
+        from PIL import Image, ImageOps
+    except ImportError:
+        return original
+    try:
+        with Image.open(image_path) as src:
+            img = ImageOps.exif_transpose(src)
+            img = img.convert("RGB")
+    except Exception:
+        return original
+
+    frame = _ASPECT_FRAMES.get(aspect_hint or "")
+    if frame:
+        # largest crop with the frame's aspect, capped at the frame size (never upscale)
+        ratio = frame[0] / frame[1]
+        cw, ch = (img.height * ratio, img.height) if img.width / img.height > ratio else (img.width, img.width / ratio)
+        k = min(1.0, frame[0] / cw)
+        img = ImageOps.fit(img, (max(1, int(cw * k)), max(1, int(ch * k))), method=Image.LANCZOS)
+    if max(img.size) > max_side:
+        img.thumbnail((max_side, max_side), Image.LANCZOS)
+
+    # concurrent uploads of the same image each encode into their own temp file;
+    # the last os.replace wins and both results are identical
+    tmp = None
+    try:
+        os.makedirs(cache_dir, exist_ok=True)
+        fd, tmp = tempfile.mkstemp(dir=cache_dir, prefix=key + ".", suffix=ext)
+        os.close(fd)
+        for quality in (90, 82, 75, 68, 60, 50):
+            img.save(tmp, format=fmt, quality=quality, optimize=True)
+            if os.path.getsize(tmp) <= max_bytes:
+                break
+        # never send something bigger than what we started with
+        if os.path.getsize(tmp) >= stat.st_size:
+            open(keep_marker, "wb").close()
+            return original
+        os.replace(tmp, out_path)
+        tmp = None
+        return out_path, mime
+    except Exception:
+        # read-only folder, full disk, encoder error: upload the original instead
+        return original
+    finally:
+        if tmp:
+            try:
+                os.remove(tmp)
+            except OSError:
+                pass